@@ -165,6 +165,14 @@ def createUnbefFlaechen(dbQK, liste_selAbflparamTeilgeb, autokorrektur, dbtyp='s
     # Erläuterung zur nachfolgenden SQL-Abfrage:
     # 1. aus der Abfrage werden alle Datensätze ohne geom-Objekte ausgeschlossen
     # 2. Wenn in einer tezg-Fläche keine Fläche liegt, wird einfach die tezg-Fläche übernommen
+    # 3. Restflächen ohne Geoobjekt oder mit einer Fläche bis 0.5 m² werden anschließend wieder 
+    #    gelöscht. Dazu wird die beim Einfügen per Trigger berechnete Spalte geomflaeche verwendet, 
+    #    so dass die Differenzfläche nur einmal berechnet werden muss. 
+
+    sql = u"""SELECT coalesce(max(pk), 0) FROM flaechen"""
+    if not dbQK.sql(sql, u"QKan.CreateUnbefFlaechen (3)"):
+        return False
+    pkmax = dbQK.fetchone()[0]
     
     sql = u"""WITH flbef AS (
             SELECT 'fd_' || ltrim(tezg.flnam, 'ft_') AS flnam, 
@@ -183,11 +191,20 @@ def createUnbefFlaechen(dbQK, liste_selAbflparamTeilgeb, autokorrektur, dbtyp='s
             INSERT INTO flaechen (flnam, haltnam, neigkl, regenschreiber, teilgebiet, abflussparameter, kommentar, geom) 
              SELECT flnam AS flnam, haltnam, neigkl, regenschreiber, teilgebiet, abflussparameter,
             kommentar, 
-            CASE WHEN geob IS NULL  THEN geot ELSE CastToMultiPolygon(Difference(geot,geob)) END AS geof FROM flbef
-            WHERE area(geof) > 0.5 AND geof IS NOT NULL""".format(auswahl=auswahl)
+            CASE WHEN geob IS NULL  THEN geot ELSE CastToMultiPolygon(Difference(geot,geob)) END AS geof FROM flbef""".format(auswahl=auswahl)
 
     logger.debug(u'QKan.k_unbef (3) - liste_selAbflparamTeilgeb = \n{}'.format(str(liste_selAbflparamTeilgeb)))
-    if not dbQK.sql(sql, u"QKan.CreateUnbefFlaechen (4)"):
+
+    # Der räumliche Index von flaechen wird erst nach dem Einfügen in einem Durchgang aufgebaut
+    with dbQK.massenladen([u'flaechen'], u'createUnbefFlaechen') as ta:
+        if not dbQK.sql(sql, u"QKan.CreateUnbefFlaechen (4)"):
+            return False
+
+        sql = u"""DELETE FROM flaechen
+                WHERE pk > {pkmax} AND (geom IS NULL OR geomflaeche IS NULL OR geomflaeche <= 0.5)""".format(pkmax=pkmax)
+        if not dbQK.sql(sql, u"QKan.CreateUnbefFlaechen (4a)"):
+            return False
+    if ta.fehler:
         return False
 
     # # status_message.setText(u"Erstellen der Anbindungen für die unbefestigten Flächen")
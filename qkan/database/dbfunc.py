@@ -32,7 +32,10 @@ import logging
 import os
 import shutil
 import glob
+import re
 import datetime
+import time
+from contextlib import contextmanager
 
 from qgis.core import QgsMessageLog, QgsProject
 from qgis.gui import QgsMessageBar
@@ -42,20 +45,84 @@ from qgis.utils import iface, pluginDirectory
 
 from PyQt4.QtGui import QProgressBar
 
-from qkan_database import createdbtables, versionolder, dbVersion
+from qkan_database import createdbtables, versionolder, dbVersion, geomkennwerte, sqlgeomkennwerte, sqlpruefungen, \
+    sqlzusatztabellen
 from qkan_utils import fortschritt, fehlermeldung, meldung
 
 logger = logging.getLogger(u'QKan')
 
 progress_bar = None
 
+# Anzahl der übersetzten SQL-Anweisungen, die je Verbindung zur Wiederverwendung vorgehalten
+# werden (Voreinstellung von SQLite: 100)
+STATEMENTCACHE = 200
+
+# Anzahl der Datensätze, die beim schrittweisen Lesen (DBConnection.abfrage) jeweils mit
+# fetchmany abgerufen werden
+BLOCKGROESSE = 1000
+
+
+# Registrierte Aktualisierungsschritte der Datenbank (s. DBConnection.updateversion) als Liste
+# von (Version, Beschreibung, Methode), aufsteigend nach Version sortiert
+_aktualisierungen = []
+
+# Anlegen eines räumlichen Index. Wird während updateversion bis zum Ende zurückgestellt.
+_CREATESPATIALINDEX = re.compile(
+    r"""^\s*SELECT\s+CreateSpatialIndex\s*\(\s*'(\w+)'\s*,\s*'(\w+)'\s*\)\s*;?\s*$""", re.IGNORECASE)
+
+
+def aktualisierung(version, beschreibung):
+    """Dekorator zur Registrierung eines Aktualisierungsschritts für DBConnection.updateversion
+
+    :version:       Version der Datenbank, die nach Ausführung des Schritts erreicht ist
+    :type version:  list of int
+
+    :beschreibung:  Kurzbeschreibung für das Protokoll
+    :type beschreibung: String
+    """
+
+    def registrieren(methode):
+        _aktualisierungen.append((version, beschreibung, methode))
+        _aktualisierungen.sort(key=lambda el: el[0])
+        return methode
+    return registrieren
+
+
+def _dictfactory(cursor, row):
+    """Zeilenformat 'dict': Datensatz als Dictionary mit den Spaltennamen als Schlüssel"""
+    return dict((spalte[0], wert) for spalte, wert in zip(cursor.description, row))
+
+
+# Zeilenformate für DBConnection.zeilenformat
+zeilenformate = {
+    u'tupel': None,
+    u'row': splite.Row,
+    u'dict': _dictfactory,
+}
+
+
+class Transaktion(object):
+    """Zustand einer mit DBConnection.transaktion geöffneten Transaktion bzw. eines Savepoints"""
+
+    def __init__(self, name, ebene):
+        self.name = name
+        self.ebene = ebene
+        self.fehler = False             # Bei Abschluss zurückrollen
+        self.commitaufrufe = 0          # Anzahl der zusammengefassten Aufrufe von commit()
+        self.start = time.time()
+
+    def verwerfen(self):
+        """Markiert die Transaktion, so dass ihre Änderungen bei Abschluss zurückgerollt werden"""
+        self.fehler = True
+
 
 # Hauptprogramm ----------------------------------------------------------------
 
 class DBConnection:
     """SpatiaLite Datenbankobjekt"""
 
-    def __init__(self, dbname=None, tabObject=None, epsg=25832, qkanDBUpdate=False):
+    def __init__(self, dbname=None, tabObject=None, epsg=25832, qkanDBUpdate=False,
+                 statementcache=STATEMENTCACHE, blockgroesse=BLOCKGROESSE):
         """Constructor. Überprüfung, ob die QKan-Datenbank die aktuelle Version hat, mit dem Attribut isCurrentVersion. 
 
         :param dbname:      Pfad zur SpatiaLite-Datenbankdatei. Falls nicht vorhanden, 
@@ -73,6 +140,13 @@ class DBConnection:
                             Nach Durchführung muss k_layersadapt mindestens mit den Optionen 
         :type qkanDBUpdate: Boolean
 
+        :statementcache:    Anzahl der übersetzten SQL-Anweisungen, die zur Wiederverwendung
+                            vorgehalten werden. Wirksam nur für Abfragen mit Platzhaltern (s. sql)
+        :type statementcache: integer
+
+        :blockgroesse:      Anzahl der Datensätze, die von abfrage jeweils gelesen werden
+        :type blockgroesse: integer
+
         
         public attributes:
 
@@ -82,11 +156,27 @@ class DBConnection:
         connected:          Datenbankverbindung erfolgreich
 
         isCurrentVersion:   Datenbank ist auf dem aktuellen Stand
+
+        commits:            Anzahl der tatsächlich ausgeführten COMMITs
+
+        commitaufrufe:      Anzahl der Aufrufe von commit(), einschließlich der innerhalb einer
+                            Transaktion zusammengefassten
         """
 
         # Übernahme einiger Attribute in die Klasse
         self.dbname = dbname
         self.epsg = epsg
+        self.blockgroesse = blockgroesse
+
+        # Offene Transaktionen (s. transaktion), äußerste zuerst
+        self.__transaktionen = []
+        self.commits = 0
+        self.commitaufrufe = 0
+
+        # Während updateversion zurückgestellte räumliche Indizes als Liste von (Tabelle, Spalte),
+        # sonst None
+        self.__raeumlicheindizes = None
+        self.updateprotokoll = []
 
         # Die nachfolgenden Klassenobjekte dienen dazu, gleichartige (sqlidtext) SQL-Debug-Meldungen 
         # nur einmal pro Sekunde zu erzeugen. 
@@ -106,7 +196,8 @@ class DBConnection:
         if dbname is not None:
             # Verbindung zur Datenbank herstellen oder die Datenbank neu erstellen
             if os.path.exists(dbname):
-                self.consl = splite.connect(database=dbname, check_same_thread=False)
+                self.consl = splite.connect(database=dbname, check_same_thread=False,
+                                            cached_statements=statementcache)
                 self.cursl = self.consl.cursor()
 
                 self.epsg = self.getepsg()
@@ -145,7 +236,7 @@ class DBConnection:
                     self.connected = False              # Verbindungsstatus zur Kontrolle
                     self.consl = None
 
-                self.consl = splite.connect(database=dbname)
+                self.consl = splite.connect(database=dbname, cached_statements=statementcache)
                 self.cursl = self.consl.cursor()
 
                 # sql = u'SELECT InitSpatialMetadata()'
@@ -170,7 +261,7 @@ class DBConnection:
             else:
 
                 try:
-                    self.consl = splite.connect(database=dbname)
+                    self.consl = splite.connect(database=dbname, cached_statements=statementcache)
                     self.cursl = self.consl.cursor()
 
                     self.epsg = self.getepsg()
@@ -224,11 +315,38 @@ class DBConnection:
         epsg = data[0]
         return epsg
 
-    def sql(self, sql, sqlinfo = u'allgemein', repeatmessage=False, transaction=False):
-        """Fuehrt eine SQL-Abfrage aus."""
+    def sql(self, sql, sqlinfo = u'allgemein', repeatmessage=False, transaction=False, parameter=None):
+        """Fuehrt eine SQL-Abfrage aus.
+
+        :sql:           SQL-Abfrage, ggfs. mit Platzhaltern (? oder :name)
+        :type sql:      String
+
+        :parameter:     Werte für die Platzhalter als Tupel oder Dictionary. Abfragen mit
+                        Platzhaltern werden von SQLite nur einmal übersetzt und bei gleichem Text
+                        aus dem Cache wiederverwendet. Außerdem müssen Texte (z.B. Namen mit
+                        Hochkomma) nicht maskiert werden.
+        :type parameter:  tuple, list oder dict
+        """
+
+        # Eine eigene Transaktion (z.B. in updateversion) geht in einer offenen Transaktion auf
+        if self.__transaktionen and sql.lstrip()[:5].upper() == u'BEGIN':
+            logger.debug(u'dbfunc.sql: {} übersprungen, Transaktion {} ist geöffnet'.format(
+                sql.strip(), self.__transaktionen[0].name))
+            return True
+
+        # Räumliche Indizes werden während updateversion erst am Ende angelegt
+        if self.__raeumlicheindizes is not None:
+            treffer = _CREATESPATIALINDEX.match(sql)
+            if treffer:
+                self.__raeumlicheindizes.append(treffer.groups())
+                logger.debug(u'dbfunc.sql: {} zurückgestellt'.format(sql.strip()))
+                return True
 
         try:
-            self.cursl.execute(sql)
+            if parameter is None:
+                self.cursl.execute(sql)
+            else:
+                self.cursl.execute(sql, parameter)
 
             # Identische Protokollmeldungen werden für 2 Sekunden unterdrückt...
             if self.sqltext == sqlinfo and not repeatmessage:
@@ -246,10 +364,32 @@ class DBConnection:
         except BaseException as err:
             fehlermeldung(u'dbfunc.sql: SQL-Fehler in {e}'.format(e=sqlinfo), 
                           u"{e}\n{s}".format(e=repr(err), s=sql))
-            # if transaction:
-                # self.cursl.commit("ROLLBACK;")
+            return self.__sqlfehler()
+
+    def executemany(self, sql, daten, sqlinfo = u'allgemein'):
+        """Fuehrt eine SQL-Abfrage mit Platzhaltern (?) für alle Datensätze in daten aus.
+        Die Abfrage wird dabei nur einmal übersetzt."""
+
+        try:
+            self.cursl.executemany(sql, daten)
+            logger.debug(u'dbfunc.executemany: {}\n{}\n'.format(sqlinfo,sql))
+            return True
+        except BaseException as err:
+            fehlermeldung(u'dbfunc.executemany: SQL-Fehler in {e}'.format(e=sqlinfo),
+                          u"{e}\n{s}".format(e=repr(err), s=sql))
+            return self.__sqlfehler()
+
+    def __sqlfehler(self):
+        """Behandlung eines SQL-Fehlers: Außerhalb einer Transaktion wird die Verbindung
+        geschlossen. Innerhalb bleibt sie geöffnet, alle offenen Transaktionen werden aber
+        zum Zurückrollen markiert."""
+
+        if self.__transaktionen:
+            for ta in self.__transaktionen:
+                ta.verwerfen()
+        else:
             self.__del__()
-            return False
+        return False
 
     def fetchall(self):
         """Gibt alle Daten aus der vorher ausgeführten SQL-Abfrage zurueck"""
@@ -263,16 +403,276 @@ class DBConnection:
         daten = self.cursl.fetchone()
         return daten
 
+    def zeilenformat(self, format=u'tupel'):
+        """Legt fest, in welcher Form fetchone und fetchall die Datensätze zurückgeben.
+
+        :format:        u'tupel': Tupel (Voreinstellung)
+                        u'row':   splite.Row, Zugriff über Index und Spaltenname
+                        u'dict':  Dictionary mit den Spaltennamen als Schlüssel
+        :type format:   String
+
+        :returns:       Bisheriges Zeilenformat
+        :rtype:         String
+        """
+
+        vorher = [k for k, v in zeilenformate.items() if v is self.cursl.row_factory]
+        self.cursl.row_factory = zeilenformate[format]
+        return vorher[0] if vorher else u'tupel'
+
     def fetchnext(self):
         """Gibt den naechsten Datensatz aus der vorher ausgeführten SQL-Abfrage zurueck"""
 
-        daten = self.cursl.fetchnext()
+        daten = self.cursl.fetchone()
         return daten
 
-    def commit(self):
-        """Schliesst eine SQL-Abfrage ab"""
+    def abfrage(self, sql, sqlinfo=u'allgemein', parameter=None, blockgroesse=None):
+        """Führt eine SQL-Abfrage mit einem eigenen Cursor aus und gibt die Datensätze
+        schrittweise zurück, ohne das gesamte Ergebnis in eine Liste zu laden.
+
+        Da jede Abfrage einen eigenen Cursor erhält, können mehrere Abfragen gleichzeitig
+        gelesen und währenddessen mit sql oder executemany (z.B. in eine andere Tabelle)
+        geschrieben werden. Während des Lesens darf nicht commit() aufgerufen werden, weil
+        SQLite dabei offene Abfragen zurücksetzt.
+
+        Beispiel::
+
+            zeilen = dbQK.abfrage(sql, u'export (1)')
+            if zeilen is None:
+                return False
+            for attr in zeilen:
+                ...
 
+        :sql:           SQL-Abfrage, ggfs. mit Platzhaltern
+        :type sql:      String
+
+        :parameter:     Werte für die Platzhalter (s. sql)
+        :type parameter: tuple, list oder dict
+
+        :blockgroesse:  Anzahl der jeweils mit fetchmany gelesenen Datensätze,
+                        None: Voreinstellung der Verbindung
+        :type blockgroesse: integer
+
+        :returns:       Iterator über die Datensätze im aktuellen Zeilenformat, None bei einem Fehler
+        :rtype:         generator
+        """
+
+        cursor = self.consl.cursor()
+        cursor.row_factory = self.cursl.row_factory
+        try:
+            if parameter is None:
+                cursor.execute(sql)
+            else:
+                cursor.execute(sql, parameter)
+            logger.debug(u'dbfunc.abfrage: {}\n{}\n'.format(sqlinfo, sql))
+        except BaseException as err:
+            fehlermeldung(u'dbfunc.abfrage: SQL-Fehler in {e}'.format(e=sqlinfo),
+                          u"{e}\n{s}".format(e=repr(err), s=sql))
+            cursor.close()
+            self.__sqlfehler()
+            return None
+
+        return self.__zeilen(cursor, blockgroesse or self.blockgroesse)
+
+    @staticmethod
+    def __zeilen(cursor, blockgroesse):
+        """Liest die Datensätze eines Cursors blockweise"""
+
+        try:
+            while True:
+                daten = cursor.fetchmany(blockgroesse)
+                if not daten:
+                    break
+                for attr in daten:
+                    yield attr
+        finally:
+            try:
+                cursor.close()
+            except BaseException:
+                pass                    # Verbindung wurde bereits geschlossen
+
+    def commit(self):
+        """Schliesst eine SQL-Abfrage ab. Innerhalb einer Transaktion wird der Aufruf nur gezählt, 
+        die Änderungen werden mit dem Abschluss der äußersten Transaktion gespeichert."""
+
+        self.commitaufrufe += 1
+        if self.__transaktionen:
+            for ta in self.__transaktionen:
+                ta.commitaufrufe += 1
+            return
         self.consl.commit()
+        self.commits += 1
+
+    @contextmanager
+    def transaktion(self, name=u'allgemein'):
+        """Führt die Anweisungen im with-Block in einer Transaktion aus.
+
+        Die äußerste Transaktion wird mit BEGIN geöffnet und am Ende mit einem einzigen COMMIT
+        gespeichert; Aufrufe von commit() im Block werden nur gezählt. Verschachtelte
+        Transaktionen werden als Savepoints angelegt. Bei einem SQL-Fehler (sql, executemany)
+        wird die Verbindung nicht geschlossen, sondern alle offenen Transaktionen werden
+        zurückgerollt. Dasselbe gilt bei einer Ausnahme oder nach Transaktion.verwerfen().
+
+        Beispiel::
+
+            with dbQK.transaktion(u'import') as ta:
+                if not dbQK.sql(sql, u'import (1)'):
+                    return False
+            if ta.fehler:
+                return False
+
+        :name:          Bezeichnung für das Protokoll
+        :type name:     String
+
+        :returns:       Zustand der Transaktion
+        :rtype:         Transaktion
+        """
+
+        ta = Transaktion(name, len(self.__transaktionen))
+        if ta.ebene == 0:
+            # Implizit geöffnete Transaktion abschließen und die automatische Transaktions-
+            # steuerung des Moduls abschalten, damit BEGIN und SAVEPOINT erhalten bleiben.
+            self.consl.commit()
+            isolation = self.consl.isolation_level
+            self.consl.isolation_level = None
+            self.cursl.execute(u'BEGIN')
+        else:
+            self.cursl.execute(u'SAVEPOINT qkan_{}'.format(ta.ebene))
+        self.__transaktionen.append(ta)
+
+        try:
+            yield ta
+        except BaseException:
+            ta.verwerfen()
+            raise
+        finally:
+            self.__transaktionen.pop()
+            try:
+                if ta.ebene == 0:
+                    try:
+                        self.cursl.execute(u'ROLLBACK' if ta.fehler else u'COMMIT')
+                    finally:
+                        self.consl.isolation_level = isolation
+                    if not ta.fehler:
+                        self.commits += 1
+                elif ta.fehler:
+                    self.cursl.execute(u'ROLLBACK TO qkan_{}'.format(ta.ebene))
+                    self.cursl.execute(u'RELEASE qkan_{}'.format(ta.ebene))
+                else:
+                    self.cursl.execute(u'RELEASE qkan_{}'.format(ta.ebene))
+            except BaseException as err:
+                # z.B. wenn SQLite die Transaktion nach einem schweren Fehler bereits beendet hat
+                logger.error(u'dbfunc.transaktion {}: Abschluss fehlgeschlagen: {}'.format(name, repr(err)))
+                ta.fehler = True
+
+            logger.debug(u'dbfunc.transaktion {name}: {erg} nach {dauer:.2f} s, {n} Aufrufe von commit()'.format(
+                name=name, erg=u'zurückgerollt' if ta.fehler else u'gespeichert',
+                dauer=time.time() - ta.start, n=ta.commitaufrufe))
+
+    @contextmanager
+    def massenladen(self, tabellen, name=u'massenladen'):
+        """Führt umfangreiche Schreibvorgänge ohne laufende Pflege der räumlichen Indizes aus.
+
+        Für die angegebenen Tabellen werden die räumlichen Indizes (R*Tree) mit
+        DisableSpatialIndex abgeschaltet und verworfen, so dass beim Einfügen und Ändern
+        keine Index-Trigger je Datensatz ausgelöst werden. Am Ende des with-Blocks werden sie
+        mit CreateSpatialIndex in einem Durchgang neu aufgebaut. Der Block läuft in einer
+        Transaktion (s. transaktion); bei einem Fehler wird auch das Abschalten der Indizes
+        zurückgerollt.
+
+        Innerhalb des Blocks darf für diese Tabellen nicht über die Sicht SpatialIndex
+        gesucht werden.
+
+        Beispiel::
+
+            with dbQK.massenladen([u'flaechen'], u'createUnbefFlaechen') as ta:
+                if not dbQK.sql(sql, u'createUnbefFlaechen (4)'):
+                    return False
+            if ta.fehler:
+                return False
+
+        :tabellen:      Tabellen, in die geschrieben wird
+        :type tabellen: list of String
+
+        :name:          Bezeichnung für das Protokoll
+        :type name:     String
+
+        :returns:       Zustand der Transaktion
+        :rtype:         Transaktion
+        """
+
+        with self.transaktion(name) as ta:
+            indizes = self.__indizesabschalten(tabellen)
+            if indizes is None:
+                ta.verwerfen()
+                indizes = []
+
+            yield ta
+
+            start = time.time()
+            for tabelle, spalte in indizes:
+                if ta.fehler:
+                    break
+                sql = u"""SELECT CreateSpatialIndex(?, ?)"""
+                if not self.sql(sql, u'dbfunc.massenladen (3)', parameter=(tabelle, spalte)):
+                    break
+                if self.fetchone()[0] != 1:
+                    fehlermeldung(u'dbfunc.massenladen: Fehler',
+                                  u'Der räumliche Index für {}.{} konnte nicht angelegt werden'.format(tabelle, spalte))
+                    ta.verwerfen()
+            logger.debug(u'dbfunc.massenladen {}: {} räumliche Indizes in {:.2f} s neu aufgebaut'.format(
+                name, len(indizes), time.time() - start))
+
+    def __indizesabschalten(self, tabellen):
+        """Schaltet die räumlichen Indizes der Tabellen ab und löscht die Indextabellen.
+
+        :returns:       Abgeschaltete Indizes als Liste von (Tabelle, Spalte), None bei Fehler
+        :rtype:         list of tuples
+        """
+
+        sql = u"""SELECT f_table_name, f_geometry_column
+                FROM geometry_columns
+                WHERE spatial_index_enabled = 1 AND lower(f_table_name) IN ({})""".format(
+            u', '.join([u'lower(?)'] * len(tabellen)))
+        if not self.sql(sql, u'dbfunc.massenladen (1)', parameter=tuple(tabellen)):
+            return None
+        indizes = self.fetchall()
+
+        for tabelle, spalte in indizes:
+            sqllis = [(u"""SELECT DisableSpatialIndex(?, ?)""", (tabelle, spalte)),
+                      (u'''DROP TABLE IF EXISTS "idx_{}_{}"'''.format(tabelle, spalte), None)]
+            for sql, parameter in sqllis:
+                if not self.sql(sql, u'dbfunc.massenladen (2)', parameter=parameter):
+                    return None
+
+        return indizes
+
+    def dataversion(self):
+        """Gibt den Änderungszähler der Datenbank zurück (PRAGMA data_version).
+
+        Der Wert ändert sich, sobald über eine andere Verbindung (z.B. einen bearbeiteten
+        Layer in QGIS) Änderungen in die Datenbank geschrieben wurden. """
+
+        sql = u'PRAGMA data_version'
+        if not self.sql(sql, u'dbfunc.dataversion'):
+            return None
+
+        data = self.cursl.fetchone()
+        if data is None:
+            return None
+        return data[0]
+
+    def sqliteversion(self):
+        """Gibt die Version der verwendeten SQLite-Bibliothek als Tupel zurück, z.B. (3, 25, 2). 
+
+        Damit kann geprüft werden, ob neuere SQL-Funktionen (z.B. Fensterfunktionen) zur 
+        Verfügung stehen. """
+
+        sql = u'SELECT sqlite_version()'
+        if not self.sql(sql, u'dbfunc.sqliteversion'):
+            return (0, 0, 0)
+
+        data = self.cursl.fetchone()
+        return tuple(int(nr) for nr in data[0].split(u'.')[:3])
 
     # Versionskontrolle der QKan-Datenbank
 
@@ -319,1095 +719,1149 @@ class DBConnection:
 
     # Aktualisierung der QKan-Datenbank auf aktuellen Stand
 
-    def updateversion(self):
+    def updateversion(self, probelauf=False):
         """Aktualisiert die QKan-Datenbank auf den aktuellen Stand. 
 
-           Es werden die nötigen Anpassungen vorgenommen und die Versionsnummer jeweils aktualisiert.
+           Es werden alle registrierten Aktualisierungsschritte (s. aktualisierung), die neuer
+           als die Version der Datenbank sind, in aufsteigender Reihenfolge ausgeführt. Alle
+           Schritte laufen in einer gemeinsamen Transaktion, so dass eine fehlgeschlagene
+           Aktualisierung die Datenbank im alten Zustand hinterlässt. Räumliche Indizes werden
+           erst nach dem letzten Schritt angelegt, damit beim Umspeichern von Tabellen kein
+           Index laufend nachgeführt werden muss.
            Falls Tabellenspalten umbenannt oder gelöscht wurden, wird eine Warnmeldung erzeugt
            mit der Empfehlung, das aktuelle Projekt neu zu laden. 
 
-        """
+           Die Laufzeiten der einzelnen Schritte stehen anschließend in self.updateprotokoll
+           als Liste von (Version, Beschreibung, Sekunden).
 
-        # Nur wenn Stand der Datenbank nicht aktuell
-        if not self.checkVersion():
-
-            self.versionlis = [int(el.replace('a','').replace('b','').replace('c','')) for el in self.versiondbQK.split('.')]
-            logger.debug(u'dbfunc.updateversion: versiondbQK = {}'.format(self.versiondbQK))
-
-            # Status, wenn die Änderungen so gravierend waren, dass das Projekt neu geladen werden muss. 
-            self.reload = False
+           :probelauf:  Alle Schritte ausführen und die Laufzeiten protokollieren, die Änderungen
+                        anschließend aber zurückrollen.
+           :type probelauf: Boolean
 
-            global progress_bar
-            progress_bar = QProgressBar(iface.messageBar())
-            progress_bar.setRange(0, 100)
-            progress_bar.setValue(0)
-
-            # ---------------------------------------------------------------------------------------------
-            # Aktualisierung von Version 1.9.9 und früher
+           :returns:    Aktualisierung (bzw. Probelauf) erfolgreich
+           :rtype:      Boolean
+        """
 
-            if versionolder(self.versionlis, [2, 0, 2]):
+        self.updateprotokoll = []
 
-                # Tabelle einleit
-                sqllis = [u"""CREATE TABLE IF NOT EXISTS einleit (
-                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                    elnam TEXT,
-                    haltnam TEXT,
-                    teilgebiet TEXT, 
-                    zufluss REAL,
-                    kommentar TEXT,
-                    createdat TEXT DEFAULT CURRENT_DATE)""", 
-                u"""SELECT AddGeometryColumn('einleit','geom',{},'POINT',2)""".format(self.epsg),
-                u"""SELECT CreateSpatialIndex('einleit','geom')"""]
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (3c)'):
-                        return False
+        # Nur wenn Stand der Datenbank nicht aktuell
+        if self.checkVersion():
+            return True
 
-                sqllis = [u"""CREATE TABLE IF NOT EXISTS linksw (
-                        pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                        elnam TEXT,
-                        haltnam TEXT,
-                        teilgebiet TEXT)""", 
-                        u"""SELECT AddGeometryColumn('linksw','geom',{},'POLYGON',2)""".format(self.epsg), 
-                        u"""SELECT AddGeometryColumn('linksw','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg), 
-                        u"""SELECT AddGeometryColumn('linksw','glink',{},'LINESTRING',2)""".format(self.epsg),
-                        u"""SELECT CreateSpatialIndex('linksw','geom')"""]
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (3d)'):
-                        return False
+        self.versionlis = [int(el.replace('a','').replace('b','').replace('c','')) for el in self.versiondbQK.split('.')]
+        logger.debug(u'dbfunc.updateversion: versiondbQK = {}'.format(self.versiondbQK))
 
-                self.versionlis = [2, 0, 2]
+        # Status, wenn die Änderungen so gravierend waren, dass das Projekt neu geladen werden muss. 
+        self.reload = False
 
+        global progress_bar
+        progress_bar = QProgressBar(iface.messageBar())
+        progress_bar.setRange(0, 100)
+        progress_bar.setValue(0)
 
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 1, 2]):
+        schritte = [el for el in _aktualisierungen if versionolder(self.versionlis, el[0])]
 
-                attrlis = self.attrlist(u'linksw')
-                if not attrlis:
-                    fehlermeldung(u'dbfunc.version (2.0.2):', u'attrlis für linksw ist leer')
-                    return False
-                elif u'elnam' not in attrlis:
-                    logger.debug(u'linksw.elnam ist nicht in: {}'.format(str(attrlis)))
-                    sql = u"""ALTER TABLE linksw ADD COLUMN elnam TEXT"""
-                    if not self.sql(sql, u'dbfunc.version (2.0.2-1)'):
-                        return False
-                    self.commit()
+        with self.transaktion(u'updateversion') as ta:
+            erfolg = self.__aktualisieren(schritte)
+            if not erfolg or probelauf:
+                ta.verwerfen()
 
-                attrlis = self.attrlist(u'linkfl')
-                if not attrlis:
-                    fehlermeldung(u'dbfunc.version (2.0.2):', u'attrlis für linkfl ist leer')
-                    return False
-                elif u'tezgnam' not in attrlis:
-                    logger.debug(u'linkfl.tezgnam ist nicht in: {}'.format(str(attrlis)))
-                    sql = u"""ALTER TABLE linkfl ADD COLUMN tezgnam TEXT"""
-                    if not self.sql(sql, u'dbfunc.version (2.0.2-3)'):
-                        return False
-                    self.commit()
+        gesamt = sum(el[2] for el in self.updateprotokoll)
+        logger.info(u'dbfunc.updateversion{}: {} -> {} in {:.1f} s\n{}'.format(
+            u' (Probelauf)' if probelauf else u'', self.versiondbQK, self.actversion, gesamt,
+            u'\n'.join([u'{:>8s}  {:8.2f} s  {}'.format(v, d, b) for v, b, d in self.updateprotokoll])))
 
-                self.versionlis = [2, 1, 2]
+        if probelauf:
+            self.reload = False
+            return erfolg
+        if ta.fehler:
+            return False
 
+        if self.reload:
+            meldung(u"Achtung! Benutzerhinweis!", u"Die Datenbank wurde geändert. Bitte QGIS-Projekt nach dem Speichern neu laden...")
+            return False
 
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 2, 0]):
-                attrlis = self.attrlist(u'einleit')
-                if not attrlis:
-                    return False
-                elif u'ew' not in attrlis:
-                    logger.debug(u'einleit.ew ist nicht in: {}'.format(str(attrlis)))
-                    sql = u"""ALTER TABLE einleit ADD COLUMN ew REAL"""
-                    if not self.sql(sql, u'dbfunc.version (2.1.2-1)'):
-                        return False
-                    sql = u"""ALTER TABLE einleit ADD COLUMN einzugsgebiet TEXT"""
-                    if not self.sql(sql, u'dbfunc.version (2.1.2-2)'):
-                        return False
-                    self.commit()
+        # Alles gut gelaufen...
 
+        return True
 
-                sql = u"""CREATE TABLE IF NOT EXISTS einzugsgebiete (
-                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                    tgnam TEXT,
-                    ewdichte REAL,
-                    wverbrauch REAL,
-                    stdmittel REAL,
-                    fremdwas REAL,
-                    kommentar TEXT,
-                    createdat TEXT DEFAULT CURRENT_DATE)"""
+    def __aktualisieren(self, schritte):
+        """Führt die Aktualisierungsschritte aus, legt die zurückgestellten räumlichen Indizes
+        an und schreibt die neue Versionsnummer.
 
-                if not self.sql(sql, u'dbfunc.version (2.1.2-3)'):
-                    return False
+        :returns:       Erfolg
+        :rtype:         Boolean
+        """
 
-                sql = u"""SELECT AddGeometryColumn('einzugsgebiete','geom',{},'MULTIPOLYGON',2)""".format(self.epsg)
-                if not self.sql(sql, u'dbfunc.version (2.1.2-4)'):
+        self.__raeumlicheindizes = []
+        try:
+            for n, (version, beschreibung, schritt) in enumerate(schritte):
+                start = time.time()
+                if schritt(self) is False:
+                    logger.error(u'dbfunc.updateversion: Schritt {} ({}) fehlgeschlagen'.format(
+                        u'.'.join(str(v) for v in version), beschreibung))
                     return False
+                self.versionlis = version
+                self.updateprotokoll.append((u'.'.join(str(v) for v in version), beschreibung,
+                                             time.time() - start))
+                progress_bar.setValue(int(90 * (n + 1) / len(schritte)))
+        finally:
+            indizes = self.__raeumlicheindizes
+            self.__raeumlicheindizes = None
+
+        # Räumliche Indizes für alle Geometriespalten anlegen, die noch existieren und noch
+        # keinen Index haben
+        start = time.time()
+        erledigt = set()
+        for tabelle, spalte in indizes:
+            if (tabelle.lower(), spalte.lower()) in erledigt:
+                continue
+            erledigt.add((tabelle.lower(), spalte.lower()))
+            sql = u"""SELECT spatial_index_enabled
+                    FROM geometry_columns
+                    WHERE lower(f_table_name) = lower(?) AND lower(f_geometry_column) = lower(?)"""
+            if not self.sql(sql, u'dbfunc.updateversion (Index 1)', parameter=(tabelle, spalte)):
+                return False
+            daten = self.fetchone()
+            if daten is None or daten[0] == 1:
+                continue
+            sql = u"""SELECT CreateSpatialIndex(?, ?)"""
+            if not self.sql(sql, u'dbfunc.updateversion (Index 2)', parameter=(tabelle, spalte)):
+                return False
+        if indizes:
+            self.updateprotokoll.append((u'', u'Räumliche Indizes ({})'.format(len(erledigt)),
+                                         time.time() - start))
 
-                sql = u"""SELECT CreateSpatialIndex('einzugsgebiete','geom')"""
-                if not self.sql(sql, u'dbfunc.version (2.1.2-5)'):
-                    return False
+        # Aktuelle Version in Tabelle "info" schreiben
+        sql = u"""UPDATE info SET value = ? WHERE subject = 'version'"""
+        if not self.sql(sql, u'dbfunc.version (aktuell)', parameter=(self.actversion,)):
+            return False
 
-                self.versionlis = [2, 2, 0]
+        progress_bar.setValue(100)
+        return True
+
+    # ---------------------------------------------------------------------------------------------
+    # Aktualisierungsschritte. Jeder Schritt wird mit dem Dekorator aktualisierung für die
+    # Version registriert, die nach seiner Ausführung erreicht ist. Die Schritte werden innerhalb
+    # der Transaktion von updateversion aufgerufen und dürfen daher weder commit() aufrufen noch
+    # eine eigene Transaktion öffnen. CreateSpatialIndex wird bis zum Ende zurückgestellt.
+    # Rückgabe: False bei einem Fehler.
+
+    @aktualisierung([2, 0, 2], u'Tabellen einleit und linksw')
+    def _version_2_0_2(self):
+        # Tabelle einleit
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS einleit (
+            pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            elnam TEXT,
+            haltnam TEXT,
+            teilgebiet TEXT, 
+            zufluss REAL,
+            kommentar TEXT,
+            createdat TEXT DEFAULT CURRENT_DATE)""", 
+        u"""SELECT AddGeometryColumn('einleit','geom',{},'POINT',2)""".format(self.epsg),
+        u"""SELECT CreateSpatialIndex('einleit','geom')"""]
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (3c)'):
+                return False
 
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS linksw (
+                pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                elnam TEXT,
+                haltnam TEXT,
+                teilgebiet TEXT)""", 
+                u"""SELECT AddGeometryColumn('linksw','geom',{},'POLYGON',2)""".format(self.epsg), 
+                u"""SELECT AddGeometryColumn('linksw','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg), 
+                u"""SELECT AddGeometryColumn('linksw','glink',{},'LINESTRING',2)""".format(self.epsg),
+                u"""SELECT CreateSpatialIndex('linksw','geom')"""]
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (3d)'):
+                return False
 
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 2, 1]):
+        return True
 
-                attrlis = self.attrlist(u'flaechen')
-                if not attrlis:
-                    return False
-                elif u'abflusstyp' not in attrlis:
-                    logger.debug(u'flaechen.abflusstyp ist nicht in: {}'.format(str(attrlis)))
-                    sql = u"""ALTER TABLE flaechen ADD COLUMN abflusstyp TEXT"""
-                    if not self.sql(sql, u'dbfunc.version (2.2.0-1)'):
-                        return False
-                    self.commit()
+    @aktualisierung([2, 1, 2], u'Spalten linksw.elnam und linkfl.tezgnam')
+    def _version_2_1_2(self):
+        attrlis = self.attrlist(u'linksw')
+        if not attrlis:
+            fehlermeldung(u'dbfunc.version (2.0.2):', u'attrlis für linksw ist leer')
+            return False
+        elif u'elnam' not in attrlis:
+            logger.debug(u'linksw.elnam ist nicht in: {}'.format(str(attrlis)))
+            sql = u"""ALTER TABLE linksw ADD COLUMN elnam TEXT"""
+            if not self.sql(sql, u'dbfunc.version (2.0.2-1)'):
+                return False
 
-                self.versionlis = [2, 2, 1]
+        attrlis = self.attrlist(u'linkfl')
+        if not attrlis:
+            fehlermeldung(u'dbfunc.version (2.0.2):', u'attrlis für linkfl ist leer')
+            return False
+        elif u'tezgnam' not in attrlis:
+            logger.debug(u'linkfl.tezgnam ist nicht in: {}'.format(str(attrlis)))
+            sql = u"""ALTER TABLE linkfl ADD COLUMN tezgnam TEXT"""
+            if not self.sql(sql, u'dbfunc.version (2.0.2-3)'):
+                return False
 
+        return True
 
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 2, 2]):
+    @aktualisierung([2, 2, 0], u'Spalten in einleit, Tabelle einzugsgebiete')
+    def _version_2_2_0(self):
+        attrlis = self.attrlist(u'einleit')
+        if not attrlis:
+            return False
+        elif u'ew' not in attrlis:
+            logger.debug(u'einleit.ew ist nicht in: {}'.format(str(attrlis)))
+            sql = u"""ALTER TABLE einleit ADD COLUMN ew REAL"""
+            if not self.sql(sql, u'dbfunc.version (2.1.2-1)'):
+                return False
+            sql = u"""ALTER TABLE einleit ADD COLUMN einzugsgebiet TEXT"""
+            if not self.sql(sql, u'dbfunc.version (2.1.2-2)'):
+                return False
 
-                attrlis = self.attrlist(u'flaechen')
-                if not attrlis:
-                    return False
-                elif u'abflusstyp' not in attrlis:
-                    logger.debug(u'flaechen.abflusstyp ist nicht in: {}'.format(str(attrlis)))
-                    sql = u"""ALTER TABLE flaechen ADD COLUMN abflusstyp TEXT"""
-                    if not self.sql(sql, u'dbfunc.version (2.2.1-1)'):
-                        return False
-                    self.commit()
+        sql = u"""CREATE TABLE IF NOT EXISTS einzugsgebiete (
+            pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            tgnam TEXT,
+            ewdichte REAL,
+            wverbrauch REAL,
+            stdmittel REAL,
+            fremdwas REAL,
+            kommentar TEXT,
+            createdat TEXT DEFAULT CURRENT_DATE)"""
+
+        if not self.sql(sql, u'dbfunc.version (2.1.2-3)'):
+            return False
 
-                self.versionlis = [2, 2, 2]
+        sql = u"""SELECT AddGeometryColumn('einzugsgebiete','geom',{},'MULTIPOLYGON',2)""".format(self.epsg)
+        if not self.sql(sql, u'dbfunc.version (2.1.2-4)'):
+            return False
 
+        sql = u"""SELECT CreateSpatialIndex('einzugsgebiete','geom')"""
+        if not self.sql(sql, u'dbfunc.version (2.1.2-5)'):
+            return False
 
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 2, 3]):
+        return True
 
+    @aktualisierung([2, 2, 1], u'Spalte flaechen.abflusstyp')
+    def _version_2_2_1(self):
+        attrlis = self.attrlist(u'flaechen')
+        if not attrlis:
+            return False
+        elif u'abflusstyp' not in attrlis:
+            logger.debug(u'flaechen.abflusstyp ist nicht in: {}'.format(str(attrlis)))
+            sql = u"""ALTER TABLE flaechen ADD COLUMN abflusstyp TEXT"""
+            if not self.sql(sql, u'dbfunc.version (2.2.0-1)'):
+                return False
 
-                # Tabelle flaechen -------------------------------------------------------------
+        return True
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='flaechen'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (1)'):
-                    # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS flaechen_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            neigkl INTEGER DEFAULT 0,
-                            abflusstyp TEXT, 
-                            he_typ INTEGER DEFAULT 0,
-                            speicherzahl INTEGER DEFAULT 2,
-                            speicherkonst REAL,
-                            fliesszeit REAL,
-                            fliesszeitkanal REAL,
-                            teilgebiet TEXT,
-                            regenschreiber TEXT,
-                            abflussparameter TEXT,
-                            aufteilen TEXT DEFAULT 'nein',
-                            kommentar TEXT,
-                            createdat TEXT DEFAULT CURRENT_DATE);""",
-                          u"""SELECT AddGeometryColumn('flaechen_t','geom',{},'MULTIPOLYGON',2);""".format(self.epsg),
-                          u"""DELETE FROM flaechen_t""",
-                          u"""INSERT INTO flaechen_t 
-                            (      "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
-                                   "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
-                            SELECT "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
-                                   "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
-                            FROM "flaechen";""",
-                          u"""SELECT DiscardGeometryColumn('flaechen','geom')""",
-                          u"""DROP TABLE flaechen;""",
-                          u"""CREATE TABLE flaechen (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            neigkl INTEGER DEFAULT 0,
-                            abflusstyp TEXT, 
-                            he_typ INTEGER DEFAULT 0,
-                            speicherzahl INTEGER DEFAULT 2,
-                            speicherkonst REAL,
-                            fliesszeit REAL,
-                            fliesszeitkanal REAL,
-                            teilgebiet TEXT,
-                            regenschreiber TEXT,
-                            abflussparameter TEXT,
-                            aufteilen TEXT DEFAULT 'nein',
-                            kommentar TEXT,
-                            createdat TEXT DEFAULT CURRENT_DATE);""",
-                          u"""SELECT AddGeometryColumn('flaechen','geom',{},'MULTIPOLYGON',2);""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('flaechen','geom')""",
-                          u"""INSERT INTO flaechen 
-                            (      "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
-                                   "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
-                            SELECT "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
-                                   "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
-                            FROM "flaechen_t";""",
-                          u"""SELECT DiscardGeometryColumn('flaechen_t','geom')""",
-                          u"""DROP TABLE flaechen_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.2.2-1)', transaction=True):
-                        return False
+    @aktualisierung([2, 2, 2], u'Spalte flaechen.abflusstyp (Nachtrag)')
+    def _version_2_2_2(self):
+        attrlis = self.attrlist(u'flaechen')
+        if not attrlis:
+            return False
+        elif u'abflusstyp' not in attrlis:
+            logger.debug(u'flaechen.abflusstyp ist nicht in: {}'.format(str(attrlis)))
+            sql = u"""ALTER TABLE flaechen ADD COLUMN abflusstyp TEXT"""
+            if not self.sql(sql, u'dbfunc.version (2.2.1-1)'):
+                return False
 
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'flaechen' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-2)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
-
-                # 4. Schritt: Transaction abschließen
-                self.commit()
-
-                # 5. Schritt: Spalte abflusstyp aus Spalte he_typ übertragen
-                sql = u"""UPDATE flaechen SET abflusstyp = 
-                        CASE he_typ 
-                            WHEN 0 THEN 'Direktabfluss' 
-                            WHEN 1 THEN 'Fließzeiten' 
-                            WHEN 2 THEN 'Schwerpunktfließzeit'
-                            ELSE NULL END
-                        WHERE abflusstyp IS NULL"""
-
-                if not self.sql(sql, u'dbfunc.version (2.2.2-3)'):
-                    return False
+        return True
 
+    @aktualisierung([2, 2, 3], u'Tabellen flaechen, linksw, linkfl und einleit umspeichern')
+    def _version_2_2_3(self):
+        # Tabelle flaechen -------------------------------------------------------------
 
-                progress_bar.setValue(15)
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='flaechen'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (1)'):
+            # return False
+        # triggers = self.fetchall()
 
-                # Tabelle linksw -------------------------------------------------------------
+        # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS flaechen_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    neigkl INTEGER DEFAULT 0,
+                    abflusstyp TEXT, 
+                    he_typ INTEGER DEFAULT 0,
+                    speicherzahl INTEGER DEFAULT 2,
+                    speicherkonst REAL,
+                    fliesszeit REAL,
+                    fliesszeitkanal REAL,
+                    teilgebiet TEXT,
+                    regenschreiber TEXT,
+                    abflussparameter TEXT,
+                    aufteilen TEXT DEFAULT 'nein',
+                    kommentar TEXT,
+                    createdat TEXT DEFAULT CURRENT_DATE);""",
+                  u"""SELECT AddGeometryColumn('flaechen_t','geom',{},'MULTIPOLYGON',2);""".format(self.epsg),
+                  u"""DELETE FROM flaechen_t""",
+                  u"""INSERT INTO flaechen_t 
+                    (      "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
+                           "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
+                    SELECT "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
+                           "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
+                    FROM "flaechen";""",
+                  u"""SELECT DiscardGeometryColumn('flaechen','geom')""",
+                  u"""DROP TABLE flaechen;""",
+                  u"""CREATE TABLE flaechen (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    neigkl INTEGER DEFAULT 0,
+                    abflusstyp TEXT, 
+                    he_typ INTEGER DEFAULT 0,
+                    speicherzahl INTEGER DEFAULT 2,
+                    speicherkonst REAL,
+                    fliesszeit REAL,
+                    fliesszeitkanal REAL,
+                    teilgebiet TEXT,
+                    regenschreiber TEXT,
+                    abflussparameter TEXT,
+                    aufteilen TEXT DEFAULT 'nein',
+                    kommentar TEXT,
+                    createdat TEXT DEFAULT CURRENT_DATE);""",
+                  u"""SELECT AddGeometryColumn('flaechen','geom',{},'MULTIPOLYGON',2);""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('flaechen','geom')""",
+                  u"""INSERT INTO flaechen 
+                    (      "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
+                           "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
+                    SELECT "flnam", "haltnam", "neigkl", "he_typ", "speicherzahl", "speicherkonst", "fliesszeit", "fliesszeitkanal",
+                           "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
+                    FROM "flaechen_t";""",
+                  u"""SELECT DiscardGeometryColumn('flaechen_t','geom')""",
+                  u"""DROP TABLE flaechen_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.2.2-1)', transaction=True):
+                return False
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linksw'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (3)'):
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'flaechen' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-2)', transaction=True):
                     # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
-                # 14.10.2018: Unklar, warum überhaupt. Es findet keine Änderung statt. Möglicherweise
-                # muss hier eine händische Änderung "eingefangen werden". 
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS linksw_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            elnam TEXT,
-                            haltnam TEXT)""",
-                          u"""SELECT AddGeometryColumn('linksw_t','geom',{},'POLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw_t','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""DELETE FROM linksw_t""",
-                          u"""INSERT INTO linksw_t 
-                            (      "elnam", "haltnam", "geom", "gbuf", "glink")
-                            SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
-                            FROM "linksw";""",
-                          u"""SELECT DiscardGeometryColumn('linksw','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linksw','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linksw','glink')""",
-                          u"""DROP TABLE linksw;""",
-                          u"""CREATE TABLE linksw (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            elnam TEXT,
-                            haltnam TEXT,
-                            teilgebiet TEXT)""",
-                          u"""SELECT AddGeometryColumn('linksw','geom',{},'POLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('linksw','geom')""",
-                          u"""INSERT INTO linksw 
-                            (      "elnam", "haltnam", "geom", "gbuf", "glink")
-                            SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
-                            FROM "linksw_t";""",
-                          u"""SELECT DiscardGeometryColumn('linksw_t','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linksw_t','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linksw_t','glink')""",
-                          u"""DROP TABLE linksw_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.2.2-4)', transaction=True):
-                        return False
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
 
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'linksw' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-5)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
 
-                # 4. Schritt: Transaction abschließen
-                self.commit()
+        # 5. Schritt: Spalte abflusstyp aus Spalte he_typ übertragen
+        sql = u"""UPDATE flaechen SET abflusstyp = 
+                CASE he_typ 
+                    WHEN 0 THEN 'Direktabfluss' 
+                    WHEN 1 THEN 'Fließzeiten' 
+                    WHEN 2 THEN 'Schwerpunktfließzeit'
+                    ELSE NULL END
+                WHERE abflusstyp IS NULL"""
+
+        if not self.sql(sql, u'dbfunc.version (2.2.2-3)'):
+            return False
 
+        # Tabelle linksw -------------------------------------------------------------
 
-                progress_bar.setValue(30)
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linksw'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (3)'):
+            # return False
+        # triggers = self.fetchall()
 
-                # Tabelle linkfl -------------------------------------------------------------
+        # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
+        # 14.10.2018: Unklar, warum überhaupt. Es findet keine Änderung statt. Möglicherweise
+        # muss hier eine händische Änderung "eingefangen werden". 
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS linksw_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    elnam TEXT,
+                    haltnam TEXT)""",
+                  u"""SELECT AddGeometryColumn('linksw_t','geom',{},'POLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw_t','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""DELETE FROM linksw_t""",
+                  u"""INSERT INTO linksw_t 
+                    (      "elnam", "haltnam", "geom", "gbuf", "glink")
+                    SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
+                    FROM "linksw";""",
+                  u"""SELECT DiscardGeometryColumn('linksw','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linksw','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linksw','glink')""",
+                  u"""DROP TABLE linksw;""",
+                  u"""CREATE TABLE linksw (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    elnam TEXT,
+                    haltnam TEXT,
+                    teilgebiet TEXT)""",
+                  u"""SELECT AddGeometryColumn('linksw','geom',{},'POLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('linksw','geom')""",
+                  u"""INSERT INTO linksw 
+                    (      "elnam", "haltnam", "geom", "gbuf", "glink")
+                    SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
+                    FROM "linksw_t";""",
+                  u"""SELECT DiscardGeometryColumn('linksw_t','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linksw_t','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linksw_t','glink')""",
+                  u"""DROP TABLE linksw_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.2.2-4)', transaction=True):
+                return False
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linkfl'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'linksw' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-5)', transaction=True):
                     # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
-                #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
-
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS linkfl_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            tezgnam TEXT);""",
-                          u"""SELECT AddGeometryColumn('linkfl_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl_t','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""DELETE FROM linkfl_t""",
-                          u"""INSERT INTO linkfl_t 
-                            (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
-                            SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
-                            FROM "linkfl";""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','glink')""",
-                          u"""DROP TABLE linkfl;""",
-                          u"""CREATE TABLE linkfl (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            tezgnam TEXT,
-                            teilgebiet TEXT);""",
-                          u"""SELECT AddGeometryColumn('linkfl','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('linkfl','glink')""",
-                          u"""INSERT INTO linkfl 
-                            (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
-                            SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
-                            FROM "linkfl_t";""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','glink')""",
-                          u"""DROP TABLE linkfl_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.2.2-6)', transaction=True):
-                        return False
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
 
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'linkfl' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
 
-                # 4. Schritt: Transaction abschließen
-                self.commit()
+        # Tabelle linkfl -------------------------------------------------------------
 
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linkfl'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
+            # return False
+        # triggers = self.fetchall()
 
-                progress_bar.setValue(45)
+        # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
+        #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
 
-                # Tabelle einleit -------------------------------------------------------------
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS linkfl_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    tezgnam TEXT);""",
+                  u"""SELECT AddGeometryColumn('linkfl_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl_t','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""DELETE FROM linkfl_t""",
+                  u"""INSERT INTO linkfl_t 
+                    (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
+                    SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
+                    FROM "linkfl";""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','glink')""",
+                  u"""DROP TABLE linkfl;""",
+                  u"""CREATE TABLE linkfl (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    tezgnam TEXT,
+                    teilgebiet TEXT);""",
+                  u"""SELECT AddGeometryColumn('linkfl','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('linkfl','glink')""",
+                  u"""INSERT INTO linkfl 
+                    (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
+                    SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
+                    FROM "linkfl_t";""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','glink')""",
+                  u"""DROP TABLE linkfl_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.2.2-6)', transaction=True):
+                return False
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='einleit'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (7)'):
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'linkfl' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
                     # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS einleit_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            elnam TEXT,
-                            haltnam TEXT,
-                            teilgebiet TEXT, 
-                            zufluss REAL,
-                            ew REAL,
-                            einzugsgebiet TEXT,
-                            kommentar TEXT,
-                            createdat TEXT DEFAULT CURRENT_DATE);""",
-                          u"""SELECT AddGeometryColumn('einleit_t','geom',{},'POINT',2)""".format(self.epsg),
-                          u"""DELETE FROM einleit_t""",
-                          u"""INSERT INTO einleit_t 
-                            (      "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom")
-                            SELECT "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom"
-                            FROM "einleit";""",
-                          u"""SELECT DiscardGeometryColumn('einleit','geom')""",
-                          u"""DROP TABLE einleit;""",
-                          u"""CREATE TABLE einleit (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            elnam TEXT,
-                            haltnam TEXT,
-                            teilgebiet TEXT, 
-                            zufluss REAL,
-                            ew REAL,
-                            einzugsgebiet TEXT,
-                            kommentar TEXT,
-                            createdat TEXT DEFAULT CURRENT_DATE);""",
-                          u"""SELECT AddGeometryColumn('einleit','geom',{},'POINT',2)""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('einleit','geom')""",
-                          u"""INSERT INTO einleit 
-                            (      "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom")
-                            SELECT "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom"
-                            FROM "einleit_t";""",
-                          u"""SELECT DiscardGeometryColumn('einleit_t','geom')""",
-                          u"""DROP TABLE einleit_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.2.2-8)', transaction=True):
-                        return False
-
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'einleit' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-9)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
-
-                # 4. Schritt: Transaction abschließen
-
-                self.commit()
-
-                progress_bar.setValue(60)
-
-                self.reload = True
-
-                # Versionsnummer hochsetzen
-
-                self.versionlis = [2, 2, 3]
-
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 2, 16]):
-
-                sql = u"""
-                    CREATE TABLE IF NOT EXISTS dynahal (
-                        pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                        haltnam TEXT,
-                        schoben TEXT,
-                        schunten TEXT,
-                        teilgebiet TEXT,
-                        kanalnummer TEXT,
-                        haltungsnummer TEXT,
-                        anzobob INTEGER,
-                        anzobun INTEGER,
-                        anzunun INTEGER,
-                        anzunob INTEGER)"""
-                if not self.sql(sql, u'dbfunc.version (2.4.1-1)'):
-                    return False
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
 
-                sql = u"""
-                    ALTER TABLE profile ADD COLUMN kp_key TEXT
-                """
-                if not self.sql(sql, u'dbfunc.version (2.4.1-3)'):
-                    return False
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
 
-                sql = u"""
-                    ALTER TABLE entwaesserungsarten ADD COLUMN kp_nr INTEGER
-                """
-                if not self.sql(sql, u'dbfunc.version (2.4.1-2)'):
-                    return False
+        # Tabelle einleit -------------------------------------------------------------
 
-                sqllis = [u"""UPDATE entwaesserungsarten SET kp_nr = 0 WHERE bezeichnung = 'Mischwasser'""",
-                          u"""UPDATE entwaesserungsarten SET kp_nr = 1 WHERE bezeichnung = 'Schmutzwasser'""",
-                          u"""UPDATE entwaesserungsarten SET kp_nr = 2 WHERE bezeichnung = 'Regenwasser'"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.4.1-4)'):
-                        return False
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='einleit'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (7)'):
+            # return False
+        # triggers = self.fetchall()
 
-                self.commit()
-
-                # Versionsnummer hochsetzen
-
-                self.versionlis = [2, 2, 16]
+        # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS einleit_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    elnam TEXT,
+                    haltnam TEXT,
+                    teilgebiet TEXT, 
+                    zufluss REAL,
+                    ew REAL,
+                    einzugsgebiet TEXT,
+                    kommentar TEXT,
+                    createdat TEXT DEFAULT CURRENT_DATE);""",
+                  u"""SELECT AddGeometryColumn('einleit_t','geom',{},'POINT',2)""".format(self.epsg),
+                  u"""DELETE FROM einleit_t""",
+                  u"""INSERT INTO einleit_t 
+                    (      "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom")
+                    SELECT "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom"
+                    FROM "einleit";""",
+                  u"""SELECT DiscardGeometryColumn('einleit','geom')""",
+                  u"""DROP TABLE einleit;""",
+                  u"""CREATE TABLE einleit (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    elnam TEXT,
+                    haltnam TEXT,
+                    teilgebiet TEXT, 
+                    zufluss REAL,
+                    ew REAL,
+                    einzugsgebiet TEXT,
+                    kommentar TEXT,
+                    createdat TEXT DEFAULT CURRENT_DATE);""",
+                  u"""SELECT AddGeometryColumn('einleit','geom',{},'POINT',2)""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('einleit','geom')""",
+                  u"""INSERT INTO einleit 
+                    (      "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom")
+                    SELECT "elnam", "haltnam", "teilgebiet", "zufluss", "ew", "einzugsgebiet", "kommentar", "createdat", "geom"
+                    FROM "einleit_t";""",
+                  u"""SELECT DiscardGeometryColumn('einleit_t','geom')""",
+                  u"""DROP TABLE einleit_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.2.2-8)', transaction=True):
+                return False
 
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 4, 9]):
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'einleit' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-9)', transaction=True):
+                    # return False
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
+
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
+
+        self.reload = True
+
+        return True
+
+    @aktualisierung([2, 2, 16], u'Tabelle dynahal, DYNA-Schlüssel in profile und entwaesserungsarten')
+    def _version_2_2_16(self):
+        sql = u"""
+            CREATE TABLE IF NOT EXISTS dynahal (
+                pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                haltnam TEXT,
+                schoben TEXT,
+                schunten TEXT,
+                teilgebiet TEXT,
+                kanalnummer TEXT,
+                haltungsnummer TEXT,
+                anzobob INTEGER,
+                anzobun INTEGER,
+                anzunun INTEGER,
+                anzunob INTEGER)"""
+        if not self.sql(sql, u'dbfunc.version (2.4.1-1)'):
+            return False
 
-                sql = u'''DROP VIEW IF EXISTS "v_linkfl_check"'''
+        sql = u"""
+            ALTER TABLE profile ADD COLUMN kp_key TEXT
+        """
+        if not self.sql(sql, u'dbfunc.version (2.4.1-3)'):
+            return False
 
-                if not self.sql(sql, u'dbfunc.version (2.4.9-1)'):
-                    return False
+        sql = u"""
+            ALTER TABLE entwaesserungsarten ADD COLUMN kp_nr INTEGER
+        """
+        if not self.sql(sql, u'dbfunc.version (2.4.1-2)'):
+            return False
 
+        sqllis = [u"""UPDATE entwaesserungsarten SET kp_nr = 0 WHERE bezeichnung = 'Mischwasser'""",
+                  u"""UPDATE entwaesserungsarten SET kp_nr = 1 WHERE bezeichnung = 'Schmutzwasser'""",
+                  u"""UPDATE entwaesserungsarten SET kp_nr = 2 WHERE bezeichnung = 'Regenwasser'"""]
 
-                sql = u'''CREATE VIEW IF NOT EXISTS "v_linkfl_check" AS 
-                        WITH lfok AS
-                        (   SELECT 
-                                lf.pk AS "pk",
-                                lf.flnam AS "linkfl_nam", 
-                                lf.haltnam AS "linkfl_haltnam", 
-                                fl.flnam AS "flaech_nam",
-                                tg.flnam AS "tezg_nam",
-                                min(lf.pk) AS pkmin, 
-                                max(lf.pk) AS pkmax,
-                                count(*) AS anzahl
-                            FROM linkfl AS lf
-                            LEFT JOIN flaechen AS fl
-                            ON lf.flnam = fl.flnam
-                            LEFT JOIN tezg AS tg
-                            ON lf.tezgnam = tg.flnam
-                            WHERE fl.aufteilen = "ja" and fl.aufteilen IS NOT NULL
-                            GROUP BY fl.flnam, tg.flnam
-                            UNION
-                            SELECT 
-                                lf.pk AS "pk",
-                                lf.flnam AS "linkfl_nam", 
-                                lf.haltnam AS "linkfl_haltnam", 
-                                fl.flnam AS "flaech_nam",
-                                NULL AS "tezg_nam",
-                                min(lf.pk) AS pkmin, 
-                                max(lf.pk) AS pkmax,
-                                count(*) AS anzahl
-                            FROM linkfl AS lf
-                            LEFT JOIN flaechen AS fl
-                            ON lf.flnam = fl.flnam
-                            WHERE fl.aufteilen <> "ja" OR fl.aufteilen IS NULL
-                            GROUP BY fl.flnam)
-                        SELECT pk, anzahl, CASE WHEN anzahl > 1 THEN 'mehrfach vorhanden' WHEN flaech_nam IS NULL THEN 'Keine Fläche' WHEN linkfl_haltnam IS NULL THEN  'Keine Haltung' ELSE 'o.k.' END AS fehler
-                        FROM lfok'''
-
-                if not self.sql(sql, u'dbfunc.version (2.4.9-2)'):
-                    return False
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.4.1-4)'):
+                return False
 
-                sql = u'''DROP VIEW IF EXISTS "v_flaechen_ohne_linkfl"'''
+        return True
 
-                if not self.sql(sql, u'dbfunc.version (2.4.9-3)'):
-                    return False
+    @aktualisierung([2, 4, 9], u'Sichten v_linkfl_check und v_flaechen_ohne_linkfl')
+    def _version_2_4_9(self):
+        sql = u'''DROP VIEW IF EXISTS "v_linkfl_check"'''
 
+        if not self.sql(sql, u'dbfunc.version (2.4.9-1)'):
+            return False
 
-                sql = u'''CREATE VIEW IF NOT EXISTS "v_flaechen_ohne_linkfl" AS 
-                        SELECT 
-                            fl.pk, 
-                            fl.flnam AS "flaech_nam",
-                            fl.aufteilen AS "flaech_aufteilen", 
-                            'Verbindung fehlt' AS "Fehler"
-                        FROM flaechen AS fl
-                        LEFT JOIN linkfl AS lf
-                        ON lf.flnam = fl.flnam
-                        LEFT JOIN tezg AS tg
-                        ON tg.flnam = lf.tezgnam
-                        WHERE ( (fl.aufteilen <> "ja" or fl.aufteilen IS NULL) AND
-                                 lf.pk IS NULL) OR
-                              (  fl.aufteilen = "ja" AND fl.aufteilen IS NOT NULL AND 
-                                 lf.pk IS NULL)
-                        UNION
-                        VALUES
-                            (0, '', '', 'o.k.')'''
-
-                if not self.sql(sql, u'dbfunc.version (2.4.9-4)'):
-                    return False
+        sql = u'''CREATE VIEW IF NOT EXISTS "v_linkfl_check" AS 
+                WITH lfok AS
+                (   SELECT 
+                        lf.pk AS "pk",
+                        lf.flnam AS "linkfl_nam", 
+                        lf.haltnam AS "linkfl_haltnam", 
+                        fl.flnam AS "flaech_nam",
+                        tg.flnam AS "tezg_nam",
+                        min(lf.pk) AS pkmin, 
+                        max(lf.pk) AS pkmax,
+                        count(*) AS anzahl
+                    FROM linkfl AS lf
+                    LEFT JOIN flaechen AS fl
+                    ON lf.flnam = fl.flnam
+                    LEFT JOIN tezg AS tg
+                    ON lf.tezgnam = tg.flnam
+                    WHERE fl.aufteilen = "ja" and fl.aufteilen IS NOT NULL
+                    GROUP BY fl.flnam, tg.flnam
+                    UNION
+                    SELECT 
+                        lf.pk AS "pk",
+                        lf.flnam AS "linkfl_nam", 
+                        lf.haltnam AS "linkfl_haltnam", 
+                        fl.flnam AS "flaech_nam",
+                        NULL AS "tezg_nam",
+                        min(lf.pk) AS pkmin, 
+                        max(lf.pk) AS pkmax,
+                        count(*) AS anzahl
+                    FROM linkfl AS lf
+                    LEFT JOIN flaechen AS fl
+                    ON lf.flnam = fl.flnam
+                    WHERE fl.aufteilen <> "ja" OR fl.aufteilen IS NULL
+                    GROUP BY fl.flnam)
+                SELECT pk, anzahl, CASE WHEN anzahl > 1 THEN 'mehrfach vorhanden' WHEN flaech_nam IS NULL THEN 'Keine Fläche' WHEN linkfl_haltnam IS NULL THEN  'Keine Haltung' ELSE 'o.k.' END AS fehler
+                FROM lfok'''
+
+        if not self.sql(sql, u'dbfunc.version (2.4.9-2)'):
+            return False
 
-                self.commit()
+        sql = u'''DROP VIEW IF EXISTS "v_flaechen_ohne_linkfl"'''
 
-                # Versionsnummer hochsetzen
+        if not self.sql(sql, u'dbfunc.version (2.4.9-3)'):
+            return False
 
-                self.versionlis = [2, 4, 9]
+        sql = u'''CREATE VIEW IF NOT EXISTS "v_flaechen_ohne_linkfl" AS 
+                SELECT 
+                    fl.pk, 
+                    fl.flnam AS "flaech_nam",
+                    fl.aufteilen AS "flaech_aufteilen", 
+                    'Verbindung fehlt' AS "Fehler"
+                FROM flaechen AS fl
+                LEFT JOIN linkfl AS lf
+                ON lf.flnam = fl.flnam
+                LEFT JOIN tezg AS tg
+                ON tg.flnam = lf.tezgnam
+                WHERE ( (fl.aufteilen <> "ja" or fl.aufteilen IS NULL) AND
+                         lf.pk IS NULL) OR
+                      (  fl.aufteilen = "ja" AND fl.aufteilen IS NOT NULL AND 
+                         lf.pk IS NULL)
+                UNION
+                VALUES
+                    (0, '', '', 'o.k.')'''
+
+        if not self.sql(sql, u'dbfunc.version (2.4.9-4)'):
+            return False
 
+        return True
+
+    @aktualisierung([2, 5, 2], u'Tabellen aussengebiete und linkageb, Eingabeformulare')
+    def _version_2_5_2(self):
+        # Einleitungen aus Aussengebieten ----------------------------------------------------------------
+
+        sql = u'''CREATE TABLE IF NOT EXISTS aussengebiete (
+            pk INTEGER PRIMARY KEY AUTOINCREMENT, 
+            gebnam TEXT, 
+            schnam TEXT, 
+            hoeheob REAL, 
+            hoeheun REAL, 
+            fliessweg REAL, 
+            basisabfluss REAL, 
+            cn REAL, 
+            regenschreiber TEXT, 
+            teilgebiet TEXT, 
+            kommentar TEXT, 
+            createdat TEXT DEFAULT CURRENT_DATE)'''
+
+        if not self.sql(sql, u'dbfunc.version (2.5.2-1)'):
+            return False
 
-            # ---------------------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 5, 2]):
+        sql = u"""SELECT AddGeometryColumn('aussengebiete','geom',{},'MULTIPOLYGON',2)""".format(self.epsg)
 
-                # Einleitungen aus Aussengebieten ----------------------------------------------------------------
+        if not self.sql(sql, u'dbfunc.version (2.5.2-2)'):
+            return False
 
-                sql = u'''CREATE TABLE IF NOT EXISTS aussengebiete (
-                    pk INTEGER PRIMARY KEY AUTOINCREMENT, 
-                    gebnam TEXT, 
-                    schnam TEXT, 
-                    hoeheob REAL, 
-                    hoeheun REAL, 
-                    fliessweg REAL, 
-                    basisabfluss REAL, 
-                    cn REAL, 
-                    regenschreiber TEXT, 
-                    teilgebiet TEXT, 
-                    kommentar TEXT, 
-                    createdat TEXT DEFAULT CURRENT_DATE)'''
+        sql = u"""SELECT CreateSpatialIndex('aussengebiete','geom')"""
 
-                if not self.sql(sql, u'dbfunc.version (2.5.2-1)'):
-                    return False
+        if not self.sql(sql, u'dbfunc.version (2.5.2-3)'):
+            return False
 
-                sql = u"""SELECT AddGeometryColumn('aussengebiete','geom',{},'MULTIPOLYGON',2)""".format(self.epsg)
+        # Anbindung Aussengebiete -------------------------------------------------------------------------
 
-                if not self.sql(sql, u'dbfunc.version (2.5.2-2)'):
-                    return False
+        sql = u"""CREATE TABLE IF NOT EXISTS linkageb (
+            pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            gebnam TEXT,
+            schnam TEXT)"""
 
-                sql = u"""SELECT CreateSpatialIndex('aussengebiete','geom')"""
+        if not self.sql(sql, u'dbfunc.version (2.5.2-4)'):
+            return False
 
-                if not self.sql(sql, u'dbfunc.version (2.5.2-3)'):
-                    return False
+        sql = u"""SELECT AddGeometryColumn('linkageb','glink',{epsg},'LINESTRING',2)""".format(epsg=self.epsg)
 
-                # Anbindung Aussengebiete -------------------------------------------------------------------------
+        if not self.sql(sql, u'dbfunc.version (2.5.2-5)'):
+            return False
 
-                sql = u"""CREATE TABLE IF NOT EXISTS linkageb (
-                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                    gebnam TEXT,
-                    schnam TEXT)"""
+        sql = u"""SELECT CreateSpatialIndex('linkageb','glink')"""
 
-                if not self.sql(sql, u'dbfunc.version (2.5.2-4)'):
-                    return False
+        if not self.sql(sql, u'dbfunc.version (2.5.2-6)'):
+            return False
 
-                sql = u"""SELECT AddGeometryColumn('linkageb','glink',{epsg},'LINESTRING',2)""".format(epsg=self.epsg)
+        # Formulare aktualisieren ----------------------------------------------------------
+        # 
+        # Dieser Block muss im letzten Update vorkommen, in dem auch Formulare geändert wurden...
+        # 
+        # Spielregel: QKan-Formulare werden ohne Rückfrage aktualisiert. 
+        # Falls eigene Formulare gewünscht sind, können diese im selben Verzeichnis liegen, 
+        # die Eingabeformulare müssen jedoch andere Namen verwenden, auf die entsprechend 
+        # in der Projektdatei verwiesen werden muss. 
 
-                if not self.sql(sql, u'dbfunc.version (2.5.2-5)'):
-                    return False
+        try:
+            projectpath = os.path.dirname(self.dbname)
+            if u'eingabemasken' not in os.listdir(projectpath):
+                os.mkdir(os.path.join(projectpath, u'eingabemasken'))
+            formpath = os.path.join(projectpath, u'eingabemasken')
+            formlist = os.listdir(formpath)
+
+            logger.debug(u"\nEingabeformulare aktualisieren: \n" + 
+                          "projectpath = {projectpath}\n".format(projectpath=projectpath) + 
+                          "formpath = {formpath}\n".format(formpath=formpath) + 
+                          "formlist = {formlist}\n".format(formlist=formlist) + 
+                          "templatepath = {templatepath}".format(templatepath=self.templatepath)
+                          )
+
+            for formfile in glob.iglob(os.path.join(self.templatepath, u'*.ui')):
+                logger.debug(u"Eingabeformular aktualisieren: {} -> {}".format(formfile, formpath))
+                shutil.copy2(formfile, formpath)
+        except BaseException as err:
+            fehlermeldung(u'Fehler beim Aktualisieren der Eingabeformulare\n', 
+                          u"{e}".format(e=repr(err)))
 
-                sql = u"""SELECT CreateSpatialIndex('linkageb','glink')"""
+        return True
 
-                if not self.sql(sql, u'dbfunc.version (2.5.2-6)'):
-                    return False
+    @aktualisierung([2, 5, 7], u'Abflussparameter von flaechen nach linkfl verschieben')
+    def _version_2_5_7(self):
+        # Tabelle linkfl um die Felder [abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeitflaeche]
+        # erweitern. Wegen der Probleme mit der Anzeige in QGIS wird die Tabelle dazu umgespeichert. 
 
-                self.commit()
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linkfl'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
+            # return False
+        # triggers = self.fetchall()
 
-                # Versionsnummer hochsetzen
+        # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
+        #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
 
-                self.versionlis = [2, 5, 2]
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS linkfl_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    tezgnam TEXT);""",
+                  u"""SELECT AddGeometryColumn('linkfl_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl_t','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""DELETE FROM linkfl_t""",
+                  u"""INSERT INTO linkfl_t 
+                    (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
+                    SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
+                    FROM "linkfl";""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','glink')""",
+                  u"""DROP TABLE linkfl;""",
+                  u"""CREATE TABLE linkfl (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    tezgnam TEXT,
+                    teilgebiet TEXT,
+                    abflusstyp TEXT,
+                    speicherzahl INTEGER,
+                    speicherkonst REAL,
+                    fliesszeitkanal REAL,
+                    fliesszeitflaeche REAL);""",
+                  u"""SELECT AddGeometryColumn('linkfl','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('linkfl','glink')""",
+                  u"""INSERT INTO linkfl 
+                    (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
+                    SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
+                    FROM "linkfl_t";""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','glink')""",
+                  u"""DROP TABLE linkfl_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.5.7-1)', transaction=True):
+                return False
 
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'linkfl' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
+                    # return False
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
 
-                # Formulare aktualisieren ----------------------------------------------------------
-                # 
-                # Dieser Block muss im letzten Update vorkommen, in dem auch Formulare geändert wurden...
-                # 
-                # Spielregel: QKan-Formulare werden ohne Rückfrage aktualisiert. 
-                # Falls eigene Formulare gewünscht sind, können diese im selben Verzeichnis liegen, 
-                # die Eingabeformulare müssen jedoch andere Namen verwenden, auf die entsprechend 
-                # in der Projektdatei verwiesen werden muss. 
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
 
-                try:
-                    projectpath = os.path.dirname(self.dbname)
-                    if u'eingabemasken' not in os.listdir(projectpath):
-                        os.mkdir(os.path.join(projectpath, u'eingabemasken'))
-                    formpath = os.path.join(projectpath, u'eingabemasken')
-                    formlist = os.listdir(formpath)
-
-                    logger.debug(u"\nEingabeformulare aktualisieren: \n" + 
-                                  "projectpath = {projectpath}\n".format(projectpath=projectpath) + 
-                                  "formpath = {formpath}\n".format(formpath=formpath) + 
-                                  "formlist = {formlist}\n".format(formlist=formlist) + 
-                                  "templatepath = {templatepath}".format(templatepath=self.templatepath)
-                                  )
-
-                    for formfile in glob.iglob(os.path.join(self.templatepath, u'*.ui')):
-                        logger.debug(u"Eingabeformular aktualisieren: {} -> {}".format(formfile, formpath))
-                        shutil.copy2(formfile, formpath)
-                except BaseException as err:
-                    fehlermeldung(u'Fehler beim Aktualisieren der Eingabeformulare\n', 
-                                  u"{e}".format(e=repr(err)))
+        # Oberflächenabflussdaten von Tabelle "flaechen" in Tabelle "linkfl" übertragen
 
-            # ------------------------------------------------------------------------------------------
-            if versionolder(self.versionlis, [2, 5, 7]):
+        sql = """
+        UPDATE linkfl SET 
+            (abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeitflaeche) =
+        (SELECT abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeit
+        FROM flaechen
+        WHERE linkfl.flnam = flaechen.flnam)
+        """
+        if not self.sql(sql, u'dbfunc.version (2.5.7-2)'):
+            return False
 
-                # Tabelle linkfl um die Felder [abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeitflaeche]
-                # erweitern. Wegen der Probleme mit der Anzeige in QGIS wird die Tabelle dazu umgespeichert. 
+        # Tabelle flaechen um die Felder [abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeitflaeche]
+        # bereinigen. Wegen der Probleme mit der Anzeige in QGIS wird die Tabelle dazu umgespeichert. 
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linkfl'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
-                    # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
-                #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
-
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS linkfl_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            tezgnam TEXT);""",
-                          u"""SELECT AddGeometryColumn('linkfl_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl_t','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""DELETE FROM linkfl_t""",
-                          u"""INSERT INTO linkfl_t 
-                            (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
-                            SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
-                            FROM "linkfl";""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','glink')""",
-                          u"""DROP TABLE linkfl;""",
-                          u"""CREATE TABLE linkfl (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            tezgnam TEXT,
-                            teilgebiet TEXT,
-                            abflusstyp TEXT,
-                            speicherzahl INTEGER,
-                            speicherkonst REAL,
-                            fliesszeitkanal REAL,
-                            fliesszeitflaeche REAL);""",
-                          u"""SELECT AddGeometryColumn('linkfl','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('linkfl','glink')""",
-                          u"""INSERT INTO linkfl 
-                            (      "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink")
-                            SELECT "flnam", "haltnam", "tezgnam", "geom", "gbuf", "glink"
-                            FROM "linkfl_t";""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','glink')""",
-                          u"""DROP TABLE linkfl_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.5.7-1)', transaction=True):
-                        return False
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='flaechen'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
+            # return False
+        # triggers = self.fetchall()
 
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'linkfl' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
-
-                # 4. Schritt: Transaction abschließen
-                self.commit()
-
-
-                # Oberflächenabflussdaten von Tabelle "flaechen" in Tabelle "linkfl" übertragen
-
-                sql = """
-                UPDATE linkfl SET 
-                    (abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeitflaeche) =
-                (SELECT abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeit
-                FROM flaechen
-                WHERE linkfl.flnam = flaechen.flnam)
-                """
-                if not self.sql(sql, u'dbfunc.version (2.5.7-2)'):
-                    return False
-                self.commit()
+        # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
+        #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
 
-                # Tabelle flaechen um die Felder [abflusstyp, speicherzahl, speicherkonst, fliesszeitkanal, fliesszeitflaeche]
-                # bereinigen. Wegen der Probleme mit der Anzeige in QGIS wird die Tabelle dazu umgespeichert. 
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS flaechen_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    neigkl INTEGER DEFAULT 0,
+                    teilgebiet TEXT,
+                    regenschreiber TEXT,
+                    abflussparameter TEXT,
+                    aufteilen TEXT DEFAULT 'nein',
+                    kommentar TEXT,
+                    createdat TEXT DEFAULT CURRENT_DATE);""",
+                  u"""SELECT AddGeometryColumn('flaechen_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""DELETE FROM flaechen_t""",
+                  u"""INSERT INTO flaechen_t 
+                    (      "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
+                    SELECT "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
+                    FROM "flaechen";""",
+                  u"""SELECT DiscardGeometryColumn('flaechen','geom')""",
+                  u"""DROP TABLE flaechen;""",
+                  u"""CREATE TABLE flaechen (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    neigkl INTEGER DEFAULT 0,
+                    teilgebiet TEXT,
+                    regenschreiber TEXT,
+                    abflussparameter TEXT,
+                    aufteilen TEXT DEFAULT 'nein',
+                    kommentar TEXT,
+                    createdat TEXT DEFAULT CURRENT_DATE);""",
+                  u"""SELECT AddGeometryColumn('flaechen','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('flaechen','geom')""",
+                  u"""INSERT INTO flaechen 
+                    (      "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
+                    SELECT "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
+                    FROM "flaechen_t";""",
+                  u"""SELECT DiscardGeometryColumn('flaechen_t','geom')""",
+                  u"""DROP TABLE flaechen_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.5.7-3)', transaction=True):
+                return False
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='flaechen'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'flaechen' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
                     # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
-                #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
-
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS flaechen_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            neigkl INTEGER DEFAULT 0,
-                            teilgebiet TEXT,
-                            regenschreiber TEXT,
-                            abflussparameter TEXT,
-                            aufteilen TEXT DEFAULT 'nein',
-                            kommentar TEXT,
-                            createdat TEXT DEFAULT CURRENT_DATE);""",
-                          u"""SELECT AddGeometryColumn('flaechen_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""DELETE FROM flaechen_t""",
-                          u"""INSERT INTO flaechen_t 
-                            (      "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
-                            SELECT "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
-                            FROM "flaechen";""",
-                          u"""SELECT DiscardGeometryColumn('flaechen','geom')""",
-                          u"""DROP TABLE flaechen;""",
-                          u"""CREATE TABLE flaechen (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            neigkl INTEGER DEFAULT 0,
-                            teilgebiet TEXT,
-                            regenschreiber TEXT,
-                            abflussparameter TEXT,
-                            aufteilen TEXT DEFAULT 'nein',
-                            kommentar TEXT,
-                            createdat TEXT DEFAULT CURRENT_DATE);""",
-                          u"""SELECT AddGeometryColumn('flaechen','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('flaechen','geom')""",
-                          u"""INSERT INTO flaechen 
-                            (      "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom")
-                            SELECT "flnam", "haltnam", "neigkl", "teilgebiet", "regenschreiber", "abflussparameter", "aufteilen", "kommentar", "createdat", "geom"
-                            FROM "flaechen_t";""",
-                          u"""SELECT DiscardGeometryColumn('flaechen_t','geom')""",
-                          u"""DROP TABLE flaechen_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.5.7-3)', transaction=True):
-                        return False
-
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'flaechen' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
 
-                # 4. Schritt: Transaction abschließen
-                self.commit()
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
 
-                progress_bar.setValue(75)
+        self.reload = True
 
-                self.reload = True
+        return True
 
-                # Versionsnummer hochsetzen
+    @aktualisierung([2, 5, 8], u'Tabellen linkfl und linksw um teilgebiet erweitern')
+    def _version_2_5_8(self):
+        # Tabelle linkfl um das Feld teilgebiet erweitern. 
+        # Wegen der Probleme mit der Anzeige in QGIS wird die Tabelle dazu umgespeichert. 
 
-                self.versionlis = [2, 5, 7]
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linkfl'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
+            # return False
+        # triggers = self.fetchall()
 
+        # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
+        #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
 
-            if versionolder(self.versionlis, [2, 5, 8]):
-
-                # Tabelle linkfl um das Feld teilgebiet erweitern. 
-                # Wegen der Probleme mit der Anzeige in QGIS wird die Tabelle dazu umgespeichert. 
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS linkfl_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    tezgnam TEXT,
+                    abflusstyp TEXT,
+                    speicherzahl INTEGER,
+                    speicherkonst REAL,
+                    fliesszeitkanal REAL,
+                    fliesszeitflaeche REAL);""",
+                  u"""SELECT AddGeometryColumn('linkfl_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl_t','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""DELETE FROM linkfl_t""",
+                  u"""INSERT INTO linkfl_t 
+                    (      "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
+                           "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
+                           "geom", "gbuf", "glink")
+                    SELECT "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
+                           "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
+                           "geom", "gbuf", "glink"
+                    FROM "linkfl";""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl','glink')""",
+                  u"""DROP TABLE linkfl;""",
+                  u"""CREATE TABLE linkfl (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    flnam TEXT,
+                    haltnam TEXT,
+                    tezgnam TEXT,
+                    teilgebiet TEXT,
+                    abflusstyp TEXT,
+                    speicherzahl INTEGER,
+                    speicherkonst REAL,
+                    fliesszeitkanal REAL,
+                    fliesszeitflaeche REAL);""",
+                  u"""SELECT AddGeometryColumn('linkfl','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linkfl','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('linkfl','glink')""",
+                  u"""INSERT INTO linkfl 
+                    (      "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
+                           "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
+                           "geom", "gbuf", "glink")
+                    SELECT "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
+                           "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
+                           "geom", "gbuf", "glink"
+                    FROM "linkfl_t";""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linkfl_t','glink')""",
+                  u"""DROP TABLE linkfl_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.5.8-1)', transaction=True):
+                return False
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linkfl'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (5)'):
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'linkfl' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
                     # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Temporäre Tabelle anlegen, Daten rüber kopieren, 
-                #             Tabelle löschen und wieder neu anlegen und Daten zurück kopieren
-
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS linkfl_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            tezgnam TEXT,
-                            abflusstyp TEXT,
-                            speicherzahl INTEGER,
-                            speicherkonst REAL,
-                            fliesszeitkanal REAL,
-                            fliesszeitflaeche REAL);""",
-                          u"""SELECT AddGeometryColumn('linkfl_t','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl_t','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""DELETE FROM linkfl_t""",
-                          u"""INSERT INTO linkfl_t 
-                            (      "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
-                                   "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
-                                   "geom", "gbuf", "glink")
-                            SELECT "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
-                                   "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
-                                   "geom", "gbuf", "glink"
-                            FROM "linkfl";""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl','glink')""",
-                          u"""DROP TABLE linkfl;""",
-                          u"""CREATE TABLE linkfl (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            flnam TEXT,
-                            haltnam TEXT,
-                            tezgnam TEXT,
-                            teilgebiet TEXT,
-                            abflusstyp TEXT,
-                            speicherzahl INTEGER,
-                            speicherkonst REAL,
-                            fliesszeitkanal REAL,
-                            fliesszeitflaeche REAL);""",
-                          u"""SELECT AddGeometryColumn('linkfl','geom',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linkfl','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('linkfl','glink')""",
-                          u"""INSERT INTO linkfl 
-                            (      "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
-                                   "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
-                                   "geom", "gbuf", "glink")
-                            SELECT "flnam", "haltnam", "tezgnam", "abflusstyp", "speicherzahl", 
-                                   "speicherkonst", "fliesszeitkanal", "fliesszeitflaeche", 
-                                   "geom", "gbuf", "glink"
-                            FROM "linkfl_t";""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linkfl_t','glink')""",
-                          u"""DROP TABLE linkfl_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.5.8-1)', transaction=True):
-                        return False
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
 
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'linkfl' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-7)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
 
-                # 4. Schritt: Transaction abschließen
-                self.commit()
+        # Tabelle linksw -------------------------------------------------------------
 
+        # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
+        # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linksw'"""
+        # if not self.sql(sql, u'dbfunc.version.pragma (3)'):
+            # return False
+        # triggers = self.fetchall()
 
-                # Tabelle linksw -------------------------------------------------------------
+        # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
+        sqllis = [u"""CREATE TABLE IF NOT EXISTS linksw_t (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    elnam TEXT,
+                    haltnam TEXT)""",
+                  u"""SELECT AddGeometryColumn('linksw_t','geom',{},'POLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw_t','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""DELETE FROM linksw_t""",
+                  u"""INSERT INTO linksw_t 
+                    (      "elnam", "haltnam", "geom", "gbuf", "glink")
+                    SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
+                    FROM "linksw";""",
+                  u"""SELECT DiscardGeometryColumn('linksw','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linksw','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linksw','glink')""",
+                  u"""DROP TABLE linksw;""",
+                  u"""CREATE TABLE linksw (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    elnam TEXT,
+                    haltnam TEXT,
+                    teilgebiet TEXT)""",
+                  u"""SELECT AddGeometryColumn('linksw','geom',{},'POLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
+                  u"""SELECT AddGeometryColumn('linksw','glink',{},'LINESTRING',2)""".format(self.epsg),
+                  u"""SELECT CreateSpatialIndex('linksw','geom')""",
+                  u"""INSERT INTO linksw 
+                    (      "elnam", "haltnam", "geom", "gbuf", "glink")
+                    SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
+                    FROM "linksw_t";""",
+                  u"""SELECT DiscardGeometryColumn('linksw_t','geom')""",
+                  u"""SELECT DiscardGeometryColumn('linksw_t','gbuf')""",
+                  u"""SELECT DiscardGeometryColumn('linksw_t','glink')""",
+                  u"""DROP TABLE linksw_t;"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.2.2-4)', transaction=True):
+                return False
 
-                # 1. Schritt: Trigger für zu ändernde Tabelle abfragen und in triggers speichern
-                # sql = u"""SELECT type, sql FROM sqlite_master WHERE tbl_name='linksw'"""
-                # if not self.sql(sql, u'dbfunc.version.pragma (3)'):
+        # 3. Schritt: Trigger wieder herstellen
+        # for el in triggers:
+            # if el[0] != 'table':
+                # sql = el[1]
+                # logger.debug(u"Trigger 'linksw' verarbeitet:\n{}".format(el[1]))
+                # if not self.sql(sql, u'dbfunc.version (2.2.2-5)', transaction=True):
                     # return False
-                # triggers = self.fetchall()
-
-                # 2. Schritt: Tabelle umbenennen, neu anlegen und Daten rüberkopieren
-                sqllis = [u"""BEGIN TRANSACTION;""",
-                          u"""CREATE TABLE IF NOT EXISTS linksw_t (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            elnam TEXT,
-                            haltnam TEXT)""",
-                          u"""SELECT AddGeometryColumn('linksw_t','geom',{},'POLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw_t','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw_t','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""DELETE FROM linksw_t""",
-                          u"""INSERT INTO linksw_t 
-                            (      "elnam", "haltnam", "geom", "gbuf", "glink")
-                            SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
-                            FROM "linksw";""",
-                          u"""SELECT DiscardGeometryColumn('linksw','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linksw','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linksw','glink')""",
-                          u"""DROP TABLE linksw;""",
-                          u"""CREATE TABLE linksw (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT,
-                            elnam TEXT,
-                            haltnam TEXT,
-                            teilgebiet TEXT)""",
-                          u"""SELECT AddGeometryColumn('linksw','geom',{},'POLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw','gbuf',{},'MULTIPOLYGON',2)""".format(self.epsg),
-                          u"""SELECT AddGeometryColumn('linksw','glink',{},'LINESTRING',2)""".format(self.epsg),
-                          u"""SELECT CreateSpatialIndex('linksw','geom')""",
-                          u"""INSERT INTO linksw 
-                            (      "elnam", "haltnam", "geom", "gbuf", "glink")
-                            SELECT "elnam", "haltnam", "geom", "gbuf", "glink"
-                            FROM "linksw_t";""",
-                          u"""SELECT DiscardGeometryColumn('linksw_t','geom')""",
-                          u"""SELECT DiscardGeometryColumn('linksw_t','gbuf')""",
-                          u"""SELECT DiscardGeometryColumn('linksw_t','glink')""",
-                          u"""DROP TABLE linksw_t;"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.2.2-4)', transaction=True):
-                        return False
+            # else:
+                # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
 
-                # 3. Schritt: Trigger wieder herstellen
-                # for el in triggers:
-                    # if el[0] != 'table':
-                        # sql = el[1]
-                        # logger.debug(u"Trigger 'linksw' verarbeitet:\n{}".format(el[1]))
-                        # if not self.sql(sql, u'dbfunc.version (2.2.2-5)', transaction=True):
-                            # return False
-                    # else:
-                        # logger.debug(u"1. Trigger 'table' erkannt:\n{}".format(el[1]))
+        # 4. Schritt: entfällt, alle Schritte laufen in einer gemeinsamen Transaktion
 
-                # 4. Schritt: Transaction abschließen
-                self.commit()
+        self.reload = True
 
+        return True
 
-                progress_bar.setValue(90)
+    @aktualisierung([2, 5, 9], u'Tabellen abflusstypen, knotentypen und schachttypen')
+    def _version_2_5_9(self):
+        # ValueMaps durch RelationMaps ersetzen, weil die entsprechende Funktion 
+        # aus der QGIS-API in Python nicht gemappt ist, somit also in Python nicht verfügbar ist.
+        # Deshalb werden nachfolgend drei Tabellen ergänzt. In der Projektdatei muss entsprechend 
+        # die Felddefinition angepasst werden. 
 
-                self.reload = True
+        # 1. Tabelle abflusstypen
 
-                # Versionsnummer hochsetzen
+        sqllis = [u'''CREATE TABLE abflusstypen (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT, 
+                    abflusstyp TEXT)''', 
+                  u"""INSERT INTO abflusstypen ('abflusstyp') 
+                  Values 
+                    ('Fliesszeiten'),
+                    ('Schwerpunktlaufzeit'),
+                    ('Speicherkaskade')"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.5.9) - abflusstypen'):
+                return False
 
-                self.versionlis = [2, 5, 8]
+        # 2. Tabelle Knotentypen
 
+        sqllis = [u'''CREATE TABLE knotentypen (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT, 
+                    knotentyp TEXT)''', 
+                  u"""INSERT INTO knotentypen ('knotentyp') 
+                  Values
+                    ('Anfangsschacht'),
+                    ('Einzelschacht'),
+                    ('Endschacht'),
+                    ('Hochpunkt'),
+                    ('Normalschacht'),
+                    ('Tiefpunkt'),
+                    ('Verzweigung'),
+                    ('Fliesszeiten')"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.5.9) - knotentypen'):
+                return False
 
-            if versionolder(self.versionlis, [2, 5, 9]):
+        # 3. Tabelle Schachttypen
 
-                # ValueMaps durch RelationMaps ersetzen, weil die entsprechende Funktion 
-                # aus der QGIS-API in Python nicht gemappt ist, somit also in Python nicht verfügbar ist.
-                # Deshalb werden nachfolgend drei Tabellen ergänzt. In der Projektdatei muss entsprechend 
-                # die Felddefinition angepasst werden. 
+        sqllis = [u'''CREATE TABLE schachttypen (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT, 
+                    schachttyp TEXT)''', 
+                  u"""INSERT INTO schachttypen ('schachttyp') 
+                  Values
+                    ('Auslass'),
+                    ('Schacht'),
+                    ('Speicher')"""]
+
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.5.9) - schachttypen'):
+                return False
 
-                # 1. Tabelle abflusstypen
+        return True
 
-                sqllis = [u'''CREATE TABLE abflusstypen (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT, 
-                            abflusstyp TEXT)''', 
-                          u"""INSERT INTO abflusstypen ('abflusstyp') 
-                          Values 
-                            ('Fliesszeiten'),
-                            ('Schwerpunktlaufzeit'),
-                            ('Speicherkaskade')"""]
+    @aktualisierung([2, 5, 10], u'Geometriekennwerte und Trigger')
+    def _version_2_5_10(self):
+        # Spalten für die Geometriekennwerte (Fläche, Länge, Schwerpunkt) ergänzen und 
+        # Trigger zu deren Aktualisierung anlegen. 
 
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.5.9) - abflusstypen'):
-                        return False
-                self.commit()
-
-                # 2. Tabelle Knotentypen
-
-                sqllis = [u'''CREATE TABLE knotentypen (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT, 
-                            knotentyp TEXT)''', 
-                          u"""INSERT INTO knotentypen ('knotentyp') 
-                          Values
-                            ('Anfangsschacht'),
-                            ('Einzelschacht'),
-                            ('Endschacht'),
-                            ('Hochpunkt'),
-                            ('Normalschacht'),
-                            ('Tiefpunkt'),
-                            ('Verzweigung'),
-                            ('Fliesszeiten')"""]
-
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.5.9) - knotentypen'):
+        for tabelle in geomkennwerte:
+            attrlis = self.attrlist(tabelle)
+            if not attrlis:
+                fehlermeldung(u'dbfunc.version (2.5.10):', u'attrlis für {} ist leer'.format(tabelle))
+                return False
+            for attr, ausdruck in geomkennwerte[tabelle]:
+                if attr not in attrlis:
+                    sql = u"""ALTER TABLE {tab} ADD COLUMN {attr} REAL""".format(tab=tabelle, attr=attr)
+                    if not self.sql(sql, u'dbfunc.version (2.5.10-1)'):
                         return False
-                self.commit()
 
-                # 3. Tabelle Schachttypen
+            for sql in sqlgeomkennwerte(tabelle):
+                if not self.sql(sql, u'dbfunc.version (2.5.10-2)'):
+                    return False
 
-                sqllis = [u'''CREATE TABLE schachttypen (
-                            pk INTEGER PRIMARY KEY AUTOINCREMENT, 
-                            schachttyp TEXT)''', 
-                          u"""INSERT INTO schachttypen ('schachttyp') 
-                          Values
-                            ('Auslass'),
-                            ('Schacht'),
-                            ('Speicher')"""]
+        return True
 
-                for sql in sqllis:
-                    if not self.sql(sql, u'dbfunc.version (2.5.9) - schachttypen'):
-                        return False
-                self.commit()
+    @aktualisierung([2, 5, 11], u'Prüftabellen v_linkfl_check und v_flaechen_ohne_linkfl')
+    def _version_2_5_11(self):
+        # Die Sichten für die Plausibilitätskontrollen werden durch Tabellen ersetzt, die von
+        # Triggern aktualisiert werden. 
 
-                progress_bar.setValue(100)
+        sqllis = [u"""DROP VIEW IF EXISTS v_linkfl_check""", 
+                  u"""DROP VIEW IF EXISTS v_flaechen_ohne_linkfl"""] + sqlpruefungen()
+        for sql in sqllis:
+            if not self.sql(sql, u'dbfunc.version (2.5.11)'):
+                return False
 
-                # Versionsnummer hochsetzen
+        return True
 
-                self.versionlis = [2, 5, 9]
+    @aktualisierung([2, 5, 12], u'Tabelle dynacache')
+    def _version_2_5_12(self):
+        # Export-Cache für die DYNA-Typ12-Datensätze (s. k_qkkp.write12)
 
+        sql = u"""CREATE TABLE IF NOT EXISTS dynacache (
+                pk INTEGER PRIMARY KEY,
+                fingerabdruck TEXT,
+                zeilen TEXT)"""
+        if not self.sql(sql, u'dbfunc.version (2.5.12)'):
+            return False
 
-            # ---------------------------------------------------------------------------------------------------------
-            # Aktuelle Version in Tabelle "info" schreiben
+        return True
 
-            sql = u"""UPDATE info SET value = '{}' WHERE subject = 'version'""".format(self.actversion)
-            if not self.sql(sql, u'dbfunc.version (aktuell)'):
-                return False
+    @aktualisierung([2, 5, 13], u'Tabellen für Prüfstände und Berechnungsergebnisse')
+    def _version_2_5_13(self):
+        # Bisher wurden diese Tabellen erst bei der ersten Verwendung angelegt
 
-            self.commit()
-
-            if self.reload:
-                meldung(u"Achtung! Benutzerhinweis!", u"Die Datenbank wurde geändert. Bitte QGIS-Projekt nach dem Speichern neu laden...")
+        for sql in sqlzusatztabellen():
+            if not self.sql(sql, u'dbfunc.version (2.5.13)'):
                 return False
 
-            # Alles gut gelaufen...
-
-            return True
-
+        return True
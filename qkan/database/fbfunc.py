@@ -120,7 +120,7 @@ class FBConnection:
     def fetchnext(self):
         """Gibt den naechsten Datensatz aus der vorher ausgefuehrten SQL-Abfrage zurueck"""
 
-        daten = self.curfb.fetchnext()
+        daten = self.curfb.fetchone()
         return daten
 
     def commit(self):
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Geometrieobjekte im SpatiaLite-Format
+  =====================================
+
+  Erzeugt Punkte, Linien und Kreispolygone (Schächte) direkt als SpatiaLite-BLOB-Geometrie.
+  Die Objekte können als Parameter an INSERT-Abfragen übergeben werden, so dass bei
+  Massenimporten weder SQL-Texte mit Koordinaten zusammengesetzt noch je Datensatz
+  Geometriefunktionen (MakePoint, MakeLine, MakeCircle) aufgerufen werden müssen.
+
+  Aufbau eines BLOBs (little endian):
+    0x00, 0x01, SRID (int), MBR (4 double), 0x7C, Geometrieklasse (int),
+    Koordinaten..., 0xFE
+
+  | Dateiname            : geoblob.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+__author__ = 'Joerg Hoettges'
+__date__ = 'Oktober 2018'
+__copyright__ = '(C) 2018, Joerg Hoettges'
+
+import math
+import struct
+
+# BLOB-Typ für die Parameterübergabe an pyspatialite (Python 2: buffer, Python 3: bytes)
+try:
+    blobtyp = buffer
+except NameError:
+    blobtyp = bytes
+
+# Geometrieklassen
+POINT = 1
+LINESTRING = 2
+POLYGON = 3
+MULTIPOLYGON = 6
+
+# Kreis aus 36 Segmenten (entspricht der Voreinstellung von MakeCircle). Die Stützstellen
+# des Einheitskreises werden nur einmal berechnet. Der letzte Punkt ist identisch mit dem ersten.
+_kreisvorlage = [(math.cos(math.radians(w)), math.sin(math.radians(w))) for w in range(0, 360, 10)]
+_kreisvorlage.append(_kreisvorlage[0])
+
+
+def _kopf(srid, xmin, ymin, xmax, ymax, klasse):
+    """Kopf des BLOBs mit SRID, umschließendem Rechteck und Geometrieklasse"""
+    return struct.pack('<BBidddd', 0x00, 0x01, int(srid), xmin, ymin, xmax, ymax) + \
+        struct.pack('<Bi', 0x7C, klasse)
+
+
+def punkt(x, y, srid):
+    """Punktobjekt
+
+    :x, y:          Koordinaten
+    :type x, y:     float
+
+    :srid:          EPSG-Code
+    :type srid:     integer
+
+    :returns:       Geometrieobjekt oder None, falls eine Koordinate fehlt
+    :rtype:         blob
+    """
+
+    if x is None or y is None:
+        return None
+    return blobtyp(_kopf(srid, x, y, x, y, POINT) + struct.pack('<ddB', x, y, 0xFE))
+
+
+def linie(punkte, srid):
+    """Linienobjekt
+
+    :punkte:        Liste der Stützstellen als (x, y)
+    :type punkte:   list of tuples
+
+    :srid:          EPSG-Code
+    :type srid:     integer
+
+    :returns:       Geometrieobjekt oder None, falls eine Koordinate fehlt
+    :rtype:         blob
+    """
+
+    koordinaten = [k for p in punkte for k in p]
+    if len(punkte) < 2 or None in koordinaten:
+        return None
+    xlis = koordinaten[0::2]
+    ylis = koordinaten[1::2]
+    return blobtyp(_kopf(srid, min(xlis), min(ylis), max(xlis), max(ylis), LINESTRING) +
+                   struct.pack('<i{}dB'.format(len(koordinaten)), len(punkte), *(koordinaten + [0xFE])))
+
+
+def kreis(x, y, radius, srid):
+    """Kreis als MultiPolygon, entspricht CastToMultiPolygon(MakePolygon(MakeCircle(x, y, radius, srid)))
+
+    :x, y:          Koordinaten des Mittelpunktes
+    :type x, y:     float
+
+    :radius:        Radius
+    :type radius:   float
+
+    :srid:          EPSG-Code
+    :type srid:     integer
+
+    :returns:       Geometrieobjekt oder None, falls eine Koordinate fehlt
+    :rtype:         blob
+    """
+
+    if x is None or y is None or radius is None:
+        return None
+    koordinaten = []
+    for cx, cy in _kreisvorlage:
+        koordinaten.append(x + radius * cx)
+        koordinaten.append(y + radius * cy)
+    npunkte = len(_kreisvorlage)
+    return blobtyp(_kopf(srid, x - radius, y - radius, x + radius, y + radius, MULTIPOLYGON) +
+                   struct.pack('<iBiii', 1, 0x69, POLYGON, 1, npunkte) +
+                   struct.pack('<{}dB'.format(2 * npunkte), *(koordinaten + [0xFE])))
@@ -1,25 +1,121 @@
 # -*- coding: utf-8 -*-
+import collections
+import copy
 import itertools
 import logging
 import os.path
+import threading
 
 from PyQt4 import QtCore
 from qkan.database.dbfunc import DBConnection
+from qkan.database.netz import aenderungszaehler
 
 main_logger = logging.getLogger("QKan")
 main_logger.info("Navigation-Modul gestartet")
 
 
+def _namensliste(namen):
+    """
+    Erzeugt aus Objektnamen eine Liste für eine IN-Bedingung
+
+    :param namen: Objektnamen
+    :type namen: iterable
+    :return: Namen in einfachen Anführungszeichen, durch Kommas getrennt
+    :rtype: str
+    """
+    return u", ".join([u"'{}'".format(n.replace(u"'", u"''")) for n in namen])
+
+
+class Routencache(object):
+    def __init__(self, maxgroesse=32):
+        """
+        Constructor. Speichert die zuletzt berechneten Routen (least recently used). Der Schlüssel
+        enthält den Änderungszähler der Datenbank, so dass nach einer Bearbeitung des Netzes
+        neu berechnet wird.
+
+        :param maxgroesse: Maximale Anzahl der gespeicherten Routen
+        :type maxgroesse: int
+        """
+        self.maxgroesse = maxgroesse
+        self.treffer = 0
+        self.fehlversuche = 0
+        self.__daten = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def holen(self, schluessel):
+        """
+        Gibt eine Kopie des gespeicherten Wertes zurück
+
+        :param schluessel: Schlüssel, None: nicht zwischenspeichern
+        :type schluessel: tuple
+        :return: Gespeicherter Wert oder None, falls nicht vorhanden
+        """
+        if schluessel is None:
+            return None
+        with self.__lock:
+            if schluessel not in self.__daten:
+                self.fehlversuche += 1
+                return None
+            self.treffer += 1
+            wert = self.__daten.pop(schluessel)
+            self.__daten[schluessel] = wert
+        return copy.deepcopy(wert)
+
+    def speichern(self, schluessel, wert):
+        """
+        Speichert eine Kopie des Wertes. Bei Überschreiten der maximalen Größe wird der am
+        längsten nicht verwendete Eintrag entfernt.
+
+        :param schluessel: Schlüssel, None: nicht zwischenspeichern
+        :type schluessel: tuple
+        """
+        if schluessel is None:
+            return
+        wert = copy.deepcopy(wert)
+        with self.__lock:
+            self.__daten.pop(schluessel, None)
+            self.__daten[schluessel] = wert
+            while len(self.__daten) > self.maxgroesse:
+                self.__daten.popitem(last=False)
+
+    def leeren(self):
+        """
+        Entfernt alle Einträge und setzt die Statistik zurück
+        """
+        with self.__lock:
+            self.__daten.clear()
+            self.treffer = 0
+            self.fehlversuche = 0
+
+    def statistik(self):
+        """
+        :return: Anzahl der Treffer, Fehlversuche und gespeicherten Routen
+        :rtype: dict
+        """
+        with self.__lock:
+            return dict(treffer=self.treffer, fehlversuche=self.fehlversuche, anzahl=len(self.__daten))
+
+
+# Gemeinsamer Cache aller Navigator-Objekte
+routencache = Routencache()
+
+
 class Navigator:
-    def __init__(self, dbname):
+    def __init__(self, dbname, cache=None):
         """
         Constructor
 
         :param dbname: Entspricht dem Datei-Pfad zur SpatiaLite-Datenbank.
         :type dbname: str
+        :param cache: Cache für berechnete Routen, None: gemeinsamer Cache routencache
+        :type cache: Routencache
         """
         self.__dbname = dbname
+        self.cache = routencache if cache is None else cache
         self.__error_msg = ""
+        self.__haltungsdaten = None
+        self.__netz = None
+        self.__netzversion = None
         self.db = DBConnection(dbname)
         if not self.db.connected:
             main_logger.error(u"Fehler in navigation:\n",
@@ -39,6 +135,13 @@ class Navigator:
         :return: Gibt ein Routen-Objekt zurück mit allen Haltungen und Schächten
         :rtype: list
         """
+        schluessel = self.__schluessel(u"schacht", nodes)
+        gespeichert = self.cache.holen(schluessel)
+        if gespeichert is not None:
+            self.log.debug(u"Route aus dem Cache:\t{}".format(nodes))
+            route, self.__error_msg = gespeichert
+            return route
+        nodes = list(nodes)
         self.log.debug(u"Übergebene Schächte:\t{}".format(nodes))
         endpoint = nodes[0]
         startpoint = nodes[0]
@@ -64,7 +167,27 @@ class Navigator:
         if len(nodes) == 0:
             nodes = None
         self.log.debug(u"Zusätzliche Punkte:\t{}".format(nodes))
-        return self.__calculate_route_schacht(startpoint, endpoint, additional_points=nodes)
+        route = self.__calculate_route_schacht(startpoint, endpoint, additional_points=nodes)
+        self.cache.speichern(schluessel, (route, self.__error_msg))
+        return route
+
+    def __schluessel(self, art, nodes):
+        """
+        Schlüssel für den Routen-Cache aus der normierten Auswahl und dem Änderungszähler im Dateikopf
+        der Datenbank. Dieser wird anders als PRAGMA data_version auch durch Änderungen über die eigene
+        und über neue Verbindungen erhöht und ist daher für den gemeinsamen Cache geeignet.
+
+        :param art: "schacht" oder "haltung"
+        :type art: str
+        :param nodes: Ausgewählte Schacht- bzw. Haltungs-Namen
+        :type nodes: list
+        :return: Schlüssel oder None, falls der Änderungszähler nicht gelesen werden konnte
+        :rtype: tuple
+        """
+        version = aenderungszaehler(self.__dbname)
+        if version is None:
+            return None
+        return self.__dbname, version, art, frozenset(nodes)
 
     def __calculate_route_schacht(self, startpoint, endpoint, additional_points):
         """
@@ -156,10 +279,23 @@ class Navigator:
         :return: Gibt eine Routen-Objekt mit allen Haltungen und Schächten zurück
         :rtype: dict
         """
+        schluessel = self.__schluessel(u"haltung", nodes)
+        gespeichert = self.cache.holen(schluessel)
+        if gespeichert is not None:
+            route, self.__error_msg = gespeichert
+            return route
+        route = self.__calculate_route_haltung(nodes)
+        self.cache.speichern(schluessel, (route, self.__error_msg))
+        return route
+
+    def __calculate_route_haltung(self, nodes):
+        """
+        Berechnet eine Route zwischen mehreren Haltungen ohne Cache, s. calculate_route_haltung
+        """
         if len(nodes) == 1:
             routes = [nodes]
         else:
-            tasks = Tasks(self.__dbname, nodes)
+            tasks = Tasks(self.__netzabbild(), nodes)
             self.log.info(u"Tasks wurden initialisiert")
             routes = tasks.start()
             self.log.info(u"Alle möglichen Routen ({}) berechnet".format(len(routes)))
@@ -176,6 +312,27 @@ class Navigator:
                 len(routes))
             return None
 
+    def __netzabbild(self):
+        """
+        Liest die Netztopologie mit einer Abfrage. Das Abbild wird wiederverwendet, bis sich der
+        Änderungszähler der Datenbank ändert.
+
+        :return: Abbild der Netztopologie
+        :rtype: Netzabbild
+        """
+        version = self.db.dataversion()
+        if self.__netz is not None and version is not None and version == self.__netzversion:
+            return self.__netz
+        statement = u"""
+        SELECT haltnam, schoben, schunten FROM haltungen
+        UNION SELECT wnam, schoben, schunten FROM wehre
+        UNION SELECT pnam, schoben, schunten FROM pumpen
+        """
+        self.db.sql(statement)
+        self.__netz = Netzabbild(self.db.fetchall())
+        self.__netzversion = version
+        return self.__netz
+
     def __fetch_data(self, haltungen):
         """
         Fragt die Datenbank nach den benötigten Attributen ab und speichert sie in einem Dictionary.
@@ -201,45 +358,10 @@ class Navigator:
         :return: Gibt ein Routen-Objekt zurück.
         :rtype: dict
         """
-        statement = u"""
-         SELECT schoben
-         FROM (SELECT
-                 haltnam AS name,
-                 schoben
-               FROM haltungen
-               UNION SELECT
-                       wnam AS name,
-                       schoben
-                     FROM wehre
-               UNION SELECT
-                       pnam AS name,
-                       schoben
-                     FROM pumpen)
-         WHERE name = "{}"
-                 """
-        schaechte = []
         self.log.debug(u"Haltungen:\t{}".format(haltungen))
-        self.db.sql(statement.format(haltungen[0]))
-        schaechte.append(self.db.fetchone()[0])
-        statement = u"""
-             SELECT schunten
-             FROM (SELECT
-                  haltnam AS name,
-                  schunten
-                   FROM haltungen
-                   UNION SELECT
-                   wnam AS name,
-                   schunten
-                    FROM wehre
-                    UNION SELECT
-                   pnam AS name,
-                   schunten
-                  FROM pumpen)
-             WHERE name = "{}"
-             """
-        for h in haltungen:
-            self.db.sql(statement.format(h))
-            schaechte.append(self.db.fetchone()[0])
+        self.__haltungsdaten = None
+        daten = self._haltungsdaten(haltungen)
+        schaechte = [daten[haltungen[0]][0]] + [daten[h][1] for h in haltungen]
         self.log.debug(u"Schächte:\t{}".format(schaechte))
         route = dict(haltungen=haltungen, schaechte=schaechte)
 
@@ -247,16 +369,93 @@ class Navigator:
         self.log.info(u"Route wurde erfolgreich erstellt!")
         return route
 
+    def _haltungsdaten(self, haltungen):
+        """
+        Fragt die Attribute aller übergebenen Haltungen, Wehre und Pumpen mit einer Abfrage ab.
+        Das Ergebnis wird bis zur nächsten Route vorgehalten, damit __fetch_data und get_info
+        die Datenbank nur einmal abfragen.
+
+        :param haltungen: Liste von Haltungs-Namen
+        :type haltungen: list
+        :return: Gibt zu jedem Namen (schoben, schunten, laenge, sohlhoeheoben, sohlhoeheunten, querschnitt) zurück
+        :rtype: dict
+        """
+        namen = set(haltungen)
+        if self.__haltungsdaten is not None and namen.issubset(self.__haltungsdaten):
+            return self.__haltungsdaten
+        statement = u"""
+        SELECT name, schoben, schunten, laenge, sohleoben, sohleunten, querschnitt
+        FROM (SELECT
+                haltnam AS name,
+                schoben,
+                schunten,
+                laenge,
+                coalesce(sohleoben, so.sohlhoehe) AS sohleoben,
+                coalesce(sohleunten, su.sohlhoehe) AS sohleunten,
+                hoehe AS querschnitt
+              FROM haltungen
+              LEFT JOIN schaechte AS so ON haltungen.schoben = so.schnam
+              LEFT JOIN schaechte AS su ON haltungen.schunten = su.schnam
+              UNION ALL SELECT
+                      wnam AS name,
+                      schoben,
+                      schunten,
+                      laenge,
+                      so.sohlhoehe AS sohleoben,
+                      su.sohlhoehe AS sohleunten,
+                      NULL AS querschnitt
+                    FROM wehre
+                    LEFT JOIN schaechte AS so ON wehre.schoben = so.schnam
+                    LEFT JOIN schaechte AS su ON wehre.schunten = su.schnam
+              UNION ALL SELECT
+                      pnam AS name,
+                      schoben,
+                      schunten,
+                      NULL AS laenge,
+                      so.sohlhoehe AS sohleoben,
+                      su.sohlhoehe AS sohleunten,
+                      NULL AS querschnitt
+                    FROM pumpen
+                    LEFT JOIN schaechte AS so ON pumpen.schoben = so.schnam
+                    LEFT JOIN schaechte AS su ON pumpen.schunten = su.schnam)
+        WHERE name IN ({})
+        """
+        self.db.sql(statement.format(_namensliste(namen)))
+        daten = {}
+        for row in self.db.fetchall():
+            daten.setdefault(row[0], row[1:])
+        self.__haltungsdaten = daten
+        return daten
+
     def get_info(self, route):
         """
-        Methode muss überschrieben werden bei Verwendung dieses Moduls
+        Standard-Implementierung: Fragt für alle Schächte und Haltungen der Route die Höhen, Längen
+        und Querschnitte mit je einer Abfrage ab. Kann überschrieben werden, wenn weitere
+        Informationen benötigt werden.
 
          :param route: Die Haltungen und Schächte in einem Dictionary
          :type route: dict
          :return Gibt zwei Dictionaries mit zusätzlichen Informationen aus der Datenbank zurück
          :rtype: dict, dict
         """
-        pass
+        haltunginfo = {}
+        daten = self._haltungsdaten(route["haltungen"])
+        for h in route["haltungen"]:
+            schoben, schunten, laenge, sohleoben, sohleunten, querschnitt = daten[h]
+            haltunginfo[h] = dict(schachtoben=schoben, schachtunten=schunten, laenge=laenge,
+                                  sohlhoeheoben=sohleoben, sohlhoeheunten=sohleunten,
+                                  querschnitt=querschnitt)
+
+        statement = u"""
+        SELECT schnam, sohlhoehe, deckelhoehe
+        FROM schaechte
+        WHERE schnam IN ({})
+        """
+        self.db.sql(statement.format(_namensliste(set(route["schaechte"]))))
+        schachtinfo = {}
+        for schnam, sohlhoehe, deckelhoehe in self.db.fetchall():
+            schachtinfo.setdefault(schnam, dict(sohlhoehe=sohlhoehe, deckelhoehe=deckelhoehe))
+        return schachtinfo, haltunginfo
 
     def get_error_msg(self):
         """
@@ -268,13 +467,38 @@ class Navigator:
         return self.__error_msg
 
 
+class Netzabbild(object):
+    def __init__(self, kanten):
+        """
+        Constructor. Unveränderliches Abbild der Netztopologie, das von mehreren Workern
+        gleichzeitig gelesen wird.
+
+        :param kanten: Liste von (name, schoben, schunten) aller Haltungen, Wehre und Pumpen
+        :type kanten: list
+        """
+        self.schunten = {}
+        self.abgehend = {}
+        for name, schoben, schunten in kanten:
+            self.schunten.setdefault(name, schunten)
+            self.abgehend.setdefault(schoben, []).append(name)
+
+    def naechste(self, haltung):
+        """
+        :param haltung: Haltungs-Name
+        :type haltung: str
+        :return: Gibt die Haltungen zurück, die am unteren Schacht der Haltung abgehen
+        :rtype: list
+        """
+        return self.abgehend.get(self.schunten.get(haltung), [])
+
+
 class Worker(QtCore.QRunnable):
-    def __init__(self, dbname, startpoint, nodes, parent):
+    def __init__(self, netz, startpoint, nodes, parent):
         """
         Constructor
 
-        :param dbname:Entspricht dem SpatiaLite-Datenbank-Pfad
-        :type dbname: str
+        :param netz: Gemeinsames, nur gelesenes Abbild der Netztopologie
+        :type netz: Netzabbild
         :param startpoint:Haltungs-Name des Startpunktes
         :type startpoint: str
         :param nodes: Liste alle Haltungs-Namen, die in der Route vorkommen müssen
@@ -285,11 +509,7 @@ class Worker(QtCore.QRunnable):
         super(Worker, self).__init__()
         self.__startpoint = startpoint
         self.__nodes = nodes
-        self.__db = DBConnection(dbname)
-        if not self.__db.connected:
-            logger.error(u"Fehler in navigation:\n",
-                          u'QKan-Datenbank {:s} wurde nicht gefunden oder war nicht aktuell!\nAbbruch!'.format(dbname))
-            return None
+        self.__netz = netz
         self.__parent = parent
 
     def run(self):
@@ -297,8 +517,7 @@ class Worker(QtCore.QRunnable):
         Berechnet alle Routen zwischen einem Startpunkt und allen anderen Punkten
         """
         routes = self.__get_routes(self.__startpoint)
-        for route in routes:
-            self.__parent.results.append(route)
+        self.__parent.add_results(routes)
 
     def __get_routes(self, startpoint):
         """
@@ -325,40 +544,10 @@ class Worker(QtCore.QRunnable):
         """
         if set(haltungen).issuperset(set(self.__nodes)):
             return haltungen
-        statement = u"""SELECT name
-        FROM (SELECT
-                haltnam AS name,
-                schoben
-              FROM haltungen
-              UNION SELECT
-                      wnam AS name,
-                      schoben
-                    FROM wehre
-              UNION SELECT
-                      pnam AS name,
-                      schoben
-                    FROM pumpen)
-        WHERE schoben =
-          (SELECT schunten
-           FROM (SELECT
-                   haltnam AS name,
-                   schunten
-                 FROM haltungen
-                 UNION SELECT
-                         wnam AS name,
-                         schunten
-                       FROM wehre
-                 UNION SELECT
-                         pnam AS name,
-                         schunten
-                       FROM pumpen)
-           WHERE name = "{}")
-            """
-        self.__db.sql(statement.format(haltungen[-1]))
-        next_haltungen = self.__db.fetchall()
+        next_haltungen = self.__netz.naechste(haltungen[-1])
         if len(next_haltungen) == 0:
             return
-        for option, in next_haltungen:
+        for option in next_haltungen:
             hCopy = list(haltungen)
             hCopy.append(option)
             res = self.__get_routes_recursive(hCopy, results)
@@ -367,22 +556,34 @@ class Worker(QtCore.QRunnable):
 
 
 class Tasks(QtCore.QObject):
-    def __init__(self, dbname, nodes):
+    def __init__(self, netz, nodes):
         """
         Constructor
 
-        :param dbname:Entspricht dem SpatialListe-Datenbank-Pfad
-        :type dbname: str
+        :param netz: Abbild der Netztopologie, das von allen Workern gemeinsam gelesen wird
+        :type netz: Netzabbild
         :param nodes: Entspricht einer Liste von allen Haltungsnamenm, welche in der Route vorkommen sollen.
         :type nodes: list
         """
         super(Tasks, self).__init__()
-        self.__pool = QtCore.QThreadPool.globalInstance()
-        self.__pool.setMaxThreadCount(2)
-        self.__dbname = dbname
+        # Eigener Pool, damit die Einstellungen des globalen QGIS-Pools unverändert bleiben
+        self.__pool = QtCore.QThreadPool()
+        self.__pool.setMaxThreadCount(max(QtCore.QThread.idealThreadCount(), 1))
+        self.__netz = netz
         self.__nodes = nodes
+        self.__lock = threading.Lock()
         self.results = []
 
+    def add_results(self, routes):
+        """
+        Fügt die Routen eines Workers threadsicher den Ergebnissen hinzu
+
+        :param routes: Routen eines Workers
+        :type routes: list
+        """
+        with self.__lock:
+            self.results.extend(routes)
+
     def start(self):
         """
         Startet alle Threads für jeden möglichen Startpunkt
@@ -393,7 +594,7 @@ class Tasks(QtCore.QObject):
         for n in self.__nodes:
             others = list(self.__nodes)
             others.remove(n)
-            worker = Worker(self.__dbname, n, others, self)
+            worker = Worker(self.__netz, n, others, self)
             self.__pool.start(worker)
         self.__pool.waitForDone()
         return self.results
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Kanalnetz als Graph
+  ===================
+
+  Liest die Topologie des Kanalnetzes (Haltungen, Wehre und Pumpen zwischen Schächten) einmal
+  aus der QKan-Datenbank und hält sie als NumPy-Arrays. Die Kanten sind die Haltungen, Wehre
+  und Pumpen, die Knoten die Schächte. Auf dieser Grundlage arbeiten Auswertungen, die dem
+  Fließweg folgen (z.B. Akkumulation von Flächen und Zuflüssen), ohne je Haltung eine
+  SQL-Abfrage auszuführen.
+
+  Das Netz kann als Abbild neben der Datenbank gespeichert werden (Verzeichnis
+  <Datenbank>.netz mit einer .npy-Datei je Array). Die Arrays werden beim Laden nur in den
+  Speicher abgebildet (mmap), so dass auch mehrere Prozesse dasselbe Abbild ohne Kopie
+  nutzen können. Gültig ist das Abbild, solange sich der Änderungszähler im Dateikopf der
+  SQLite-Datenbank nicht geändert hat.
+
+  | Dateiname            : netz.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+__author__ = 'Joerg Hoettges'
+__date__ = 'Oktober 2018'
+__copyright__ = '(C) 2018, Joerg Hoettges'
+
+import logging
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from qkan_utils import fehlermeldung
+
+logger = logging.getLogger(u'QKan')
+
+# Kantentypen
+HALTUNG = 0
+WEHR = 1
+PUMPE = 2
+kantentypen = (u'Haltung', u'Wehr', u'Pumpe')
+
+# Version des Abbildformats. Bei Änderungen an den gespeicherten Arrays erhöhen.
+ABBILDVERSION = 1
+
+# Arrays, die im Abbild gespeichert werden
+_knotenarrays = (u'sohlhoehe', u'deckelhoehe', u'x', u'y')
+_kantenarrays = (u'kantentyp', u'oben', u'unten', u'laenge', u'sohleoben', u'sohleunten',
+                 u'hoehe', u'breite', u'ks')
+_abbildarrays = ((u'knotennamen', u'kantennamen', u'profil') + _knotenarrays + _kantenarrays +
+                 (u'ebenen', u'ebenenstart', u'zyklus', u'kennung'))
+
+
+def bereiche(lo, anz):
+    """Erweitert Indexbereiche [lo, lo + anz) zu einem zusammenhängenden Indexarray"""
+    gesamt = int(anz.sum())
+    if gesamt == 0:
+        return np.zeros(0, dtype=np.int64)
+    start = np.repeat(lo - (np.cumsum(anz) - anz), anz)
+    return start + np.arange(gesamt, dtype=np.int64)
+
+
+def aenderungszaehler(dbname):
+    """Liest den Änderungszähler aus dem Dateikopf einer SQLite-Datenbank. Er wird bei jedem
+    Speichern (commit) erhöht, auch bei Änderungen über andere Verbindungen.
+
+    :dbname:        Pfad zur SQLite-Datenbank
+    :type dbname:   String
+
+    :returns:       Änderungszähler oder None, falls er nicht verwendet werden kann (z.B. im WAL-Modus)
+    :rtype:         integer
+    """
+
+    if dbname is None or not os.path.isfile(dbname) or os.path.exists(dbname + u'-wal'):
+        return None
+    try:
+        with open(dbname, 'rb') as datei:
+            kopf = datei.read(28)
+    except IOError:
+        return None
+    if len(kopf) < 28:
+        return None
+    return struct.unpack('>I', kopf[24:28])[0]
+
+
+def abbildpfad(dbname):
+    """Verzeichnis des Netzabbilds zu einer QKan-Datenbank"""
+    return os.path.splitext(dbname)[0] + u'.netz'
+
+
+class Netz(object):
+    """Topologie und Grunddaten des Kanalnetzes
+
+    Kanten (Haltungen, Wehre, Pumpen):
+        kantennamen, kantentyp, oben, unten (Index des Schachtes, -1: nicht vorhanden),
+        laenge, sohleoben, sohleunten, hoehe, breite, ks, profil
+
+    Knoten (Schächte):
+        knotennamen, sohlhoehe, deckelhoehe, x, y
+    """
+
+    def __init__(self):
+        self.knotennamen = []
+        self.knotenindex = {}
+        self.kantennamen = []
+        self.kantenindex = {}
+        self.profil = []
+        self._ebenen = None
+        self._abwaerts = None
+
+    @classmethod
+    def lesen(cls, dbQK):
+        """Liest das Kanalnetz aus der QKan-Datenbank
+
+        :dbQK:          Datenbankobjekt, das die Verknüpfung zur QKan-Datenbank verwaltet.
+        :type dbQK:     DBConnection (geerbt von dbapi...)
+
+        :returns:       Kanalnetz oder None bei einem Fehler
+        :rtype:         Netz
+        """
+
+        if np is None:
+            fehlermeldung(u'Fehler in netz.Netz.lesen', u'Das Python-Modul NumPy ist nicht installiert.')
+            return None
+
+        sql = u"""SELECT schnam, sohlhoehe, deckelhoehe, xsch, ysch
+                FROM schaechte
+                WHERE schnam IS NOT NULL"""
+        if not dbQK.sql(sql, u'netz.Netz.lesen (1)'):
+            return None
+        schaechte = dbQK.fetchall()
+
+        # Sohlhöhen der Haltungen: Falls nicht angegeben, die der Schächte
+        sql = u"""SELECT haltnam, 0, schoben, schunten, laenge,
+                    coalesce(sohleoben, so.sohlhoehe), coalesce(sohleunten, su.sohlhoehe),
+                    hoehe, breite, ks, profilnam
+                FROM haltungen
+                LEFT JOIN schaechte AS so ON haltungen.schoben = so.schnam
+                LEFT JOIN schaechte AS su ON haltungen.schunten = su.schnam
+                WHERE haltnam IS NOT NULL
+                UNION ALL
+                SELECT wnam, 1, schoben, schunten, laenge, NULL, NULL, NULL, NULL, NULL, NULL
+                FROM wehre
+                WHERE wnam IS NOT NULL
+                UNION ALL
+                SELECT pnam, 2, schoben, schunten, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+                FROM pumpen
+                WHERE pnam IS NOT NULL"""
+        if not dbQK.sql(sql, u'netz.Netz.lesen (2)'):
+            return None
+        kanten = dbQK.fetchall()
+
+        netz = cls()
+        for sch in schaechte:
+            netz._knoten(sch[0])
+        for kante in kanten:
+            netz._knoten(kante[2])
+            netz._knoten(kante[3])
+
+        nk = len(netz.knotennamen)
+        netz.sohlhoehe = np.repeat(np.nan, nk)
+        netz.deckelhoehe = np.repeat(np.nan, nk)
+        netz.x = np.repeat(np.nan, nk)
+        netz.y = np.repeat(np.nan, nk)
+        if len(schaechte) > 0:
+            idx = np.array([netz.knotenindex[sch[0]] for sch in schaechte], dtype=np.int64)
+            werte = np.array([sch[1:] for sch in schaechte], dtype=float)
+            netz.sohlhoehe[idx] = werte[:, 0]
+            netz.deckelhoehe[idx] = werte[:, 1]
+            netz.x[idx] = werte[:, 2]
+            netz.y[idx] = werte[:, 3]
+
+        netz.kantennamen = [kante[0] for kante in kanten]
+        for i, name in enumerate(netz.kantennamen):
+            netz.kantenindex.setdefault(name, i)
+        netz.kantentyp = np.array([kante[1] for kante in kanten], dtype=np.int8)
+        netz.oben = np.array([netz.knotenindex.get(kante[2], -1) for kante in kanten], dtype=np.int64)
+        netz.unten = np.array([netz.knotenindex.get(kante[3], -1) for kante in kanten], dtype=np.int64)
+        werte = np.array([kante[4:10] for kante in kanten], dtype=float).reshape(len(kanten), 6)
+        netz.laenge, netz.sohleoben, netz.sohleunten, netz.hoehe, netz.breite, netz.ks = werte.T
+        netz.profil = [kante[10] for kante in kanten]
+
+        logger.debug(u'netz.Netz.lesen: {} Knoten, {} Kanten'.format(nk, len(kanten)))
+        return netz
+
+    @classmethod
+    def holen(cls, dbQK):
+        """Liefert das Kanalnetz aus dem Abbild neben der Datenbank, falls dieses aktuell ist.
+        Andernfalls wird es aus der Datenbank gelesen und das Abbild neu geschrieben.
+
+        Achtung: Offene Änderungen der Verbindung werden vorher gespeichert (dbQK.commit), damit das
+        Abbild dem Änderungszähler entspricht. Innerhalb einer Transaktion (dbQK.transaktion) ist
+        commit wirkungslos; dort darf holen erst nach Abschluss der Änderungen am Netz aufgerufen werden.
+
+        :dbQK:          Datenbankobjekt, das die Verknüpfung zur QKan-Datenbank verwaltet.
+        :type dbQK:     DBConnection (geerbt von dbapi...)
+
+        :returns:       Kanalnetz oder None bei einem Fehler
+        :rtype:         Netz
+        """
+
+        if np is None:
+            return cls.lesen(dbQK)
+
+        dbQK.commit()
+        zaehler = aenderungszaehler(dbQK.dbname)
+        if zaehler is None:
+            return cls.lesen(dbQK)
+
+        pfad = abbildpfad(dbQK.dbname)
+        netz = cls.laden(pfad, zaehler)
+        if netz is not None:
+            return netz
+
+        netz = cls.lesen(dbQK)
+        if netz is not None:
+            netz.speichern(pfad, zaehler)
+        return netz
+
+    @classmethod
+    def laden(cls, pfad, zaehler=None):
+        """Lädt ein Netzabbild. Die Arrays werden nur gelesen und in den Speicher abgebildet.
+
+        :pfad:          Verzeichnis des Abbilds
+        :type pfad:     String
+
+        :zaehler:       Erwarteter Änderungszähler der Datenbank, None: nicht prüfen
+        :type zaehler:  integer
+
+        :returns:       Kanalnetz oder None, falls das Abbild fehlt oder veraltet ist
+        :rtype:         Netz
+        """
+
+        def array(name):
+            return np.load(os.path.join(pfad, name + u'.npy'), mmap_mode='r')
+
+        try:
+            kennung = array(u'kennung')
+            if kennung[0] != ABBILDVERSION or (zaehler is not None and kennung[1] != zaehler):
+                return None
+
+            netz = cls()
+            netz.knotennamen = array(u'knotennamen').tolist()
+            netz.knotenindex = dict(zip(netz.knotennamen, range(len(netz.knotennamen))))
+            netz.kantennamen = array(u'kantennamen').tolist()
+            # Bei doppelten Namen gilt wie in lesen das erste Objekt
+            anz = len(netz.kantennamen)
+            netz.kantenindex = dict(zip(netz.kantennamen[::-1], range(anz - 1, -1, -1)))
+            netz.profil = [p or None for p in array(u'profil').tolist()]
+            for name in _knotenarrays + _kantenarrays:
+                setattr(netz, name, array(name))
+
+            ebenen = np.asarray(array(u'ebenen'))
+            start = np.asarray(array(u'ebenenstart'))
+            netz._ebenen = np.split(ebenen, start[1:-1]) if len(start) > 1 else []
+            netz.zyklus = array(u'zyklus')
+        except (IOError, OSError, ValueError, IndexError) as err:
+            logger.debug(u'netz.Netz.laden: Abbild {} nicht verwendbar: {}'.format(pfad, repr(err)))
+            return None
+
+        logger.debug(u'netz.Netz.laden: {} Knoten, {} Kanten aus {}'.format(
+            netz.anzahl_knoten, netz.anzahl_kanten, pfad))
+        return netz
+
+    def speichern(self, pfad, zaehler):
+        """Speichert das Netz als Abbild. Die Kennung mit dem Änderungszähler wird zuletzt
+        geschrieben, damit ein unvollständiges Abbild nicht verwendet wird. Ein vorhandenes
+        Verzeichnis wird nur verwendet, wenn es ein Netzabbild enthält (kennung.npy). Dabei werden
+        nur die Dateien des Abbilds ersetzt.
+
+        :pfad:          Verzeichnis des Abbilds
+        :type pfad:     String
+
+        :zaehler:       Änderungszähler der Datenbank, zu dem das Netz gelesen wurde
+        :type zaehler:  integer
+
+        :returns:       Erfolg
+        :rtype:         Boolean
+        """
+
+        ebenen = self.ebenen()
+        start = np.cumsum([0] + [len(e) for e in ebenen])
+        try:
+            if os.path.isdir(pfad):
+                if not os.path.isfile(os.path.join(pfad, u'kennung.npy')):
+                    logger.warning(u'netz.Netz.speichern: {} ist kein Netzabbild und wird nicht '
+                                   u'überschrieben'.format(pfad))
+                    return False
+                # Kennung zuerst entfernen, damit ein teilweise ersetztes Abbild nicht verwendet wird
+                for name in (u'kennung',) + _abbildarrays[:-1]:
+                    datei = os.path.join(pfad, name + u'.npy')
+                    if os.path.isfile(datei):
+                        os.remove(datei)
+            else:
+                os.makedirs(pfad)
+
+            def array(name, werte):
+                np.save(os.path.join(pfad, name + u'.npy'), werte)
+
+            array(u'knotennamen', np.array(self.knotennamen, dtype=u'U'))
+            array(u'kantennamen', np.array(self.kantennamen, dtype=u'U'))
+            array(u'profil', np.array([p or u'' for p in self.profil], dtype=u'U'))
+            for name in _knotenarrays + _kantenarrays:
+                array(name, np.asarray(getattr(self, name)))
+            array(u'ebenen', np.concatenate(ebenen) if ebenen else np.zeros(0, dtype=np.int64))
+            array(u'ebenenstart', start.astype(np.int64))
+            array(u'zyklus', np.asarray(self.zyklus, dtype=np.int64))
+            array(u'kennung', np.array([ABBILDVERSION, zaehler], dtype=np.int64))
+        except (IOError, OSError) as err:
+            logger.warning(u'netz.Netz.speichern: Abbild {} konnte nicht geschrieben werden: {}'.format(
+                pfad, repr(err)))
+            return False
+        return True
+
+    def _knoten(self, name):
+        """Fügt einen Knoten hinzu, falls noch nicht vorhanden"""
+        if name is not None and name not in self.knotenindex:
+            self.knotenindex[name] = len(self.knotennamen)
+            self.knotennamen.append(name)
+
+    @property
+    def anzahl_knoten(self):
+        return len(self.knotennamen)
+
+    @property
+    def anzahl_kanten(self):
+        return len(self.kantennamen)
+
+    def abwaerts(self):
+        """Kanten sortiert nach dem oberen Knoten, für die Suche der abgehenden Kanten
+
+        :returns:       Kantenindizes sortiert nach oberem Knoten und Startposition je Knoten
+        :rtype:         tuple of numpy.arrays
+        """
+        if self._abwaerts is None:
+            folge = np.argsort(self.oben, kind='mergesort')
+            start = np.searchsorted(self.oben[folge], np.arange(self.anzahl_knoten + 1))
+            self._abwaerts = (folge, start)
+        return self._abwaerts
+
+    def abgehend(self, knoten):
+        """Gibt die von den Knoten abgehenden Kanten zurück
+
+        :knoten:        Knotenindizes
+        :type knoten:   numpy.array
+
+        :returns:       Kantenindizes
+        :rtype:         numpy.array
+        """
+        folge, start = self.abwaerts()
+        knoten = knoten[knoten >= 0]
+        return folge[bereiche(start[knoten], start[knoten + 1] - start[knoten])]
+
+    def ebenen(self):
+        """Topologische Sortierung der Kanten in Ebenen. Eine Kante gehört zu einer Ebene,
+        wenn alle Kanten, die in ihren oberen Knoten münden, in vorherigen Ebenen liegen.
+        Kanten in Zyklen werden nicht einsortiert (s. zyklus).
+
+        :returns:       Liste von Arrays mit Kantenindizes
+        :rtype:         list
+        """
+        if self._ebenen is not None:
+            return self._ebenen
+
+        nk = self.anzahl_knoten
+        gueltig = self.unten >= 0
+        offen = np.bincount(self.unten[gueltig], minlength=nk)
+
+        self._ebenen = []
+        eingeordnet = np.zeros(self.anzahl_kanten, dtype=bool)
+
+        # Erste Ebene: Kanten ohne oberen Knoten und Kanten an Knoten ohne Zufluss
+        ebene = np.concatenate((np.nonzero(self.oben < 0)[0], self.abgehend(np.nonzero(offen == 0)[0])))
+        while len(ebene) > 0:
+            self._ebenen.append(ebene)
+            eingeordnet[ebene] = True
+            unten = self.unten[ebene]
+            unten = unten[unten >= 0]
+            vorher = offen[unten] > 0
+            offen -= np.bincount(unten, minlength=nk)
+            fertig = np.unique(unten[vorher & (offen[unten] == 0)])
+            ebene = self.abgehend(fertig)
+
+        self.zyklus = np.nonzero(~eingeordnet)[0]
+        if len(self.zyklus) > 0:
+            logger.warning(u'netz.Netz.ebenen: {} Kanten liegen in Zyklen, z.B. {}'.format(
+                len(self.zyklus), self.kantennamen[self.zyklus[0]]))
+        return self._ebenen
+
+    def unterhalb(self, kanten):
+        """Ermittelt alle Kanten unterhalb der gegebenen Kanten einschließlich dieser selbst
+
+        :kanten:        Kantenindizes
+        :type kanten:   numpy.array oder list
+
+        :returns:       Markierung der Kanten
+        :rtype:         numpy.array of bool
+        """
+        markiert = np.zeros(self.anzahl_kanten, dtype=bool)
+        knotenmarkiert = np.zeros(self.anzahl_knoten, dtype=bool)
+        neu = np.unique(np.asarray(kanten, dtype=np.int64))
+        while len(neu) > 0:
+            markiert[neu] = True
+            knoten = np.unique(self.unten[neu])
+            knoten = knoten[knoten >= 0]
+            knoten = knoten[~knotenmarkiert[knoten]]
+            knotenmarkiert[knoten] = True
+            neu = self.abgehend(knoten)
+            neu = neu[~markiert[neu]]
+        return markiert
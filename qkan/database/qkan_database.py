@@ -22,7 +22,7 @@
 __author__ = 'Joerg Hoettges'
 __date__ = 'Oktober 2016'
 __copyright__ = '(C) 2016, Joerg Hoettges'
-__dbVersion__ = '2.5.9'                         # Version der QKan-Datenbank
+__dbVersion__ = '2.5.13'                        # Version der QKan-Datenbank
 __qgsVersion__  = '2.5.21'                       # Version des Projektes und der Projektdatei. Kann 
                                                 # höher als die der QKan-Datenbank sein
 
@@ -134,6 +134,240 @@ def qgsActualVersion(update = True, warning = False):
     return isActual
 
 
+# Geometriekennwerte ---------------------------------------------------------------------------
+# Fläche, Länge und Schwerpunkt der Geoobjekte werden in zusätzlichen Spalten gespeichert und 
+# von Triggern bei jeder Änderung des Geoobjektes (auch in QGIS) aktualisiert. Sie ersetzen in 
+# häufig ausgeführten Abfragen (Export, Verknüpfungen) die wiederholte Berechnung von 
+# area(), GLength() und Centroid(). 
+
+geomkennwerte = {
+    u'haltungen': ((u'geomlaenge', u'GLength({geom})'), 
+                   (u'xmitte', u'X(Centroid({geom}))'), 
+                   (u'ymitte', u'Y(Centroid({geom}))')), 
+    u'flaechen': ((u'geomflaeche', u'area({geom})'), 
+                  (u'xmitte', u'X(Centroid({geom}))'), 
+                  (u'ymitte', u'Y(Centroid({geom}))')), 
+    u'tezg': ((u'geomflaeche', u'area({geom})'),)}
+
+
+def sqlgeomkennwerte(tabelle):
+    """Liefert die SQL-Befehle, mit denen die Trigger für die Geometriekennwerte der Tabelle
+    angelegt und die Kennwerte für die vorhandenen Datensätze berechnet werden.
+
+    :param tabelle:     Name der Tabelle, Schlüssel in geomkennwerte
+    :type tabelle:      String
+
+    :returns:           Liste der SQL-Befehle
+    :rtype:             list of String
+    """
+
+    setzen = u', '.join([u'{} = {}'.format(attr, ausdruck.format(geom=u'NEW.geom')) 
+                         for attr, ausdruck in geomkennwerte[tabelle]])
+    berechnen = u', '.join([u'{} = {}'.format(attr, ausdruck.format(geom=u'geom')) 
+                            for attr, ausdruck in geomkennwerte[tabelle]])
+
+    return [u"""DROP TRIGGER IF EXISTS geomkennwerte_{tab}_ins""".format(tab=tabelle), 
+            u"""DROP TRIGGER IF EXISTS geomkennwerte_{tab}_upd""".format(tab=tabelle), 
+            u"""CREATE TRIGGER geomkennwerte_{tab}_ins AFTER INSERT ON {tab}
+                BEGIN
+                    UPDATE {tab} SET {setzen} WHERE pk = NEW.pk;
+                END""".format(tab=tabelle, setzen=setzen), 
+            u"""CREATE TRIGGER geomkennwerte_{tab}_upd AFTER UPDATE OF geom ON {tab}
+                BEGIN
+                    UPDATE {tab} SET {setzen} WHERE pk = NEW.pk;
+                END""".format(tab=tabelle, setzen=setzen), 
+            u"""UPDATE {tab} SET {berechnen}""".format(tab=tabelle, berechnen=berechnen)]
+
+
+# Plausibilitätskontrollen ---------------------------------------------------------------------
+# Die Prüfergebnisse v_linkfl_check und v_flaechen_ohne_linkfl werden in Tabellen gespeichert und
+# von Triggern auf linkfl, flaechen und tezg jeweils nur für die geänderten Flächennamen
+# aktualisiert, so dass die Prüflayer in QGIS ohne erneute Auswertung geöffnet werden. 
+# Da beim Umspeichern einer Tabelle auch deren Trigger gelöscht werden, müssen sie danach mit 
+# sqlpruefungen neu angelegt werden. 
+
+# Mehrfache, fehlende und unvollständige Anbindungen in linkfl, je Fläche (bei aufzuteilenden
+# Flächen je Fläche und Haltungsfläche)
+_sqllinkfl_check = u"""INSERT INTO v_linkfl_check (pk, anzahl, fehler, linkfl_nam)
+            SELECT pk, anzahl, 
+                CASE WHEN anzahl > 1 THEN 'mehrfach vorhanden' 
+                     WHEN flaech_nam IS NULL THEN 'Keine Fläche' 
+                     WHEN linkfl_haltnam IS NULL THEN 'Keine Haltung' 
+                     ELSE 'o.k.' END, 
+                linkfl_nam
+            FROM
+            (   SELECT 
+                    min(lf.pk) AS pk, lf.flnam AS linkfl_nam, lf.haltnam AS linkfl_haltnam, 
+                    fl.flnam AS flaech_nam, count(*) AS anzahl
+                FROM linkfl AS lf
+                LEFT JOIN flaechen AS fl
+                ON lf.flnam = fl.flnam
+                LEFT JOIN tezg AS tg
+                ON lf.tezgnam = tg.flnam
+                WHERE fl.aufteilen = 'ja'{auswahl}
+                GROUP BY lf.flnam, tg.flnam
+                UNION ALL
+                SELECT 
+                    min(lf.pk) AS pk, lf.flnam AS linkfl_nam, lf.haltnam AS linkfl_haltnam, 
+                    fl.flnam AS flaech_nam, count(*) AS anzahl
+                FROM linkfl AS lf
+                LEFT JOIN flaechen AS fl
+                ON lf.flnam = fl.flnam
+                WHERE (fl.aufteilen <> 'ja' OR fl.aufteilen IS NULL){auswahl}
+                GROUP BY lf.flnam)"""
+
+# Flächen ohne Anbindung
+_sqlflaechen_ohne_linkfl = u"""INSERT INTO v_flaechen_ohne_linkfl (pk, flaech_nam, flaech_aufteilen, Fehler)
+            SELECT fl.pk, fl.flnam, fl.aufteilen, 'Verbindung fehlt'
+            FROM flaechen AS fl
+            WHERE NOT EXISTS (SELECT 1 FROM linkfl AS lf WHERE lf.flnam = fl.flnam){auswahl}"""
+
+
+def _sqlpruefungneu(auswahl):
+    """Liefert die SQL-Befehle, mit denen die Prüfergebnisse für die Flächennamen in auswahl
+    neu berechnet werden.
+
+    :param auswahl:     Bedingung für den Flächennamen {spalte}, z.B. u"IS NEW.flnam"
+    :type auswahl:      String
+
+    :returns:           Liste der SQL-Befehle (v_linkfl_check, v_flaechen_ohne_linkfl)
+    :rtype:             tuple of lists
+    """
+
+    def bed(spalte):
+        return u' AND {} {}'.format(spalte, auswahl)
+
+    linkfl_check = [u"""DELETE FROM v_linkfl_check WHERE linkfl_nam {}""".format(auswahl), 
+                    _sqllinkfl_check.format(auswahl=bed(u'lf.flnam'))]
+    flaechen_ohne_linkfl = [
+        u"""DELETE FROM v_flaechen_ohne_linkfl WHERE pk <> 0 AND flaech_nam {}""".format(auswahl), 
+        _sqlflaechen_ohne_linkfl.format(auswahl=bed(u'fl.flnam'))]
+    return linkfl_check, flaechen_ohne_linkfl
+
+
+def sqlpruefungen():
+    """Liefert die SQL-Befehle, mit denen die Tabellen für die Plausibilitätskontrollen 
+    v_linkfl_check und v_flaechen_ohne_linkfl samt Triggern angelegt und vollständig 
+    berechnet werden.
+
+    :returns:           Liste der SQL-Befehle
+    :rtype:             list of String
+    """
+
+    sqllis = [u"""CREATE TABLE IF NOT EXISTS v_linkfl_check (
+                pk INTEGER,
+                anzahl INTEGER,
+                fehler TEXT,
+                linkfl_nam TEXT)""", 
+              u"""CREATE INDEX IF NOT EXISTS v_linkfl_check_linkfl_nam_idx ON v_linkfl_check (linkfl_nam)""", 
+              u"""CREATE TABLE IF NOT EXISTS v_flaechen_ohne_linkfl (
+                pk INTEGER PRIMARY KEY,
+                flaech_nam TEXT,
+                flaech_aufteilen TEXT,
+                Fehler TEXT)""", 
+              u"""CREATE INDEX IF NOT EXISTS v_flaechen_ohne_linkfl_flaech_nam_idx 
+                ON v_flaechen_ohne_linkfl (flaech_nam)"""]
+
+    # Indizes für die Suche nach den Flächennamen in den Triggern
+    sqllis += [u"""CREATE INDEX IF NOT EXISTS {tab}_{attr}_idx ON {tab} ({attr})""".format(tab=tab, attr=attr)
+               for tab, attr in [(u'linkfl', u'flnam'), (u'linkfl', u'tezgnam'), 
+                                 (u'flaechen', u'flnam'), (u'tezg', u'flnam')]]
+
+    # Trigger: Tabelle, Ereignis, Auswahl der neu zu berechnenden Flächennamen, 
+    # Prüfung v_flaechen_ohne_linkfl betroffen
+    tezgauswahl = u"IN (SELECT flnam FROM linkfl WHERE tezgnam IS {}.flnam)"
+    trigger = [(u'linkfl', u'ins', u'INSERT', [u'IS NEW.flnam'], True), 
+               (u'linkfl', u'del', u'DELETE', [u'IS OLD.flnam'], True), 
+               (u'linkfl', u'upd', u'UPDATE OF flnam, haltnam, tezgnam', [u'IS OLD.flnam', u'IS NEW.flnam'], True), 
+               (u'flaechen', u'ins', u'INSERT', [u'IS NEW.flnam'], True), 
+               (u'flaechen', u'del', u'DELETE', [u'IS OLD.flnam'], True), 
+               (u'flaechen', u'upd', u'UPDATE OF flnam, aufteilen', [u'IS OLD.flnam', u'IS NEW.flnam'], True), 
+               (u'tezg', u'ins', u'INSERT', [tezgauswahl.format(u'NEW')], False), 
+               (u'tezg', u'del', u'DELETE', [tezgauswahl.format(u'OLD')], False), 
+               (u'tezg', u'upd', u'UPDATE OF flnam', [tezgauswahl.format(u'OLD'), tezgauswahl.format(u'NEW')], False)]
+
+    for tab, kurz, ereignis, auswahlliste, ohnelinkfl in trigger:
+        befehle = []
+        for auswahl in auswahlliste:
+            linkfl_check, flaechen_ohne_linkfl = _sqlpruefungneu(auswahl)
+            befehle += linkfl_check
+            if ohnelinkfl:
+                befehle += flaechen_ohne_linkfl
+        sqllis += [u"""DROP TRIGGER IF EXISTS pruefungen_{tab}_{kurz}""".format(tab=tab, kurz=kurz), 
+                   u"""CREATE TRIGGER pruefungen_{tab}_{kurz} AFTER {ereignis} ON {tab}
+                BEGIN
+                    {befehle};
+                END""".format(tab=tab, kurz=kurz, ereignis=ereignis, 
+                              befehle=u';\n                    '.join(befehle))]
+
+    # Vollständige Berechnung
+    sqllis += [u"""DELETE FROM v_linkfl_check""", 
+               _sqllinkfl_check.format(auswahl=u''), 
+               u"""DELETE FROM v_flaechen_ohne_linkfl""", 
+               u"""INSERT INTO v_flaechen_ohne_linkfl (pk, flaech_nam, flaech_aufteilen, Fehler)
+                VALUES (0, '', '', 'o.k.')""", 
+               _sqlflaechen_ohne_linkfl.format(auswahl=u'')]
+
+    return sqllis
+
+
+def sqlzusatztabellen():
+    """Liefert die SQL-Befehle, mit denen die Tabellen für Prüfstände und Berechnungsergebnisse 
+    angelegt werden.
+
+    :returns:           Liste der SQL-Befehle
+    :rtype:             list of String
+    """
+
+    # Prüfstände von checknames und checkgeom (s. qkan_utils.pruefstand_einrichten)
+    sqllis = [u"""CREATE TABLE IF NOT EXISTS pruefstand (
+                pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                tabelle TEXT,
+                attribut TEXT,
+                geprueft INTEGER DEFAULT 0)"""]
+
+    # Ergebnisse der Akkumulation (s. k_akkumulation.akkumulation)
+    sqllis += [u"""CREATE TABLE IF NOT EXISTS akkumulation (
+                pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                typ TEXT,
+                schoben TEXT,
+                schunten TEXT,
+                flbef REAL,
+                fldur REAL,
+                ew REAL,
+                zufluss REAL)""", 
+               u"""CREATE INDEX IF NOT EXISTS akkumulation_name ON akkumulation (name)"""]
+
+    # Fließzeiten (s. k_fliesszeit.fliesszeiten)
+    sqllis += [u"""CREATE TABLE IF NOT EXISTS fliesszeiten (
+                pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                typ TEXT,
+                fliesszeitrohr REAL,
+                konzentrationszeit REAL)"""]
+
+    # Plausibilitätsprüfung (s. k_pruefung.pruefen): Befunde und Änderungsvermerke für die 
+    # inkrementelle Prüfung
+    sqllis += [u"""CREATE TABLE IF NOT EXISTS pruefergebnisse (
+                pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                tabelle TEXT,
+                objekt_pk INTEGER,
+                objekt TEXT,
+                regel TEXT,
+                schwere TEXT,
+                meldung TEXT,
+                createdat TEXT DEFAULT (strftime('%d.%m.%Y %H:%M','now')))""", 
+               u"""CREATE INDEX IF NOT EXISTS pruefergebnisse_tabelle_idx ON pruefergebnisse (tabelle, objekt_pk)""", 
+               u"""CREATE TABLE IF NOT EXISTS pruefaenderungen (
+                tabelle TEXT,
+                objekt_pk INTEGER,
+                name TEXT,
+                PRIMARY KEY (tabelle, objekt_pk, name))"""]
+
+    return sqllis
+
+
 # Erzeuge QKan-Tabellen
 
 def createdbtables(consl, cursl, version=__dbVersion__, epsg=25832):
@@ -175,7 +409,10 @@ def createdbtables(consl, cursl, version=__dbVersion__, epsg=25832):
     xschob REAL,
     yschob REAL,
     xschun REAL,
-    yschun REAL)'''
+    yschun REAL,
+    geomlaenge REAL,
+    xmitte REAL,
+    ymitte REAL)'''
 
     try:
         cursl.execute(sql)
@@ -589,7 +826,10 @@ def createdbtables(consl, cursl, version=__dbVersion__, epsg=25832):
     abflussparameter TEXT,
     aufteilen TEXT DEFAULT 'nein',
     kommentar TEXT,
-    createdat TEXT DEFAULT (strftime('%d.%m.%Y %H:%M','now')))'''
+    createdat TEXT DEFAULT (strftime('%d.%m.%Y %H:%M','now')),
+    geomflaeche REAL,
+    xmitte REAL,
+    ymitte REAL)'''
 
     try:
         cursl.execute(sql)
@@ -703,7 +943,8 @@ def createdbtables(consl, cursl, version=__dbVersion__, epsg=25832):
     teilgebiet TEXT,
     abflussparameter TEXT,
     kommentar TEXT,
-    createdat TEXT DEFAULT (strftime('%d.%m.%Y %H:%M','now')))'''
+    createdat TEXT DEFAULT (strftime('%d.%m.%Y %H:%M','now')),
+    geomflaeche REAL)'''
 
     try:
         cursl.execute(sql)
@@ -1127,6 +1368,35 @@ def createdbtables(consl, cursl, version=__dbVersion__, epsg=25832):
         consl.close()
         return False
     consl.commit()
+
+    # Export-Cache für die DYNA-Typ12-Datensätze ----------------------------------
+
+    sql = u"""
+        CREATE TABLE IF NOT EXISTS dynacache (
+            pk INTEGER PRIMARY KEY,
+            fingerabdruck TEXT,
+            zeilen TEXT)"""
+
+    try:
+        cursl.execute(sql)
+    except BaseException as err:
+        fehlermeldung(u'qkan_database.createdbtables: {}'.format(err), 
+                      u'Fehler beim Erzeugen der Tabelle "dynacache".')
+        consl.close()
+        return False
+    consl.commit()
+
+    # Prüfstände und Berechnungsergebnisse ----------------------------------------
+
+    try:
+        for sql in sqlzusatztabellen():
+            cursl.execute(sql)
+    except BaseException as err:
+        fehlermeldung(u'qkan_database.createdbtables: {}'.format(err), 
+                      u'Fehler beim Erzeugen der Tabellen für Prüfstände und Berechnungsergebnisse.')
+        consl.close()
+        return False
+    consl.commit()
     
     # Allgemeiner Informationen -----------------------------------------------
 
@@ -1147,79 +1417,29 @@ def createdbtables(consl, cursl, version=__dbVersion__, epsg=25832):
     # Plausibilitätskontrollen --------------------------------------------------
 
     # Prüfung der Anbindungen in "linkfl" auf eindeutige Zuordnung zu Flächen und Haltungen
-
-    sql = u'''CREATE VIEW IF NOT EXISTS "v_linkfl_check" AS 
-            WITH lfok AS
-            (   SELECT 
-                    lf.pk AS "pk",
-                    lf.flnam AS "linkfl_nam", 
-                    lf.haltnam AS "linkfl_haltnam", 
-                    fl.flnam AS "flaech_nam",
-                    tg.flnam AS "tezg_nam",
-                    min(lf.pk) AS pkmin, 
-                    max(lf.pk) AS pkmax,
-                    count(*) AS anzahl
-                FROM linkfl AS lf
-                LEFT JOIN flaechen AS fl
-                ON lf.flnam = fl.flnam
-                LEFT JOIN tezg AS tg
-                ON lf.tezgnam = tg.flnam
-                WHERE fl.aufteilen = "ja" and fl.aufteilen IS NOT NULL
-                GROUP BY fl.flnam, tg.flnam
-                UNION
-                SELECT 
-                    lf.pk AS "pk",
-                    lf.flnam AS "linkfl_nam", 
-                    lf.haltnam AS "linkfl_haltnam", 
-                    fl.flnam AS "flaech_nam",
-                    NULL AS "tezg_nam",
-                    min(lf.pk) AS pkmin, 
-                    max(lf.pk) AS pkmax,
-                    count(*) AS anzahl
-                FROM linkfl AS lf
-                LEFT JOIN flaechen AS fl
-                ON lf.flnam = fl.flnam
-                WHERE fl.aufteilen <> "ja" OR fl.aufteilen IS NULL
-                GROUP BY fl.flnam)
-            SELECT pk, anzahl, CASE WHEN anzahl > 1 THEN 'mehrfach vorhanden' WHEN flaech_nam IS NULL THEN 'Keine Fläche' WHEN linkfl_haltnam IS NULL THEN  'Keine Haltung' ELSE 'o.k.' END AS fehler
-            FROM lfok'''
+    # sowie Feststellen der Flächen ohne Anbindung
 
     try:
-        cursl.execute(sql)
+        for sql in sqlpruefungen():
+            cursl.execute(sql)
     except BaseException as err:
-        fehlermeldung(u'qkan_database.version: Fehler {}'.format(err), 
-                      u'Fehler beim Erzeugen der Plausibilitätskontrolle "v_linkfl_check".')
+        fehlermeldung(u'qkan_database.createdbtables: {}'.format(err), 
+                      u'Fehler beim Erzeugen der Plausibilitätskontrollen "v_linkfl_check" und "v_flaechen_ohne_linkfl".')
         consl.close()
         return False
 
-    # Feststellen der Flächen ohne Anbindung
+    # Trigger für die Geometriekennwerte ----------------------------------------------
 
-    sql = u'''CREATE VIEW IF NOT EXISTS "v_flaechen_ohne_linkfl" AS 
-            SELECT 
-                fl.pk, 
-                fl.flnam AS "flaech_nam",
-                fl.aufteilen AS "flaech_aufteilen", 
-                'Verbindung fehlt' AS "Fehler"
-            FROM flaechen AS fl
-            LEFT JOIN linkfl AS lf
-            ON lf.flnam = fl.flnam
-            LEFT JOIN tezg AS tg
-            ON tg.flnam = lf.tezgnam
-            WHERE ( (fl.aufteilen <> "ja" or fl.aufteilen IS NULL) AND
-                     lf.pk IS NULL) OR
-                  (  fl.aufteilen = "ja" AND fl.aufteilen IS NOT NULL AND 
-                     lf.pk IS NULL)
-            UNION
-            VALUES
-                (0, '', '', 'o.k.') '''
-
-    try:
-        cursl.execute(sql)
-    except BaseException as err:
-        fehlermeldung(u'qkan_database.version: Fehler {}'.format(err), 
-                      u'Fehler beim Erzeugen der Plausibilitätskontrolle "v_flaechen_ohne_linkfl".')
-        consl.close()
-        return False
+    for tabelle in geomkennwerte:
+        try:
+            for sql in sqlgeomkennwerte(tabelle):
+                cursl.execute(sql)
+        except BaseException as err:
+            fehlermeldung(u'qkan_database.createdbtables: {}'.format(err), 
+                          u'Trigger für die Geometriekennwerte der Tabelle "{}" konnten nicht erstellt werden.'.format(tabelle))
+            consl.close()
+            return False
+    consl.commit()
 
     # Abschluss --------------------------------------------------------------------
 
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import multiprocessing
+import os
 import re
+import sys
 
+from PyQt4 import QtCore
 from qgis.core import QgsMessageLog, QgsProject
 from qgis.gui import QgsMessageBar
 from qgis.utils import iface
@@ -43,6 +47,67 @@ def fehlermeldung(title, text=u''):
 
 # Allgemeine Funktionen
 
+def parallel_ausfuehren(funktion, auftraege, prozesse):
+    '''Bearbeitet Aufträge in einem Pool von Prozessen. Der Pool wird nur verwendet, wenn ausdrücklich
+    mehr als ein Prozess eingestellt ist (Konfigurationsparameter "anzahl_prozesse", Voreinstellung 1).
+
+    Die Prozesse werden unter Linux mit fork aus dem QGIS-Prozess erzeugt. funktion darf deshalb weder
+    Qt noch die Datenbankverbindung des Hauptprozesses verwenden, sondern öffnet eine eigene Verbindung.
+    Unter Windows werden die Prozesse mit python.exe aus dem Verzeichnis von QGIS gestartet und
+    importieren das Modul von funktion neu. Dies setzt voraus, dass QGIS mit den Umgebungsvariablen
+    von OSGeo4W (PATH, PYTHONHOME, PYTHONPATH) gestartet wurde, so dass python.exe die Module qgis
+    und PyQt4 findet.
+
+    Während der Bearbeitung werden die Ereignisse der QGIS-Oberfläche ohne Benutzereingaben weiter
+    verarbeitet, damit die Oberfläche nicht blockiert.
+
+    :funktion:      Funktion auf Modulebene, die einen Auftrag bearbeitet
+    :type funktion: function
+
+    :auftraege:     Aufträge, die einzeln an funktion übergeben werden
+    :type auftraege: list
+
+    :prozesse:      Anzahl der Prozesse
+    :type prozesse: integer
+
+    :returns:       Ergebnisse in der Reihenfolge der Aufträge. None, wenn der Pool nicht verwendet 
+                    wird oder nicht verwendet werden kann. Die Aufträge sind dann vom Aufrufer in 
+                    diesem Prozess zu bearbeiten.
+    :rtype:         list
+    '''
+
+    if int(prozesse) <= 1 or len(auftraege) <= 1:
+        return None
+
+    # QGIS unter Windows: Die Prozesse müssen mit dem Python-Interpreter und nicht mit
+    # qgis.exe gestartet werden.
+    if sys.platform == 'win32':
+        python = os.path.join(sys.exec_prefix, u'python.exe')
+        if not os.path.exists(python):
+            warnung(u'Parallele Bearbeitung nicht möglich', 
+                    u'{} nicht gefunden. Die Bearbeitung erfolgt in einem Prozess.'.format(python))
+            return None
+        multiprocessing.set_executable(python)
+
+    try:
+        pool = multiprocessing.Pool(min(int(prozesse), len(auftraege)))
+        try:
+            laeufer = pool.map_async(funktion, auftraege)
+            while not laeufer.ready():
+                QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
+                laeufer.wait(0.1)
+            ergebnisse = laeufer.get()
+        finally:
+            pool.close()
+            pool.join()
+    except BaseException as err:
+        warnung(u'Parallele Bearbeitung nicht möglich', 
+                u'Die Bearbeitung erfolgt in einem Prozess:\n{}'.format(repr(err)))
+        return None
+
+    return ergebnisse
+
+
 def listQkanLayers():
     '''Dictionary mit den Namen aller QKan-Layer und einer Liste mit: 
             Tabellenname, Geometriespalte, SQL-Where-Bedingung, Gruppenname
@@ -192,6 +257,92 @@ def get_editable_layers():
     return elayers
 
 
+def pruefstand_einrichten(dbQK, tab, attr):
+    """Richtet für die Tabelle {tab} und das Attribut {attr} einen Prüfstand ein. 
+
+    Der Prüfstand wird in der Tabelle "pruefstand" (ab Version 2.5.13 der QKan-Datenbank) 
+    verwaltet und vermerkt, dass eine Prüfung (checknames, checkgeom) ohne Befund durchgeführt 
+    wurde. Trigger setzen den Vermerk zurück, sobald in der Tabelle Datensätze hinzugefügt oder 
+    im Attribut {attr} geändert werden. Dies gilt auch für Änderungen, die in QGIS vorgenommen 
+    werden. 
+
+    :dbQK:              Datenbankobjekt, das die Verknüpfung zur QKan-Datenbank verwaltet.
+    :type dbQK:         DBConnection (geerbt von dbapi...)
+    
+    :tab:               Name der Tabelle
+    :type tab:          String
+    
+    :attr:              Name des geprüften Attributs
+    :type attr:         String
+
+    :returns:           Erfolg
+    :type returns:      Boolean
+    """
+
+    sql = u"""INSERT INTO pruefstand (tabelle, attribut, geprueft)
+            SELECT '{tab}', '{attr}', 0
+            WHERE NOT EXISTS (SELECT pk FROM pruefstand WHERE tabelle = '{tab}' AND attribut = '{attr}')""".format(
+                tab=tab, attr=attr)
+    if not dbQK.sql(sql, u"QKan.qgis_utils.pruefstand_einrichten (1)"):
+        return False
+
+    # Falls die Trigger fehlen (neuer Prüfstand oder Tabelle wurde z.B. bei einem Update der 
+    # Datenbank neu angelegt), ist der Prüfstand nicht verlässlich und wird zurückgesetzt. 
+    sql = u"""SELECT count(*) AS anzahl FROM sqlite_master
+            WHERE type = 'trigger' AND name IN ('pruefstand_{tab}_{attr}_ins', 'pruefstand_{tab}_{attr}_upd')""".format(
+                tab=tab, attr=attr)
+    if not dbQK.sql(sql, u"QKan.qgis_utils.pruefstand_einrichten (2)"):
+        return False
+    daten = dbQK.fetchone()
+    if daten[0] == 2:
+        return True
+
+    ruecksetzen = u"""UPDATE pruefstand SET geprueft = 0 
+                WHERE tabelle = '{tab}' AND attribut = '{attr}' AND geprueft <> 0""".format(tab=tab, attr=attr)
+
+    sql = u"""CREATE TRIGGER IF NOT EXISTS pruefstand_{tab}_{attr}_ins AFTER INSERT ON {tab}
+            BEGIN
+                {ruecksetzen};
+            END""".format(tab=tab, attr=attr, ruecksetzen=ruecksetzen)
+    if not dbQK.sql(sql, u"QKan.qgis_utils.pruefstand_einrichten (3)"):
+        return False
+
+    sql = u"""CREATE TRIGGER IF NOT EXISTS pruefstand_{tab}_{attr}_upd AFTER UPDATE OF {attr} ON {tab}
+            BEGIN
+                {ruecksetzen};
+            END""".format(tab=tab, attr=attr, ruecksetzen=ruecksetzen)
+    if not dbQK.sql(sql, u"QKan.qgis_utils.pruefstand_einrichten (4)"):
+        return False
+
+    sql = u"""UPDATE pruefstand SET geprueft = 0 
+            WHERE tabelle = '{tab}' AND attribut = '{attr}'""".format(tab=tab, attr=attr)
+    if not dbQK.sql(sql, u"QKan.qgis_utils.pruefstand_einrichten (5)"):
+        return False
+
+    return True
+
+
+def pruefstand_geprueft(dbQK, tab, attr):
+    """Gibt wahr zurück, wenn die Tabelle {tab} seit der letzten Prüfung ohne Befund im 
+    Attribut {attr} nicht geändert wurde. Setzt pruefstand_einrichten voraus. """
+
+    sql = u"""SELECT geprueft FROM pruefstand
+            WHERE tabelle = '{tab}' AND attribut = '{attr}'""".format(tab=tab, attr=attr)
+    if not dbQK.sql(sql, u"QKan.qgis_utils.pruefstand_geprueft"):
+        return False
+
+    daten = dbQK.fetchone()
+    return daten is not None and daten[0] == 1
+
+
+def pruefstand_setzen(dbQK, tab, attr):
+    """Vermerkt für die Tabelle {tab} und das Attribut {attr} eine Prüfung ohne Befund"""
+
+    sql = u"""UPDATE pruefstand SET geprueft = 1
+            WHERE tabelle = '{tab}' AND attribut = '{attr}'""".format(tab=tab, attr=attr)
+    return dbQK.sql(sql, u"QKan.qgis_utils.pruefstand_setzen")
+
+
 def checknames(dbQK, tab, attr, prefix, autokorrektur, dbtyp = u'spatialite'):
     """Prüft, ob in der Tabelle {tab} im Attribut {attr} eindeutige Namen enthalten sind. 
     Falls nicht, werden Namen vergeben, die sich aus {prefix} und ROWID zusammensetzen
@@ -219,8 +370,19 @@ def checknames(dbQK, tab, attr, prefix, autokorrektur, dbtyp = u'spatialite'):
     
     :returns:           Ergebnis der Prüfung bzw. Korrektur
     :type returns:      Boolean
+
+    Die Prüfung entfällt, wenn die Tabelle seit der letzten Prüfung ohne Befund nicht 
+    geändert wurde (s. pruefstand_einrichten). 
     """
 
+    if not pruefstand_einrichten(dbQK, tab, attr):
+        return False
+
+    if pruefstand_geprueft(dbQK, tab, attr):
+        return True
+
+    korrigiert = False                  # Bei Korrekturen wird der Prüfstand nicht gesetzt
+
     # ----------------------------------------------------------------------------------------------------------------
     # Prüfung, ob Objektnamen leer oder NULL sind:
 
@@ -244,19 +406,25 @@ def checknames(dbQK, tab, attr, prefix, autokorrektur, dbtyp = u'spatialite'):
 
             if not dbQK.sql(sql, u"QKan.qgis_utils.checknames (2)"):
                 return False
+            korrigiert = True
         else:
             fehlermeldung(u'Datenfehler', 
                 u'In der Tabelle "{tab}" gibt es leere Namen im Feld "{attr}". Abbruch!'.format(tab=tab, attr=attr))
             return False
 
     # ----------------------------------------------------------------------------------------------------------------
-    # Prüfung, ob Objektnamen mehrfach vergeben sind. 
+    # Prüfung, ob Objektnamen mehrfach vergeben sind. Der Index auf {attr} erspart dabei
+    # die Sortierung der gesamten Tabelle. 
+
+    sql = u"""CREATE INDEX IF NOT EXISTS {tab}_{attr}_idx ON {tab} ({attr})""".format(tab=tab, attr=attr)
+    if not dbQK.sql(sql, u"QKan.qgis_utils.checknames (3)"):
+        return False
 
     sql = u"""SELECT {attr}, count(*) AS anzahl
             FROM {tab}
             GROUP BY {attr}
             HAVING anzahl > 1 OR {attr} IS NULL""".format(tab=tab, attr=attr)
-    if not dbQK.sql(sql, u"QKan.qgis_utils.checknames (3)"):
+    if not dbQK.sql(sql, u"QKan.qgis_utils.checknames (4)"):
         return False
 
     daten = dbQK.fetchall()
@@ -275,13 +443,19 @@ def checknames(dbQK, tab, attr, prefix, autokorrektur, dbtyp = u'spatialite'):
                 SET {attr} = printf('{prefix}%d', ROWID)
                 WHERE {attr} IN (SELECT {attr} FROM doppelte)""".format(tab=tab, attr=attr, prefix=prefix)
 
-            if not dbQK.sql(sql, u"QKan.qgis_utils.checknames (4)"):
+            if not dbQK.sql(sql, u"QKan.qgis_utils.checknames (5)"):
                 return False
+            korrigiert = True
         else:
             fehlermeldung(u'Datenfehler', 
                 u'In der Tabelle "{tab}" gibt es doppelte Namen im Feld "{attr}". Abbruch!'.format(tab=tab, attr=attr))
             return False
 
+    # Nach automatischen Korrekturen wird beim nächsten Aufruf erneut geprüft
+    if not korrigiert:
+        if not pruefstand_setzen(dbQK, tab, attr):
+            return False
+
     return True
 
 
@@ -307,8 +481,18 @@ def checkgeom(dbQK, tab, attrgeo, autokorrektur, liste_teilgebiete = [], dbtyp =
     
     :returns:           Ergebnis der Prüfung bzw. Korrektur
     :type returns:      Boolean
+
+    Die Prüfung entfällt, wenn die Tabelle seit der letzten Prüfung ohne Befund nicht 
+    geändert wurde (s. pruefstand_einrichten). Der Prüfstand wird nur bei einer Prüfung 
+    ohne Einschränkung auf Teilgebiete gesetzt. 
     """
 
+    if not pruefstand_einrichten(dbQK, tab, attrgeo):
+        return False
+
+    if pruefstand_geprueft(dbQK, tab, attrgeo):
+        return True
+
     # ----------------------------------------------------------------------------------------------------------------
     # Prüfung, ob das Geoobjekt in Spalte attrgeo existiert
 
@@ -343,6 +527,10 @@ def checkgeom(dbQK, tab, attrgeo, autokorrektur, liste_teilgebiete = [], dbtyp =
                 u'In der Tabelle "{tab}" gibt es leere Geoobjekte. Abbruch!'.format(tab=tab, attrgeo=attrgeo))
             return False
 
+    if auswahl == '':
+        if not pruefstand_setzen(dbQK, tab, attrgeo):
+            return False
+
     return True
 
 
@@ -392,100 +580,204 @@ def sqlconditions(keyword, attrlis, valuelis2):
     return auswahl
 
 
-def evalNodeTypes(dbQK):
-    """Schachttypen auswerten. Dies geschieht ausschließlich mit SQL-Abfragen"""
-
-    # -- Anfangsschächte: Schächte ohne Haltung oben
-    sql_typAnf = u'''
-        UPDATE schaechte SET knotentyp = 'Anfangsschacht' WHERE schaechte.schnam IN
-        (SELECT t_sch.schnam
-        FROM schaechte AS t_sch 
-        LEFT JOIN haltungen AS t_hob
-        ON t_sch.schnam = t_hob.schoben
-        LEFT JOIN haltungen AS t_hun
-        ON t_sch.schnam = t_hun.schunten
-        WHERE t_hun.pk IS NULL)'''
-
-    # -- Endschächte: Schächte ohne Haltung unten
-    sql_typEnd = u'''
-        UPDATE schaechte SET knotentyp = 'Endschacht' WHERE schaechte.schnam IN
-        (SELECT t_sch.schnam
-        FROM schaechte AS t_sch 
-        LEFT JOIN haltungen AS t_hob
-        ON t_sch.schnam = t_hob.schunten
-        LEFT JOIN haltungen AS t_hun
-        ON t_sch.schnam = t_hun.schoben
-        WHERE t_hun.pk IS NULL)'''
-
-    # -- Hochpunkt: 
-    sql_typHoch = u'''
-        UPDATE schaechte SET knotentyp = 'Hochpunkt' WHERE schaechte.schnam IN
-        ( SELECT t_sch.schnam
-          FROM schaechte AS t_sch 
-          JOIN haltungen AS t_hob
-          ON t_sch.schnam = t_hob.schunten
-          JOIN haltungen AS t_hun
-          ON t_sch.schnam = t_hun.schoben
-          JOIN schaechte AS t_sun
-          ON t_sun.schnam = t_hun.schunten
-          JOIN schaechte AS t_sob
-          ON t_sob.schnam = t_hob.schunten
-          WHERE ifnull(t_hob.sohleunten,t_sch.sohlhoehe)>ifnull(t_hob.sohleoben,t_sob.sohlhoehe) AND 
-                ifnull(t_hun.sohleoben,t_sch.sohlhoehe)>ifnull(t_hun.sohleunten,t_sun.sohlhoehe))'''
-
-    # -- Tiefpunkt:
-    sql_typTief = u'''
-        UPDATE schaechte SET knotentyp = 'Tiefpunkt' WHERE schaechte.schnam IN
-        ( SELECT t_sch.schnam
-          FROM schaechte AS t_sch 
-          JOIN haltungen AS t_hob
-          ON t_sch.schnam = t_hob.schunten
-          JOIN haltungen AS t_hun
-          ON t_sch.schnam = t_hun.schoben
-          JOIN schaechte AS t_sun
-          ON t_sun.schnam = t_hun.schunten
-          JOIN schaechte AS t_sob
-          ON t_sob.schnam = t_hob.schunten
-          WHERE ifnull(t_hob.sohleunten,t_sch.sohlhoehe)<ifnull(t_hob.sohleoben,t_sob.sohlhoehe) AND 
-                ifnull(t_hun.sohleoben,t_sch.sohlhoehe)<ifnull(t_hun.sohleunten,t_sun.sohlhoehe))'''
-
-    # -- Verzweigung:
-    sql_typZweig = u'''
-        UPDATE schaechte SET knotentyp = 'Verzweigung' WHERE schaechte.schnam IN
-        ( SELECT t_sch.schnam
-          FROM schaechte AS t_sch 
-          JOIN haltungen AS t_hun
-          ON t_sch.schnam = t_hun.schoben
-          GROUP BY t_sch.pk
-          HAVING count(*) > 1)'''
-
-    # -- Einzelschacht:
-    sql_typEinzel = u'''
-        UPDATE schaechte SET knotentyp = 'Einzelschacht' WHERE schaechte.schnam IN
-        ( SELECT t_sch.schnam 
-          FROM schaechte AS t_sch 
-          LEFT JOIN haltungen AS t_hun
-          ON t_sch.schnam = t_hun.schoben
-          LEFT JOIN haltungen AS t_hob
-          ON t_sch.schnam = t_hob.schunten
-          WHERE t_hun.pk IS NULL AND t_hob.pk IS NULL)'''
-
-    if not dbQK.sql(sql_typAnf, u'importkanaldaten_he (39)'):
-        return None
+class Auswahlhistogramm(object):
+    """Anzahl der Objekte einer Tabelle, gruppiert nach Auswahlattributen.
 
-    if not dbQK.sql(sql_typEnd, u'importkanaldaten_he (40)'):
-        return None
+    Dient dazu, in Formularen bei jedem Klick in eine Auswahlliste die Anzahl der
+    betroffenen Objekte anzuzeigen, ohne jedesmal die Tabelle zu durchsuchen. Die
+    Häufigkeiten werden einmal mit GROUP BY gelesen und erst dann neu gelesen, wenn
+    sich der Änderungszähler der Datenbank (PRAGMA data_version) geändert hat.
+    """
 
-    if not dbQK.sql(sql_typHoch, u'importkanaldaten_he (41)'):
-        return None
+    def __init__(self, dbQK, tabelle, attrlis):
+        """Constructor
+
+        :dbQK:          Datenbankobjekt, das die Verknüpfung zur QKan-Datenbank verwaltet.
+        :type dbQK:     DBConnection (geerbt von dbapi...)
+
+        :tabelle:       Name der Tabelle
+        :type tabelle:  string
+
+        :attrlis:       Liste von Attributen oder SQL-Ausdrücken, nach denen gruppiert wird.
+                        Reihenfolge entspricht den Wertelisten in anzahl()
+        :type attrlis:  list of strings
+        """
+
+        self.dbQK = dbQK
+        self.tabelle = tabelle
+        self.attrlis = attrlis
+        self.dataversion = None
+        self.histogramm = None              # Liste aus (Werte-Tupel, Anzahl)
+
+    def lesen(self):
+        """Liest die Häufigkeiten aus der Datenbank, falls sich diese seit dem letzten
+        Lesen geändert hat.
+
+        :returns:       Erfolg
+        :rtype:         Boolean
+        """
+
+        dataversion = self.dbQK.dataversion()
+        if self.histogramm is not None and dataversion is not None and dataversion == self.dataversion:
+            return True
 
-    if not dbQK.sql(sql_typTief, u'importkanaldaten_he (42)'):
+        attribute = u', '.join(self.attrlis)
+        sql = u"""SELECT {attribute}, count(*) AS anzahl
+                FROM {tabelle}
+                GROUP BY {attribute}""".format(attribute=attribute, tabelle=self.tabelle)
+        if not self.dbQK.sql(sql, u'qkan_utils.Auswahlhistogramm.lesen ({})'.format(self.tabelle)):
+            self.histogramm = None
+            return False
+
+        anz = len(self.attrlis)
+        self.histogramm = [(tuple(el[:anz]), el[anz]) for el in self.dbQK.fetchall()]
+        self.dataversion = dataversion
+        return True
+
+    def anzahl(self, valuelis2):
+        """Anzahl der Objekte für eine Auswahl. Die Bedeutung entspricht sqlconditions:
+        Leere Wertelisten schränken die Auswahl nicht ein.
+
+        :valuelis2:     Liste aus Listen mit Werten. Anzahl muss mit attrlis korrespondieren
+        :type valuelis2:list of lists
+
+        :returns:       Anzahl der Objekte oder None bei Fehler
+        :rtype:         integer
+        """
+
+        if not self.lesen():
+            return None
+
+        bedingungen = [(i, set(valuelis)) for i, valuelis in enumerate(valuelis2) if len(valuelis) > 0]
+        anzahl = 0
+        for werte, anz in self.histogramm:
+            for i, valueset in bedingungen:
+                if werte[i] not in valueset:
+                    break
+            else:
+                anzahl += anz
+        return anzahl
+
+
+def evalNodeTypes(dbQK, liste_haltungen=None, liste_schaechte=None):
+    """Schachttypen auswerten. Dies geschieht ausschließlich mit SQL-Abfragen
+
+    :dbQK:              Datenbankobjekt, das die Verknüpfung zur QKan-Datenbank verwaltet.
+    :type dbQK:         DBConnection (geerbt von dbapi...)
+
+    :liste_haltungen:   Inkrementeller Modus: Nur die Schächte an diesen (bearbeiteten) Haltungen 
+                        werden neu klassifiziert. None: alle Schächte
+    :type liste_haltungen: list of strings
+
+    :liste_schaechte:   Inkrementeller Modus: Zusätzlich neu zu klassifizierende Schächte, z.B. die 
+                        früheren Anschlussschächte gelöschter oder umgehängter Haltungen
+    :type liste_schaechte: list of strings
+
+    Für jeden Schacht werden in einem Durchlauf über die Haltungen die Anzahl der zu- und 
+    abführenden Haltungen sowie deren Gefällerichtung ermittelt. Daraus wird der Knotentyp 
+    abgeleitet und in einem Schritt in die Tabelle "schaechte" geschrieben. Bei mehreren 
+    zutreffenden Typen gilt die Rangfolge: Einzelschacht, Verzweigung, Tiefpunkt, Hochpunkt, 
+    Endschacht, Anfangsschacht. Bei Schächten, auf die keiner dieser Typen zutrifft (z.B. ein früherer 
+    Endschacht, der nach einer Änderung innerhalb eines Strangs liegt), wird der Knotentyp gelöscht, 
+    damit inkrementeller und vollständiger Lauf dasselbe Ergebnis liefern. 
+    """
+
+    inkrementell = liste_haltungen is not None or liste_schaechte is not None
+
+    # Im inkrementellen Modus werden die betroffenen Schächte zuerst in einer temporären 
+    # Tabelle gesammelt
+    if inkrementell:
+        sql = u"""CREATE TEMP TABLE IF NOT EXISTS knotenauswahl (schnam TEXT PRIMARY KEY)"""
+        if not dbQK.sql(sql, u'qkan_utils.evalNodeTypes (1)'):
+            return None
+        if not dbQK.sql(u'DELETE FROM temp.knotenauswahl', u'qkan_utils.evalNodeTypes (2)'):
+            return None
+
+        if liste_haltungen:
+            sql = u"""INSERT OR IGNORE INTO temp.knotenauswahl (schnam)
+                SELECT schoben FROM haltungen WHERE haltnam IN ('{haltungen}')
+                UNION
+                SELECT schunten FROM haltungen WHERE haltnam IN ('{haltungen}')""".format(
+                    haltungen=u"', '".join(liste_haltungen))
+            if not dbQK.sql(sql, u'qkan_utils.evalNodeTypes (3)'):
+                return None
+
+        if liste_schaechte:
+            sql = u"""INSERT OR IGNORE INTO temp.knotenauswahl (schnam)
+                SELECT schnam FROM schaechte WHERE schnam IN ('{schaechte}')""".format(
+                    schaechte=u"', '".join(liste_schaechte))
+            if not dbQK.sql(sql, u'qkan_utils.evalNodeTypes (4)'):
+                return None
+
+        auswahl_hal = u"""
+          WHERE h.schoben IN (SELECT schnam FROM temp.knotenauswahl)
+             OR h.schunten IN (SELECT schnam FROM temp.knotenauswahl)"""
+        auswahl_sch = u"""
+        WHERE sch.schnam IN (SELECT schnam FROM temp.knotenauswahl)"""
+    else:
+        auswahl_hal = u''
+        auswahl_sch = u''
+
+    # Zwischenergebnis: Knotentyp je Schacht
+    sql = u"""CREATE TEMP TABLE IF NOT EXISTS knotenklassen (schnam TEXT PRIMARY KEY, knotentyp TEXT)"""
+    if not dbQK.sql(sql, u'qkan_utils.evalNodeTypes (5)'):
+        return None
+    if not dbQK.sql(u'DELETE FROM temp.knotenklassen', u'qkan_utils.evalNodeTypes (6)'):
         return None
 
-    if not dbQK.sql(sql_typZweig, u'importkanaldaten_he (43)'):
+    # dz: Höhendifferenz Sohle oben - Sohle unten. Fehlende Sohlhöhen der Haltung werden 
+    # durch die Sohlhöhe des jeweiligen Schachtes ersetzt. 
+    # Zufluss (Schacht = schunten): Hochpunkt bei steigender, Tiefpunkt bei fallender Haltung
+    # Abfluss (Schacht = schoben):  Hochpunkt bei fallender, Tiefpunkt bei steigender Haltung
+    sql = u"""
+        WITH gefaelle AS (
+          SELECT h.schoben, h.schunten, 
+                 ifnull(h.sohleoben, sob.sohlhoehe) - ifnull(h.sohleunten, sun.sohlhoehe) AS dz
+          FROM haltungen AS h
+          LEFT JOIN schaechte AS sob
+          ON sob.schnam = h.schoben
+          LEFT JOIN schaechte AS sun
+          ON sun.schnam = h.schunten{auswahl_hal}),
+        enden AS (
+          SELECT schunten AS schnam, 1 AS zu, 0 AS ab, 
+                 dz < 0 AS hochzu, 0 AS hochab, dz > 0 AS tiefzu, 0 AS tiefab
+          FROM gefaelle
+          UNION ALL
+          SELECT schoben AS schnam, 0 AS zu, 1 AS ab, 
+                 0 AS hochzu, dz > 0 AS hochab, 0 AS tiefzu, dz < 0 AS tiefab
+          FROM gefaelle),
+        knoten AS (
+          SELECT schnam, sum(zu) AS anzzu, sum(ab) AS anzab, 
+                 max(hochzu) AS hochzu, max(hochab) AS hochab, 
+                 max(tiefzu) AS tiefzu, max(tiefab) AS tiefab
+          FROM enden
+          GROUP BY schnam),
+        klassen AS (
+          SELECT sch.schnam, 
+            CASE WHEN kn.schnam IS NULL THEN 'Einzelschacht'
+                 WHEN kn.anzab > 1 THEN 'Verzweigung'
+                 WHEN kn.tiefzu AND kn.tiefab THEN 'Tiefpunkt'
+                 WHEN kn.hochzu AND kn.hochab THEN 'Hochpunkt'
+                 WHEN kn.anzab = 0 THEN 'Endschacht'
+                 WHEN kn.anzzu = 0 THEN 'Anfangsschacht'
+                 ELSE NULL END AS knotentyp
+          FROM schaechte AS sch
+          LEFT JOIN knoten AS kn
+          ON kn.schnam = sch.schnam{auswahl_sch})
+        INSERT OR REPLACE INTO temp.knotenklassen (schnam, knotentyp)
+        SELECT schnam, knotentyp FROM klassen""".format(auswahl_hal=auswahl_hal, auswahl_sch=auswahl_sch)
+
+    if not dbQK.sql(sql, u'qkan_utils.evalNodeTypes (7)'):
         return None
 
-    if not dbQK.sql(sql_typEinzel, u'importkanaldaten_he (44)'):
+    sql = u"""
+        UPDATE schaechte SET knotentyp = 
+          (SELECT knotentyp FROM temp.knotenklassen AS kk WHERE kk.schnam = schaechte.schnam)
+        WHERE schnam IN (SELECT schnam FROM temp.knotenklassen)"""
+
+    if not dbQK.sql(sql, u'qkan_utils.evalNodeTypes (8)'):
         return None
 
     dbQK.commit()
+
+    return True
@@ -432,6 +432,24 @@ class ExportToKP:
         else:
             max_loops = 1000
 
+        # Export-Cache für die Typ12-Datensätze
+        if 'dynacache' in self.config:
+            dynacache = self.config['dynacache']
+        else:
+            dynacache = False
+
+        # Export je Teilgebiet in eigene DYNA-Dateien, gegebenenfalls in mehreren Prozessen
+        if 'dyna_je_teilgebiet' in self.config:
+            dyna_je_teilgebiet = self.config['dyna_je_teilgebiet']
+        else:
+            dyna_je_teilgebiet = False
+
+        # Nur über die Konfigurationsdatei einstellbar (s. qkan_utils.parallel_ausfuehren)
+        if 'anzahl_prozesse' in self.config:
+            anzahl_prozesse = self.config['anzahl_prozesse']
+        else:
+            anzahl_prozesse = u'1'
+
         # Optionen zur Berechnung der befestigten Flächen
         if 'dynabef_choice' in self.config:
             dynabef_choice = self.config['dynabef_choice']
@@ -502,6 +520,9 @@ class ExportToKP:
             self.config['max_loops'] = max_loops
             self.config['dynabef_choice'] = dynabef_choice
             self.config['dynaprof_choice'] = dynaprof_choice
+            self.config['dynacache'] = dynacache
+            self.config['dyna_je_teilgebiet'] = dyna_je_teilgebiet
+            self.config['anzahl_prozesse'] = anzahl_prozesse
 
             with open(self.configfil, 'w') as fileconfig:
                 # logger.debug(u"Config-Dictionary: {}".format(self.config))
@@ -509,4 +530,5 @@ class ExportToKP:
 
             exportKanaldaten(iface, dynafile, template_dyna, self.dbQK, dynabef_choice, dynaprof_choice, 
                              liste_teilgebiete, profile_ergaenzen, autonummerierung_dyna, mit_verschneidung, 
-                             fangradius, mindestflaeche, max_loops, datenbanktyp)
+                             fangradius, mindestflaeche, max_loops, datenbanktyp, dynacache,
+                             dyna_je_teilgebiet, anzahl_prozesse)
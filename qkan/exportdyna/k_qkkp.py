@@ -19,12 +19,19 @@
 
 """
 
+import hashlib
 import logging
 import math
 import os
+import re
 import shutil
 import time
 
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
 from qgis.PyQt.QtGui import QProgressBar
 
 from qgis.core import QgsMessageLog
@@ -32,7 +39,7 @@ from qgis.gui import QgsMessageBar
 from qgis.utils import iface
 
 from qkan.database.dbfunc import DBConnection
-from qkan.database.qkan_utils import fortschritt, fehlermeldung, meldung, checknames
+from qkan.database.qkan_utils import fortschritt, fehlermeldung, meldung, checknames, parallel_ausfuehren
 from qkan.linkflaechen.updatelinks import updatelinkfl, updatelinksw
 
 
@@ -122,10 +129,149 @@ def fneigkl(neigung):
         return 0.
 
 
+# Export-Cache für die DYNA-Typ12-Datensätze ----------------------------------------------
+# In der Tabelle "dynacache" werden die fertig formatierten Typ12-Zeilen je Haltung zusammen mit einem
+# Fingerabdruck ihrer Eingangsdaten gespeichert. Bei einem erneuten Export werden nur die Haltungen neu
+# berechnet, deren Fingerabdruck sich geändert hat.
+
+def _fingerabdruecke12(dbQK, kopf, sql_prof1, sql_prof2, ausw_hal):
+    '''Fingerabdrücke der Eingangsdaten der DYNA-Typ12-Datensätze je Haltung
+
+    Berücksichtigt werden die Haltungsattribute mit Schächten, DYNA-Nummerierung, Profilschlüssel und
+    Einleitungen sowie alle über linkfl verknüpften Flächen mit Geometrie, Haltungsfläche und Abflussparametern.
+
+    :dbQK:                  Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:             DBConnection
+
+    :kopf:                  Exportoptionen und Schlüssellisten, die in alle Fingerabdrücke eingehen
+    :type kopf:             String
+
+    :sql_prof1:             SQL-Textbaustein für den Profilschlüssel (s. write12)
+    :type sql_prof1:        String
+
+    :sql_prof2:             SQL-Textbaustein für die Verknüpfung mit der Tabelle "profile" (s. write12)
+    :type sql_prof2:        String
+
+    :ausw_hal:              SQL-Textbaustein zur Auswahl der Haltungen nach Teilgebieten (s. write12)
+    :type ausw_hal:         String
+
+    :returns:               Liste aus (pk, Fingerabdruck) in der Reihenfolge der Typ12-Datensätze,
+                            None bei einem Fehler
+    :rtype:                 List
+    '''
+
+    sql = u"""
+        SELECT
+            h.pk, h.haltnam, h.laenge, h.sohleoben, h.sohleunten, h.hoehe, h.ks, h.entwart,
+            h.schoben, h.schunten, hex(h.geom), d.kanalnummer, d.haltungsnummer,
+            so.deckelhoehe, so.sohlhoehe, so.xsch, so.ysch, su.sohlhoehe, a.kp_nr, {sql_prof1},
+            (SELECT sum(e.zufluss) FROM einleit AS e WHERE e.haltnam = h.haltnam) AS qzu
+        FROM haltungen AS h
+        INNER JOIN dynahal AS d
+        ON h.pk = d.pk
+        INNER JOIN schaechte AS so
+        ON h.schoben = so.schnam
+        INNER JOIN schaechte AS su
+        ON h.schunten = su.schnam{sql_prof2}
+        LEFT JOIN entwaesserungsarten AS a
+        ON h.entwart = a.bezeichnung{ausw_hal}
+        ORDER BY h.pk""".format(sql_prof1=sql_prof1, sql_prof2=sql_prof2, ausw_hal=ausw_hal)
+
+    zeilen = dbQK.abfrage(sql, u'dbQK: k_qkkp.fingerabdruecke12 (1)')
+    if zeilen is None:
+        return None
+
+    reihenfolge = []
+    abdruecke = {}
+    pks = {}                    # Haltungsname -> Liste der pk
+    for attr in zeilen:
+        pk, haltnam = attr[:2]
+        if pk not in abdruecke:
+            reihenfolge.append(pk)
+            abdruecke[pk] = hashlib.md5(kopf.encode('utf-8'))
+            pks.setdefault(haltnam, []).append(pk)
+        abdruecke[pk].update(repr(attr).encode('utf-8'))
+
+    sql = u"""
+        SELECT
+            lf.haltnam, lf.flnam, lf.tezgnam, fl.neigkl, fl.abflussparameter, fl.aufteilen,
+            fl.geomflaeche, hex(fl.geom), tg.geomflaeche, hex(tg.geom),
+            ap.endabflussbeiwert, ap.bodenklasse
+        FROM linkfl AS lf
+        INNER JOIN flaechen AS fl
+        ON lf.flnam = fl.flnam
+        LEFT JOIN tezg AS tg
+        ON lf.tezgnam = tg.flnam
+        LEFT JOIN abflussparameter AS ap
+        ON fl.abflussparameter = ap.apnam
+        WHERE lf.haltnam IS NOT NULL
+        ORDER BY lf.haltnam, lf.flnam, lf.tezgnam"""
+
+    zeilen = dbQK.abfrage(sql, u'dbQK: k_qkkp.fingerabdruecke12 (2)')
+    if zeilen is None:
+        return None
+
+    for attr in zeilen:
+        for pk in pks.get(attr[0], []):
+            abdruecke[pk].update(repr(attr).encode('utf-8'))
+
+    return [(pk, abdruecke[pk].hexdigest()) for pk in reihenfolge]
+
+
+def _cache_lesen(dbQK):
+    '''Liest die im Export-Cache gespeicherten Typ12-Zeilen und legt bei Bedarf die temporäre Tabelle
+    für die geänderten Haltungen an. Die Tabelle "dynacache" ist Teil der QKan-Datenbank (ab Version 2.5.12).
+
+    :dbQK:                  Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:             DBConnection
+
+    :returns:               Dictionary pk -> (Fingerabdruck, Zeilen), None bei einem Fehler
+    :rtype:                 Dictionary
+    '''
+
+    sql = u"""CREATE TEMP TABLE IF NOT EXISTS dynadelta (
+                pk INTEGER PRIMARY KEY)"""
+    if not dbQK.sql(sql, u'dbQK: k_qkkp.cache_lesen (1)'):
+        return None
+
+    sql = u"""SELECT pk, fingerabdruck, zeilen FROM dynacache"""
+    zeilen = dbQK.abfrage(sql, u'dbQK: k_qkkp.cache_lesen (2)')
+    if zeilen is None:
+        return None
+
+    return dict((pk, (fingerabdruck, text)) for pk, fingerabdruck, text in zeilen)
+
+
+def _cache_schreiben(dbQK, neu):
+    '''Speichert die neu berechneten Typ12-Zeilen und entfernt die Einträge gelöschter Haltungen
+
+    :dbQK:                  Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:             DBConnection
+
+    :neu:                   Liste aus (pk, Fingerabdruck, Zeilen)
+    :type neu:              List
+
+    :returns:               Erfolg
+    :rtype:                 Boolean
+    '''
+
+    with dbQK.transaktion(u'dynacache') as ta:
+        sql = u"""DELETE FROM dynacache WHERE pk NOT IN (SELECT pk FROM haltungen)"""
+        if not dbQK.sql(sql, u'dbQK: k_qkkp.cache_schreiben (1)'):
+            return False
+
+        if len(neu) > 0:
+            sql = u"""INSERT OR REPLACE INTO dynacache (pk, fingerabdruck, zeilen) VALUES (?, ?, ?)"""
+            if not dbQK.executemany(sql, neu, u'dbQK: k_qkkp.cache_schreiben (2)'):
+                return False
+
+    return not ta.fehler
+
+
 # Funktionen zum Schreiben der DYNA-Daten. Werden aus exportKanaldaten aufgerufen 
 def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidung, 
             dynaprof_choice, dynabef_choice, 
-             dynaprof_nam, dynaprof_key, ausw_and, auswahl):
+             dynaprof_nam, dynaprof_key, ausw_and, auswahl, mit_cache=False):
     '''Schreiben der DYNA-Typ12-Datenzeilen
 
     :dbQK:                  Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
@@ -166,6 +312,10 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
     :auswahl:               SQL-Textbaustein mit der Bedingung zur Filterung auf eine Liste von Teilgebieten
     :type dbQK:             String
 
+    :mit_cache:             Nur die Datensätze neu berechnen, deren Eingangsdaten sich seit dem letzten
+                            Export geändert haben (Tabelle "dynacache")
+    :type mit_cache:        Boolean
+
     :returns: void
     '''
 
@@ -187,12 +337,55 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
     # Verschneidung nur, wenn (mit_verschneidung)
     if mit_verschneidung:
         case_verschneidung = "fl.aufteilen IS NULL or fl.aufteilen <> 'ja'"
-        join_verschneidung = """
-            LEFT JOIN tezg AS tg
-            ON lf.tezgnam = tg.flnam"""
     else:
         case_verschneidung = "1"
-        join_verschneidung = ""
+
+    # Zuordnung der Rauheiten zu den DYNA-Schlüsseln. Wird nur einmal aufgebaut, bei mehrfach
+    # vorkommenden Rauheiten gilt der erste Schlüssel.
+    kskeys = dict((u'{0:10.6f}'.format(float(kb)), id) for kb, id in reversed(list(zip(dynakeys_ks, dynakeys_id))))
+
+    # Auswahl der Haltungen nach Teilgebieten
+    if auswahl == '':
+        ausw_hal = u''
+    else:
+        ausw_hal = u"""
+        WHERE h.{auswahl}""".format(auswahl=auswahl)
+
+    # Export-Cache: Es werden nur die Haltungen neu berechnet, deren Eingangsdaten sich seit dem letzten
+    # Export geändert haben. Exportoptionen und Schlüssellisten gehen in alle Fingerabdrücke ein.
+    if mit_cache:
+        kopf = repr((mindestflaeche, mit_verschneidung, dynaprof_choice, dynabef_choice,
+                     sorted(kskeys.items()), list(zip(dynaprof_nam, dynaprof_key))))
+        abdruecke = _fingerabdruecke12(dbQK, kopf, sql_prof1, sql_prof2, ausw_hal)
+        if abdruecke is None:
+            return False
+        gespeichert = _cache_lesen(dbQK)
+        if gespeichert is None:
+            return False
+
+        geaendert = set([pk for pk, fingerabdruck in abdruecke
+                         if gespeichert.get(pk, (None, None))[0] != fingerabdruck])
+        logger.debug(u'k_qkkp.write12: {} von {} Haltungen werden neu berechnet'.format(
+            len(geaendert), len(abdruecke)))
+
+        if not dbQK.sql(u"""DELETE FROM dynadelta""", u'dbQK: k_qkkp.write12 (2)'):
+            return False
+        if not dbQK.executemany(u"""INSERT INTO dynadelta (pk) VALUES (?)""", [(pk,) for pk in geaendert],
+                                u'dbQK: k_qkkp.write12 (3)'):
+            return False
+
+        delta_fl = u"""
+            WHERE lf.haltnam IN (
+                SELECT h.haltnam FROM haltungen AS h
+                INNER JOIN dynadelta AS dd
+                ON h.pk = dd.pk)"""
+        delta_hal = u"""
+        {verknuepfung} h.pk IN (SELECT pk FROM dynadelta)""".format(verknuepfung=u'AND' if ausw_hal else u'WHERE')
+        neu = {}                    # pk -> neu berechnete Typ12-Zeilen
+    else:
+        delta_fl = u''
+        delta_hal = u''
+        neu = None
 
     # wdistbef ist die mit der (Teil-) Fläche gewichtete Fließlänge zur Haltung für die befestigten Flächen zu 
     # einer Haltung, 
@@ -209,40 +402,42 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
                     ELSE 20.0
                     END AS neigung, 
                 fl.abflussparameter AS abflussparameter, 
-                area(tg.geom) AS fltezg,
+                tg.geomflaeche AS fltezg,
                 CASE WHEN {case_verschneidung} THEN fl.geom 
-                ELSE CastToMultiPolygon(intersection(fl.geom,tg.geom)) END AS geom
+                ELSE CastToMultiPolygon(intersection(fl.geom,tg.geom)) END AS geom,
+                CASE WHEN {case_verschneidung} THEN fl.geomflaeche 
+                ELSE area(intersection(fl.geom,tg.geom)) END AS flaeche
             FROM linkfl AS lf
             INNER JOIN flaechen AS fl
-            ON lf.flnam = fl.flnam{join_verschneidung}),
+            ON lf.flnam = fl.flnam
             LEFT JOIN tezg AS tg
-            ON lf.tezgnam = tg.flnam),
+            ON lf.tezgnam = tg.flnam{delta_fl}),
         halflaech AS (
             SELECT
                 fi.haltnam AS haltnam, 
                 coalesce(ap.endabflussbeiwert, 1.0) AS abflussbeiwert, 
                 sum(CASE ap.bodenklasse IS NULL 
-                    WHEN 1 THEN area(fi.geom)/10000.
+                    WHEN 1 THEN fi.flaeche/10000.
                     ELSE 0 END) AS flbef,
                 sum(CASE ap.bodenklasse IS NULL 
                     WHEN 1 THEN 0
-                    ELSE area(fi.geom)/10000. END) AS fldur,
+                    ELSE fi.flaeche/10000. END) AS fldur,
                 sum(CASE ap.bodenklasse IS NULL 
-                    WHEN 1 THEN distance(fi.geom,h.geom)*area(fi.geom)/10000.
+                    WHEN 1 THEN distance(fi.geom,h.geom)*fi.flaeche/10000.
                            ELSE 0 END) AS wdistbef,
                 sum(CASE ap.bodenklasse IS NULL 
                     WHEN 1 THEN 0
-                           ELSE distance(fi.geom,h.geom)*area(fi.geom)/10000. END) AS wdistdur,
-                sum(area(fi.geom)/10000.) AS flges,
+                           ELSE distance(fi.geom,h.geom)*fi.flaeche/10000. END) AS wdistdur,
+                sum(fi.flaeche/10000.) AS flges,
                 fi.fltezg AS fltezg,
                 distance(fi.geom,h.geom) AS disttezg, 
-                sum(neigung*area(fi.geom)/10000.) AS wneigung
+                sum(neigung*fi.flaeche/10000.) AS wneigung
             FROM flintersect AS fi
             LEFT JOIN abflussparameter AS ap
             ON fi.abflussparameter = ap.apnam
             INNER JOIN haltungen AS h 
             ON fi.haltnam = h.haltnam
-            WHERE area(fi.geom) > {mindestflaeche}{ausw_and}{auswahl}
+            WHERE fi.flaeche > {mindestflaeche}{ausw_and}{auswahl}
             GROUP BY fi.haltnam),
         einleitsw AS (
             SELECT haltnam, sum(zufluss) AS zufluss
@@ -276,7 +471,8 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
             h.schoben AS schoben, 
             h.schunten AS schunten,
             so.xsch AS xob, 
-            so.ysch AS yob
+            so.ysch AS yob,
+            h.pk AS pk
         FROM haltungen AS h
         INNER JOIN dynahal AS d
         ON h.pk = d.pk
@@ -289,25 +485,31 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
         LEFT JOIN einleitsw AS e
         ON e.haltnam = h.haltnam
         LEFT JOIN entwaesserungsarten AS a
-        ON h.entwart = a.bezeichnung
+        ON h.entwart = a.bezeichnung{ausw_hal}{delta_hal}
+        ORDER BY h.pk
     """.format(mindestflaeche=mindestflaeche, ausw_and=ausw_and, auswahl=auswahl, 
                 sql_prof1=sql_prof1, sql_prof2=sql_prof2, 
-                case_verschneidung=case_verschneidung, join_verschneidung=join_verschneidung)
+                case_verschneidung=case_verschneidung, ausw_hal=ausw_hal, delta_fl=delta_fl, delta_hal=delta_hal)
 
-    if not dbQK.sql(sql, u'dbQK: k_qkkp.write12 (1)'):
-        return False
+    if neu is not None and len(geaendert) == 0:
+        zeilen = []                 # Alle Datensätze werden aus dem Cache übernommen
+    else:
+        zeilen = dbQK.abfrage(sql, u'dbQK: k_qkkp.write12 (1)')
+        if zeilen is None:
+            return False
 
     fortschritt(u'Export Datensätze Typ12', 0.3)
-    progress_bar.setValue(30)
+    if progress_bar is not None:
+        progress_bar.setValue(30)           # nicht in den Prozessen des Exports je Teilgebiet
     # createdat = time.strftime(u'%d.%m.%Y %H:%M:%S', time.localtime())
 
     # Lesen der Daten aus der SQL-Abfrage und Schreiben in die DYNA-Datei --------------------
-    for attr in dbQK.fetchall():
+    for attr in zeilen:
 
         # Attribute in Variablen speichern
         (kanalnummer, haltungsnummer, laenge, deckelhoehe, sohleob, sohleun, material, 
          profilid, profilhoehe, ks, flbef, flges, distbef, distdur, fltezg, disttezg, 
-         abfltyp, qzu, ewdichte, tgnr, neigung, entwart, haltyp, schoben, schunten, xob, yob) = attr
+         abfltyp, qzu, ewdichte, tgnr, neigung, entwart, haltyp, schoben, schunten, xob, yob, pk) = attr
 
         laenge_t = formf(laenge, 7)
         deckelhoehe_t = formf(deckelhoehe, 7)
@@ -320,7 +522,7 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
          
         # Schlüssel für DYNA einsetzen
         try:
-            kskey = dynakeys_id[[u'{0:10.6f}'.format(kb) for kb in dynakeys_ks].index(u'{0:10.6f}'.format(ks))]
+            kskey = kskeys[u'{0:10.6f}'.format(ks)]
             # logger.debug(u'ks= {0:10.6f}\ndynakeys_ks= {1:s}\ndynakeys_id= {2:s}\nkskey= {3:s}'.format(
                 # ks,
                 # ', '.join([u'{0:10.6f}'.format(kb) for kb in dynakeys_ks]),
@@ -414,7 +616,10 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
                 # 'qzu = {}\n'.format(qzu) + \
                 # 'ewdichte = {}\n'.format(ewdichte))
 
-            df.write(zeile)
+            if neu is None:
+                df.write(zeile)
+            else:
+                neu[pk] = neu.get(pk, u'') + zeile
         except BaseException as err:
             fehlermeldung(u'Fehler in QKan_ExportDYNA.write12: {}\n'.format(err), 
                 'Datentypfehler in Variablenliste:\n' + \
@@ -443,6 +648,18 @@ def write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidun
                 'yob = {}\n'.format(yob))
             return False
 
+    if neu is not None:
+        # Neu berechnete und unveränderte Datensätze in der Reihenfolge der Haltungen schreiben
+        for pk, fingerabdruck in abdruecke:
+            if pk in geaendert:
+                df.write(neu.get(pk, u''))
+            else:
+                df.write(gespeichert[pk][1])
+
+        if not _cache_schreiben(dbQK, [(pk, fingerabdruck, neu.get(pk, u'')) for pk, fingerabdruck in abdruecke
+                                       if pk in geaendert]):
+            return False
+
     return True
 
 
@@ -468,7 +685,7 @@ def write16(dbQK, df, ausw_and, auswahl):
     if auswahl == '':
         ausw_tab = ''
     else:
-        ausw_tab = 'schaechte'
+        ausw_tab = 's.'
 
     # Zusammenstellen der Daten. 
     sql = u"""
@@ -519,7 +736,8 @@ def write16(dbQK, df, ausw_and, auswahl):
     ORDER BY s.schnam, han.kanalnummer, han.haltungsnummer
     """.format(ausw_and=ausw_and, ausw_tab=ausw_tab, auswahl=auswahl)
 
-    if not dbQK.sql(sql, u'dbQK: k_qkkp.write16 (1)'):
+    zeilen = dbQK.abfrage(sql, u'dbQK: k_qkkp.write16 (1)')
+    if zeilen is None:
         return False
 
     akt_schnam = ''             # Identifiziert Datensätze zum gleichen Knoten
@@ -527,7 +745,7 @@ def write16(dbQK, df, ausw_and, auswahl):
     zeilan = ''
     zeilab = ''
 
-    for i, attr in enumerate(dbQK.fetchall()):
+    for i, attr in enumerate(zeilen):
 
         # Attribute in Variablen speichern
         (schnam, an_kanalnummer, an_haltungsnummer, ab_kanalnummer, ab_haltungsnummer, an_anz, ab_anz) = attr
@@ -611,7 +829,7 @@ def write41(dbQK, df, ausw_and, auswahl):
     if auswahl == '':
         ausw_tab = ''
     else:
-        ausw_tab = 'schaechte'
+        ausw_tab = 's.'
 
     # Zusammenstellen der Daten. 
     sql = u"""
@@ -628,10 +846,11 @@ def write41(dbQK, df, ausw_and, auswahl):
         WHERE s.schachttyp = 'Auslass'{ausw_and}{ausw_tab}{auswahl}
     """.format(ausw_and=ausw_and, ausw_tab=ausw_tab, auswahl=auswahl)
 
-    if not dbQK.sql(sql, u'dbQK: k_qkkp.write41 (1)'):
+    zeilen = dbQK.abfrage(sql, u'dbQK: k_qkkp.write41 (1)')
+    if zeilen is None:
         return False
 
-    for attr in dbQK.fetchall():
+    for attr in zeilen:
         
         # Attribute in Variablen speichern
         (kanalnummer, haltungsnummer, deckelhoehe, xsch, ysch, schnam) = attr
@@ -649,10 +868,225 @@ def write41(dbQK, df, ausw_and, auswahl):
 
 
 
+# Schreiben der DYNA-Datei und Export je Teilgebiet ------------------------------------------------
+
+def _dynadatei_schreiben(dynafile, dynatemplate, dynakeys_id, dynakeys_mat, dynakeys_ks, schreiben):
+    '''Schreibt eine DYNA-Datei anhand der Vorlage und fügt dabei die Datenblöcke ein
+
+    :dynafile:              Zu schreibende DYNA-Datei
+    :type dynafile:         String
+
+    :dynatemplate:          Zeilen der Vorlage-DYNA-Datei
+    :type dynatemplate:     List
+
+    :dynakeys_id:           Liste der DYNA-Schlüssel für Rauheitsbeiwerte, Material und Regenspende
+    :type dynakeys_id:      List
+
+    :dynakeys_mat:          Liste der Materialien in der DYNA-Datei
+    :type dynakeys_mat:     List
+
+    :dynakeys_ks:           Liste der Rauheitsbeiwerte in der DYNA-Datei
+    :type dynakeys_ks:      List
+
+    :schreiben:             Funktion, die zu einer Satzart ('12', '16', '41') die Datensätze in die
+                            geöffnete DYNA-Datei schreibt und den Erfolg zurückgibt
+    :type schreiben:        Function
+
+    :returns:               Erfolg
+    :rtype:                 Boolean
+    '''
+
+    with open(dynafile, 'w') as df:
+
+        typ05 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 05 erreicht
+        typ12 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 12 erreicht
+        typ16 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 16 erreicht
+        typ41 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 41 erreicht
+
+        # Die nachfolgende Schleife durchläuft das DYNA-Template in der Liste "dynatemplate", schreibt die 
+        # Standardzeilen. An den Stellen, an denen in der Vorlage Daten eingefügt und gegebenfalls in der
+        # Vorlage vorhandene Daten übersprungen werden müssen, sind entsprechende Blöcke eingefügt.
+        # Diese sind durch Flags gekennzeichnet, z.B. typ05
+
+        for z in dynatemplate:
+
+            if z[:2] == '##':
+                # Kommentarzeilen werden geschrieben, solange keine Blöcke aktiv sind
+                df.write(z)
+                continue
+
+            # Schreiben des aktiven Datenblocks
+
+            # Block Typ05
+            if typ05:
+                if z[:2] == '++':
+                    # Sobald nächster Block erreicht, ist Typ05 beendet
+                    # Jetzt werden alle neuen Typ-05-Datensätze geschrieben
+                    for id, mat, kb in zip(dynakeys_id, dynakeys_mat, dynakeys_ks):
+                        df.write(u'05 {id:1s} {mat:4s} {sp:10.6f}{kb:10.6f}{ks:10.6f}\n'.format(id=id[:1], mat=mat[:4], sp=0, kb=kb, ks=0).replace('  0.000000','          '))
+                    typ05 = False
+                    df.write(z)
+
+            # Block Typ12
+            elif typ12:
+                if z[:2] == '++':
+                    # Sobald nächster Block erreicht, ist Typ12 beendet
+                    # Jetzt werden alle neuen Typ-12-Datensätze geschrieben
+                    if not schreiben(u'12', df):
+                        return False
+                    typ12 = False
+                    df.write(z)
+
+            # Block Typ16
+            elif typ16:
+                if z[:2] == '++':
+                    # Sobald nächster Block erreicht, ist Typ16 beendet
+                    # Jetzt werden alle neuen Typ-16-Datensätze geschrieben
+                    if not schreiben(u'16', df):
+                        return False
+                    typ16 = False
+                    df.write(z)
+                elif z[6:8] != '  ':
+                    df.write(z)                             # Bauwerksverknüpfungen
+            # Block Typ41
+            elif typ41:
+                if z[:2] == '++':
+                    # Sobald nächster Block erreicht, ist Typ41 beendet
+                    # Jetzt werden alle neuen Typ-41-Datensätze geschrieben
+                    if not schreiben(u'41', df):
+                        return False
+                    typ41 = False
+                    df.write(z)
+            else:
+                # Allgemeine Zeilen werden direkt aus der Templatedatei geschrieben
+                df.write(z)
+
+
+            # Aktivierung der Datenblöcke
+
+            if z[:6] == '++SCHL':
+                # Block Typ05 beginnt: "Schlüsseltabellen für Rauheit, Material und Regenspende"
+                typ05 = True
+                # df.write(z)
+                continue
+            elif z[:6] == '++KANA':
+                # Block Typ12 beginnt: "Haltungs- und Flächendaten"
+                typ12 = True
+                # df.write(z)
+                continue
+            elif z[:6] == '++NETZ':
+                # Block Typ16 beginnt: "Verzweigungen und Endschächte"
+                typ16 = True
+                # df.write(z)
+                continue
+            elif z[:6] == '++DECK':
+                # Block Typ41 beginnt: "Verzweigungen und Endschächte"
+                typ41 = True
+                # df.write(z)
+                continue
+
+    return True
+
+
+def _teilgebietsdatei(dynafile, teilgebiet):
+    '''Name der DYNA-Datei für ein Teilgebiet: Der Teilgebietsname wird vor der Dateiendung angehängt'''
+
+    name, endung = os.path.splitext(dynafile)
+    return u'{}_{}{}'.format(name, re.sub(u'[^\\w.-]', u'_', teilgebiet, flags=re.UNICODE), endung)
+
+
+def _teilgebiet_bloecke(dbQK, teilgebiet, param12, mit_cache=False):
+    '''Erzeugt die DYNA-Datensätze Typ12, 16 und 41 eines Teilgebiets
+
+    :dbQK:                  Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:             DBConnection
+
+    :teilgebiet:            Name des Teilgebiets
+    :type teilgebiet:       String
+
+    :param12:               Parameter für write12 von dynakeys_id bis dynaprof_key
+    :type param12:          Tuple
+
+    :mit_cache:             s. write12
+    :type mit_cache:        Boolean
+
+    :returns:               Dictionary Satzart -> Datenblock, None bei einem Fehler
+    :rtype:                 Dictionary
+    '''
+
+    ausw_and = u' AND '
+    auswahl = u"teilgebiet in ('{}')".format(teilgebiet)
+
+    bloecke = {}
+    for satzart in (u'12', u'16', u'41'):
+        df = StringIO()
+        if satzart == u'12':
+            erfolg = write12(dbQK, df, *(param12 + (ausw_and, auswahl)), mit_cache=mit_cache)
+        elif satzart == u'16':
+            erfolg = write16(dbQK, df, ausw_and, auswahl)
+        else:
+            erfolg = write41(dbQK, df, ausw_and, auswahl)
+        if not erfolg:
+            return None
+        bloecke[satzart] = df.getvalue()
+
+    return bloecke
+
+
+def _teilgebiet_exportieren(auftrag):
+    '''Erzeugt in einem eigenen Prozess die DYNA-Datensätze eines Teilgebiets
+
+    :auftrag:               Pfad zur QKan-Datenbank, Teilgebiet und Parameter für write12
+    :type auftrag:          Tuple
+
+    :returns:               Teilgebiet und Datenblöcke (s. _teilgebiet_bloecke)
+    :rtype:                 Tuple
+    '''
+
+    dbname, teilgebiet, param12 = auftrag
+    dbQK = DBConnection(dbname=dbname)
+    if not dbQK.connected:
+        return teilgebiet, None
+    if not dbQK.sql(u'PRAGMA query_only = ON', u'dbQK: k_qkkp.teilgebiet_exportieren'):
+        return teilgebiet, None
+
+    return teilgebiet, _teilgebiet_bloecke(dbQK, teilgebiet, param12)
+
+
+def _teilgebiete_exportieren(dbQK, liste_teilgebiete, param12, prozesse=1, mit_cache=False):
+    '''Erzeugt die DYNA-Datensätze Typ12, 16 und 41 für jedes Teilgebiet, bei mehr als einem Prozess parallel.
+
+    Die Prozesse lesen die Datenbank nur. Der Export-Cache (mit_cache) wird deshalb nur bei einem
+    Prozess verwendet. Voraussetzungen und Rückfall auf einen Prozess s. parallel_ausfuehren.
+
+    :returns:               Dictionary Teilgebiet -> Datenblöcke (s. _teilgebiet_bloecke), None bei einem Fehler
+    :rtype:                 Dictionary
+    '''
+
+    ergebnisse = None
+    if int(prozesse) > 1 and len(liste_teilgebiete) > 1:
+        # Die Prozesse lesen aus der Datenbankdatei
+        dbQK.commit()
+        auftraege = [(dbQK.dbname, teilgebiet, param12) for teilgebiet in liste_teilgebiete]
+        ergebnisse = parallel_ausfuehren(_teilgebiet_exportieren, auftraege, prozesse)
+    if ergebnisse is None:
+        ergebnisse = [(teilgebiet, _teilgebiet_bloecke(dbQK, teilgebiet, param12, mit_cache))
+                      for teilgebiet in liste_teilgebiete]
+
+    for teilgebiet, bloecke in ergebnisse:
+        if bloecke is None:
+            fehlermeldung(u'Fehler in k_qkkp.exportKanaldaten',
+                          u'Die DYNA-Datensätze für Teilgebiet {} konnten nicht erzeugt werden'.format(teilgebiet))
+            return None
+
+    return dict(ergebnisse)
+
+
 # Hauptfunktion ----------------------------------------------------------------------------
 def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynaprof_choice, 
                     liste_teilgebiete, profile_ergaenzen, autonum_dyna, mit_verschneidung, 
-                    fangradius=0.1, mindestflaeche=0.5, max_loops=1000, datenbanktyp=u'spatialite'):
+                    fangradius=0.1, mindestflaeche=0.5, max_loops=1000, datenbanktyp=u'spatialite',
+                    mit_cache=False, je_teilgebiet=False, prozesse=1):
     '''Export der Kanaldaten aus einer QKan-SpatiaLite-Datenbank und Schreiben in eine HE-Firebird-Datenbank.
 
     :dynafile:              Zu Schreibende DYNA-Datei; kann mit Vorlagedatei identisch sein
@@ -685,9 +1119,32 @@ def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynap
     :check_export:          Liste von Export-Optionen
     :type check_export:     Dictionary
 
+    :mit_cache:             Typ12-Datensätze nur für Haltungen mit geänderten Eingangsdaten neu berechnen,
+                            die übrigen aus der Tabelle "dynacache" übernehmen
+    :type mit_cache:        Boolean
+
+    :je_teilgebiet:         Für jedes Teilgebiet in liste_teilgebiete eine eigene DYNA-Datei schreiben. Der Name
+                            des Teilgebiets wird an den Namen von dynafile angehängt. Die Vorbereitungen
+                            (Vorlage, Schlüssel, Profile, dynahal) werden nur einmal ausgeführt.
+    :type je_teilgebiet:    Boolean
+
+    :prozesse:              Anzahl der Prozesse, in denen die Datensätze der Teilgebiete parallel
+                            erzeugt werden (nur mit je_teilgebiet)
+    :type prozesse:         Integer
+
     :returns: void
     '''
 
+    # Beim Export je Teilgebiet wird für jedes Teilgebiet eine eigene Datei geschrieben
+    if je_teilgebiet:
+        if len(liste_teilgebiete) == 0:
+            fehlermeldung(u'Fehler in QKan_ExportDYNA',
+                          u'Für den Export je Teilgebiet muss mindestens ein Teilgebiet ausgewählt sein')
+            return False
+        dateien = [(teilgebiet, _teilgebietsdatei(dynafile, teilgebiet)) for teilgebiet in liste_teilgebiete]
+    else:
+        dateien = [(None, dynafile)]
+
     # Statusmeldung in der Anzeige
     global progress_bar
     progress_bar = QProgressBar(iface.messageBar())
@@ -709,13 +1166,14 @@ def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynap
     dynatemplate = open(template_dyna).readlines()
 
     # DYNA-Datei löschen, falls schon vorhanden
-    if os.path.exists(dynafile):
-        try:
-            os.remove(dynafile)
-        except BaseException as err:
-            fehlermeldung(u'Fehler (33) in QKan_ExportDYNA {}'.format(err), 
-                'Die DYNA-Datei ist schon vorhanden und kann nicht ersetzt werden: {}'.format(repr(err)))
-            return False
+    for teilgebiet, datei in dateien:
+        if os.path.exists(datei):
+            try:
+                os.remove(datei)
+            except BaseException as err:
+                fehlermeldung(u'Fehler (33) in QKan_ExportDYNA {}'.format(err), 
+                    'Die DYNA-Datei ist schon vorhanden und kann nicht ersetzt werden: {}'.format(repr(err)))
+                return False
 
     fortschritt(u"DYNA-Datei aus Vorlage kopiert...", 0.01)
     progress_bar.setValue(1)
@@ -749,147 +1207,152 @@ def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynap
         ausw_and = u""
         auswahl = u""
 
-    if autonum_dyna:
-
-        # Zurücksetzen von "kanalnummer" und "haltungsnummer"
-        sql = u"""
-            UPDATE dynahal
-            SET kanalnummer = NULL,
-                haltungsnummer = NULL{ausw_where}{auswahl}""".format(ausw_where=ausw_where, auswahl=auswahl)
-
-        if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (1)'):
-            return False
-
-        dbQK.commit()
-
-        # Einfügen der Haltungsdaten in die Zusatztabelle "dynahal"
+    # Die Nummerierung in dynahal wird in einer Transaktion mit einem einzigen COMMIT ausgeführt
+    with dbQK.transaktion(u'init_dynahal') as ta:
+        if autonum_dyna:
 
-        sql = u"""
-            WITH halnumob AS (
-                SELECT schunten, count(*) AS anzahl
-                FROM haltungen
-                GROUP BY schunten
-            ), halnumun AS (
-                SELECT schoben, count(*) AS anzahl
-                FROM haltungen
-                GROUP BY schoben
-            )
-            INSERT INTO dynahal
-            (pk, haltnam, schoben, schunten, teilgebiet, anzobob, anzobun, anzunun, anzunob)
-            SELECT
-                haltungen.pk, haltungen.haltnam, haltungen.schoben, haltungen.schunten, haltungen.teilgebiet,
-                coalesce(haltobob.anzahl, 0) AS anzobob, coalesce(haltobun.anzahl, 0) AS anzobun,
-                coalesce(haltunun.anzahl, 0) AS anzunun, coalesce(haltunob.anzahl, 0) AS anzunob
-            FROM haltungen
-            LEFT JOIN halnumob AS haltobob
-            ON haltungen.schoben = haltobob.schunten
-            LEFT JOIN halnumun AS haltobun
-            ON haltungen.schoben = haltobun.schoben
-            LEFT JOIN halnumun AS haltunun
-            ON haltungen.schunten = haltunun.schoben
-            LEFT JOIN halnumob AS haltunob
-            ON haltungen.schunten = haltunob.schunten
-            WHERE haltnam NOT IN (
-                SELECT haltnam FROM dynahal)
-                {ausw_and}{auswahl}""".format(ausw_and=ausw_and, auswahl=auswahl)
-
-        if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (2)'):
-            return False
+            # Zurücksetzen von "kanalnummer" und "haltungsnummer"
+            sql = u"""
+                UPDATE dynahal
+                SET kanalnummer = NULL,
+                    haltungsnummer = NULL{ausw_where}{auswahl}""".format(ausw_where=ausw_where, auswahl=auswahl)
 
-        # Zurücksetzen von "kanalnummer" und "haltungsnummer"
-        
-        sql = u"""
-            UPDATE dynahal
-            SET kanalnummer = NULL,
-                haltungsnummer = NULL
-                {ausw_where}{auswahl}""".format(ausw_where=ausw_where, auswahl=auswahl)
+            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (1)'):
+                return False
 
-        if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (3)'):
-            return False
+            dbQK.commit()
 
-        # Nummerierung der Anfangshaltungen
+            # Einfügen der Haltungsdaten in die Zusatztabelle "dynahal"
 
-        if len(liste_teilgebiete) == 0:
             sql = u"""
-                UPDATE dynahal
-                SET kanalnummer = ROWID, haltungsnummer = 1
-                WHERE anzobob <> 1 OR anzobun <> 1
+                WITH halnumob AS (
+                    SELECT schunten, count(*) AS anzahl
+                    FROM haltungen
+                    GROUP BY schunten
+                ), halnumun AS (
+                    SELECT schoben, count(*) AS anzahl
+                    FROM haltungen
+                    GROUP BY schoben
+                )
+                INSERT INTO dynahal
+                (pk, haltnam, schoben, schunten, teilgebiet, anzobob, anzobun, anzunun, anzunob)
+                SELECT
+                    haltungen.pk, haltungen.haltnam, haltungen.schoben, haltungen.schunten, haltungen.teilgebiet,
+                    coalesce(haltobob.anzahl, 0) AS anzobob, coalesce(haltobun.anzahl, 0) AS anzobun,
+                    coalesce(haltunun.anzahl, 0) AS anzunun, coalesce(haltunob.anzahl, 0) AS anzunob
+                FROM haltungen
+                LEFT JOIN halnumob AS haltobob
+                ON haltungen.schoben = haltobob.schunten
+                LEFT JOIN halnumun AS haltobun
+                ON haltungen.schoben = haltobun.schoben
+                LEFT JOIN halnumun AS haltunun
+                ON haltungen.schunten = haltunun.schoben
+                LEFT JOIN halnumob AS haltunob
+                ON haltungen.schunten = haltunob.schunten
+                WHERE haltnam NOT IN (
+                    SELECT haltnam FROM dynahal)
                     {ausw_and}{auswahl}""".format(ausw_and=ausw_and, auswahl=auswahl)
 
-        if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (4)'):
-            return False
-
-        dbQK.commit()
-
-        # Weitergabe der Nummerierung an die Folgehaltung im selben Strang, 
-        # solange change() nicht 0 zurückgibt
+            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (2)'):
+                return False
 
-        nchange = 1         # Initialisierung
-        changelog = []
-        nlimit = 0
-        while nchange > 0 and nlimit < max_loops:
+            # Zurücksetzen von "kanalnummer" und "haltungsnummer"
+        
             sql = u"""
                 UPDATE dynahal
-                SET 
-                    kanalnummer = 
-                    (   SELECT kanalnummer
-                        FROM dynahal AS dh
-                        WHERE dh.schunten = dynahal.schoben),
-                    haltungsnummer = 
-                    (   SELECT haltungsnummer + 1
-                        FROM dynahal AS dh
-                        WHERE dh.schunten = dynahal.schoben)
-                WHERE
-                    dynahal.anzobob = 1 AND
-                    dynahal.anzobun = 1 AND
-                    dynahal.kanalnummer IS NULL
-                    {ausw_and}{auswahl};
-                """.format(ausw_and=ausw_and, auswahl=auswahl)
-
-            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (5)'):
+                SET kanalnummer = NULL,
+                    haltungsnummer = NULL
+                    {ausw_where}{auswahl}""".format(ausw_where=ausw_where, auswahl=auswahl)
+
+            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (3)'):
                 return False
 
-            sql = u"""
-                SELECT changes();
-                """
+            # Nummerierung der Anfangshaltungen
 
-            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (6)'):
-                return False
+            if len(liste_teilgebiete) == 0:
+                sql = u"""
+                    UPDATE dynahal
+                    SET kanalnummer = ROWID, haltungsnummer = 1
+                    WHERE anzobob <> 1 OR anzobun <> 1
+                        {ausw_and}{auswahl}""".format(ausw_and=ausw_and, auswahl=auswahl)
 
-            nchange = int(dbQK.fetchone()[0])       # Zahl der zuletzt geänderten Datensätze
-            changelog.append(nchange)
+            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (4)'):
+                return False
 
-        dbQK.commit()
+            dbQK.commit()
+
+            # Weitergabe der Nummerierung an die Folgehaltung im selben Strang, 
+            # solange change() nicht 0 zurückgibt
+
+            nchange = 1         # Initialisierung
+            changelog = []
+            nlimit = 0
+            while nchange > 0 and nlimit < max_loops:
+                sql = u"""
+                    UPDATE dynahal
+                    SET 
+                        kanalnummer = 
+                        (   SELECT kanalnummer
+                            FROM dynahal AS dh
+                            WHERE dh.schunten = dynahal.schoben),
+                        haltungsnummer = 
+                        (   SELECT haltungsnummer + 1
+                            FROM dynahal AS dh
+                            WHERE dh.schunten = dynahal.schoben)
+                    WHERE
+                        dynahal.anzobob = 1 AND
+                        dynahal.anzobun = 1 AND
+                        dynahal.kanalnummer IS NULL
+                        {ausw_and}{auswahl};
+                    """.format(ausw_and=ausw_and, auswahl=auswahl)
+
+                if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (5)'):
+                    return False
+
+                sql = u"""
+                    SELECT changes();
+                    """
+
+                if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (6)'):
+                    return False
+
+                nchange = int(dbQK.fetchone()[0])       # Zahl der zuletzt geänderten Datensätze
+                changelog.append(nchange)
+
+            dbQK.commit()
+
+            if nlimit >= max_loops:
+                fehlermeldung(u'Fehler in QKan_ExportDYNA', 
+                    u'{} Schleifendurchläufe in der Autonummerierung. Gegebenenfalls muss max_loops in der config-Datei angepasst werden...')
+
+            logger.debug(u'Anzahl Änderungen für DYNA:\n{}'.format(u', '.join([str(n) for n in changelog])))
 
-        if nlimit >= max_loops:
-            fehlermeldung(u'Fehler in QKan_ExportDYNA', 
-                u'{} Schleifendurchläufe in der Autonummerierung. Gegebenenfalls muss max_loops in der config-Datei angepasst werden...')
+        else:
+            # Keine Autonummerierung. Dann müssen die Haltungsnamen so vergeben sein, dass sich Kanal- und Haltungs-
+            # nummer daraus wieder herstellen lassen (8 Zeichen für Kanal + "-" + 3 Zeichen für Haltungsnummer).
 
-        logger.debug(u'Anzahl Änderungen für DYNA:\n{}'.format(u', '.join([str(n) for n in changelog])))
+            sql = u"""DELETE FROM dynahal"""
+            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (7): Daten in Tabelle dynahal konnten nicht gelöscht werden'):
+                    return False
 
-    else:
-        # Keine Autonummerierung. Dann müssen die Haltungsnamen so vergeben sein, dass sich Kanal- und Haltungs-
-        # nummer daraus wieder herstellen lassen (8 Zeichen für Kanal + "-" + 3 Zeichen für Haltungsnummer).
+            sql = u"""
+                INSERT INTO dynahal
+                (pk, haltnam, kanalnummer, haltungsnummer, schoben, schunten, teilgebiet)
+                SELECT
+                    h.pk, h.haltnam,
+                    substr(h.haltnam, 1, instr(h.haltnam, '-')-1) AS kn,
+                    substr(h.haltnam, instr(h.haltnam, '-') - length(h.haltnam)) AS hn,
+                    h.schoben, h.schunten, h.teilgebiet
+                FROM haltungen AS h
+                WHERE haltnam NOT IN (
+                    SELECT haltnam FROM dynahal)
+                    {ausw_and}{auswahl}""".format(ausw_and=ausw_and, auswahl=auswahl)
 
-        sql = u"""DELETE FROM dynahal"""
-        if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (7): Daten in Tabelle dynahal konnten nicht gelöscht werden'):
-                return False
+            if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (8)'):
+                    return False
 
-        sql = u"""
-            INSERT INTO dynahal
-            (pk, haltnam, kanalnummer, haltungsnummer, schoben, schunten, teilgebiet)
-            SELECT
-                h.pk, h.haltnam,
-                substr(h.haltnam, 1, instr(h.haltnam, '-')-1) AS kn,
-                substr(h.haltnam, instr(h.haltnam, '-') - length(h.haltnam)) AS hn,
-                h.schoben, h.schunten, h.teilgebiet
-            FROM haltungen AS h
-            WHERE haltnam NOT IN (
-                SELECT haltnam FROM dynahal)
-                {ausw_and}{auswahl}""".format(ausw_and=ausw_and, auswahl=auswahl)
-
-        if not dbQK.sql(sql, u'dbQK: k_qkkp.init_dynahal (8)'):
-                return False
+    if ta.fehler:
+        return False
 
     progress_bar.setValue(20)
 
@@ -1048,19 +1511,21 @@ def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynap
             return False
 
         daten = dbQK.fetchall()
+        neueprofile = []
         for profil in daten:
             profil_new = profil[0]
             if profil_new not in dynaprof_nam:
                 meldung(u'Fehlende Profildaten in DYNA-Vorlagedatei {fn}'.format(fn=template_dyna), 
                     u'{pn}'.format(pn=profil_new))
                 logger.debug(u'k_qkkp.exportKanaldaten (1): dynaprof_nam = {}'.format(', '.join(dynaprof_nam)))
-                if profile_ergaenzen:
-                    sql = """INSERT INTO profile (profilnam)
-                            VALUES ('{pn}')""".format(pn=profil_new)
-                    if not dbQK.sql(sql, u'dbQK: k_qkkp.exportKanaldaten (1)'):
-                        return False
-                    dbQK.commit()
+                neueprofile.append((profil_new,))
                 fehler = 2
+        if profile_ergaenzen and len(neueprofile) > 0:
+            sql = u"""INSERT INTO profile (profilnam)
+                    VALUES (?)"""
+            if not dbQK.executemany(sql, neueprofile, u'dbQK: k_qkkp.exportKanaldaten (1)'):
+                return False
+            dbQK.commit()
         if fehler == 2:
             fehlermeldung(u'Fehler in den Profildaten', u'Es gibt Profile in den Haltungsdaten, die nicht in der DYNA-Vorlage ')
             del dbQK
@@ -1077,6 +1542,7 @@ def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynap
             return False
 
         daten = dbQK.fetchall()
+        neueprofile = []
         for profil in daten:
             profil_key, profilnam = profil
             if profil_key is None:
@@ -1085,18 +1551,20 @@ def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynap
                 meldung(u'Fehlende Profildaten in DYNA-Vorlagedatei {fn}'.format(fn=template_dyna), 
                     u'{id}'.format(id=profil_key))
                 logger.debug(u'dynaprof_key = {}'.format(', '.join(dynaprof_key)))
-                if profile_ergaenzen:
-                    sql = """INSERT INTO profile (profilnam, kp_key)
-                            VALUES ('{pn}', '{id}')""".format(pn=profilnam, id=profil_key)
-                    if not dbQK.sql(sql, u'dbQK: k_qkkp.exportKanaldaten (1)'):
-                        return False
-                    dbQK.commit()
+                neueprofile.append((profilnam, profil_key))
                 fehler = 2
             elif profil_key is None:
                 fehlermeldung(u'Fehlende ID in DYNA-Vorlagedatei {fn}'.format(fn=template_dyna), 
                     u'Es fehlt die ID für Profil {pn}'.format(pn=profil_new))
                 fehler = max(fehler, 1)         # fehler = 2 hat Priorität
 
+        if profile_ergaenzen and len(neueprofile) > 0:
+            sql = u"""INSERT INTO profile (profilnam, kp_key)
+                    VALUES (?, ?)"""
+            if not dbQK.executemany(sql, neueprofile, u'dbQK: k_qkkp.exportKanaldaten (1)'):
+                return False
+            dbQK.commit()
+
         if fehler == 1:
             fehlermeldung(u'Fehler in den Profildaten', u'Es gibt Profile ohne eine DYNA-Nummer (kp_key)')
             del dbQK
@@ -1109,96 +1577,34 @@ def exportKanaldaten(iface, dynafile, template_dyna, dbQK, dynabef_choice, dynap
 
     # Schreiben der DYNA-Datei ------------------------------------------------------------------------
 
-    with open(dynafile, 'w') as df:
-
-        typ05 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 05 erreicht
-        typ12 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 12 erreicht
-        typ16 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 16 erreicht
-        typ41 = False                  # markiert, ob in der Vorlagedatei Block mit Datentyp 41 erreicht
-
-        # Die nachfolgende Schleife durchläuft das DYNA-Template in der Liste "dynatemplate", schreibt die 
-        # Standardzeilen. An den Stellen, an denen in der Vorlage Daten eingefügt und gegebenfalls in der
-        # Vorlage vorhandene Daten übersprungen werden müssen, sind entsprechende Blöcke eingefügt.
-        # Diese sind durch Flags gekennzeichnet, z.B. typ05
-
-        for z in dynatemplate:
-
-            if z[:2] == '##':
-                # Kommentarzeilen werden geschrieben, solange keine Blöcke aktiv sind
-                df.write(z)
-                continue
+    param12 = (dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidung, dynaprof_choice, dynabef_choice,
+               dynaprof_nam, dynaprof_key)
 
-            # Schreiben des aktiven Datenblocks
-
-            # Block Typ05
-            if typ05:
-                if z[:2] == '++':
-                    # Sobald nächster Block erreicht, ist Typ05 beendet
-                    # Jetzt werden alle neuen Typ-05-Datensätze geschrieben
-                    for id, mat, kb in zip(dynakeys_id, dynakeys_mat, dynakeys_ks):
-                        df.write(u'05 {id:1s} {mat:4s} {sp:10.6f}{kb:10.6f}{ks:10.6f}\n'.format(id=id[:1], mat=mat[:4], sp=0, kb=kb, ks=0).replace('  0.000000','          '))
-                    typ05 = False
-                    df.write(z)
+    if je_teilgebiet:
+        # Die Datensätze aller Teilgebiete werden zuerst erzeugt und danach in die Dateien geschrieben
+        ergebnisse = _teilgebiete_exportieren(dbQK, liste_teilgebiete, param12, prozesse, mit_cache)
+        if ergebnisse is None:
+            return False
+        progress_bar.setValue(80)
 
-            # Block Typ12
-            elif typ12:
-                if z[:2] == '++':
-                    # Sobald nächster Block erreicht, ist Typ12 beendet
-                    # Jetzt werden alle neuen Typ-12-Datensätze geschrieben
-                    if not write12(dbQK, df, dynakeys_id, dynakeys_ks, mindestflaeche, mit_verschneidung, 
-                                    dynaprof_choice, dynabef_choice, dynaprof_nam, dynaprof_key, 
-                                    ausw_and, auswahl):
-                        return False
-                    typ12 = False
-                    df.write(z)
+        for teilgebiet, datei in dateien:
+            def schreiben(satzart, df, bloecke=ergebnisse[teilgebiet]):
+                df.write(bloecke[satzart])
+                return True
 
-            # Block Typ16
-            elif typ16:
-                if z[:2] == '++':
-                    # Sobald nächster Block erreicht, ist Typ16 beendet
-                    # Jetzt werden alle neuen Typ-16-Datensätze geschrieben
-                    if not write16(dbQK, df, ausw_and, auswahl):
-                        return False
-                    typ16 = False
-                    df.write(z)
-                elif z[6:8] != '  ':
-                    df.write(z)                             # Bauwerksverknüpfungen
-            # Block Typ41
-            elif typ41:
-                if z[:2] == '++':
-                    # Sobald nächster Block erreicht, ist Typ41 beendet
-                    # Jetzt werden alle neuen Typ-41-Datensätze geschrieben
-                    if not write41(dbQK, df, ausw_and, auswahl):
-                        return False
-                    typ41 = False
-                    df.write(z)
+            if not _dynadatei_schreiben(datei, dynatemplate, dynakeys_id, dynakeys_mat, dynakeys_ks, schreiben):
+                return False
+    else:
+        def schreiben(satzart, df, dbQK=dbQK):
+            if satzart == u'12':
+                return write12(dbQK, df, *(param12 + (ausw_and, auswahl)), mit_cache=mit_cache)
+            elif satzart == u'16':
+                return write16(dbQK, df, ausw_and, auswahl)
             else:
-                # Allgemeine Zeilen werden direkt aus der Templatedatei geschrieben
-                df.write(z)
-
-
-            # Aktivierung der Datenblöcke
+                return write41(dbQK, df, ausw_and, auswahl)
 
-            if z[:6] == '++SCHL':
-                # Block Typ05 beginnt: "Schlüsseltabellen für Rauheit, Material und Regenspende"
-                typ05 = True
-                # df.write(z)
-                continue
-            elif z[:6] == '++KANA':
-                # Block Typ12 beginnt: "Haltungs- und Flächendaten"
-                typ12 = True
-                # df.write(z)
-                continue
-            elif z[:6] == '++NETZ':
-                # Block Typ16 beginnt: "Verzweigungen und Endschächte"
-                typ16 = True
-                # df.write(z)
-                continue
-            elif z[:6] == '++DECK':
-                # Block Typ41 beginnt: "Verzweigungen und Endschächte"
-                typ41 = True
-                # df.write(z)
-                continue
+        if not _dynadatei_schreiben(dynafile, dynatemplate, dynakeys_id, dynakeys_mat, dynakeys_ks, schreiben):
+            return False
 
     del dbQK
 
@@ -48,6 +48,7 @@ import pyspatialite.dbapi2 as splite
 import xml.etree.ElementTree as ET
 import logging
 
+from qkan.database import geoblob
 from qkan.database.dbfunc import DBConnection
 from qkan.database.qkan_utils import fortschritt, fehlermeldung, evalNodeTypes
 
@@ -274,604 +275,531 @@ def importKanaldaten(dynafile, database_QKan, projectfile, epsg, dbtyp = 'Spatia
     # abflspendelis = {}             # Wird aus der dyna-Datei gelesen
 
 
-    # ------------------------------------------------------------------------------
-    # Vorverarbeitung der überhaupt nicht Datenbank kopatiblen Datenstruktur aus DYNA...
-
-    # Einlesen der DYNA-Datei
-
-    status_einw = False
-
-    sqllist = [
-        u"""CREATE TABLE IF NOT EXISTS dyna12 (
-           pk INTEGER PRIMARY KEY AUTOINCREMENT,
-           ID INTEGER,
-           IDob INTEGER,
-           IDun INTEGER,
-           kanalnummer TEXT,
-           haltungsnummer TEXT,
-           laenge REAL,
-           deckeloben REAL,
-           sohleoben REAL,
-           sohleunten REAL,
-           schdmoben REAL,
-           material INTEGER,
-           profil_key TEXT,
-           hoehe REAL,
-           ks_key INTEGER,
-           flaeche REAL,
-           flaecheund TEXT,
-           flaechenid TEXT,
-           neigkl INTEGER,
-           entwart_nr INTEGER,
-           simstatus_nr INTEGER,
-           haeufigkeit INTEGER,
-           typ INTEGER,
-           schoben TEXT,
-           schunten TEXT,
-           xob REAL,
-           yob REAL,
-           strschluessel TEXT)""",
-        u"""CREATE TABLE IF NOT EXISTS dyna41 (
-           pk INTEGER PRIMARY KEY AUTOINCREMENT,
-           schnam TEXT,
-           deckelhoehe REAL,
-           xkoor REAL,
-           ykoor REAL,
-           kanalnummer TEXT,
-           haltungsnummer TEXT)""",
-        u"""CREATE TABLE IF NOT EXISTS dynarauheit (
-           pk INTEGER PRIMARY KEY AUTOINCREMENT,
-           ks_key TEXT,
-           ks REAL)""",
-        u"""CREATE TABLE IF NOT EXISTS dynaprofil (
-           pk INTEGER PRIMARY KEY AUTOINCREMENT,
-           profil_key TEXT,
-           profilnam TEXT,
-           breite REAL,
-           hoehe REAL)"""]
+    # Der gesamte Import wird in einer Transaktion ausgeführt und nur einmal gespeichert. Bei 
+    # einem Fehler wird er vollständig zurückgerollt. Die räumlichen Indizes von haltungen und
+    # schaechte werden erst am Ende in einem Durchgang aufgebaut.
+
+    with dbQK.massenladen([u'haltungen', u'schaechte'], u'importKanaldaten') as ta:
+
+        # ------------------------------------------------------------------------------
+        # Vorverarbeitung der überhaupt nicht Datenbank kopatiblen Datenstruktur aus DYNA...
+
+        # Einlesen der DYNA-Datei
+
+        status_einw = False
+
+        # Die DYNA-Daten werden zunächst in temporäre Tabellen eingelesen, die nur für die Dauer der
+        # Datenbankverbindung existieren und die Projektdatenbank nicht vergrößern. Frühere Versionen
+        # haben diese Tabellen dauerhaft in der Projektdatenbank angelegt. Sie werden hier entfernt, 
+        # da ihr Inhalt bei einem erneuten Import zu fehlerhaften Daten führen würde. 
+
+        for tab in (u'dyna12', u'dyna41', u'dynarauheit', u'dynaprofil'):
+            sql = u'DROP TABLE IF EXISTS main.{tab}'.format(tab=tab)
+            if not dbQK.sql(sql, u'importkanaldaten_dyna drop tab_typ12'):
+                return None
+            sql = u'DROP TABLE IF EXISTS temp.{tab}'.format(tab=tab)
+            if not dbQK.sql(sql, u'importkanaldaten_dyna drop tab_typ12'):
+                return None
+
+        sqllist = [
+            u"""CREATE TEMP TABLE dyna12 (
+               pk INTEGER PRIMARY KEY AUTOINCREMENT,
+               ID INTEGER,
+               IDob INTEGER,
+               IDun INTEGER,
+               kanalnummer TEXT,
+               haltungsnummer TEXT,
+               laenge REAL,
+               deckeloben REAL,
+               sohleoben REAL,
+               sohleunten REAL,
+               schdmoben REAL,
+               material INTEGER,
+               profil_key TEXT,
+               hoehe REAL,
+               ks_key INTEGER,
+               flaeche REAL,
+               flaecheund TEXT,
+               flaechenid TEXT,
+               neigkl INTEGER,
+               entwart_nr INTEGER,
+               simstatus_nr INTEGER,
+               haeufigkeit INTEGER,
+               typ INTEGER,
+               schoben TEXT,
+               schunten TEXT,
+               xob REAL,
+               yob REAL,
+               strschluessel TEXT)""",
+            u"""CREATE TEMP TABLE dyna41 (
+               pk INTEGER PRIMARY KEY AUTOINCREMENT,
+               schnam TEXT,
+               deckelhoehe REAL,
+               xkoor REAL,
+               ykoor REAL,
+               kanalnummer TEXT,
+               haltungsnummer TEXT)""",
+            u"""CREATE TEMP TABLE dynarauheit (
+               pk INTEGER PRIMARY KEY AUTOINCREMENT,
+               ks_key TEXT,
+               ks REAL)""",
+            u"""CREATE TEMP TABLE dynaprofil (
+               pk INTEGER PRIMARY KEY AUTOINCREMENT,
+               profil_key TEXT,
+               profilnam TEXT,
+               breite REAL,
+               hoehe REAL)"""]
 
     
-    for sql in sqllist:
-        if not dbQK.sql(sql, u'importkanaldaten_dyna create tab_typ12'):
-            return None
+        for sql in sqllist:
+            if not dbQK.sql(sql, u'importkanaldaten_dyna create tab_typ12'):
+                return None
 
-    # Initialisierung von Parametern für die nachfolgende Leseschleife
-
-    kanalnummer_vor = ''            # um bei doppelten Haltungsdatensätzen diese nur einmal zu lesen. 
-    haltungnummer_vor = ''          # Erläuterung: Die doppelten Haltungsdatensätze tauchen in DYNA immer dann
-                                    # auf, wenn mehrere Zuflüsse angegeben werden müssen. 
-
-    # Initialisierungen für Profile
-    profilmodus = -1       # -1: Nicht im Profilblock, Nächste Zeile ist bei:
-                           #  0: Bezeichnung des gesamten Profile-Blocks. 
-                           #  1: Profilname, Koordinaten, nächster Block oder Ende
-                           #  2: Profilnr.
-                           #  3: Erste Koordinaten des Querprofils
-
-    x1 = y1 = None   # markiert, dass noch kein Profil eingelesen wurde (s. u.)
-
-    for zeile in open(dynafile):
-        if zeile[0:2] == '##':
-            continue                # Kommentarzeile wird übersprungen
-
-        # Zuerst werden Abschnitte mit besonderen Daten bearbeitet (Profildaten etc.)
-        if profilmodus >= 0:
-            if profilmodus == 0:
-                # Bezeichnung des gesamten Profile-Blocks. Wird nicht weiter verwendet
-                profilmodus = 1
-                grenzen = rahmen()              # Grenzen-Objekt erstellen
-                continue
-            elif profilmodus == 2:
-                # Profilnr.
-
-                profil_key = zeile.strip()
-                profilmodus = 3
-                continue
-            elif profilmodus == 3:
-                # Erster Profilpunkt
-                werte = zeile.strip()[1:-2].replace(')(',',').replace(')',',').split(',')
-                if len(werte) != 2:
-                    logger.error('Erste Zeile von Profil {} ist keine Punktkoordinate: {}'.format(
-                        profilnam, zeile))
-                xp, yp = [float(w) for w in werte]
-                grenzen.reset(xp, yp)
-
-                plmodus = 'Linie'  # Alternative: 'Kreis'
-                profilmodus = 1
-                x1, y1 = xp, yp             # Punkt als Startpunkt für nächstes Teilstück speichern
-                continue
-            elif profilmodus == 1:
-                # weitere Profilpunkte, nächstes Profil oder Ende der Profile
-                if zeile[0:1] == '(':
-                    # profilmodus == 1, weitere Profilpunkte
-                    werte = zeile.strip()[1:-2].replace(')(',',').replace(')',',').split(',')
-                    nargs = len(werte)
-
-                    if nargs == 2:
-                        # Geradensegment
-                        xp, yp = [float(w) for w in werte]
-                        grenzen.line(x1, y1, xp, yp)            # Grenzen aktualisieren
-                        x1, y1 = xp, yp                         # Punkt als Startpunkt für nächstes Teilstück speichern
-
-                    elif nargs == 3:
-                        # Polyliniensegment mit Radius und Endpunkt
-                        xp, yp, radius = [float(w) for w in werte]
-                        grenzen.line(x1, y1, xp, yp)            # Grenzen mit Stützstellen aktualisieren
-                        grenzen.ppr(x1, y1, xp, yp, radius)     # Grenzen für äußeren Punkt des Bogens aktualisieren
-                        x1, y1 = xp, yp                         # Punkt als Startpunkt für nächstes Teilstück speichern
-
-                    elif nargs == 4:
-                        # Polyliniensegment mit Punkt auf Bogen und Endpunkt
-                        xm, ym, xp, yp = [float(w) for w in werte]
-                        grenzen.line(x1, y1, xm, ym)            # Grenzen mit Stützstellen aktualisieren
-                        grenzen.p(xp, yp)                       # Grenzen mit Stützstellen aktualisieren
-                        grenzen.ppp(x1, y1, xm, ym, xp, yp)     # Grenzen für äußere Punkte des Bogens aktualisieren
-                        x1, y1 = xp, yp                         # Punkt als Startpunkt für nächstes Teilstück speichern
+        # Initialisierung von Parametern für die nachfolgende Leseschleife
+
+        kanalnummer_vor = ''            # um bei doppelten Haltungsdatensätzen diese nur einmal zu lesen. 
+        haltungnummer_vor = ''          # Erläuterung: Die doppelten Haltungsdatensätze tauchen in DYNA immer dann
+                                        # auf, wenn mehrere Zuflüsse angegeben werden müssen. 
+
+        # Initialisierungen für Profile
+        profilmodus = -1       # -1: Nicht im Profilblock, Nächste Zeile ist bei:
+                               #  0: Bezeichnung des gesamten Profile-Blocks. 
+                               #  1: Profilname, Koordinaten, nächster Block oder Ende
+                               #  2: Profilnr.
+                               #  3: Erste Koordinaten des Querprofils
+
+        x1 = y1 = None   # markiert, dass noch kein Profil eingelesen wurde (s. u.)
+
+        # Die gelesenen Datensätze werden gesammelt und nach der Leseschleife mit executemany
+        # geschrieben, so dass jede INSERT-Abfrage nur einmal übersetzt wird.
+        datenprofil = []
+        datenrauheit = []
+        daten12 = []
+        daten41 = []
+
+        for zeile in codecs.open(dynafile, 'r', 'iso-8859-1'):
+            if zeile[0:2] == '##':
+                continue                # Kommentarzeile wird übersprungen
+
+            # Zuerst werden Abschnitte mit besonderen Daten bearbeitet (Profildaten etc.)
+            if profilmodus >= 0:
+                if profilmodus == 0:
+                    # Bezeichnung des gesamten Profile-Blocks. Wird nicht weiter verwendet
+                    profilmodus = 1
+                    grenzen = rahmen()              # Grenzen-Objekt erstellen
+                    continue
+                elif profilmodus == 2:
+                    # Profilnr.
 
+                    profil_key = zeile.strip()
+                    profilmodus = 3
                     continue
-                else:
-                    # Nächstes Profil oder Ende Querprofile (=Ende des aktuellen Profils)
-
-                    # Beschriftung des Profils. Grund: Berechnung von Breite und Höhe ist erst nach
-                    # Einlesen aller Profilzeilen möglich.
-
-                    # Erst wenn das erste Profil eingelesen wurde
-                    if x1 is not None:
-                        # Höhe zu Breite-Verhältnis berechnen
-                        breite = (grenzen.xmax - grenzen.xmin)/1000.
-                        hoehe = (grenzen.ymax - grenzen.ymin)/1000.
-                        sql = u'''INSERT INTO dynaprofil (profil_key, profilnam, breite, hoehe) 
-                                      VALUES ('{key}', '{nam}', {br}, {ho})'''.format(
-                                      key=profil_key, nam=profilnam, br=breite, ho=hoehe)
-                        logger.debug(u'sql = {}'.format(sql))
-                        if not dbQK.sql(sql, u'importkanaldaten_kp (1)'):
-                            return None
-
-                    if zeile[0:2] != '++':
-                        # Profilname
-                        profilnam = zeile.strip()
-                        profilmodus = 2
+                elif profilmodus == 3:
+                    # Erster Profilpunkt
+                    werte = zeile.strip()[1:-2].replace(')(',',').replace(')',',').split(',')
+                    if len(werte) != 2:
+                        logger.error('Erste Zeile von Profil {} ist keine Punktkoordinate: {}'.format(
+                            profilnam, zeile))
+                    xp, yp = [float(w) for w in werte]
+                    grenzen.reset(xp, yp)
+
+                    plmodus = 'Linie'  # Alternative: 'Kreis'
+                    profilmodus = 1
+                    x1, y1 = xp, yp             # Punkt als Startpunkt für nächstes Teilstück speichern
+                    continue
+                elif profilmodus == 1:
+                    # weitere Profilpunkte, nächstes Profil oder Ende der Profile
+                    if zeile[0:1] == '(':
+                        # profilmodus == 1, weitere Profilpunkte
+                        werte = zeile.strip()[1:-2].replace(')(',',').replace(')',',').split(',')
+                        nargs = len(werte)
+
+                        if nargs == 2:
+                            # Geradensegment
+                            xp, yp = [float(w) for w in werte]
+                            grenzen.line(x1, y1, xp, yp)            # Grenzen aktualisieren
+                            x1, y1 = xp, yp                         # Punkt als Startpunkt für nächstes Teilstück speichern
+
+                        elif nargs == 3:
+                            # Polyliniensegment mit Radius und Endpunkt
+                            xp, yp, radius = [float(w) for w in werte]
+                            grenzen.line(x1, y1, xp, yp)            # Grenzen mit Stützstellen aktualisieren
+                            grenzen.ppr(x1, y1, xp, yp, radius)     # Grenzen für äußeren Punkt des Bogens aktualisieren
+                            x1, y1 = xp, yp                         # Punkt als Startpunkt für nächstes Teilstück speichern
+
+                        elif nargs == 4:
+                            # Polyliniensegment mit Punkt auf Bogen und Endpunkt
+                            xm, ym, xp, yp = [float(w) for w in werte]
+                            grenzen.line(x1, y1, xm, ym)            # Grenzen mit Stützstellen aktualisieren
+                            grenzen.p(xp, yp)                       # Grenzen mit Stützstellen aktualisieren
+                            grenzen.ppp(x1, y1, xm, ym, xp, yp)     # Grenzen für äußere Punkte des Bogens aktualisieren
+                            x1, y1 = xp, yp                         # Punkt als Startpunkt für nächstes Teilstück speichern
+
                         continue
                     else:
-                        # Ende Block Querprofile (es sind mehrere möglich!)
-                        profilmodus = -1
-                        x1 = y1 = None
-
-        # Optionen und Daten
-        if zeile[0:6] == u'++QUER':
-            profilmodus = 0
-
-        elif zeile[0:6] == u'++KANA' and not status_einw:
-            status_einw = (u'EINW' in zeile)
-
-        elif zeile[0:2] == u'05':
-            ks_key = zeile[3:4].strip()
-            abflspende = float('0'+zeile[10:20].strip())
-            ks = float('0'+zeile[20:30].strip())
-
-            sql = u'''INSERT INTO dynarauheit (ks_key, ks) 
-                      Values ('{ks_key}', {ks})'''.format(
-                      ks_key=ks_key, ks=ks)
-            if not dbQK.sql(sql, u'importkanaldaten_kp (2)'):
-                return None
+                        # Nächstes Profil oder Ende Querprofile (=Ende des aktuellen Profils)
 
-        elif zeile[0:2] == u'12':
+                        # Beschriftung des Profils. Grund: Berechnung von Breite und Höhe ist erst nach
+                        # Einlesen aller Profilzeilen möglich.
 
-            n = 1
-            kanalnummer = zeile[6:14].lstrip('0 ').replace(' ', '0');  n = 3  # wegen der merkwürdigen DYNA-Logik für Kanalnamen
-            haltungsnummer = str(int('0' + zeile[14:17].strip()));  n = 4
-            if (kanalnummer, haltungsnummer) != (kanalnummer_vor, haltungnummer_vor):
-                kanalnummer_vor, haltungnummer_vor = kanalnummer, haltungsnummer        # doppelte Haltungen werden übersprungen, weil Flächen-
-                                                                                        # daten z.Zt. nicht eingelesen werden. 
-                try:
-                    strschluessel = zeile[2:6].strip();  n = 2
-                    laenge = zahl(zeile[17:24], 2);  n = 5
-                    deckeloben = zahl(zeile[24:31], 3);  n = 6
-                    sohleoben = zahl(zeile[31:38], 3);  n = 7
-                    sohleunten = zahl(zeile[38:45], 3);  n = 8
-                    material = zeile[45:46];  n = 9
-                    profil_key = zeile[46:48].strip();  n = 10
-                    hoehe = zahl(zeile[48:52], 0)/1000.;  n = 11
-                    ks_key = zeile[52:53].strip();  n = 12
-                    flaeche = zahl(zeile[71:76], 2) * 10000.;  n = 20
-                    flaecheund = round(zahl(zeile[53:55]) / 100. * flaeche, 1);  n = 13
-                    qgewerbeind = zeile[55:56].strip();  n = 14
-                    qfremdind = zeile[56:57].strip();  n = 15
-                    zuflussid = zeile[57:58];  n = 16
-                    qzu = zahl(zeile[58:63], 1);  n = 17
-                    if status_einw:
-                        ew = zahl(zeile[63:66]);    n = 18
-                    else:
-                        ew = zahl(zeile[63:66]) * flaeche / 10000.
-                    flaechenid = zeile[66:71];  n = 19
-                    neigkl = int('0' + zeile[76:77].strip());  n = 21
-                    entwart_nr = int('0' + zeile[77:78].strip());  n = 22
-                    simstatus_nr = int('0' + zeile[78:79].strip());  n = 23
-                    haeufigkeit = int('0' + zeile[80:81].strip());  n = 24
-                    schoben = zeile[81:93].strip();  n = 25
-                    schunten = zeile[94:106].strip();  n = 26
-                    xob = zahl(zeile[106:120]);  n = 27
-                    yob = zahl(zeile[120:134]);  n = 28
-                    schdmoben = zahl(zeile[180:187])
-                except BaseException as err:
-                    fehlermeldung(u"Programmfehler",u"import_from_dyna.importKanaldaten (1)")
-                    logger.error(u'12er: Wert Nr. {} - {}\nZeile: {}'.format(n, err, zeile))
-                    del dbQK
-                    return None
+                        # Erst wenn das erste Profil eingelesen wurde
+                        if x1 is not None:
+                            # Höhe zu Breite-Verhältnis berechnen
+                            breite = (grenzen.xmax - grenzen.xmin)/1000.
+                            hoehe = (grenzen.ymax - grenzen.ymin)/1000.
+                            datenprofil.append((profil_key, profilnam, breite, hoehe))
 
-                try:
-                    sql = u"""INSERT INTO dyna12
-                    ( kanalnummer, haltungsnummer, schoben, schunten,
-                      xob, yob, laenge, deckeloben, sohleoben, sohleunten,
-                      material, profil_key, hoehe, ks_key, flaeche, flaecheund, neigkl,
-                      entwart_nr, simstatus_nr, 
-                      flaechenid, strschluessel, haeufigkeit, schdmoben)
-                    VALUES ('{kanalnummer}', '{haltungsnummer}', '{schoben}', '{schunten}',
-                      {xob}, {yob}, {laenge}, {deckeloben}, {sohleoben}, {sohleunten},
-                      '{material}', '{profil_key}', {hoehe}, '{ks_key}', {flaeche}, {flaecheund}, {neigkl},
-                      {entwart_nr}, {simstatus_nr},
-                      '{flaechenid}', '{strschluessel}', {haeufigkeit}, {schdmoben})""".format(
-                        kanalnummer=kanalnummer, haltungsnummer=haltungsnummer,
-                        schoben=schoben, schunten=schunten, xob=xob, yob=yob,
-                        laenge=laenge, deckeloben=deckeloben, sohleoben=sohleoben,
-                        sohleunten=sohleunten, material=material, profil_key=profil_key,
-                        hoehe=hoehe, ks_key=ks_key, flaeche=flaeche, flaecheund=flaecheund,
-                        neigkl=neigkl, entwart_nr=entwart_nr, simstatus_nr=simstatus_nr,
-                        flaechenid=flaechenid, strschluessel=strschluessel,
-                        haeufigkeit=haeufigkeit, schdmoben=schdmoben)
+                        if zeile[0:2] != '++':
+                            # Profilname
+                            profilnam = zeile.strip()
+                            profilmodus = 2
+                            continue
+                        else:
+                            # Ende Block Querprofile (es sind mehrere möglich!)
+                            profilmodus = -1
+                            x1 = y1 = None
 
-                except BaseException as err:
-                    logger.error('12er: {}\n{}'.format(err, zeile))
-                if not dbQK.sql(sql, u'importkanaldaten_dyna import typ12'):
-                    return None
+            # Optionen und Daten
+            if zeile[0:6] == u'++QUER':
+                profilmodus = 0
 
+            elif zeile[0:6] == u'++KANA' and not status_einw:
+                status_einw = (u'EINW' in zeile)
 
-        elif zeile[0:2] == u'41':
+            elif zeile[0:2] == u'05':
+                ks_key = zeile[3:4].strip()
+                abflspende = float('0'+zeile[10:20].strip())
+                ks = float('0'+zeile[20:30].strip())
+
+                datenrauheit.append((ks_key, ks))
+
+            elif zeile[0:2] == u'12':
 
-            try:
                 n = 1
-                kanalnummer = zeile[6:14].lstrip('0 ').replace(' ', '0');    n = 2  # wegen der eigenwilligen DYNA-Logik für Kanalnamen;
-                haltungsnummer = zeile[14:17];    n = 3
-                deckelhoehe = zahl(zeile[24:31],3);    n = 4
-                xkoor = zahl(zeile[31:45],0);    n = 5
-                ykoor = zahl(zeile[45:59],0);    n = 6
-                schnam = zeile[59:71].strip();    n = 7
-            except BaseException as err:
-                logger.error(u'16er: Wert Nr. {} - {}\nZeile: {}'.format(n, err, zeile))
-                return False
+                kanalnummer = zeile[6:14].lstrip('0 ').replace(' ', '0');  n = 3  # wegen der merkwürdigen DYNA-Logik für Kanalnamen
+                haltungsnummer = str(int('0' + zeile[14:17].strip()));  n = 4
+                if (kanalnummer, haltungsnummer) != (kanalnummer_vor, haltungnummer_vor):
+                    kanalnummer_vor, haltungnummer_vor = kanalnummer, haltungsnummer        # doppelte Haltungen werden übersprungen, weil Flächen-
+                                                                                            # daten z.Zt. nicht eingelesen werden. 
+                    try:
+                        strschluessel = zeile[2:6].strip();  n = 2
+                        laenge = zahl(zeile[17:24], 2);  n = 5
+                        deckeloben = zahl(zeile[24:31], 3);  n = 6
+                        sohleoben = zahl(zeile[31:38], 3);  n = 7
+                        sohleunten = zahl(zeile[38:45], 3);  n = 8
+                        material = zeile[45:46];  n = 9
+                        profil_key = zeile[46:48].strip();  n = 10
+                        hoehe = zahl(zeile[48:52], 0)/1000.;  n = 11
+                        ks_key = zeile[52:53].strip();  n = 12
+                        flaeche = zahl(zeile[71:76], 2) * 10000.;  n = 20
+                        flaecheund = round(zahl(zeile[53:55]) / 100. * flaeche, 1);  n = 13
+                        qgewerbeind = zeile[55:56].strip();  n = 14
+                        qfremdind = zeile[56:57].strip();  n = 15
+                        zuflussid = zeile[57:58];  n = 16
+                        qzu = zahl(zeile[58:63], 1);  n = 17
+                        if status_einw:
+                            ew = zahl(zeile[63:66]);    n = 18
+                        else:
+                            ew = zahl(zeile[63:66]) * flaeche / 10000.
+                        flaechenid = zeile[66:71];  n = 19
+                        neigkl = int('0' + zeile[76:77].strip());  n = 21
+                        entwart_nr = int('0' + zeile[77:78].strip());  n = 22
+                        simstatus_nr = int('0' + zeile[78:79].strip());  n = 23
+                        haeufigkeit = int('0' + zeile[80:81].strip());  n = 24
+                        schoben = zeile[81:93].strip();  n = 25
+                        schunten = zeile[94:106].strip();  n = 26
+                        xob = zahl(zeile[106:120]);  n = 27
+                        yob = zahl(zeile[120:134]);  n = 28
+                        schdmoben = zahl(zeile[180:187])
+                    except BaseException as err:
+                        fehlermeldung(u"Programmfehler",u"import_from_dyna.importKanaldaten (1)")
+                        logger.error(u'12er: Wert Nr. {} - {}\nZeile: {}'.format(n, err, zeile))
+                        ta.verwerfen()
+                        return None
+
+                    daten12.append((kanalnummer, haltungsnummer, schoben, schunten,
+                                    xob, yob, laenge, deckeloben, sohleoben, sohleunten,
+                                    material, profil_key, hoehe, ks_key, flaeche, flaecheund, neigkl,
+                                    entwart_nr, simstatus_nr,
+                                    flaechenid, strschluessel, haeufigkeit, schdmoben))
+
+
+            elif zeile[0:2] == u'41':
 
-            try:
-                sql = u"""INSERT INTO dyna41
-                ( schnam, deckelhoehe, xkoor, ykoor, kanalnummer, haltungsnummer)
-                VALUES ('{schnam}', {deckelhoehe}, {xkoor}, {ykoor}, 
-                  '{kanalnummer}', '{haltungsnummer}')""".format(
-                    schnam=schnam, deckelhoehe=deckelhoehe, xkoor=xkoor, ykoor=ykoor, 
-                    kanalnummer=kanalnummer, haltungsnummer=haltungsnummer)
+                try:
+                    n = 1
+                    kanalnummer = zeile[6:14].lstrip('0 ').replace(' ', '0');    n = 2  # wegen der eigenwilligen DYNA-Logik für Kanalnamen;
+                    haltungsnummer = zeile[14:17];    n = 3
+                    deckelhoehe = zahl(zeile[24:31],3);    n = 4
+                    xkoor = zahl(zeile[31:45],0);    n = 5
+                    ykoor = zahl(zeile[45:59],0);    n = 6
+                    schnam = zeile[59:71].strip();    n = 7
+                except BaseException as err:
+                    logger.error(u'16er: Wert Nr. {} - {}\nZeile: {}'.format(n, err, zeile))
+                    ta.verwerfen()
+                    return False
 
-            except BaseException as err:
-                logger.error(u'16er: {}\n{}'.format(err, zeile))
-            if not dbQK.sql(sql, u'importkanaldaten_dyna typ16'):
-                return None
+                daten41.append((schnam, deckelhoehe, xkoor, ykoor, kanalnummer, haltungsnummer))
 
 
-    # ------------------------------------------------------------------------------
-    # Profile aus DYNA-Datei in Tabelle profile ergänzen
-    # 1. Bei Namenskonflikten mit bereits gespeicherten Profilen wird die kp_key auf NULL gesetzt
+        sql = u'''INSERT INTO dynaprofil (profil_key, profilnam, breite, hoehe) 
+                  VALUES (?, ?, ?, ?)'''
+        if not dbQK.executemany(sql, datenprofil, u'importkanaldaten_kp (1)'):
+            return None
 
-    sql = u'''UPDATE profile 
-        SET kp_key = NULL
-        WHERE profilnam IN 
-        (   SELECT profilnam
-            FROM dynaprofil
-            WHERE profile.profilnam = dynaprofil.profilnam and profile.kp_key <> dynaprofil.profil_key)'''
+        sql = u'''INSERT INTO dynarauheit (ks_key, ks) 
+                  VALUES (?, ?)'''
+        if not dbQK.executemany(sql, datenrauheit, u'importkanaldaten_kp (2)'):
+            return None
 
-    if not dbQK.sql(sql, 'importkanaldaten_dyna profile-1'):
-        return None
+        sql = u"""INSERT INTO dyna12
+                ( kanalnummer, haltungsnummer, schoben, schunten,
+                  xob, yob, laenge, deckeloben, sohleoben, sohleunten,
+                  material, profil_key, hoehe, ks_key, flaeche, flaecheund, neigkl,
+                  entwart_nr, simstatus_nr, 
+                  flaechenid, strschluessel, haeufigkeit, schdmoben)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+        if not dbQK.executemany(sql, daten12, u'importkanaldaten_dyna import typ12'):
+            return None
 
-    # 2. Neue Profile aus DYNA hinzufügen
+        sql = u"""INSERT INTO dyna41
+                ( schnam, deckelhoehe, xkoor, ykoor, kanalnummer, haltungsnummer)
+                VALUES (?, ?, ?, ?, ?, ?)"""
+        if not dbQK.executemany(sql, daten41, u'importkanaldaten_dyna typ16'):
+            return None
 
-    sql = u'''INSERT INTO profile 
-        (profilnam, kp_key)
-        SELECT profilnam, profil_key
-        FROM dynaprofil
-        WHERE profil_key not in 
-        (   SELECT kp_key 
-            FROM profile)'''
+        # ------------------------------------------------------------------------------
+        # Indizes auf die Verknüpfungsattribute der temporären Tabellen. Sie werden erst nach dem 
+        # Einlesen erstellt, weil dies schneller ist als die laufende Aktualisierung. 
+
+        sqllist = [
+            u"CREATE INDEX temp.dyna12_schoben ON dyna12 (schoben)",
+            u"CREATE INDEX temp.dyna12_schunten ON dyna12 (schunten)",
+            u"CREATE INDEX temp.dyna12_haltung ON dyna12 (kanalnummer, haltungsnummer)",
+            u"CREATE INDEX temp.dyna41_schnam ON dyna41 (schnam)",
+            u"CREATE INDEX temp.dynarauheit_ks_key ON dynarauheit (ks_key)",
+            u"CREATE INDEX temp.dynaprofil_profil_key ON dynaprofil (profil_key)",
+            u"CREATE INDEX temp.dynaprofil_profilnam ON dynaprofil (profilnam)"]
+
+        for sql in sqllist:
+            if not dbQK.sql(sql, u'importkanaldaten_dyna create index'):
+                return None
 
-    if not dbQK.sql(sql, 'importkanaldaten_dyna profile-2'):
-        return None
+        # ------------------------------------------------------------------------------
+        # Profile aus DYNA-Datei in Tabelle profile ergänzen
+        # 1. Bei Namenskonflikten mit bereits gespeicherten Profilen wird die kp_key auf NULL gesetzt
 
+        sql = u'''UPDATE profile 
+            SET kp_key = NULL
+            WHERE profilnam IN 
+            (   SELECT profilnam
+                FROM dynaprofil
+                WHERE profile.profilnam = dynaprofil.profilnam and profile.kp_key <> dynaprofil.profil_key)'''
 
-    # ------------------------------------------------------------------------------
-    # Haltungsdaten
-
-    # Tabelle in QKan-Datenbank leeren
-    # if check_tabinit:
-        # sql = """DELETE FROM haltungen"""
-        # if not dbQK.sql(sql, 'importkanaldaten_dyna (6)'):
-            # return None
-
-    # Daten aUS temporären DYNA-Tabellen abfragen
-    sql = u'''
-        SELECT 
-            printf('%s-%s', dyna12.kanalnummer, dyna12.haltungsnummer) AS haltnam, 
-            dyna12.schoben AS schoben, 
-            dyna12.schunten AS schunten, 
-            dyna12.hoehe AS hoehe, 
-            dyna12.hoehe*dynaprofil.breite/dynaprofil.hoehe AS breite, 
-            dyna12.laenge AS laenge, 
-            dyna12.sohleoben AS sohleoben, 
-            dyna12.sohleunten AS sohleunten, 
-            dyna12.deckeloben AS deckeloben, 
-            coalesce(dy12un.deckeloben, dyna41.deckelhoehe) as deckelunten, 
-            NULL as teilgebiet, 
-            dynaprofil.profilnam as profilnam, 
-            entwaesserungsarten.bezeichnung as entwart, 
-            dynarauheit.ks as ks, 
-            simulationsstatus.bezeichnung as simstatus, 
-            'DYNA-Import' AS kommentar, 
-            dyna12.xob as xob, 
-            dyna12.yob as yob, 
-            coalesce(dy12un.xob, dyna41.xkoor) as xun, 
-            coalesce(dy12un.yob, dyna41.ykoor) as yun
-        FROM dyna12
-        LEFT JOIN dyna12 AS dy12un
-        ON dyna12.schunten = dy12un.schoben
-        LEFT JOIN dyna41
-        ON dyna12.schunten = dyna41.schnam
-        LEFT JOIN dynarauheit
-        ON dyna12.ks_key = dynarauheit.ks_key
-        LEFT JOIN dynaprofil
-        ON dyna12.profil_key = dynaprofil.profil_key
-        LEFT JOIN simulationsstatus
-        ON dyna12.simstatus_nr = simulationsstatus.kp_nr
-        LEFT JOIN entwaesserungsarten
-        ON dyna12.entwart_nr = entwaesserungsarten.kp_nr
-        GROUP BY dyna12.kanalnummer, dyna12.haltungsnummer'''
-
-    if not dbQK.sql(sql, 'importkanaldaten_dyna (7)'):
-        return None
-    daten = dbQK.fetchall()
+        if not dbQK.sql(sql, 'importkanaldaten_dyna profile-1'):
+            return None
 
-    # Haltungsdaten in die QKan-DB schreiben
+        # 2. Neue Profile aus DYNA hinzufügen
 
-    for attr in daten:
-        (haltnam_ansi, schoben_ansi, schunten_ansi, hoehe, breite, laenge, sohleoben, sohleunten, 
-        deckeloben, deckelunten, teilgebiet, profilnam, 
-        entwart, ks, simstatus, kommentar, xob, yob, xun, yun) = \
-            ['NULL' if el is None else el for el in attr]
+        sql = u'''INSERT INTO profile 
+            (profilnam, kp_key)
+            SELECT profilnam, profil_key
+            FROM dynaprofil
+            WHERE profil_key not in 
+            (   SELECT kp_key 
+                FROM profile)'''
 
-        (haltnam, schoben, schunten) = \
-          [tt.decode('iso-8859-1') for tt in (haltnam_ansi, schoben_ansi, schunten_ansi)]
+        if not dbQK.sql(sql, 'importkanaldaten_dyna profile-2'):
+            return None
 
 
-        # Geo-Objekt erzeugen
+        # ------------------------------------------------------------------------------
+        # Haltungsdaten
 
-        if dbtyp == 'SpatiaLite':
-            geom = u'MakeLine(MakePoint({0:},{1:},{4:s}),MakePoint({2:},{3:},{4:}))'.format(xob, yob, xun, yun, epsg)
-            logger.debug(u'geom = {}'.format(geom))
-        elif dbtyp == 'postgis':
-            geom = u'ST_MakeLine(ST_SetSRID(ST_MakePoint({0:},{1:}),{4:s}),ST_SetSRID(ST_MakePoint({2:},{3:}),{4:}))'.format(xob, yob, xun, yun, epsg)
-        else:
+        # Tabelle in QKan-Datenbank leeren
+        # if check_tabinit:
+            # sql = """DELETE FROM haltungen"""
+            # if not dbQK.sql(sql, 'importkanaldaten_dyna (6)'):
+                # return None
+
+        # Die Geo-Objekte werden direkt als SpatiaLite-Geometrie erzeugt (s. qkan.database.geoblob) und 
+        # zusammen mit den übrigen Attributen als Parameter übergeben. 
+
+        if dbtyp != 'SpatiaLite':
             fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
+                'Datenbanktyp ist fehlerhaft: {0:s}!\nAbbruch!'.format(dbtyp))
+            return None
+
+        srid = int(epsg)
+
+        # Daten aus temporären DYNA-Tabellen abfragen
+        sql = u'''
+            SELECT 
+                printf('%s-%s', dyna12.kanalnummer, dyna12.haltungsnummer) AS haltnam, 
+                dyna12.schoben AS schoben, 
+                dyna12.schunten AS schunten, 
+                dyna12.hoehe AS hoehe, 
+                dyna12.hoehe*dynaprofil.breite/dynaprofil.hoehe AS breite, 
+                dyna12.laenge AS laenge, 
+                dyna12.sohleoben AS sohleoben, 
+                dyna12.sohleunten AS sohleunten, 
+                dyna12.deckeloben AS deckeloben, 
+                coalesce(dy12un.deckeloben, dyna41.deckelhoehe) as deckelunten, 
+                NULL as teilgebiet, 
+                dynaprofil.profilnam as profilnam, 
+                entwaesserungsarten.bezeichnung as entwart, 
+                dynarauheit.ks as ks, 
+                simulationsstatus.bezeichnung as simstatus, 
+                'DYNA-Import' AS kommentar, 
+                dyna12.xob as xob, 
+                dyna12.yob as yob, 
+                coalesce(dy12un.xob, dyna41.xkoor) as xun, 
+                coalesce(dy12un.yob, dyna41.ykoor) as yun
+            FROM dyna12
+            LEFT JOIN dyna12 AS dy12un
+            ON dyna12.schunten = dy12un.schoben
+            LEFT JOIN dyna41
+            ON dyna12.schunten = dyna41.schnam
+            LEFT JOIN dynarauheit
+            ON dyna12.ks_key = dynarauheit.ks_key
+            LEFT JOIN dynaprofil
+            ON dyna12.profil_key = dynaprofil.profil_key
+            LEFT JOIN simulationsstatus
+            ON dyna12.simstatus_nr = simulationsstatus.kp_nr
+            LEFT JOIN entwaesserungsarten
+            ON dyna12.entwart_nr = entwaesserungsarten.kp_nr
+            GROUP BY dyna12.kanalnummer, dyna12.haltungsnummer'''
+
+        zeilen = dbQK.abfrage(sql, 'importkanaldaten_dyna (7)')
+        if zeilen is None:
+            return None
 
-        # Datensatz aufbereiten in die QKan-DB schreiben
+        # Haltungsdaten in die QKan-DB schreiben. Die letzten vier Attribute sind die Koordinaten.
+        # Die Datensätze werden beim Schreiben schrittweise gelesen (s. DBConnection.abfrage).
+        daten = (attr[:16] + (geoblob.linie((attr[16:18], attr[18:20]), srid),) 
+                 for attr in zeilen)
 
-        try:
-            sql = u"""INSERT INTO haltungen 
-                (geom, haltnam, schoben, schunten, 
-                hoehe, breite, laenge, sohleoben, sohleunten, 
-                deckeloben, deckelunten, teilgebiet, profilnam, entwart, ks, simstatus, kommentar) VALUES (
-                {geom}, '{haltnam}', '{schoben}', '{schunten}', {hoehe}, {breite}, {laenge}, 
-                {sohleoben}, {sohleunten}, {deckeloben}, {deckelunten}, '{teilgebiet}', '{profilnam}', 
-                '{entwart}', {ks}, '{simstatus}', '{kommentar}')""".format( \
-                    geom=geom, haltnam=haltnam, schoben=schoben, schunten=schunten, hoehe=hoehe, 
-                    breite=breite, laenge=laenge, sohleoben=sohleoben, sohleunten=sohleunten, 
-                    deckeloben=deckeloben, deckelunten=deckelunten, teilgebiet=teilgebiet, 
-                    profilnam=profilnam, entwart=entwart, ks=ks, simstatus=simstatus, kommentar=kommentar)
-        except BaseException as e:
-            fehlermeldung('SQL-Fehler', str(e))
-            fehlermeldung("Fehler in QKan_Import_from_KP", u"\nFehler in sql INSERT INTO haltungen: \n" + \
-                str((geom, haltnam, schoben, schunten, 
+        sql = u"""INSERT INTO haltungen 
+                (haltnam, schoben, schunten, 
                 hoehe, breite, laenge, sohleoben, sohleunten, 
-                deckeloben, deckelunten, teilgebiet, profilnam, entwart, ks, simstatus)) + '\n\n')
+                deckeloben, deckelunten, teilgebiet, profilnam, entwart, ks, simstatus, kommentar, geom) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
 
-        if not dbQK.sql(sql, 'importkanaldaten_dyna (9a)'):
+        if not dbQK.executemany(sql, daten, 'importkanaldaten_dyna (9a)'):
             return None
 
-    dbQK.commit()
+        dbQK.commit()
 
 
-    # ------------------------------------------------------------------------------
-    # Schachtdaten
-
-
-    # Tabelle in QKan-Datenbank leeren
-    # if check_tabinit:
-        # sql = u'DELETE FROM schaechte'
-        # if not dbQK.sql(sql, 'importkanaldaten_dyna (10)'):
-            # return None
-
-    # Daten aus temporären DYNA-Tabellen abfragen
-    sql = u'''
-        SELECT 
-            dyna12.schoben as schnam,
-            dyna12.xob as xsch, 
-            dyna12.yob as ysch, 
-            dyna12.sohleoben as sohlhoehe, 
-            dyna12.deckeloben as deckelhoehe, 
-            1000 as durchm, 
-            0 as druckdicht, 
-            entwaesserungsarten.bezeichnung as entwart, 
-            simulationsstatus.bezeichnung AS simstat, 
-            'Importiert mit QKan' AS kommentar
-        FROM dyna12
-        LEFT JOIN simulationsstatus
-        ON dyna12.simstatus_nr = simulationsstatus.kp_nr
-        LEFT JOIN entwaesserungsarten
-        ON dyna12.entwart_nr = entwaesserungsarten.kp_nr
-        GROUP BY dyna12.schoben'''
-
-    dbQK.sql(sql)
-    daten = dbQK.fetchall()
-
-    # Schachtdaten aufbereiten und in die QKan-DB schreiben
-
-    for attr in daten:
-        (schnam_ansi, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart, 
-            simstat, kommentar) = ['NULL' if el is None else el for el in attr]
-
-        schnam = schnam_ansi.decode('iso-8859-1')
-
-        # # Entwasserungsarten
-        # if entwart_kp in ref_entwart:
-            # entwart = ref_entwart[entwart_kp]
-        # else:
-            # # Noch nicht in Tabelle [entwaesserungsarten] enthalten, also ergänzen
-            # sql = u"INSERT INTO entwaesserungsarten (bezeichnung, kp_nr) Values ('({0:})', {0:d})".format(entwart_kp)
-            # entwart = u'({:})'.format(entwart_kp)
-            # if not dbQK.sql(sql, 'importkanaldaten_dyna (11)'):
-                # return None
+        # ------------------------------------------------------------------------------
+        # Schachtdaten
+
 
-        # # Simstatus-Nr aus EIN-Datei ersetzten
-        # if simstat_kp in ref_simstat:
-            # simstatus = ref_simstat[simstat_kp]
-        # else:
-            # # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            # simstatus = u'({}_kp)'.format(simstat_kp)
-            # sql = u"INSERT INTO simulationsstatus (bezeichnung, kp_nr) Values ('{simstatus}', {kp_nr})".format( \
-                      # simstatus=simstatus, kp_nr=simstat_kp)
-            # ref_simstat[simstat_kp] = simstatus
-            # if not dbQK.sql(sql, 'importkanaldaten_dyna (12)'):
+        # Tabelle in QKan-Datenbank leeren
+        # if check_tabinit:
+            # sql = u'DELETE FROM schaechte'
+            # if not dbQK.sql(sql, 'importkanaldaten_dyna (10)'):
                 # return None
 
-        # Geo-Objekte erzeugen
+        # Daten aus temporären DYNA-Tabellen abfragen
+        sql = u'''
+            SELECT 
+                dyna12.schoben as schnam,
+                dyna12.xob as xsch, 
+                dyna12.yob as ysch, 
+                dyna12.sohleoben as sohlhoehe, 
+                dyna12.deckeloben as deckelhoehe, 
+                1000 as durchm, 
+                0 as druckdicht, 
+                entwaesserungsarten.bezeichnung as entwart, 
+                'Schacht' AS schachttyp, 
+                simulationsstatus.bezeichnung AS simstat, 
+                'Importiert mit QKan' AS kommentar
+            FROM dyna12
+            LEFT JOIN simulationsstatus
+            ON dyna12.simstatus_nr = simulationsstatus.kp_nr
+            LEFT JOIN entwaesserungsarten
+            ON dyna12.entwart_nr = entwaesserungsarten.kp_nr
+            GROUP BY dyna12.schoben'''
+
+        zeilen = dbQK.abfrage(sql, 'importkanaldaten_dyna (11)')
+        if zeilen is None:
+            return None
 
-        if dbtyp == 'SpatiaLite':
-            geop = u'MakePoint({0:},{1:},{2:})'.format(xsch,ysch,epsg)
-            geom = u'CastToMultiPolygon(MakePolygon(MakeCircle({0:},{1:},{2:},{3:})))'.format(xsch, ysch, 
-                                             (1. if durchm == 'NULL' else durchm/ 1000.) , epsg)
-        elif dbtyp == 'postgis':
-            geop = u'ST_SetSRID(ST_MakePoint({0:},{1:}),{2:})'.format(xsch,ysch,epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz in die QKan-DB schreiben
-
-        try:
-            sql = u"""INSERT INTO schaechte (schnam, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart, 
-                              schachttyp, simstatus, kommentar, geop, geom)
-            VALUES ('{schnam}', {xsch}, {ysch}, {sohlhoehe}, {deckelhoehe}, {durchm}, {druckdicht}, '{entwart}', 
-                     '{schachttyp}', '{simstatus}', '{kommentar}', 
-                     {geop}, {geom})""".format( \
-                     schnam=schnam, xsch=xsch, ysch=ysch, sohlhoehe=sohlhoehe, deckelhoehe=deckelhoehe, 
-                     durchm=durchm, druckdicht=druckdicht, entwart=entwart, 
-                     schachttyp = 'Schacht', simstatus=simstatus, 
-                     kommentar=kommentar, geop=geop, geom=geom)
-            if not dbQK.sql(sql, 'importkanaldaten_dyna (13)'):
-                return None
-        except BaseException as e:
-            fehlermeldung('SQL-Fehler', str(e))
-            fehlermeldung("Fehler in QKan_Import_from_KP", u"\nSchächte: in sql: \n" + sql + '\n\n')
+        # Schachtdaten in die QKan-DB schreiben. Attribute 1 und 2 sind die Koordinaten, 5 der Durchmesser.
+        daten = (attr + (geoblob.punkt(attr[1], attr[2], srid), 
+                         geoblob.kreis(attr[1], attr[2], attr[5] / 1000., srid)) 
+                 for attr in zeilen)
 
-    dbQK.commit()
+        sql = u"""INSERT INTO schaechte 
+                (schnam, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart, 
+                 schachttyp, simstatus, kommentar, geop, geom)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
 
+        if not dbQK.executemany(sql, daten, 'importkanaldaten_dyna (13)'):
+            return None
 
-    # ------------------------------------------------------------------------------
-    # Auslässe
-
-
-    # Daten aus temporären DYNA-Tabellen abfragen
-    sql = u'''
-        SELECT
-            dyna41.schnam as schnam,
-            dyna41.xkoor as xsch, 
-            dyna41.ykoor as ysch, 
-            dyna12.sohleunten as sohlhoehe, 
-            dyna41.deckelhoehe as deckelhoehe, 
-            1000 as durchm, 
-            0 as druckdicht, 
-            entwaesserungsarten.bezeichnung as entwart, 
-            simulationsstatus.bezeichnung AS simstat, 
-            'Importiert mit QKan' AS kommentar
-        FROM dyna41
-        LEFT JOIN dyna12
-        ON dyna41.schnam = dyna12.schunten
-        LEFT JOIN simulationsstatus
-        ON dyna12.simstatus_nr = simulationsstatus.kp_nr
-        LEFT JOIN entwaesserungsarten
-        ON dyna12.entwart_nr = entwaesserungsarten.kp_nr'''
-
-    dbQK.sql(sql)
-    daten = dbQK.fetchall()
-
-    # Auslassdaten aufbereiten und in die QKan-DB schreiben
-
-    for attr in daten:
-        (schnam_ansi, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart, 
-            simstat, kommentar) = ['NULL' if el is None else el for el in attr]
-
-        schnam = schnam_ansi.decode('iso-8859-1')
-
-        # # Entwasserungsarten
-        # if entwart_kp in ref_entwart:
-            # entwart = ref_entwart[entwart_kp]
-        # else:
-            # # Noch nicht in Tabelle [entwaesserungsarten] enthalten, also ergänzen
-            # sql = u"INSERT INTO entwaesserungsarten (bezeichnung, kp_nr) Values ('({0:})', {0:d})".format(entwart_kp)
-            # entwart = u'({:})'.format(entwart_kp)
-            # if not dbQK.sql(sql, 'importkanaldaten_dyna (14)'):
-                # return None
+        dbQK.commit()
+
+
+        # ------------------------------------------------------------------------------
+        # Auslässe
+
+
+        # Daten aus temporären DYNA-Tabellen abfragen
+        sql = u'''
+            SELECT
+                dyna41.schnam as schnam,
+                dyna41.xkoor as xsch, 
+                dyna41.ykoor as ysch, 
+                dyna12.sohleunten as sohlhoehe, 
+                dyna41.deckelhoehe as deckelhoehe, 
+                1000 as durchm, 
+                0 as druckdicht, 
+                entwaesserungsarten.bezeichnung as entwart, 
+                'Auslass' AS schachttyp, 
+                simulationsstatus.bezeichnung AS simstat, 
+                'Importiert mit QKan' AS kommentar
+            FROM dyna41
+            LEFT JOIN dyna12
+            ON dyna41.schnam = dyna12.schunten
+            LEFT JOIN simulationsstatus
+            ON dyna12.simstatus_nr = simulationsstatus.kp_nr
+            LEFT JOIN entwaesserungsarten
+            ON dyna12.entwart_nr = entwaesserungsarten.kp_nr
+            GROUP BY dyna41.pk'''
+
+        zeilen = dbQK.abfrage(sql, 'importkanaldaten_dyna (14)')
+        if zeilen is None:
+            return None
 
-        # # Simstatus-Nr aus EIN-Datei ersetzten
-        # if simstat_kp in ref_simstat:
-            # simstatus = ref_simstat[simstat_kp]
-        # else:
-            # # Noch nicht in Tabelle [simulationsstatus] enthalten, also ergqenzen
-            # simstatus = u'({}_kp)'.format(simstat_kp)
-            # sql = u"INSERT INTO simulationsstatus (bezeichnung, kp_nr) Values ('{simstatus}', {kp_nr})".format( \
-                      # simstatus=simstatus, kp_nr=simstat_kp)
-            # ref_simstat[simstat_kp] = simstatus
-            # if not dbQK.sql(sql, 'importkanaldaten_dyna (15)'):
-                # return None
+        # Auslassdaten in die QKan-DB schreiben
+        daten = (attr + (geoblob.punkt(attr[1], attr[2], srid), 
+                         geoblob.kreis(attr[1], attr[2], attr[5] / 1000., srid)) 
+                 for attr in zeilen)
 
-        # Geo-Objekte erzeugen
+        sql = u"""INSERT INTO schaechte 
+                (schnam, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart, 
+                 schachttyp, simstatus, kommentar, geop, geom)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
 
-        if dbtyp == 'SpatiaLite':
-            geop = u'MakePoint({0:},{1:},{2:})'.format(xsch,ysch,epsg)
-            geom = u'CastToMultiPolygon(MakePolygon(MakeCircle({0:},{1:},{2:},{3:})))'.format(xsch, ysch, 
-                                             (1. if durchm == 'NULL' else durchm/ 1000.) , epsg)
-        elif dbtyp == 'postgis':
-            geop = u'ST_SetSRID(ST_MakePoint({0:},{1:}),{2:})'.format(xsch,ysch,epsg)
-        else:
-            fehlermeldung('Programmfehler!', 
-                'Datenbanktyp ist fehlerhaft {0:s}, Endung: {1:s}!\nAbbruch!'.format(dbtyp,dbdatabase[-7:].lower()))
-
-        # Datensatz in die QKan-DB schreiben
-
-        try:
-            sql = u"""INSERT INTO schaechte (schnam, xsch, ysch, sohlhoehe, deckelhoehe, durchm, druckdicht, entwart, 
-                              schachttyp, simstatus, kommentar, geop, geom)
-            VALUES ('{schnam}', {xsch}, {ysch}, {sohlhoehe}, {deckelhoehe}, {durchm}, {druckdicht}, '{entwart}', 
-                     '{schachttyp}', '{simstatus}', '{kommentar}', 
-                     {geop}, {geom})""".format( \
-                     schnam=schnam, xsch=xsch, ysch=ysch, sohlhoehe=sohlhoehe, deckelhoehe=deckelhoehe, 
-                     durchm=durchm, druckdicht=druckdicht, entwart=entwart, 
-                     schachttyp = 'Auslass', simstatus=simstatus, 
-                     kommentar=kommentar, geop=geop, geom=geom)
-            if not dbQK.sql(sql, 'importkanaldaten_dyna (16)'):
+        if not dbQK.executemany(sql, daten, 'importkanaldaten_dyna (16)'):
+            return None
+
+        dbQK.commit()
+
+        # Temporäre Tabellen werden nicht mehr benötigt
+        for tab in (u'dyna12', u'dyna41', u'dynarauheit', u'dynaprofil'):
+            sql = u'DROP TABLE IF EXISTS temp.{tab}'.format(tab=tab)
+            if not dbQK.sql(sql, u'importkanaldaten_dyna drop tab_typ12'):
                 return None
-        except BaseException as e:
-            fehlermeldung('SQL-Fehler', str(e))
-            fehlermeldung("Fehler in QKan_Import_from_KP", u"\nSchächte: in sql: \n" + sql + '\n\n')
 
-    dbQK.commit()
 
+        # Schachttypen auswerten
+        evalNodeTypes(dbQK)                     # in qkan.database.qkan_utils
 
-    # Schachttypen auswerten
-    evalNodeTypes(dbQK)                     # in qkan.database.qkan_utils
+    if ta.fehler:
+        return None
 
 
     # --------------------------------------------------------------------------
@@ -41,7 +41,7 @@ from application_dialog import CreatelineflDialog, CreatelineswDialog, Assigntge
 from k_link import createlinkfl, createlinksw, assigntgeb, storegroup, reloadgroup
 from qkan import Dummy
 from qkan.database.dbfunc import DBConnection
-from qkan.database.qkan_utils import get_database_QKan, get_editable_layers, fehlermeldung
+from qkan.database.qkan_utils import get_database_QKan, get_editable_layers, fehlermeldung, Auswahlhistogramm
 from qkan.linkflaechen.updatelinks import updatelinkfl, updatelinksw
 
 # Anbindung an Logging-System (Initialisierung in __init__)
@@ -277,67 +277,29 @@ class LinkFl:
 
     def countselectionfl(self):
         """Zählt nach Änderung der Auswahlen in den Listen im Formular die Anzahl
-        der betroffenen Flächen und Haltungen"""
+        der betroffenen Flächen und Haltungen. Die Anzahlen werden aus den beim Öffnen
+        des Formulars angelegten Häufigkeitstabellen ermittelt. """
         liste_flaechen_abflussparam = self.listselecteditems(self.dlg_cl.lw_flaechen_abflussparam)
         liste_hal_entw = self.listselecteditems(self.dlg_cl.lw_hal_entw)
         liste_teilgebiete = self.listselecteditems(self.dlg_cl.lw_teilgebiete)
-        # Aufbereiten für SQL-Abfrage
 
         # Zu berücksichtigende ganze Flächen zählen
-        if len(liste_flaechen_abflussparam) == 0:
-            # Keine Auswahl. Soll eigentlich nicht vorkommen, funktioniert aber...
-            auswahl = u''
-            logger.debug(u'liste_flaechen_abflussparam:\n{}'.format(liste_flaechen_abflussparam))
-        else:
-            auswahl = u" AND flaechen.abflussparameter in ('{}')".format(u"', '".join(liste_flaechen_abflussparam))
-
-        if len(liste_teilgebiete) != 0:
-            auswahl += u" and flaechen.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
-
-        sql = u"""SELECT count(*) AS anzahl FROM flaechen
-                WHERE (aufteilen <> 'ja' OR aufteilen IS NULL){auswahl}""".format(auswahl=auswahl)
-
-        if not self.dbQK.sql(sql, u"QKan_LinkFlaechen.countselectionfl (1)"):
+        anzahl = self.histo_flaechen.anzahl((liste_flaechen_abflussparam, liste_teilgebiete, [u'nein']))
+        if anzahl is None:
             return False
-        daten = self.dbQK.fetchone()
-        if not (daten is None):
-            self.dlg_cl.lf_anzahl_flaechen.setText(str(daten[0]))
-        else:
-            self.dlg_cl.lf_anzahl_flaechen.setText(u'0')
+        self.dlg_cl.lf_anzahl_flaechen.setText(str(anzahl))
 
         # Zu berücksichtigende zu verschneidende Flächen zählen
-
-        sql = u"""SELECT count(*) AS anzahl FROM flaechen
-                WHERE aufteilen = 'ja'{auswahl}""".format(auswahl=auswahl)
-        logger.debug(u'sql Flaechen zu verschneiden:\n{}'.format(sql))
-        if not self.dbQK.sql(sql, u"QKan_LinkFlaechen.countselectionfl (2)"):
+        anzahl = self.histo_flaechen.anzahl((liste_flaechen_abflussparam, liste_teilgebiete, [u'ja']))
+        if anzahl is None:
             return False
-        daten = self.dbQK.fetchone()
-        if not (daten is None):
-            self.dlg_cl.lf_anzahl_flaechsec.setText(str(daten[0]))
-        else:
-            self.dlg_cl.lf_anzahl_flaechsec.setText(u'0')
+        self.dlg_cl.lf_anzahl_flaechsec.setText(str(anzahl))
 
         # Zu berücksichtigende Haltungen zählen
-        if len(liste_hal_entw) == 0:
-            auswahl = u''
-        else:
-            auswahl = u" WHERE haltungen.entwart in ('{}')".format(u"', '".join(liste_hal_entw))
-
-        if len(liste_teilgebiete) != 0:
-            if auswahl == u'':
-                auswahl = u" WHERE haltungen.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
-            else:
-                auswahl += u" and haltungen.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
-
-        sql = u"""SELECT count(*) AS anzahl FROM haltungen{auswahl}""".format(auswahl=auswahl)
-        if not self.dbQK.sql(sql, u"QKan_LinkFlaechen.countselectionfl (3)"):
+        anzahl = self.histo_haltungen.anzahl((liste_hal_entw, liste_teilgebiete))
+        if anzahl is None:
             return False
-        daten = self.dbQK.fetchone()
-        if not (daten is None):
-            self.dlg_cl.lf_anzahl_haltungen.setText(str(daten[0]))
-        else:
-            self.dlg_cl.lf_anzahl_haltungen.setText(u'0')
+        self.dlg_cl.lf_anzahl_haltungen.setText(str(anzahl))
 
 
     # -------------------------------------------------------------------------
@@ -396,47 +358,22 @@ class LinkFl:
 
     def countselectionsw(self):
         """Zählt nach Änderung der Auswahlen in den Listen im Formular die Anzahl
-        der betroffenen Haltungen"""
+        der betroffenen Haltungen und Direkteinleitungen. Die Anzahlen werden aus den beim 
+        Öffnen des Formulars angelegten Häufigkeitstabellen ermittelt. """
         liste_hal_entw = self.listselecteditems(self.dlg_sw.lw_hal_entw)
         liste_teilgebiete = self.listselecteditems(self.dlg_sw.lw_teilgebiete)
-        # Aufbereiten für SQL-Abfrage
 
         # Zu berücksichtigende Haltungen zählen
-        if len(liste_hal_entw) == 0:
-            auswahl = u''
-        else:
-            auswahl = u" WHERE haltungen.entwart in ('{}')".format(u"', '".join(liste_hal_entw))
-
-        if len(liste_teilgebiete) != 0:
-            if auswahl == u'':
-                auswahl = u" WHERE haltungen.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
-            else:
-                auswahl += u" and haltungen.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
-
-        sql = u"""SELECT count(*) AS anzahl FROM haltungen{auswahl}""".format(auswahl=auswahl)
-        if not self.dbQK.sql(sql, u"QKan_LinkFlaechen.countselectionsw (1)"):
+        anzahl = self.histo_haltungen.anzahl((liste_hal_entw, liste_teilgebiete))
+        if anzahl is None:
             return False
-        daten = self.dbQK.fetchone()
-        if not (daten is None):
-            self.dlg_sw.lf_anzahl_haltungen.setText(str(daten[0]))
-        else:
-            self.dlg_sw.lf_anzahl_haltungen.setText(u'0')
+        self.dlg_sw.lf_anzahl_haltungen.setText(str(anzahl))
 
         # Zu berücksichtigende Direkteinleitungen zählen
-
-        if len(liste_teilgebiete) != 0:
-            auswahl = u" WHERE einleit.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
-        else:
-            auswahl = u''
-
-        sql = u"""SELECT count(*) AS anzahl FROM einleit{auswahl}""".format(auswahl=auswahl)
-        if not self.dbQK.sql(sql, u"QKan_LinkFlaechen.countselectionsw (2)"):
+        anzahl = self.histo_einleit.anzahl((liste_teilgebiete,))
+        if anzahl is None:
             return False
-        daten = self.dbQK.fetchone()
-        if not (daten is None):
-            self.dlg_sw.lf_anzahl_einleit.setText(str(daten[0]))
-        else:
-            self.dlg_sw.lf_anzahl_einleit.setText(u'0')
+        self.dlg_sw.lf_anzahl_einleit.setText(str(anzahl))
 
 
     # -------------------------------------------------------------------------
@@ -662,6 +599,13 @@ class LinkFl:
         else:
             fangradius = u'0.1'
 
+        # Anzahl der Prozesse für die Suche nach der nächsten Haltung
+        # Nur über die Konfigurationsdatei einstellbar (s. qkan_utils.parallel_ausfuehren)
+        if 'anzahl_prozesse' in self.config:
+            anzahl_prozesse = self.config['anzahl_prozesse']
+        else:
+            anzahl_prozesse = u'1'
+
         # Festlegung, ob sich der Abstand auf die Flächenkante oder deren Mittelpunkt bezieht
         if 'bezug_abstand' in self.config:
             bezug_abstand = self.config['bezug_abstand']
@@ -676,6 +620,13 @@ class LinkFl:
             fehlermeldung(u"Fehler im Programmcode", u"Nicht definierte Option")
             return False
 
+        # Häufigkeitstabellen für die Anzeige der Anzahl der ausgewählten Objekte. Sie werden
+        # nur neu gelesen, wenn die Datenbank zwischenzeitlich geändert wurde.
+        self.histo_flaechen = Auswahlhistogramm(self.dbQK, u'flaechen', 
+                    (u'abflussparameter', u'teilgebiet', 
+                     u"CASE WHEN aufteilen = 'ja' THEN 'ja' ELSE 'nein' END"))
+        self.histo_haltungen = Auswahlhistogramm(self.dbQK, u'haltungen', (u'entwart', u'teilgebiet'))
+
         self.countselectionfl()
 
 
@@ -727,6 +678,7 @@ class LinkFl:
             self.config['autokorrektur'] = autokorrektur
             self.config['linksw_in_tezg'] = linksw_in_tezg
             self.config['mit_verschneidung'] = mit_verschneidung
+            self.config['anzahl_prozesse'] = anzahl_prozesse
 
             with open(self.configfil, 'w') as fileconfig:
                 fileconfig.write(json.dumps(self.config))
@@ -735,7 +687,8 @@ class LinkFl:
 
             createlinkfl(self.dbQK, liste_flaechen_abflussparam, liste_hal_entw,
                         liste_teilgebiete, linksw_in_tezg, mit_verschneidung, autokorrektur, 
-                        suchradius, mindestflaeche, fangradius, bezug_abstand, epsg)
+                        suchradius, mindestflaeche, fangradius, bezug_abstand, epsg, 
+                        prozesse=anzahl_prozesse)
 
             # Einfügen der Verbindungslinien in die Layerliste, wenn nicht schon geladen
             layers = iface.legendInterface().layers()
@@ -749,6 +702,7 @@ class LinkFl:
         # --------------------------------------------------------------------------
         # Datenbankverbindungen schliessen
 
+        del self.histo_flaechen, self.histo_haltungen
         del self.dbQK
 
 
@@ -845,6 +799,11 @@ class LinkFl:
         # Haltungen direkt in einleit eintragen. Es kann wegen der längeren Zeitdauer sinnvoll
         # sein, dies erst am Schluss der Bearbeitung in einem eigenen Vorgang zu machen.
 
+        # Häufigkeitstabellen für die Anzeige der Anzahl der ausgewählten Objekte. Sie werden
+        # nur neu gelesen, wenn die Datenbank zwischenzeitlich geändert wurde.
+        self.histo_haltungen = Auswahlhistogramm(self.dbQK, u'haltungen', (u'entwart', u'teilgebiet'))
+        self.histo_einleit = Auswahlhistogramm(self.dbQK, u'einleit', (u'teilgebiet',))
+
         self.countselectionsw()
 
 
@@ -897,6 +856,7 @@ class LinkFl:
         # --------------------------------------------------------------------------
         # Datenbankverbindungen schliessen
 
+        del self.histo_haltungen, self.histo_einleit
         del self.dbQK
 
 
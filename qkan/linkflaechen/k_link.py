@@ -41,6 +41,8 @@ from qgis.PyQt.QtGui import QProgressBar
 
 from qkan.database.qkan_utils import fehlermeldung, checknames
 from qkan.linkflaechen.updatelinks import updatelinkfl, updatelinksw
+from qkan.linkflaechen.k_nearest import numpy_verfuegbar, linksw_naechste
+from qkan.linkflaechen.k_parallel import linkfl_parallel
 
 logger = logging.getLogger(u'QKan')
 
@@ -52,7 +54,7 @@ progress_bar = None
 def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
                 liste_teilgebiete, linksw_in_tezg=False, mit_verschneidung=False, autokorrektur=True, 
                 suchradius=50, mindestflaeche=0.5, fangradius=0.1, bezug_abstand=u'kante', 
-                epsg=u'25832', dbtyp=u'SpatiaLite'):
+                epsg=u'25832', dbtyp=u'SpatiaLite', prozesse=1):
     '''Import der Kanaldaten aus einer HE-Firebird-Datenbank und Schreiben in eine QKan-SpatiaLite-Datenbank.
 
     :dbQK: Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
@@ -91,6 +93,10 @@ def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
 
     :dbtyp:         Typ der Datenbank (SpatiaLite, PostGIS)
     :type dbtyp:    String
+
+    :prozesse:      Anzahl der Prozesse für die Suche nach der nächsten Haltung. Bei mehr als 
+                    einem Prozess erfolgt die Suche in k_parallel.linkfl_parallel
+    :type prozesse: integer
     
     :returns: void
 
@@ -177,10 +183,10 @@ def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
         sql = u"""WITH linkadd AS (
                 SELECT
                     linkfl.pk AS lpk, tezg.flnam AS tezgnam, flaechen.flnam, flaechen.aufteilen, flaechen.teilgebiet, 
-                    flaechen.geom
+                    flaechen.geom, flaechen.geomflaeche AS flaeche
                 FROM flaechen
                 INNER JOIN tezg
-                ON within(centroid(flaechen.geom),tezg.geom)
+                ON within(MakePoint(flaechen.xmitte, flaechen.ymitte, {epsg}),tezg.geom)
                 LEFT JOIN linkfl
                 ON linkfl.flnam = flaechen.flnam
                 WHERE ((flaechen.aufteilen <> 'ja' or flaechen.aufteilen IS NULL) 
@@ -188,7 +194,7 @@ def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
                 UNION
                 SELECT
                     linkfl.pk AS lpk, tezg.flnam AS tezgnam, flaechen.flnam, flaechen.aufteilen, tezg.teilgebiet, 
-                    CastToMultiPolygon(intersection(flaechen.geom,tezg.geom)) AS geom
+                    CastToMultiPolygon(intersection(flaechen.geom,tezg.geom)) AS geom, NULL AS flaeche
                 FROM flaechen
                 INNER JOIN tezg
                 ON intersects(flaechen.geom,tezg.geom)
@@ -199,12 +205,13 @@ def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
             INSERT INTO linkfl (flnam, tezgnam, geom)
             SELECT flnam, tezgnam, geom
             FROM linkadd
-            WHERE lpk IS NULL AND geom > {minfl}""".format(ausw_einf=ausw_einf, ausw_teil=ausw_teil, minfl=mindestflaeche)
+            WHERE lpk IS NULL AND coalesce(flaeche, area(geom)) > {minfl}""".format(ausw_einf=ausw_einf, 
+                ausw_teil=ausw_teil, minfl=mindestflaeche, epsg=epsg)
     else:
         sql = u"""WITH linkadd AS (
                 SELECT
                     linkfl.pk AS lpk, flaechen.flnam, flaechen.aufteilen, flaechen.teilgebiet, 
-                    flaechen.geom
+                    flaechen.geom, flaechen.geomflaeche AS flaeche
                 FROM flaechen
                 LEFT JOIN linkfl
                 ON linkfl.flnam = flaechen.flnam
@@ -213,24 +220,7 @@ def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
             INSERT INTO linkfl (flnam, geom)
             SELECT flnam, geom
             FROM linkadd
-            WHERE lpk IS NULL AND geom > {minfl}""".format(ausw_einf=ausw_einf, ausw_teil=ausw_teil, minfl=mindestflaeche)
-
-    if not dbQK.sql(sql, u"QKan_LinkFlaechen (4a)"):
-        del dbQK
-        progress_bar.reset()
-        return False
-
-    progress_bar.setValue(60)
-
-    # Jetzt werden die Flächenobjekte mit einem Buffer erweitert und jeweils neu 
-    # hinzugekommmene mögliche Zuordnungen eingetragen.
-
-    sql = u"""UPDATE linkfl SET gbuf = CastToMultiPolygon(buffer(geom,{})) WHERE linkfl.glink IS NULL""".format(
-        suchradius)
-    if not dbQK.sql(sql, u"createlinkfl (2)"):
-        del dbQK
-        progress_bar.reset()
-        return False
+            WHERE lpk IS NULL AND flaeche > {minfl}""".format(ausw_einf=ausw_einf, ausw_teil=ausw_teil, minfl=mindestflaeche)
 
     # Erzeugung der Verbindungslinie zwischen dem Zentroiden der Haltung und dem PointonSurface der Fläche. 
     # Filter braucht nur noch für Haltungen berücksichtigt zu werden, da Flächen bereits beim Einfügen 
@@ -252,69 +242,85 @@ def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
     else:
         bezug = u'PointonSurface(lf.geom)'
 
-    # Erläuterung zur nachfolgenden SQL-Abfrage:
-    # tlink enthält alle potenziellen Verbindungen zwischen Flächen und Haltungen mit der jeweiligen Entfernung
-    # t2 enthält von diesen Verbindungen nur die Fläche (als pk) und den minimalen Abstand, 
-    # so dass in der Abfrage nach "update" nur die jeweils nächste Verbindung gefiltert wird. 
-    # Da diese Abfrage nur für neu zu erstellende Verknüpfungen gelten soll (also noch kein Eintrag
-    # im Feld "flaechen.haltnam" -> fl.haltnam -> tlink.linkhal -> t1.linkhal). 
+    # Ermittlung der nächsten Haltung in drei Schritten:
+    # 1. temp.linkkandidaten enthält alle potenziellen Verbindungen zwischen Flächen und Haltungen 
+    #    mit der jeweiligen Entfernung. Die Suche erfolgt über den Spatialindex der Haltungen. 
+    # 2. temp.linkneu enthält je Fläche nur die nächste Haltung (bei gleichem Abstand die mit dem
+    #    kleineren pk) sowie die um den Fangradius verkleinerte Fläche, die so nur einmal 
+    #    berechnet wird. 
+    # 3. linkfl wird in einer Abfrage aus temp.linkneu aktualisiert. 
+    # Da diese Abfrage nur für neu zu erstellende Verknüpfungen gelten soll, werden nur 
+    # Flächen ohne Verbindungslinie berücksichtigt. 
 
     # Varianten ohne und mit Beschränkung der Anbindungslinien auf die Haltungsfläche
 
     # Tipp: within und intersects schließt Datensätze ohne Geoobjekt ein. Deshalb müssen 
     # sie ausgeschlossen werden.
-    
 
     if linksw_in_tezg and mit_verschneidung:
         # linksw_in_tezg funktioniert nur, wenn mit_verschneidung aktiviert ist
-        sql = u"""WITH tlink AS
-            (	SELECT lf.pk AS pk,
-                    ha.haltnam, 
-                    Distance(ha.geom,{bezug}) AS dist, 
-                    ha.geom AS geohal, lf.geom AS geolf
-                FROM haltungen AS ha
-                INNER JOIN linkfl AS lf
-                ON Intersects(ha.geom,lf.gbuf)
+        jointezg = u"""
                 INNER JOIN tezg AS tg
-                ON tg.flnam = lf.tezgnam
-                WHERE (within(centroid(ha.geom),tg.geom) and lf.glink IS NULL 
-                    and ha.geom IS NOT NULL and lf.gbuf IS NOT NULL and tg.geom IS NOT NULL){auswha})
-            UPDATE linkfl SET (glink, haltnam) = 
-            (   SELECT MakeLine(PointOnSurface(Buffer(t1.geolf, -1.1*{fangradius})),Centroid(t1.geohal)), t1.haltnam
-                FROM tlink AS t1
-                INNER JOIN (SELECT pk, Min(dist) AS dmin FROM tlink GROUP BY pk) AS t2
-                ON t1.pk=t2.pk AND t1.dist <= t2.dmin + 0.000001
-                WHERE linkfl.pk = t1.pk AND area(Buffer(t1.geolf, -1.1*{fangradius})) IS NOT NULL)
-            WHERE linkfl.glink IS NULL{auswlinkfl}""".format(bezug=bezug, fangradius=fangradius, 
-                auswha=auswha, auswlinkfl=auswlinkfl)
+                ON tg.flnam = lf.tezgnam"""
+        ausw_tezg = u" and within(MakePoint(ha.xmitte, ha.ymitte, {}),tg.geom) and tg.geom IS NOT NULL".format(epsg)
     else:
-        sql = u"""WITH tlink AS
-            (	SELECT lf.pk AS pk,
-                    ha.haltnam, 
-                    Distance(ha.geom,{bezug}) AS dist, 
-                    ha.geom AS geohal, lf.geom AS geolf
+        jointezg = u''
+        ausw_tezg = u''
+
+    sql_kandidaten = u"""SELECT lf.pk, Distance(ha.geom,{bezug}) AS dist, ha.pk
                 FROM haltungen AS ha
                 INNER JOIN linkfl AS lf
-                ON Intersects(ha.geom,lf.gbuf)
-                WHERE lf.glink IS NULL
-                    and ha.geom IS NOT NULL and lf.gbuf IS NOT NULL{auswha})
-            UPDATE linkfl SET (glink, haltnam) =  
-            (   SELECT MakeLine(PointOnSurface(Buffer(t1.geolf, -1.1*{fangradius})),Centroid(t1.geohal)), t1.haltnam
-                FROM tlink AS t1
-                INNER JOIN (SELECT pk, Min(dist) AS dmin FROM tlink GROUP BY pk) AS t2
-                ON t1.pk=t2.pk AND t1.dist <= t2.dmin + 0.000001
-                WHERE linkfl.pk = t1.pk AND area(Buffer(t1.geolf, -1.1*{fangradius})) IS NOT NULL)
-            WHERE linkfl.glink IS NULL{auswlinkfl}""".format(bezug=bezug, fangradius=fangradius, 
-                auswha=auswha, auswlinkfl=auswlinkfl)
-
-
-    logger.debug(u'\nSQL-3a:\n{}\n'.format(sql))
-
-    if not dbQK.sql(sql, u"createlinkfl (5)"):
+                ON Intersects(ha.geom,lf.gbuf){jointezg}
+                WHERE {{auswahl_pk}} and lf.glink IS NULL
+                    and ha.geom IS NOT NULL and lf.gbuf IS NOT NULL{ausw_tezg}
+                    and ha.ROWID IN
+                    (   SELECT ROWID FROM SpatialIndex WHERE
+                        f_table_name = 'haltungen' AND
+                        search_frame = lf.gbuf){auswha}{auswlf}""".format(bezug=bezug, jointezg=jointezg, 
+                    ausw_tezg=ausw_tezg, auswha=auswha, auswlf=auswlinkfl.replace(u'linkfl.', u'lf.'))
+
+    # Einfügen in linkfl und Erzeugen der Verbindungslinien ohne laufende Pflege des räumlichen
+    # Index von linkfl. Die parallele Verknüpfung liest aus der gespeicherten Datenbankdatei und
+    # folgt deshalb erst nach Abschluss des Blocks.
+    with dbQK.massenladen([u'linkfl'], u'createlinkfl') as ta:
+        if not dbQK.sql(sql, u"QKan_LinkFlaechen (4a)"):
+            del dbQK
+            progress_bar.reset()
+            return False
+
+        progress_bar.setValue(60)
+
+        # Jetzt werden die Flächenobjekte mit einem Buffer erweitert und jeweils neu 
+        # hinzugekommmene mögliche Zuordnungen eingetragen.
+
+        sql = u"""UPDATE linkfl SET gbuf = CastToMultiPolygon(buffer(geom,{})) WHERE linkfl.glink IS NULL""".format(
+            suchradius)
+        if not dbQK.sql(sql, u"createlinkfl (2)"):
+            del dbQK
+            progress_bar.reset()
+            return False
+
+        if int(prozesse) <= 1:
+            if not _linkfl_naechste(dbQK, sql_kandidaten.format(auswahl_pk=u'1'), fangradius, epsg):
+                ta.verwerfen()
+                del dbQK
+                progress_bar.reset()
+                return False
+    if ta.fehler:
         del dbQK
         progress_bar.reset()
         return False
 
+    if int(prozesse) > 1:
+        # Parallele Bearbeitung: Die Abfrage liefert nur die Kandidaten für die Flächen einer 
+        # Kachel (pkliste). Die Auswahl der nächsten Haltung erfolgt in linkfl_parallel.
+        sql = sql_kandidaten.format(auswahl_pk=u'lf.pk IN ({pkliste})')
+        naechste = linkfl_parallel(dbQK, sql, int(prozesse))
+        if naechste is None or not _linkfl_uebernehmen(dbQK, naechste, fangradius, epsg):
+            del dbQK
+            progress_bar.reset()
+            return False
+
     progress_bar.setValue(80)
 
     # Löschen der Datensätze in linkfl, bei denen keine Verbindung erstellt wurde, weil die 
@@ -352,6 +358,133 @@ def createlinkfl(dbQK, liste_flaechen_abflussparam, liste_hal_entw,
     return True
 
 
+def _linkfl_naechste(dbQK, sql_kandidaten, fangradius, epsg):
+    '''Erzeugt in linkfl die Verbindungslinien zur jeweils nächsten Haltung.
+
+    :dbQK: Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type database: DBConnection (geerbt von dbapi...)
+
+    :sql_kandidaten: SQL-Abfrage, die alle in Frage kommenden Verbindungen als 
+                     (pk der Fläche, Abstand, pk der Haltung) liefert
+    :type sql_kandidaten: String
+
+    :fangradius: Suchradius, mit dem an den Enden der Verknüpfungen gesucht wird
+    :type fangradius: Real
+
+    :epsg: Nummer des Projektionssystems
+    :type epsg: String
+
+    :returns: Erfolg
+    :rtype: Boolean
+    '''
+
+    sqllis = [u"""DROP TABLE IF EXISTS temp.linkkandidaten""", 
+              u"""DROP TABLE IF EXISTS temp.linkneu""", 
+              u"""CREATE TEMP TABLE linkkandidaten (pk INTEGER, dist REAL, hpk INTEGER)""", 
+              u"""INSERT INTO temp.linkkandidaten (pk, dist, hpk)
+                {}""".format(sql_kandidaten), 
+              u"""CREATE INDEX temp.linkkandidaten_idx ON linkkandidaten (pk, dist, hpk)"""]
+
+    # Auswahl der nächsten Haltung. Fensterfunktionen gibt es erst ab SQLite 3.25. Bei älteren
+    # Versionen wird je Fläche der erste Eintrag im Index linkkandidaten_idx gelesen. 
+    if dbQK.sqliteversion() >= (3, 25, 0):
+        sqlnaechste = u"""SELECT pk, hpk FROM
+                (   SELECT pk, hpk, ROW_NUMBER() OVER (PARTITION BY pk ORDER BY dist, hpk) AS nr
+                    FROM temp.linkkandidaten)
+                WHERE nr = 1"""
+    else:
+        sqlnaechste = u"""SELECT pk, 
+                (   SELECT k2.hpk FROM temp.linkkandidaten AS k2
+                    WHERE k2.pk = k1.pk
+                    ORDER BY k2.dist, k2.hpk LIMIT 1) AS hpk
+                FROM (SELECT DISTINCT pk FROM temp.linkkandidaten) AS k1"""
+
+    sqllis += [u"""CREATE TEMP TABLE linkneu (pk INTEGER PRIMARY KEY, hpk INTEGER, geoinnen BLOB)""", 
+               u"""INSERT INTO temp.linkneu (pk, hpk)
+                {sqlnaechste}""".format(sqlnaechste=sqlnaechste), 
+               u"""DROP TABLE temp.linkkandidaten"""]
+
+    for nr, sql in enumerate(sqllis):
+        logger.debug(u'\nSQL-3a:\n{}\n'.format(sql))
+        if not dbQK.sql(sql, u"createlinkfl (5.{})".format(nr + 1)):
+            return False
+
+    return _linkfl_schreiben(dbQK, fangradius, epsg)
+
+
+def _linkfl_uebernehmen(dbQK, naechste, fangradius, epsg):
+    '''Erzeugt in linkfl die Verbindungslinien zu den in k_parallel.linkfl_parallel ermittelten 
+    nächsten Haltungen.
+
+    :dbQK: Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type database: DBConnection (geerbt von dbapi...)
+
+    :naechste: Liste mit (pk der Fläche, pk der Haltung)
+    :type naechste: list of tuples
+
+    :fangradius: Suchradius, mit dem an den Enden der Verknüpfungen gesucht wird
+    :type fangradius: Real
+
+    :epsg: Nummer des Projektionssystems
+    :type epsg: String
+
+    :returns: Erfolg
+    :rtype: Boolean
+    '''
+
+    sqllis = [u"""DROP TABLE IF EXISTS temp.linkneu""", 
+              u"""CREATE TEMP TABLE linkneu (pk INTEGER PRIMARY KEY, hpk INTEGER, geoinnen BLOB)"""]
+    for nr, sql in enumerate(sqllis):
+        if not dbQK.sql(sql, u"createlinkfl (6.{})".format(nr + 1)):
+            return False
+
+    sql = u"""INSERT INTO temp.linkneu (pk, hpk) VALUES (?, ?)"""
+    if not dbQK.executemany(sql, naechste, u"createlinkfl (7)"):
+        return False
+
+    return _linkfl_schreiben(dbQK, fangradius, epsg)
+
+
+def _linkfl_schreiben(dbQK, fangradius, epsg):
+    '''Erzeugt in linkfl die Verbindungslinien zu den in der temporären Tabelle "linkneu" 
+    eingetragenen Haltungen (pk, hpk) und entfernt anschließend die temporäre Tabelle. Wird 
+    sowohl bei der Bearbeitung in einem Prozess als auch von k_parallel.linkfl_parallel verwendet.
+
+    :dbQK: Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type database: DBConnection (geerbt von dbapi...)
+
+    :fangradius: Suchradius, mit dem an den Enden der Verknüpfungen gesucht wird
+    :type fangradius: Real
+
+    :epsg: Nummer des Projektionssystems
+    :type epsg: String
+
+    :returns: Erfolg
+    :rtype: Boolean
+    '''
+
+    # Der innere Puffer wird je Fläche nur einmal berechnet
+    sqllis = [u"""UPDATE temp.linkneu SET geoinnen = 
+                (   SELECT Buffer(lf.geom, -1.1*{fangradius})
+                    FROM linkfl AS lf
+                    WHERE lf.pk = linkneu.pk)""".format(fangradius=fangradius), 
+              u"""UPDATE linkfl SET (glink, haltnam) = 
+                (   SELECT MakeLine(PointOnSurface(ln.geoinnen),MakePoint(ha.xmitte, ha.ymitte, {epsg})), ha.haltnam
+                    FROM temp.linkneu AS ln
+                    INNER JOIN haltungen AS ha
+                    ON ha.pk = ln.hpk
+                    WHERE ln.pk = linkfl.pk AND area(ln.geoinnen) IS NOT NULL)
+                WHERE linkfl.pk IN (SELECT pk FROM temp.linkneu)""".format(epsg=epsg), 
+              u"""DROP TABLE temp.linkneu"""]
+
+    for nr, sql in enumerate(sqllis):
+        logger.debug(u'\nSQL-3b:\n{}\n'.format(sql))
+        if not dbQK.sql(sql, u"createlinkfl (8.{})".format(nr + 1)):
+            return False
+
+    return True
+
+
 # ------------------------------------------------------------------------------
 # Erzeugung der graphischen Verknüpfungen für Direkteinleitungen
 
@@ -410,12 +543,15 @@ def createlinksw(dbQK, liste_teilgebiete, suchradius=50, epsg=u'25832',
     else:
         auswahl = ''
 
+    # Radius des Kreises, der in linksw den Einleitpunkt darstellt
+    radius_einleit = 0.5
+
     sql = u"""INSERT INTO linksw (elnam, teilgebiet, geom)
             SELECT einleit.elnam, einleit.teilgebiet,buffer(einleit.geom,{radius})
             FROM einleit
             LEFT JOIN linksw
             ON linksw.elnam = einleit.elnam
-            WHERE linksw.pk IS NULL{auswahl}""".format(auswahl=auswahl, radius = 0.5)
+            WHERE linksw.pk IS NULL{auswahl}""".format(auswahl=auswahl, radius=radius_einleit)
 
     # logger.debug(u'\nSQL-2a:\n{}\n'.format(sql))
 
@@ -424,6 +560,62 @@ def createlinksw(dbQK, liste_teilgebiete, suchradius=50, epsg=u'25832',
 
     progress_bar.setValue(25)
 
+    if numpy_verfuegbar():
+        # Vektorisierte Suche der nächsten Haltung, s. k_nearest.py. Der Suchradius bezieht sich
+        # wie in der SQL-Variante auf den Rand des Kreises um den Einleitpunkt.
+        if not linksw_naechste(dbQK, liste_teilgebiete, float(suchradius) + radius_einleit, epsg):
+            return False
+    elif not _linksw_sql(dbQK, liste_teilgebiete, suchradius):
+        return False
+
+    progress_bar.setValue(50)
+
+    # Löschen der Datensätze in linksw, bei denen keine Verbindung erstellt wurde, weil die 
+    # nächste Haltung zu weit entfernt ist.
+
+    sql = u"""DELETE FROM linksw WHERE glink IS NULL"""
+
+    if not dbQK.sql(sql, u"QKan_LinkSW (7)"):
+        return False
+
+    # Aktualisierung des logischen Cache
+
+    if not updatelinksw(dbQK, deletelinkGeomNone = False):
+        fehlermeldung(u'Fehler beim Update der Einzeleinleiter-Verknüpfungen', 
+                      u'Der logische Cache konnte nicht aktualisiert werden.')
+        return False
+
+    progress_bar.setValue(100)
+    status_message.setText(u"Fertig!")
+    status_message.setLevel(QgsMessageBar.SUCCESS)
+
+    # Karte aktualisieren
+    iface.mapCanvas().refreshAllLayers()
+
+    # iface.mainWindow().statusBar().clearMessage()
+    # iface.messageBar().pushMessage(u"Information", u"Verknüpfungen sind erstellt!", level=QgsMessageBar.INFO)
+    QgsMessageLog.logMessage(u"\nVerknüpfungen sind erstellt!", level=QgsMessageLog.INFO)
+
+    return True
+
+
+def _linksw_sql(dbQK, liste_teilgebiete, suchradius):
+    '''Verbindet die noch nicht verknüpften Einleitpunkte in linksw per SQL-Abfrage mit der 
+    nächsten Haltung. Wird verwendet, wenn NumPy nicht installiert ist.
+
+    :dbQK: Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type database: DBConnection (geerbt von dbapi...)
+
+    :liste_teilgebiete: Liste der ausgewählten Teilgebiete
+    :type liste_teilgebiete: list of String
+
+    :suchradius: Suchradius in der SQL-Abfrage
+    :type suchradius: Real
+
+    :returns: Erfolg
+    :rtype: Boolean
+    '''
+
     # Jetzt werden die Direkteinleitungen-Punkte mit einem Buffer erweitert und jeweils neu 
     # hinzugekommmene mögliche Zuordnungen eingetragen.
     # Wenn das Attribut "haltnam" vergeben ist, gilt die Fläche als zugeordnet.
@@ -480,34 +672,6 @@ def createlinksw(dbQK, liste_teilgebiete, suchradius=50, epsg=u'25832',
     if not dbQK.sql(sql, u"QKan_LinkSW (5)"):
         return False
 
-    progress_bar.setValue(50)
-
-    # Löschen der Datensätze in linksw, bei denen keine Verbindung erstellt wurde, weil die 
-    # nächste Haltung zu weit entfernt ist.
-
-    sql = u"""DELETE FROM linksw WHERE glink IS NULL"""
-
-    if not dbQK.sql(sql, u"QKan_LinkSW (7)"):
-        return False
-
-    # Aktualisierung des logischen Cache
-
-    if not updatelinksw(dbQK, deletelinkGeomNone = False):
-        fehlermeldung(u'Fehler beim Update der Einzeleinleiter-Verknüpfungen', 
-                      u'Der logische Cache konnte nicht aktualisiert werden.')
-        return False
-
-    progress_bar.setValue(100)
-    status_message.setText(u"Fertig!")
-    status_message.setLevel(QgsMessageBar.SUCCESS)
-
-    # Karte aktualisieren
-    iface.mapCanvas().refreshAllLayers()
-
-    # iface.mainWindow().statusBar().clearMessage()
-    # iface.messageBar().pushMessage(u"Information", u"Verknüpfungen sind erstellt!", level=QgsMessageBar.INFO)
-    QgsMessageLog.logMessage(u"\nVerknüpfungen sind erstellt!", level=QgsMessageLog.INFO)
-
     return True
 
 
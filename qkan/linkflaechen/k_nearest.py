@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Nächste Haltung zu Punktobjekten
+  ================================
+
+  Ermittelt für Punktobjekte (Direkteinleitungen) die jeweils nächste Haltung, ohne dafür
+  räumliche SQL-Abfragen zu verwenden. Die Haltungen werden in Liniensegmente zerlegt, als
+  NumPy-Arrays geladen und in ein regelmäßiges Raster einsortiert. Die Zellgröße ist der
+  Suchradius, mindestens aber die typische (mittlere) Segmentlänge. Längere Segmente werden
+  für das Raster in Teilstücke von höchstens einer Zellgröße zerlegt, so dass jedes Teilstück
+  in höchstens 2 x 2 Zellen eingetragen wird und der Speicherbedarf linear bleibt. Für jeden
+  Punkt werden nur die Segmente in den benachbarten Rasterzellen untersucht. Die Abstände
+  werden blockweise vektorisiert berechnet.
+
+  | Dateiname            : k_nearest.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+__author__ = 'Joerg Hoettges'
+__date__ = 'Oktober 2018'
+__copyright__ = '(C) 2018, Joerg Hoettges'
+
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from qkan.database import geoblob
+
+logger = logging.getLogger(u'QKan')
+
+
+def numpy_verfuegbar():
+    """Gibt wahr zurück, wenn NumPy installiert ist. Andernfalls muss auf die SQL-Variante
+    ausgewichen werden."""
+    return np is not None
+
+
+def segmente(geomlis):
+    """Zerlegt Linienobjekte im WKB-Format in einzelne Segmente
+
+    :geomlis:       Liste von Linienobjekten (WKB, LINESTRING), z.B. aus AsBinary(geom)
+    :type geomlis:  list of blobs
+
+    :returns:       Anfangs- und Endkoordinaten der Segmente und Index des Linienobjektes
+    :rtype:         tuple of numpy.arrays (ax, ay, bx, by, iobj)
+    """
+
+    koordlis = []
+    objlis = []
+    for iobj, wkb in enumerate(geomlis):
+        if wkb is None:
+            continue
+        wkb = bytes(wkb)
+        dtyp = '<f8' if wkb[0:1] == b'\x01' else '>f8'
+        ityp = '<u4' if wkb[0:1] == b'\x01' else '>u4'
+        npunkte = int(np.frombuffer(wkb, dtype=ityp, count=1, offset=5)[0])
+        if npunkte < 2:
+            continue
+        koord = np.frombuffer(wkb, dtype=dtyp, count=2 * npunkte, offset=9).reshape(npunkte, 2)
+        koordlis.append(np.hstack((koord[:-1], koord[1:])))
+        objlis.append(np.repeat(iobj, npunkte - 1))
+
+    if len(koordlis) == 0:
+        leer = np.zeros(0)
+        return leer, leer, leer, leer, np.zeros(0, dtype=np.int64)
+
+    seg = np.vstack(koordlis)
+    return seg[:, 0], seg[:, 1], seg[:, 2], seg[:, 3], np.concatenate(objlis).astype(np.int64)
+
+
+def _bereiche(lo, anz):
+    """Erweitert Indexbereiche [lo, lo + anz) zu einem zusammenhängenden Indexarray"""
+    gesamt = int(anz.sum())
+    if gesamt == 0:
+        return np.zeros(0, dtype=np.int64)
+    start = np.repeat(lo - (np.cumsum(anz) - anz), anz)
+    return start + np.arange(gesamt, dtype=np.int64)
+
+
+def naechste(px, py, ax, ay, bx, by, iobj, radius, blockgroesse=20000):
+    """Ermittelt zu Punkten das nächste Linienobjekt innerhalb eines Suchradius
+
+    :px, py:        Koordinaten der Punkte
+    :type px, py:   numpy.array
+
+    :ax, ay, bx, by, iobj: Segmente und deren Linienobjekte, s. segmente()
+    :type ax, ay, bx, by, iobj: numpy.array
+
+    :radius:        Suchradius
+    :type radius:   float
+
+    :blockgroesse:  Anzahl der Punkte, die gemeinsam bearbeitet werden
+    :type blockgroesse: integer
+
+    :returns:       Index des nächsten Linienobjektes (-1: keines im Suchradius) und Abstand
+    :rtype:         tuple of numpy.arrays
+
+    Bei gleichem Abstand wird das Linienobjekt mit dem kleineren Index gewählt.
+    """
+
+    npunkte = len(px)
+    ergobj = np.repeat(np.int64(-1), npunkte)
+    ergdist = np.repeat(np.inf, npunkte)
+    if npunkte == 0 or len(ax) == 0:
+        return ergobj, ergdist
+
+    abx = bx - ax
+    aby = by - ay
+
+    # Zellgröße: Suchradius, mindestens die mittlere Segmentlänge. Ein Punkt liegt dann höchstens
+    # eine Zelle von allen Segmenten innerhalb des Suchradius entfernt.
+    laenge = np.sqrt(abx * abx + aby * aby)
+    zelle = max(float(radius), float(np.median(laenge)), 1e-6)
+
+    # Raster mit einer Zelle Rand, so dass die Nachbarzellen aller Punkte gültige Indizes haben
+    x0 = min(ax.min(), bx.min(), px.min()) - zelle
+    y0 = min(ay.min(), by.min(), py.min()) - zelle
+    ny = int((max(ay.max(), by.max(), py.max()) - y0) // zelle) + 2
+
+    # Längere Segmente werden in Teilstücke von höchstens einer Zellgröße zerlegt. Jedes Teilstück
+    # wird in die (höchstens 2 x 2) Zellen eingetragen, die sein umschließendes Rechteck berührt.
+    # Die Abstände werden weiterhin zum ganzen Segment (iseg) berechnet.
+    teile = np.maximum(np.ceil(laenge / zelle), 1).astype(np.int64)
+    iseg = np.repeat(np.arange(len(ax), dtype=np.int64), teile)
+    k = _bereiche(np.zeros(len(ax), dtype=np.int64), teile)
+    t0 = k / teile[iseg].astype(float)
+    t1 = (k + 1) / teile[iseg].astype(float)
+    tax = ax[iseg] + t0 * abx[iseg]
+    tay = ay[iseg] + t0 * aby[iseg]
+    tbx = ax[iseg] + t1 * abx[iseg]
+    tby = ay[iseg] + t1 * aby[iseg]
+
+    ix0 = ((np.minimum(tax, tbx) - x0) // zelle).astype(np.int64)
+    ix1 = ((np.maximum(tax, tbx) - x0) // zelle).astype(np.int64)
+    iy0 = ((np.minimum(tay, tby) - y0) // zelle).astype(np.int64)
+    iy1 = ((np.maximum(tay, tby) - y0) // zelle).astype(np.int64)
+    breite = iy1 - iy0 + 1
+    anz = (ix1 - ix0 + 1) * breite
+    iteil = np.repeat(np.arange(len(iseg), dtype=np.int64), anz)
+    k = _bereiche(np.zeros(len(iseg), dtype=np.int64), anz)
+    zx = ix0[iteil] + k // breite[iteil]
+    zy = iy0[iteil] + k % breite[iteil]
+    schluessel = zx * ny + zy
+    folge = np.argsort(schluessel, kind='mergesort')
+    schluessel = schluessel[folge]
+    iseg = iseg[iteil[folge]]
+
+    laenge2 = abx * abx + aby * aby
+    laenge2[laenge2 == 0.] = 1.                     # Segmente der Länge 0: t wird 0
+
+    for anfang in range(0, npunkte, blockgroesse):
+        bpx = px[anfang:anfang + blockgroesse]
+        bpy = py[anfang:anfang + blockgroesse]
+        pix = ((bpx - x0) // zelle).astype(np.int64)
+        piy = ((bpy - y0) // zelle).astype(np.int64)
+
+        # Kandidaten aus den 9 benachbarten Zellen
+        plis = []
+        slis = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                nschl = (pix + dx) * ny + (piy + dy)
+                lo = np.searchsorted(schluessel, nschl, side='left')
+                hi = np.searchsorted(schluessel, nschl, side='right')
+                anzk = hi - lo
+                plis.append(np.repeat(np.arange(len(bpx), dtype=np.int64), anzk))
+                slis.append(iseg[_bereiche(lo, anzk)])
+        ip = np.concatenate(plis)
+        isg = np.concatenate(slis)
+        if len(ip) == 0:
+            continue
+
+        # Abstand Punkt - Segment
+        t = ((bpx[ip] - ax[isg]) * abx[isg] + (bpy[ip] - ay[isg]) * aby[isg]) / laenge2[isg]
+        t = np.clip(t, 0., 1.)
+        dx = bpx[ip] - (ax[isg] + t * abx[isg])
+        dy = bpy[ip] - (ay[isg] + t * aby[isg])
+        dist = np.sqrt(dx * dx + dy * dy)
+
+        innen = dist <= radius
+        ip = ip[innen]
+        dist = dist[innen]
+        io = iobj[isg[innen]]
+        if len(ip) == 0:
+            continue
+
+        # Je Punkt den kleinsten Abstand auswählen
+        folge = np.lexsort((io, dist, ip))
+        ip, dist, io = ip[folge], dist[folge], io[folge]
+        erste = np.concatenate(([True], ip[1:] != ip[:-1]))
+        ergobj[anfang + ip[erste]] = io[erste]
+        ergdist[anfang + ip[erste]] = dist[erste]
+
+    return ergobj, ergdist
+
+
+def linksw_naechste(dbQK, liste_teilgebiete, grenzabstand, epsg):
+    """Erzeugt in der Tabelle linksw für alle noch nicht verbundenen Einleitpunkte die
+    Verbindungslinie zur nächsten Haltung.
+
+    :dbQK:              Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:         DBConnection (geerbt von dbapi...)
+
+    :liste_teilgebiete: Liste der ausgewählten Teilgebiete
+    :type liste_teilgebiete: list of String
+
+    :grenzabstand:      Maximaler Abstand zwischen Einleitpunkt und Haltung
+    :type grenzabstand: float
+
+    :epsg:              Nummer des Projektionssystems
+    :type epsg:         String
+
+    :returns:           Erfolg
+    :rtype:             Boolean
+
+    Die Verbindungslinie verläuft vom Einleitpunkt zum Mittelpunkt der Haltung.
+    """
+
+    if len(liste_teilgebiete) != 0:
+        auswahl = u" AND hal.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
+        auswlin = u" AND linksw.teilgebiet in ('{}')".format(u"', '".join(liste_teilgebiete))
+    else:
+        auswahl = u''
+        auswlin = u''
+
+    sql = u"""SELECT AsBinary(hal.geom), hal.xmitte, hal.ymitte
+            FROM haltungen AS hal
+            WHERE hal.geom IS NOT NULL{auswahl}""".format(auswahl=auswahl)
+    if not dbQK.sql(sql, u"k_nearest.linksw_naechste (1)"):
+        return False
+    daten = dbQK.fetchall()
+    mitte = [(el[1], el[2]) for el in daten]
+    ax, ay, bx, by, iobj = segmente([el[0] for el in daten])
+
+    # Der Einleitpunkt ist der Mittelpunkt des in linksw gespeicherten Kreises
+    sql = u"""SELECT pk, X(Centroid(geom)), Y(Centroid(geom))
+            FROM linksw
+            WHERE glink IS NULL AND geom IS NOT NULL{auswlin}""".format(auswlin=auswlin)
+    if not dbQK.sql(sql, u"k_nearest.linksw_naechste (2)"):
+        return False
+    daten = dbQK.fetchall()
+    pklis = [el[0] for el in daten]
+    px = np.array([el[1] for el in daten], dtype=float)
+    py = np.array([el[2] for el in daten], dtype=float)
+
+    ergobj, ergdist = naechste(px, py, ax, ay, bx, by, iobj, float(grenzabstand))
+
+    srid = int(epsg)
+    daten = [(geoblob.linie(((px[i], py[i]), mitte[iobj]), srid), pklis[i])
+             for i, iobj in enumerate(ergobj.tolist()) if iobj >= 0]
+    logger.debug(u'k_nearest.linksw_naechste: {} von {} Einleitpunkten verbunden'.format(
+        len(daten), len(pklis)))
+
+    sql = u"""UPDATE linksw SET glink = ? WHERE pk = ?"""
+    if not dbQK.executemany(sql, daten, u"k_nearest.linksw_naechste (3)"):
+        return False
+
+    return True
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Parallele Erzeugung der Flächenverknüpfungen
+  ============================================
+
+  Die Suche nach der nächsten Haltung wird auf mehrere Prozesse verteilt. Dazu werden die
+  noch nicht verknüpften Flächen aus linkfl anhand ihres Bezugspunktes auf räumliche Kacheln
+  verteilt. Jeder Prozess öffnet eine eigene, nur lesende Verbindung zur QKan-Datenbank und
+  ermittelt für die Flächen seiner Kachel alle Haltungen innerhalb des Suchradius. Die
+  Haltungen werden dabei nicht auf die Kachel beschränkt, so dass Flächen am Kachelrand
+  dieselben Kandidaten erhalten wie bei der Bearbeitung in einem Prozess.
+
+  Das Zusammenführen erfolgt im Hauptprozess: Je Fläche wird die Haltung mit dem kleinsten
+  Abstand gewählt, bei gleichem Abstand die mit dem kleineren Primärschlüssel. Das Ergebnis
+  ist damit unabhängig von der Anzahl der Prozesse und der Reihenfolge ihrer Fertigstellung.
+  Die Verbindungslinien werden anschließend wie bei der Bearbeitung in einem Prozess in
+  k_link._linkfl_schreiben erzeugt.
+
+  | Dateiname            : k_parallel.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+__author__ = 'Joerg Hoettges'
+__date__ = 'Oktober 2018'
+__copyright__ = '(C) 2018, Joerg Hoettges'
+
+import logging
+import math
+
+import pyspatialite.dbapi2 as splite
+
+from qkan.database.qkan_utils import parallel_ausfuehren
+
+logger = logging.getLogger(u'QKan')
+
+# Anzahl der Kacheln je Prozess. Mehrere kleinere Kacheln gleichen unterschiedlich dicht
+# bebaute Bereiche besser aus.
+KACHELN_JE_PROZESS = 4
+
+
+def _kandidaten(auftrag):
+    """Ermittelt in einem eigenen Prozess die Kandidaten für die Flächen einer Kachel
+
+    :auftrag:       Pfad zur QKan-Datenbank und SQL-Abfrage
+    :type auftrag:  tuple
+
+    :returns:       Liste mit (pk der Fläche, Abstand, pk der Haltung)
+    :rtype:         list of tuples
+    """
+
+    dbname, sql = auftrag
+    consl = splite.connect(database=dbname)
+    try:
+        cursl = consl.cursor()
+        cursl.execute(u'PRAGMA query_only = ON')
+        cursl.execute(sql)
+        return cursl.fetchall()
+    finally:
+        consl.close()
+
+
+def kacheln(punkte, anzahl):
+    """Verteilt Objekte anhand ihrer Bezugspunkte auf ein regelmäßiges Raster von Kacheln
+
+    :punkte:        Liste mit (pk, x, y)
+    :type punkte:   list of tuples
+
+    :anzahl:        Gewünschte Mindestanzahl der Kacheln
+    :type anzahl:   integer
+
+    :returns:       Liste der nicht leeren Kacheln als sortierte Listen von Primärschlüsseln
+    :rtype:         list of lists
+    """
+
+    punkte = [p for p in punkte if p[1] is not None and p[2] is not None]
+    if len(punkte) == 0:
+        return []
+
+    n = max(int(math.ceil(math.sqrt(anzahl))), 1)
+    xmin = min(p[1] for p in punkte)
+    ymin = min(p[2] for p in punkte)
+    dx = (max(p[1] for p in punkte) - xmin) / n or 1.
+    dy = (max(p[2] for p in punkte) - ymin) / n or 1.
+
+    kachelliste = {}
+    for pk, x, y in punkte:
+        ix = min(int((x - xmin) / dx), n - 1)
+        iy = min(int((y - ymin) / dy), n - 1)
+        kachelliste.setdefault((ix, iy), []).append(pk)
+
+    return [sorted(kachelliste[k]) for k in sorted(kachelliste)]
+
+
+def linkfl_parallel(dbQK, sql_kandidaten, prozesse):
+    """Ermittelt mit mehreren Prozessen für die noch nicht verknüpften Flächen in linkfl die
+    jeweils nächste Haltung
+
+    :dbQK:              Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:         DBConnection (geerbt von dbapi...)
+
+    :sql_kandidaten:    SQL-Abfrage, die für die Flächen in {pkliste} alle in Frage kommenden
+                        Haltungen als (pk der Fläche, Abstand, pk der Haltung) liefert
+    :type sql_kandidaten: String
+
+    :prozesse:          Anzahl der parallelen Prozesse. Voraussetzungen und Rückfall auf einen
+                        Prozess s. parallel_ausfuehren.
+    :type prozesse:     integer
+
+    :returns:           Liste mit (pk der Fläche, pk der Haltung), None bei einem Fehler
+    :rtype:             list of tuples
+    """
+
+    # Die Prozesse lesen aus der Datenbankdatei. Deshalb müssen die in createlinkfl
+    # eingefügten Flächen vorher gespeichert werden.
+    dbQK.commit()
+
+    sql = u"""SELECT pk, X(PointOnSurface(geom)), Y(PointOnSurface(geom))
+            FROM linkfl
+            WHERE glink IS NULL AND gbuf IS NOT NULL"""
+    if not dbQK.sql(sql, u"k_parallel.linkfl_parallel"):
+        return None
+    auftraege = [(dbQK.dbname, sql_kandidaten.format(pkliste=u', '.join([str(pk) for pk in pkliste])))
+                 for pkliste in kacheln(dbQK.fetchall(), prozesse * KACHELN_JE_PROZESS)]
+
+    if len(auftraege) == 0:
+        return []
+
+    # Steht der Pool nicht zur Verfügung, werden die Kacheln nacheinander in diesem Prozess bearbeitet
+    ergebnisse = parallel_ausfuehren(_kandidaten, auftraege, prozesse)
+    if ergebnisse is None:
+        ergebnisse = [_kandidaten(auftrag) for auftrag in auftraege]
+
+    # Zusammenführen: Je Fläche die nächste Haltung, bei gleichem Abstand die mit dem kleineren pk
+    naechste = {}
+    for ergebnis in ergebnisse:
+        for pk, dist, hpk in ergebnis:
+            if dist is None:
+                continue
+            if pk not in naechste or (dist, hpk) < naechste[pk]:
+                naechste[pk] = (dist, hpk)
+
+    logger.debug(u'k_parallel.linkfl_parallel: {} Kacheln, {} Flächen verknüpft'.format(
+        len(auftraege), len(naechste)))
+
+    return [(pk, hpk) for pk, (dist, hpk) in sorted(naechste.items())]
@@ -46,7 +46,8 @@ from k_layersadapt import layersadapt
 from k_runoffparams import setRunoffparams
 from qkan import Dummy
 from qkan.database.dbfunc import DBConnection
-from qkan.database.qkan_utils import get_database_QKan, get_editable_layers, fehlermeldung, meldung, sqlconditions, isQkanLayer
+from qkan.database.qkan_utils import get_database_QKan, get_editable_layers, fehlermeldung, meldung, isQkanLayer, \
+    Auswahlhistogramm
 
 # Anbindung an Logging-System (Initialisierung in __init__)
 logger = logging.getLogger(u'QKan')
@@ -583,18 +584,11 @@ class QKanTools:
         liste_teilgebiete = self.listselecteditems(self.dlgro.lw_teilgebiete)
         liste_abflussparameter = self.listselecteditems(self.dlgro.lw_abflussparameter)
 
-        # Auswahl der zu bearbeitenden Flächen
-        auswahl = sqlconditions('WHERE', ('teilgebiet', 'abflussparameter'), (liste_teilgebiete, liste_abflussparameter))
-
-        sql = u"""SELECT count(*) AS anzahl FROM flaechen{auswahl}""".format(auswahl=auswahl)
-
-        if not self.dbQK.sql(sql, u"QKan_Tools.application.dlgro_countselection (1)"):
+        # Anzahl der zu bearbeitenden Flächen
+        anzahl = self.histo_flaechen.anzahl((liste_teilgebiete, liste_abflussparameter))
+        if anzahl is None:
             return False
-        daten = self.dbQK.fetchone()
-        if not (daten is None):
-            self.dlgro.lf_anzahl_flaechen.setText(str(daten[0]))
-        else:
-            self.dlgro.lf_anzahl_flaechen.setText('0')
+        self.dlgro.lf_anzahl_flaechen.setText(str(anzahl))
 
 
     def run_runoffparams(self):
@@ -713,6 +707,10 @@ class QKanTools:
                 # if len(daten) == 1:
                 # self.dlgro.lw_abflussparameter.setCurrentRow(0)
 
+        # Häufigkeitstabelle für die Anzeige der Anzahl der ausgewählten Flächen. Sie wird
+        # nur neu gelesen, wenn die Datenbank zwischenzeitlich geändert wurde.
+        self.histo_flaechen = Auswahlhistogramm(self.dbQK, u'flaechen', (u'teilgebiet', u'abflussparameter'))
+
         self.dlgro_countselection()
 
         # Funktionen zur Berechnung des Oberflächenabflusses
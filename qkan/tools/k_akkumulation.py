@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Akkumulation entlang des Fließweges
+  ===================================
+
+  Summiert für jede Haltung (sowie für Wehre und Pumpen) die oberhalb angeschlossenen
+  befestigten und unbefestigten Flächen, die Einwohnerwerte und die Zuflüsse aus der
+  Tabelle einleit. Das Kanalnetz wird dazu einmal topologisch sortiert und ebenenweise mit
+  NumPy aufsummiert.
+
+  Verzweigungen: Gehen von einem Schacht mehrere Haltungen oder Pumpen ab, wird der
+  Zufluss gleichmäßig auf diese aufgeteilt. Wehre erhalten keinen Anteil, solange
+  an dem Schacht noch eine Haltung oder Pumpe abgeht, weil sie nur im Entlastungsfall
+  anspringen. Sind nur Wehre vorhanden, wird der Zufluss auf diese aufgeteilt.
+
+  Die Ergebnisse werden in die Tabelle "akkumulation" (ab Version 2.5.13 der QKan-Datenbank)
+  geschrieben. Im inkrementellen Modus werden nur die Objekte unterhalb der geänderten Objekte
+  neu berechnet und geschrieben.
+
+  | Dateiname            : k_akkumulation.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+__author__ = 'Joerg Hoettges'
+__date__ = 'Oktober 2018'
+__copyright__ = '(C) 2018, Joerg Hoettges'
+
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from qkan.database.netz import Netz, WEHR, kantentypen
+from qkan.database.qkan_utils import fehlermeldung
+
+logger = logging.getLogger(u'QKan')
+
+# Akkumulierte Größen in der Reihenfolge der Spalten der Ergebnistabelle
+groessen = (u'flbef', u'fldur', u'ew', u'zufluss')
+
+
+def verteilung(netz):
+    """Anteile, mit denen der Zufluss eines Schachtes auf die abgehenden Kanten verteilt wird
+
+    :netz:          Kanalnetz
+    :type netz:     Netz
+
+    :returns:       Anteil je Kante
+    :rtype:         numpy.array
+    """
+
+    nk = netz.anzahl_knoten
+    oben = netz.oben
+    gueltig = oben >= 0
+    regulaer = gueltig & (netz.kantentyp != WEHR)
+
+    anz_alle = np.bincount(oben[gueltig], minlength=nk)
+    anz_regulaer = np.bincount(oben[regulaer], minlength=nk)
+
+    anteil = np.zeros(netz.anzahl_kanten)
+    o = oben[gueltig]
+    # Wehre nur, wenn am Schacht keine Haltung oder Pumpe abgeht
+    anteil[gueltig] = np.where(anz_regulaer[o] > 0,
+                               regulaer[gueltig] / np.maximum(anz_regulaer[o], 1.),
+                               1. / np.maximum(anz_alle[o], 1.))
+    return anteil
+
+
+def akkumulieren(netz, lokal, anteil, berechnen=None, gespeichert=None):
+    """Summiert die lokalen Größen entlang des Fließweges
+
+    :netz:          Kanalnetz
+    :type netz:     Netz
+
+    :lokal:         Lokale Größen je Kante (Kanten x Größen)
+    :type lokal:    numpy.array
+
+    :anteil:        Verteilung des Zuflusses am oberen Schacht, s. verteilung
+    :type anteil:   numpy.array
+
+    :berechnen:     Nur diese Kanten werden berechnet (inkrementeller Modus)
+    :type berechnen: numpy.array of bool
+
+    :gespeichert:   Für die übrigen Kanten die bisherigen Ergebnisse
+    :type gespeichert: numpy.array
+
+    :returns:       Akkumulierte Größen je Kante, für Kanten in Zyklen NaN
+    :rtype:         numpy.array
+    """
+
+    nk = netz.anzahl_knoten
+    ng = lokal.shape[1]
+    knoten = np.zeros((nk + 1, ng))                 # letzte Zeile: Kanten ohne Schacht
+    ergebnis = np.repeat(np.nan, lokal.size).reshape(lokal.shape)
+    oben = np.where(netz.oben >= 0, netz.oben, nk)
+    unten = np.where(netz.unten >= 0, netz.unten, nk)
+
+    for ebene in netz.ebenen():
+        summe = lokal[ebene] + knoten[oben[ebene]] * anteil[ebene, np.newaxis]
+        if berechnen is not None:
+            summe = np.where(berechnen[ebene, np.newaxis], summe, gespeichert[ebene])
+        ergebnis[ebene] = summe
+        for j in range(ng):
+            knoten[:, j] += np.bincount(unten[ebene], weights=summe[:, j], minlength=nk + 1)
+
+    return ergebnis
+
+
+def _lokal(dbQK, netz):
+    """Liest die lokal an die Kanten angeschlossenen Größen
+
+    :returns:       Lokale Größen je Kante (Kanten x Größen) oder None bei einem Fehler
+    :rtype:         numpy.array
+    """
+
+    lokal = np.zeros((netz.anzahl_kanten, len(groessen)))
+
+    # Flächen in ha, befestigt: Abflussparameter ohne Bodenklasse. Aufgeteilte Flächen
+    # gehen mit dem Anteil in linkfl ein.
+    sql = u"""SELECT lf.haltnam, ap.bodenklasse IS NULL,
+                sum(CASE WHEN fl.aufteilen = 'ja' THEN area(lf.geom) ELSE fl.geomflaeche END)/10000.
+            FROM linkfl AS lf
+            INNER JOIN flaechen AS fl
+            ON lf.flnam = fl.flnam
+            LEFT JOIN abflussparameter AS ap
+            ON fl.abflussparameter = ap.apnam
+            WHERE lf.haltnam IS NOT NULL
+            GROUP BY lf.haltnam, ap.bodenklasse IS NULL"""
+    zeilen = dbQK.abfrage(sql, u'k_akkumulation._lokal (1)')
+    if zeilen is None:
+        return None
+    for haltnam, befestigt, flaeche in zeilen:
+        i = netz.kantenindex.get(haltnam)
+        if i is not None:
+            lokal[i, 0 if befestigt else 1] += flaeche or 0.
+
+    sql = u"""SELECT haltnam, sum(ew), sum(zufluss)
+            FROM einleit
+            WHERE haltnam IS NOT NULL
+            GROUP BY haltnam"""
+    zeilen = dbQK.abfrage(sql, u'k_akkumulation._lokal (2)')
+    if zeilen is None:
+        return None
+    for haltnam, ew, zufluss in zeilen:
+        i = netz.kantenindex.get(haltnam)
+        if i is not None:
+            lokal[i, 2] += ew or 0.
+            lokal[i, 3] += zufluss or 0.
+
+    return lokal
+
+
+def _alteunterhalb(gespeichert, namen):
+    """Ermittelt die Objekte unterhalb der geänderten Objekte im bisherigen Netzzustand,
+    wie er in der Tabelle akkumulation gespeichert ist.
+
+    :gespeichert:   Liste mit (name, schoben, schunten)
+    :namen:         Namen der geänderten Objekte
+
+    :returns:       Namen der betroffenen Objekte
+    :rtype:         set
+    """
+
+    abgehend = {}
+    schunten = {}
+    for name, oben, unten in gespeichert:
+        abgehend.setdefault(oben, []).append(name)
+        schunten[name] = unten
+
+    betroffen = set()
+    offen = [n for n in namen if n in schunten]
+    while offen:
+        name = offen.pop()
+        if name in betroffen:
+            continue
+        betroffen.add(name)
+        offen.extend(abgehend.get(schunten[name], []))
+    return betroffen
+
+
+def akkumulation(dbQK, liste_geaendert=None):
+    """Berechnet die akkumulierten Flächen, Einwohnerwerte und Zuflüsse und schreibt sie
+    in die Tabelle akkumulation.
+
+    :dbQK:              Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:         DBConnection (geerbt von dbapi...)
+
+    :liste_geaendert:   Namen der geänderten Haltungen, Wehre und Pumpen. Wenn angegeben, werden nur
+                        die Objekte unterhalb dieser Objekte (im alten und neuen Netzzustand)
+                        neu berechnet. Bei None wird das gesamte Netz berechnet.
+    :type liste_geaendert: list of strings
+
+    :returns:           Erfolg
+    :rtype:             Boolean
+    """
+
+    # Netz.holen speichert offene Änderungen in dbQK (commit), damit das Netzabbild aktuell ist
+    netz = Netz.holen(dbQK)
+    if netz is None:
+        return False
+
+    netz.ebenen()
+    lokal = _lokal(dbQK, netz)
+    if lokal is None:
+        return False
+    anteil = verteilung(netz)
+
+    berechnen = None
+    gespeichert = None
+    entfernt = []
+    if liste_geaendert is not None:
+        sql = u"""SELECT name, schoben, schunten, flbef, fldur, ew, zufluss FROM akkumulation"""
+        if not dbQK.sql(sql, u'k_akkumulation.akkumulation (1)'):
+            return False
+        daten = dbQK.fetchall()
+
+        gespeichert = np.repeat(np.nan, lokal.size).reshape(lokal.shape)
+        for zeile in daten:
+            i = netz.kantenindex.get(zeile[0])
+            if i is not None:
+                gespeichert[i] = [np.nan if w is None else w for w in zeile[3:]]
+
+        # Betroffen sind die Objekte unterhalb der geänderten Objekte im neuen Netzzustand
+        # sowie diejenigen, die im alten Netzzustand unterhalb lagen (z.B. bei geändertem schunten)
+        alt = _alteunterhalb([zeile[:3] for zeile in daten], liste_geaendert)
+        entfernt = [name for name in alt if name not in netz.kantenindex]
+        kanten = [netz.kantenindex[name] for name in set(liste_geaendert) | alt if name in netz.kantenindex]
+        berechnen = netz.unterhalb(kanten)
+
+        # Fehlen für nicht betroffene Objekte die bisherigen Ergebnisse, wird alles neu berechnet
+        pruefen = ~berechnen
+        pruefen[netz.zyklus] = False
+        if np.isnan(gespeichert[pruefen]).any():
+            logger.debug(u'k_akkumulation.akkumulation: Ergebnisse unvollständig, vollständige Berechnung')
+            berechnen = None
+            gespeichert = None
+
+    ergebnis = akkumulieren(netz, lokal, anteil, berechnen, gespeichert)
+
+    if berechnen is None:
+        kanten = np.arange(netz.anzahl_kanten)
+        if not dbQK.sql(u'DELETE FROM akkumulation', u'k_akkumulation.akkumulation (2)'):
+            return False
+    else:
+        kanten = np.nonzero(berechnen)[0]
+        namen = [(netz.kantennamen[i],) for i in kanten] + [(name,) for name in entfernt]
+        if not dbQK.executemany(u'DELETE FROM akkumulation WHERE name = ?', namen,
+                                u'k_akkumulation.akkumulation (3)'):
+            return False
+
+    daten = []
+    for i in kanten:
+        oben, unten = netz.oben[i], netz.unten[i]
+        daten.append([netz.kantennamen[i], kantentypen[netz.kantentyp[i]],
+                      netz.knotennamen[oben] if oben >= 0 else None,
+                      netz.knotennamen[unten] if unten >= 0 else None] +
+                     [None if np.isnan(w) else float(w) for w in ergebnis[i]])
+
+    sql = u"""INSERT INTO akkumulation (name, typ, schoben, schunten, flbef, fldur, ew, zufluss)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+    if not dbQK.executemany(sql, daten, u'k_akkumulation.akkumulation (4)'):
+        return False
+
+    dbQK.commit()
+
+    if len(netz.zyklus) > 0:
+        fehlermeldung(u'Warnung in k_akkumulation.akkumulation',
+                      u'{} Objekte liegen in einem Zyklus und wurden nicht berechnet, z.B. "{}"'.format(
+                          len(netz.zyklus), netz.kantennamen[netz.zyklus[0]]))
+
+    logger.debug(u'k_akkumulation.akkumulation: {} von {} Objekten berechnet'.format(
+        len(kanten), netz.anzahl_kanten))
+    return True
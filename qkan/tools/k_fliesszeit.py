@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Fließzeiten im Kanalnetz
+  ========================
+
+  Berechnet für jede Haltung die Rohrfließzeit aus Länge, Gefälle und Profil (Vollfüllung nach
+  Prandtl-Colebrook) und daraus die Konzentrationszeit, d.h. die längste Fließzeit von einer
+  angeschlossenen Fläche bis zum unteren Ende der Haltung. Die Anfangszeit einer Haltung ist
+  die größte Summe aus fliesszeitflaeche und fliesszeitkanal der mit ihr verknüpften Flächen,
+  wie sie von setRunoffparams im Modus "Fliesszeiten" eingetragen werden.
+
+  Die Konzentrationszeit wird als längster Weg ebenenweise entlang der topologischen
+  Sortierung des Netzes ermittelt. Wehre, die an einem Schacht neben einer Haltung oder Pumpe
+  abgehen, werden wie bei der Akkumulation nicht durchflossen. Für Variantenrechnungen
+  (z.B. geänderte Rauheit oder Mindestgefälle) können rohrfliesszeit und konzentrationszeit
+  mehrfach mit demselben Netz aufgerufen werden, ohne die Datenbank erneut zu lesen.
+
+  | Dateiname            : k_fliesszeit.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+__author__ = 'Joerg Hoettges'
+__date__ = 'Oktober 2018'
+__copyright__ = '(C) 2018, Joerg Hoettges'
+
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from qkan.database.netz import Netz, HALTUNG, kantentypen
+from qkan.database.qkan_utils import fehlermeldung
+from qkan.tools.k_akkumulation import verteilung
+
+logger = logging.getLogger(u'QKan')
+
+# Kinematische Zähigkeit von Wasser bei 10 °C [m²/s]
+NUE = 1.31e-6
+G = 9.81
+
+
+def rohrfliesszeit(netz, ks=1.5, gefaelle_min=0.001, vmin=0.1):
+    """Fließzeiten der Kanten bei Vollfüllung in Minuten
+
+    :netz:          Kanalnetz
+    :type netz:     Netz
+
+    :ks:            Betriebliche Rauheit in mm für Haltungen ohne Angabe
+    :type ks:       Real
+
+    :gefaelle_min:  Mindestgefälle, z.B. für Haltungen ohne Gefälle oder mit Gegengefälle
+    :type gefaelle_min: Real
+
+    :vmin:          Mindestfließgeschwindigkeit in m/s
+    :type vmin:     Real
+
+    :returns:       Fließzeit je Kante, für Wehre und Pumpen 0
+    :rtype:         numpy.array
+    """
+
+    laenge = np.nan_to_num(netz.laenge)
+    gefaelle = (netz.sohleoben - netz.sohleunten) / np.where(laenge > 0, laenge, np.nan)
+    gefaelle = np.fmax(np.nan_to_num(gefaelle), gefaelle_min)
+
+    # Hydraulischer Durchmesser: Kreisprofil (ohne Breite) bzw. Rechteck
+    hoehe = netz.hoehe
+    breite = np.where(np.isnan(netz.breite) | (netz.breite <= 0), hoehe, netz.breite)
+    dh = np.where(breite == hoehe, hoehe, 2. * breite * hoehe / (breite + hoehe))
+    dh = np.where(np.isnan(dh) | (dh <= 0), np.nan, dh)
+    k = np.where(np.isnan(netz.ks), ks, netz.ks) / 1000.
+
+    wurzel = np.sqrt(2. * G * dh * gefaelle)
+    v = -2. * np.log10(2.51 * NUE / (dh * wurzel) + k / (3.71 * dh)) * wurzel
+    v = np.fmax(np.nan_to_num(v), vmin)
+
+    zeit = laenge / v / 60.
+    zeit[netz.kantentyp != HALTUNG] = 0.
+    return zeit
+
+
+def konzentrationszeit(netz, anfang, fliesszeit, anteil):
+    """Längste Fließzeit bis zum unteren Ende jeder Kante
+
+    :netz:          Kanalnetz
+    :type netz:     Netz
+
+    :anfang:        Anfangszeit je Kante aus den angeschlossenen Flächen in Minuten
+    :type anfang:   numpy.array
+
+    :fliesszeit:    Rohrfließzeit je Kante in Minuten
+    :type fliesszeit: numpy.array
+
+    :anteil:        Verteilung am oberen Schacht, s. k_akkumulation.verteilung. Kanten mit dem
+                    Anteil 0 werden nicht von oben durchflossen.
+    :type anteil:   numpy.array
+
+    :returns:       Konzentrationszeit je Kante in Minuten, für Kanten in Zyklen NaN
+    :rtype:         numpy.array
+    """
+
+    nk = netz.anzahl_knoten
+    knoten = np.zeros(nk + 1)                       # letzte Position: Kanten ohne Schacht
+    ergebnis = np.repeat(np.nan, netz.anzahl_kanten)
+    oben = np.where((netz.oben >= 0) & (anteil > 0), netz.oben, nk)
+    unten = np.where(netz.unten >= 0, netz.unten, nk)
+
+    for ebene in netz.ebenen():
+        zeit = np.fmax(anfang[ebene], knoten[oben[ebene]]) + fliesszeit[ebene]
+        ergebnis[ebene] = zeit
+        np.maximum.at(knoten, unten[ebene], zeit)
+        knoten[nk] = 0.
+
+    return ergebnis
+
+
+def _anfangszeit(dbQK, netz):
+    """Liest die Anfangszeiten der Kanten aus den Flächenverknüpfungen
+
+    :returns:       Anfangszeit je Kante in Minuten oder None bei einem Fehler
+    :rtype:         numpy.array
+    """
+
+    anfang = np.zeros(netz.anzahl_kanten)
+    sql = u"""SELECT haltnam, max(coalesce(fliesszeitflaeche, 0) + coalesce(fliesszeitkanal, 0))
+            FROM linkfl
+            WHERE haltnam IS NOT NULL
+            GROUP BY haltnam"""
+    zeilen = dbQK.abfrage(sql, u'k_fliesszeit._anfangszeit')
+    if zeilen is None:
+        return None
+    for haltnam, zeit in zeilen:
+        i = netz.kantenindex.get(haltnam)
+        if i is not None and zeit is not None:
+            anfang[i] = max(anfang[i], zeit)
+    return anfang
+
+
+def fliesszeiten(dbQK, ks=1.5, gefaelle_min=0.001):
+    """Berechnet die Rohrfließzeiten und Konzentrationszeiten und schreibt sie in die
+    Tabelle fliesszeiten (ab Version 2.5.13 der QKan-Datenbank).
+
+    :dbQK:              Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:         DBConnection (geerbt von dbapi...)
+
+    :ks:                Betriebliche Rauheit in mm für Haltungen ohne Angabe
+    :type ks:           Real
+
+    :gefaelle_min:      Mindestgefälle
+    :type gefaelle_min: Real
+
+    :returns:           Erfolg
+    :rtype:             Boolean
+    """
+
+    # Netz.holen speichert offene Änderungen in dbQK (commit), damit das Netzabbild aktuell ist
+    netz = Netz.holen(dbQK)
+    if netz is None:
+        return False
+
+    anfang = _anfangszeit(dbQK, netz)
+    if anfang is None:
+        return False
+
+    fliesszeit = rohrfliesszeit(netz, ks, gefaelle_min)
+    tc = konzentrationszeit(netz, anfang, fliesszeit, verteilung(netz))
+
+    if not dbQK.sql(u'DELETE FROM fliesszeiten', u'k_fliesszeit.fliesszeiten (1)'):
+        return False
+
+    daten = [(netz.kantennamen[i], kantentypen[netz.kantentyp[i]], float(fliesszeit[i]),
+              None if np.isnan(tc[i]) else float(tc[i])) for i in range(netz.anzahl_kanten)]
+    sql = u"""INSERT INTO fliesszeiten (name, typ, fliesszeitrohr, konzentrationszeit)
+            VALUES (?, ?, ?, ?)"""
+    if not dbQK.executemany(sql, daten, u'k_fliesszeit.fliesszeiten (2)'):
+        return False
+
+    dbQK.commit()
+
+    if len(netz.zyklus) > 0:
+        fehlermeldung(u'Warnung in k_fliesszeit.fliesszeiten',
+                      u'{} Objekte liegen in einem Zyklus und wurden nicht berechnet, z.B. "{}"'.format(
+                          len(netz.zyklus), netz.kantennamen[netz.zyklus[0]]))
+
+    return True
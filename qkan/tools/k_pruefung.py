@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Plausibilitätsprüfung eines QKan-Projektes
+  ==========================================
+
+  Prüft alle Tabellen eines Projektes nach einheitlichen Regeln, die in "pruefregeln"
+  beschrieben sind. Jede Tabelle wird dabei mit einer einzigen Abfrage gelesen, die je
+  Datensatz alle Prüfgrößen liefert:
+
+    name_fehlt          Name (Schlüsselattribut) ist leer
+    name_doppelt        Name ist mehrfach vergeben
+    geometrie_fehlt     Kein Geoobjekt
+    geometrie_ungueltig Geoobjekt ist ungültig (IsValid)
+    referenz_fehlt      Pflichtverweis (z.B. schoben) ist leer
+    referenz_unbekannt  Verweis auf ein nicht vorhandenes Objekt (z.B. Schacht, Profil, Entwässerungsart)
+    netz_getrennt       Haltungen, Wehre und Pumpen ohne Verbindung zum Hauptnetz, Schächte ohne Anschluss
+
+  Die Befunde werden in die Tabelle "pruefergebnisse" geschrieben. Die Tabellen können auf
+  ausdrücklichen Wunsch mit mehreren Prozessen gleichzeitig geprüft werden (s. parallel_ausfuehren);
+  der Netzzusammenhang wird anschließend im Hauptprozess ermittelt.
+
+  Im inkrementellen Modus werden nur die seit der letzten Prüfung geänderten Datensätze sowie
+  die Datensätze mit gleichem Namen oder mit Verweisen auf geänderte Objekte erneut geprüft.
+  Die Änderungen werden dazu von Triggern in der Tabelle "pruefaenderungen" vermerkt, jede
+  Kombination aus Datensatz und Name nur einmal. Die Trigger werden nur bei einer inkrementellen
+  Prüfung angelegt und bei einer vollständigen Prüfung wieder entfernt, damit andere Funktionen
+  nicht durch die Vermerke gebremst werden. UPDATE-Trigger reagieren nur auf die geprüften
+  Attribute. Fehlen Trigger (z.B. bei der ersten inkrementellen Prüfung), wird vollständig
+  geprüft.
+
+  | Dateiname            : k_pruefung.py
+  | Date                 : Oktober 2018
+  | Copyright            : (C) 2018 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+'''
+
+__author__ = 'Joerg Hoettges'
+__date__ = 'Oktober 2018'
+__copyright__ = '(C) 2018, Joerg Hoettges'
+
+import logging
+import time
+
+import pyspatialite.dbapi2 as splite
+
+from qkan.database.netz import Netz, np, HALTUNG, WEHR, PUMPE
+from qkan.database.qkan_utils import parallel_ausfuehren
+
+logger = logging.getLogger(u'QKan')
+
+# Prüfregeln je Tabelle:
+#   name:       Schlüsselattribut, das gefüllt und eindeutig sein muss (None: keine Prüfung)
+#   geom:       Geo-Attribut, das vorhanden und gültig sein muss (None: keine Prüfung)
+#   referenzen: Verweise als (Attribut, Zieltabelle, Zielattribut, Pflicht)
+pruefregeln = {
+    u'schaechte': {u'name': u'schnam', u'geom': u'geop',
+                   u'referenzen': [(u'entwart', u'entwaesserungsarten', u'bezeichnung', False)]},
+    u'haltungen': {u'name': u'haltnam', u'geom': u'geom',
+                   u'referenzen': [(u'schoben', u'schaechte', u'schnam', True),
+                                   (u'schunten', u'schaechte', u'schnam', True),
+                                   (u'profilnam', u'profile', u'profilnam', True),
+                                   (u'entwart', u'entwaesserungsarten', u'bezeichnung', False)]},
+    u'wehre': {u'name': u'wnam', u'geom': u'geom',
+               u'referenzen': [(u'schoben', u'schaechte', u'schnam', True),
+                               (u'schunten', u'schaechte', u'schnam', True)]},
+    u'pumpen': {u'name': u'pnam', u'geom': u'geom',
+                u'referenzen': [(u'schoben', u'schaechte', u'schnam', True),
+                                (u'schunten', u'schaechte', u'schnam', True)]},
+    u'flaechen': {u'name': u'flnam', u'geom': u'geom',
+                  u'referenzen': [(u'abflussparameter', u'abflussparameter', u'apnam', True)]},
+    u'tezg': {u'name': u'flnam', u'geom': u'geom',
+              u'referenzen': [(u'abflussparameter', u'abflussparameter', u'apnam', False)]},
+    u'linkfl': {u'name': None, u'geom': u'glink',
+                u'referenzen': [(u'flnam', u'flaechen', u'flnam', True),
+                                (u'haltnam', u'haltungen', u'haltnam', True)]},
+    u'einleit': {u'name': u'elnam', u'geom': u'geom',
+                 u'referenzen': [(u'haltnam', u'haltungen', u'haltnam', False)]},
+    u'abflussparameter': {u'name': u'apnam', u'geom': None,
+                          u'referenzen': [(u'bodenklasse', u'bodenklassen', u'bknam', False)]},
+}
+
+# Tabellen des Kanalnetzes. Bei Änderungen darin wird der Netzzusammenhang neu geprüft.
+netztabellen = (u'schaechte', u'haltungen', u'wehre', u'pumpen')
+kantentabellen = {HALTUNG: u'haltungen', WEHR: u'wehre', PUMPE: u'pumpen'}
+
+# Schwere der Befunde
+FEHLER = u'Fehler'
+WARNUNG = u'Warnung'
+HINWEIS = u'Hinweis'
+
+
+def _schluessel():
+    """Schlüsselattribut je Tabelle, das bei Änderungen vermerkt wird: Für geprüfte Tabellen der
+    Name, für Tabellen, auf die nur verwiesen wird, das Zielattribut der Verweise."""
+
+    schluessel = {}
+    for tab, regel in pruefregeln.items():
+        for attr, ziel, zielattr, pflicht in regel[u'referenzen']:
+            schluessel.setdefault(ziel, zielattr)
+    for tab, regel in pruefregeln.items():
+        schluessel[tab] = regel[u'name'] or u'pk'
+    return schluessel
+
+
+def _spalten():
+    """Attribute je Tabelle, deren Änderung sich auf die Prüfung auswirkt: Name, Geo-Attribut,
+    Verweise sowie die Zielattribute der Verweise anderer Tabellen auf diese Tabelle. Nur bei
+    Änderungen dieser Attribute vermerken die UPDATE-Trigger eine Änderung."""
+
+    spalten = {}
+    for tab, regel in pruefregeln.items():
+        liste = spalten.setdefault(tab, [])
+        for attr in [regel[u'name'], regel[u'geom']] + [ref[0] for ref in regel[u'referenzen']]:
+            if attr is not None and attr not in liste:
+                liste.append(attr)
+        for attr, ziel, zielattr, pflicht in regel[u'referenzen']:
+            liste = spalten.setdefault(ziel, [])
+            if zielattr not in liste:
+                liste.append(zielattr)
+    return spalten
+
+
+def _verwender():
+    """Geprüfte Tabellen je Tabelle, deren Prüfung die dort vermerkten Änderungen auswertet:
+    die Tabelle selbst und die Tabellen mit Verweisen auf sie"""
+
+    verwender = {}
+    for tab, regel in pruefregeln.items():
+        verwender.setdefault(tab, set()).add(tab)
+        for attr, ziel, zielattr, pflicht in regel[u'referenzen']:
+            verwender.setdefault(ziel, set()).add(tab)
+    return verwender
+
+
+def _sqlscan(tab, inkrementell):
+    """Abfrage, die für jeden Datensatz der Tabelle alle Prüfgrößen liefert:
+    pk, Name, Anzahl gleicher Namen, Geometrie fehlt, IsValid, je Verweis (Wert, vorhanden)
+
+    :inkrementell:  Nur geänderte Datensätze und die davon abhängigen
+    :type inkrementell: Boolean
+    """
+
+    regel = pruefregeln[tab]
+    name = regel[u'name']
+    geom = regel[u'geom']
+
+    spalten = [u't.pk']
+    if name is None:
+        spalten += [u'NULL', u'1']
+    else:
+        spalten += [u't.{}'.format(name),
+                    u'(SELECT count(*) FROM {tab} AS d WHERE d.{name} = t.{name})'.format(tab=tab, name=name)]
+    if geom is None:
+        spalten += [u'0', u'1']
+    else:
+        spalten += [u't.{} IS NULL'.format(geom), u'IsValid(t.{})'.format(geom)]
+    for attr, ziel, zielattr, pflicht in regel[u'referenzen']:
+        spalten += [u't.{}'.format(attr),
+                    u'EXISTS (SELECT 1 FROM {ziel} AS z WHERE z.{zielattr} = t.{attr})'.format(
+                        ziel=ziel, zielattr=zielattr, attr=attr)]
+
+    sql = u"""SELECT {spalten}
+            FROM {tab} AS t""".format(spalten=u', '.join(spalten), tab=tab)
+
+    if inkrementell:
+        geaendert = u"""(SELECT {sp} FROM pruefaenderungen WHERE tabelle = '{tab}')"""
+        bedingungen = [u't.pk IN {}'.format(geaendert.format(sp=u'objekt_pk', tab=tab))]
+        if name is not None:
+            bedingungen.append(u't.{} IN {}'.format(name, geaendert.format(sp=u'name', tab=tab)))
+        for attr, ziel, zielattr, pflicht in regel[u'referenzen']:
+            bedingungen.append(u't.{} IN {}'.format(attr, geaendert.format(sp=u'name', tab=ziel)))
+        sql += u"""
+            WHERE {}""".format(u'\n                OR '.join(bedingungen))
+
+    return sql
+
+
+def _befunde(tab, zeilen):
+    """Wertet die Prüfgrößen einer Tabelle aus (s. _sqlscan)
+
+    :returns:       geprüfte pk und Befunde als (Tabelle, pk, Name, Regel, Schwere, Meldung)
+    :rtype:         tuple
+    """
+
+    regel = pruefregeln[tab]
+    referenzen = regel[u'referenzen']
+    geprueft = []
+    befunde = []
+    for zeile in zeilen:
+        pk, name, anzahl, ohnegeom, gueltig = zeile[:5]
+        geprueft.append(pk)
+        if regel[u'name'] is not None:
+            if name is None or not u'{}'.format(name).strip():
+                befunde.append((tab, pk, name, u'name_fehlt', FEHLER,
+                                u'{} ist leer'.format(regel[u'name'])))
+            elif anzahl > 1:
+                befunde.append((tab, pk, name, u'name_doppelt', FEHLER,
+                                u'{} "{}" ist {}-fach vergeben'.format(regel[u'name'], name, anzahl)))
+        if regel[u'geom'] is not None:
+            if ohnegeom:
+                befunde.append((tab, pk, name, u'geometrie_fehlt', FEHLER,
+                                u'Kein Geoobjekt in {}'.format(regel[u'geom'])))
+            elif gueltig == 0:
+                befunde.append((tab, pk, name, u'geometrie_ungueltig', WARNUNG,
+                                u'Geoobjekt in {} ist ungültig'.format(regel[u'geom'])))
+        for i, (attr, ziel, zielattr, pflicht) in enumerate(referenzen):
+            wert, vorhanden = zeile[5 + 2 * i:7 + 2 * i]
+            if wert is None or not u'{}'.format(wert).strip():
+                if pflicht:
+                    befunde.append((tab, pk, name, u'referenz_fehlt', FEHLER,
+                                    u'{} ist leer'.format(attr)))
+            elif not vorhanden:
+                befunde.append((tab, pk, name, u'referenz_unbekannt', FEHLER,
+                                u'{attr} "{wert}" fehlt in {ziel}.{zielattr}'.format(
+                                    attr=attr, wert=wert, ziel=ziel, zielattr=zielattr)))
+    return geprueft, befunde
+
+
+def _tabelle_pruefen(auftrag):
+    """Prüft in einem eigenen Prozess eine Tabelle
+
+    :auftrag:       Pfad zur QKan-Datenbank, Tabelle und SQL-Abfrage (s. _sqlscan)
+    :type auftrag:  tuple
+
+    :returns:       s. _befunde
+    """
+
+    dbname, tab, sql = auftrag
+    consl = splite.connect(database=dbname)
+    try:
+        cursl = consl.cursor()
+        cursl.execute(u'PRAGMA query_only = ON')
+        cursl.execute(sql)
+
+        def zeilen():
+            while True:
+                block = cursl.fetchmany(1000)
+                if not block:
+                    return
+                for zeile in block:
+                    yield zeile
+
+        return _befunde(tab, zeilen())
+    finally:
+        consl.close()
+
+
+def _netz_pruefen(dbQK):
+    """Ermittelt die Teile des Kanalnetzes, die nicht mit dem Hauptnetz (dem Netzteil mit den
+    meisten Haltungen, Wehren und Pumpen) verbunden sind, sowie Schächte ohne Anschluss.
+
+    :returns:       Befunde wie _befunde oder None bei einem Fehler
+    :rtype:         list
+    """
+
+    # Netz.holen speichert offene Änderungen in dbQK (commit), damit das Netzabbild aktuell ist
+    netz = Netz.holen(dbQK)
+    if netz is None:
+        return None
+
+    # Zusammenhängende Netzteile (Union-Find über die Knoten)
+    vorgaenger = list(range(netz.anzahl_knoten))
+
+    def wurzel(k):
+        while vorgaenger[k] != k:
+            vorgaenger[k] = vorgaenger[vorgaenger[k]]
+            k = vorgaenger[k]
+        return k
+
+    oben = netz.oben.tolist()
+    unten = netz.unten.tolist()
+    for o, u in zip(oben, unten):
+        if o >= 0 and u >= 0:
+            wo, wu = wurzel(o), wurzel(u)
+            if wo != wu:
+                vorgaenger[wo] = wu
+
+    teil = [wurzel(o if o >= 0 else u) if max(o, u) >= 0 else -1 for o, u in zip(oben, unten)]
+    groesse = {}
+    for t in teil:
+        groesse[t] = groesse.get(t, 0) + 1
+    haupt = max(groesse, key=lambda t: groesse[t]) if groesse else None
+
+    befunde = []
+    nummern = {}
+    kantentyp = netz.kantentyp.tolist()
+    for i, t in enumerate(teil):
+        if t == haupt:
+            continue
+        nr = nummern.setdefault(t, len(nummern) + 1)
+        befunde.append((kantentabellen[kantentyp[i]], None, netz.kantennamen[i], u'netz_getrennt', HINWEIS,
+                        u'Netzteil {} ohne Verbindung zum Hauptnetz ({} Objekte)'.format(nr, groesse[t])))
+
+    angeschlossen = set(oben) | set(unten)
+    for k, name in enumerate(netz.knotennamen):
+        if k not in angeschlossen:
+            befunde.append((u'schaechte', None, name, u'netz_getrennt', HINWEIS,
+                            u'Schacht ohne Haltung, Wehr oder Pumpe'))
+
+    return befunde
+
+
+def _aenderungen_entfernen(dbQK):
+    """Entfernt die Trigger für die Änderungsvermerke und die Vermerke selbst
+
+    :returns:       Erfolg
+    :rtype:         Boolean
+    """
+
+    sql = u"""SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'pruefaenderungen_%'"""
+    if not dbQK.sql(sql, u'k_pruefung.aenderungen_entfernen (1)'):
+        return False
+    for trigger, in dbQK.fetchall():
+        if not dbQK.sql(u'DROP TRIGGER {}'.format(trigger), u'k_pruefung.aenderungen_entfernen (2)'):
+            return False
+
+    if not dbQK.sql(u'DELETE FROM pruefaenderungen', u'k_pruefung.aenderungen_entfernen (3)'):
+        return False
+
+    return True
+
+
+def _aenderungen_einrichten(dbQK, tabellen):
+    """Legt die Trigger an, die in der Tabelle "pruefaenderungen" Änderungen an den Tabellen
+    vermerken (vgl. qkan_utils.pruefstand_einrichten).
+
+    :returns:       Alle Trigger waren bereits vorhanden (inkrementelle Prüfung möglich),
+                    None bei einem Fehler
+    :rtype:         Boolean
+    """
+
+    schluessel = _schluessel()
+    spalten = _spalten()
+    sql = u"""SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'pruefaenderungen_%'"""
+    if not dbQK.sql(sql, u'k_pruefung.aenderungen_einrichten (1)'):
+        return None
+    vorhanden = dict((name, u' '.join(text.split())) for name, text in dbQK.fetchall())
+
+    vollstaendig = True
+    # Wiederholte Änderungen eines Datensatzes werden nur einmal vermerkt (Primärschlüssel). Ein leerer
+    # Name wird als '' vermerkt, da NULL im Primärschlüssel nicht als gleich gilt.
+    vermerk = u"""INSERT OR IGNORE INTO pruefaenderungen (tabelle, objekt_pk, name)
+                    VALUES ('{tab}', {neu}.pk, IFNULL({neu}.{attr}, ''))"""
+    for tab in tabellen:
+        attr = schluessel[tab]
+        # UPDATE-Trigger nur für die geprüften Attribute, damit Massenänderungen anderer Attribute
+        # (z.B. gbuf in linkfl) keine Vermerke erzeugen
+        for kurz, ereignis, zeilen in [(u'ins', u'INSERT', [u'NEW']),
+                                       (u'upd', u'UPDATE OF {}'.format(u', '.join(spalten[tab])), [u'OLD', u'NEW']),
+                                       (u'del', u'DELETE', [u'OLD'])]:
+            trigger = u'pruefaenderungen_{}_{}'.format(tab, kurz)
+            sql = u"""CREATE TRIGGER {trigger} AFTER {ereignis} ON {tab}
+                BEGIN
+                    {vermerke};
+                END""".format(trigger=trigger, ereignis=ereignis, tab=tab, vermerke=u';\n                    '.join(
+                    [vermerk.format(tab=tab, neu=neu, attr=attr) for neu in zeilen]))
+            if trigger in vorhanden:
+                if vorhanden[trigger] == u' '.join(sql.split()):
+                    continue
+                # Trigger einer früheren Version ersetzen. Er hat mindestens dieselben Änderungen
+                # vermerkt, die Vermerke bleiben daher gültig.
+                if not dbQK.sql(u'DROP TRIGGER {}'.format(trigger), u'k_pruefung.aenderungen_einrichten (2)'):
+                    return None
+            else:
+                vollstaendig = False
+            if not dbQK.sql(sql, u'k_pruefung.aenderungen_einrichten (3)'):
+                return None
+
+    return vollstaendig
+
+
+def pruefen(dbQK, tabellen=None, inkrementell=False, prozesse=1, netzpruefung=True):
+    """Prüft die Tabellen des Projektes und schreibt die Befunde in die Tabelle "pruefergebnisse"
+
+    :dbQK:          Datenbankobjekt, das die Verknüpfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:     DBConnection (geerbt von dbapi...)
+
+    :tabellen:      Zu prüfende Tabellen (Schlüssel in pruefregeln). Bei None alle.
+    :type tabellen: list of String
+
+    :inkrementell:  Nur die seit der letzten Prüfung geänderten Datensätze und die davon
+                    abhängigen prüfen. Die Befunde der übrigen Datensätze bleiben erhalten.
+                    Bei False werden die Trigger für die Änderungsvermerke entfernt.
+    :type inkrementell: Boolean
+
+    :prozesse:      Anzahl der Prozesse, mit denen die Tabellen parallel geprüft werden. Ist der
+                    Pool nicht verfügbar, wird in einem Prozess geprüft (s. parallel_ausfuehren).
+    :type prozesse: integer
+
+    :netzpruefung:  Zusammenhang des Kanalnetzes prüfen (erfordert NumPy)
+    :type netzpruefung: Boolean
+
+    :returns:       Anzahl der Befunde je (Tabelle, Regel, Schwere) in "pruefergebnisse"
+                    oder None bei einem Fehler
+    :rtype:         dict
+    """
+
+    start = time.time()
+    if tabellen is None:
+        tabellen = sorted(pruefregeln)
+
+    # Indizes für die Suche nach gleichen Namen und nach den Zielen der Verweise
+    indizes = set()
+    for tab in tabellen:
+        regel = pruefregeln[tab]
+        if regel[u'name'] is not None:
+            indizes.add((tab, regel[u'name']))
+        for attr, ziel, zielattr, pflicht in regel[u'referenzen']:
+            indizes.add((ziel, zielattr))
+    for tab, attr in sorted(indizes):
+        sql = u"""CREATE INDEX IF NOT EXISTS {tab}_{attr}_idx ON {tab} ({attr})""".format(tab=tab, attr=attr)
+        if not dbQK.sql(sql, u'k_pruefung.pruefen (1)'):
+            return None
+
+    if inkrementell:
+        # Vermerk der Änderungen für die nächste inkrementelle Prüfung. Waren die Trigger nicht
+        # vollständig vorhanden, sind die vermerkten Änderungen unvollständig.
+        beobachtet = set(tabellen) | set(ziel for tab in tabellen
+                                         for attr, ziel, zielattr, pflicht in pruefregeln[tab][u'referenzen'])
+        if netzpruefung:
+            beobachtet |= set(netztabellen)
+        vollstaendig = _aenderungen_einrichten(dbQK, sorted(beobachtet))
+        if vollstaendig is None:
+            return None
+        if not vollstaendig:
+            logger.info(u'k_pruefung.pruefen: Änderungsvermerke unvollständig, es wird vollständig geprüft')
+            inkrementell = False
+    elif not _aenderungen_entfernen(dbQK):
+        return None
+
+    netzgeaendert = True
+    if inkrementell:
+        sql = u"""SELECT count(*) FROM pruefaenderungen WHERE tabelle IN ('{}')""".format(u"', '".join(netztabellen))
+        if not dbQK.sql(sql, u'k_pruefung.pruefen (2)'):
+            return None
+        netzgeaendert = dbQK.fetchone()[0] > 0
+
+    # Die Prozesse lesen aus der Datenbankdatei
+    dbQK.commit()
+
+    auftraege = [(dbQK.dbname, tab, _sqlscan(tab, inkrementell)) for tab in tabellen]
+
+    ergebnisse = parallel_ausfuehren(_tabelle_pruefen, auftraege, prozesse)
+    if ergebnisse is None:
+        ergebnisse = []
+        for dbname, tab, sql in auftraege:
+            zeilen = dbQK.abfrage(sql, u'k_pruefung.pruefen ({})'.format(tab))
+            if zeilen is None:
+                return None
+            ergebnisse.append(_befunde(tab, zeilen))
+
+    netzbefunde = None
+    if netzpruefung and netzgeaendert:
+        netzbefunde = _netz_pruefen(dbQK)
+
+    if netzpruefung and netzgeaendert and netzbefunde is None:
+        if np is None:
+            logger.warning(u'k_pruefung.pruefen: Netzzusammenhang nicht geprüft, NumPy fehlt')
+        else:
+            return None
+
+    # Bericht schreiben: Befunde der geprüften Datensätze ersetzen
+    with dbQK.transaktion(u'k_pruefung.pruefen') as ta:
+        for tab, (geprueft, befunde) in zip(tabellen, ergebnisse):
+            if inkrementell:
+                # Geänderte (auch gelöschte) und erneut geprüfte Datensätze
+                sql = u"""DELETE FROM pruefergebnisse
+                        WHERE tabelle = ? AND regel <> 'netz_getrennt' AND
+                            objekt_pk IN (SELECT objekt_pk FROM pruefaenderungen WHERE tabelle = ?)"""
+                if not dbQK.sql(sql, u'k_pruefung.pruefen (3)', parameter=(tab, tab)):
+                    return None
+                sql = u"""DELETE FROM pruefergebnisse
+                        WHERE tabelle = ? AND objekt_pk = ? AND regel <> 'netz_getrennt'"""
+                if not dbQK.executemany(sql, [(tab, pk) for pk in geprueft], u'k_pruefung.pruefen (4)'):
+                    return None
+            else:
+                sql = u"""DELETE FROM pruefergebnisse WHERE tabelle = ? AND regel <> 'netz_getrennt'"""
+                if not dbQK.sql(sql, u'k_pruefung.pruefen (5)', parameter=(tab,)):
+                    return None
+            sql = u"""INSERT INTO pruefergebnisse (tabelle, objekt_pk, objekt, regel, schwere, meldung)
+                    VALUES (?, ?, ?, ?, ?, ?)"""
+            if not dbQK.executemany(sql, befunde, u'k_pruefung.pruefen (6)'):
+                return None
+
+        if netzbefunde is not None:
+            sql = u"""DELETE FROM pruefergebnisse WHERE regel = 'netz_getrennt'"""
+            if not dbQK.sql(sql, u'k_pruefung.pruefen (7)'):
+                return None
+            sql = u"""INSERT INTO pruefergebnisse (tabelle, objekt_pk, objekt, regel, schwere, meldung)
+                    VALUES (?, ?, ?, ?, ?, ?)"""
+            if not dbQK.executemany(sql, netzbefunde, u'k_pruefung.pruefen (8)'):
+                return None
+
+        # Die Änderungen einer Tabelle sind berücksichtigt, wenn alle Tabellen geprüft wurden, die sie
+        # auswerten (bei Tabellen des Kanalnetzes auch der Netzzusammenhang). Die übrigen bleiben
+        # für die nächste inkrementelle Prüfung erhalten.
+        erledigt = [tab for tab, verwender in _verwender().items()
+                    if verwender <= set(tabellen) and (netzpruefung or tab not in netztabellen)]
+        if len(erledigt) > 0:
+            sql = u"""DELETE FROM pruefaenderungen WHERE tabelle IN ('{}')""".format(u"', '".join(sorted(erledigt)))
+            if not dbQK.sql(sql, u'k_pruefung.pruefen (9)'):
+                return None
+    if ta.fehler:
+        return None
+
+    sql = u"""SELECT tabelle, regel, schwere, count(*) FROM pruefergebnisse GROUP BY tabelle, regel, schwere"""
+    if not dbQK.sql(sql, u'k_pruefung.pruefen (10)'):
+        return None
+    bericht = dict(((tab, regel, schwere), anzahl) for tab, regel, schwere, anzahl in dbQK.fetchall())
+
+    logger.info(u'k_pruefung.pruefen{}: {} Tabellen in {:.2f} s geprüft, {} Befunde'.format(
+        u' (inkrementell)' if inkrementell else u'', len(tabellen), time.time() - start,
+        sum(bericht.values())))
+    return bericht
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Benchmark Geometriekennwerte
+  ============================
+
+  Vergleicht die Laufzeiten der Export- und Verknüpfungsabfragen mit direkter Berechnung von
+  area() und Centroid() (vorher) und mit den von Triggern gepflegten Spalten geomflaeche,
+  xmitte und ymitte (nachher). Die Abfragen lesen nur und können auf einer beliebigen
+  QKan-Datenbank ab Version 2.5.10 ausgeführt werden.
+
+  Aufruf (in der OSGeo4W-Shell):
+
+    python benchmark_geomkennwerte.py <QKan-Datenbank> [Wiederholungen]
+
+'''
+
+from __future__ import print_function
+
+import sys
+import time
+
+import pyspatialite.dbapi2 as splite
+
+# Abfragen jeweils als (Bezeichnung, vorher, nachher)
+ABFRAGEN = [
+    (u'Export: Flächensummen je Haltung (write12/halflaech)',
+     u"""SELECT lf.haltnam,
+            sum(area(fl.geom)/10000.), sum(distance(fl.geom,h.geom)*area(fl.geom)/10000.),
+            sum(CASE fl.neigkl WHEN 0 THEN 0.5 ELSE 2.5 END*area(fl.geom)/10000.)
+        FROM linkfl AS lf
+        INNER JOIN flaechen AS fl ON lf.flnam = fl.flnam
+        INNER JOIN haltungen AS h ON lf.haltnam = h.haltnam
+        WHERE area(fl.geom) > 0.5
+        GROUP BY lf.haltnam""",
+     u"""SELECT lf.haltnam,
+            sum(fl.geomflaeche/10000.), sum(distance(fl.geom,h.geom)*fl.geomflaeche/10000.),
+            sum(CASE fl.neigkl WHEN 0 THEN 0.5 ELSE 2.5 END*fl.geomflaeche/10000.)
+        FROM linkfl AS lf
+        INNER JOIN flaechen AS fl ON lf.flnam = fl.flnam
+        INNER JOIN haltungen AS h ON lf.haltnam = h.haltnam
+        WHERE fl.geomflaeche > 0.5
+        GROUP BY lf.haltnam"""),
+    (u'Export: Größe der Haltungsflächen',
+     u"""SELECT sum(area(geom)) FROM tezg""",
+     u"""SELECT sum(geomflaeche) FROM tezg"""),
+    (u'Verknüpfung: Zuordnung Flächen zu Haltungsflächen (createlinkfl)',
+     u"""SELECT count(*) FROM flaechen
+        INNER JOIN tezg ON within(centroid(flaechen.geom), tezg.geom)
+        WHERE flaechen.geom IS NOT NULL AND tezg.geom IS NOT NULL""",
+     u"""SELECT count(*) FROM flaechen
+        INNER JOIN tezg ON within(MakePoint(flaechen.xmitte, flaechen.ymitte, SRID(flaechen.geom)), tezg.geom)
+        WHERE flaechen.geom IS NOT NULL AND tezg.geom IS NOT NULL"""),
+    (u'Verknüpfung: Endpunkte der Verbindungslinien',
+     u"""SELECT count(MakeLine(PointOnSurface(lf.geom), Centroid(ha.geom)))
+        FROM linkfl AS lf INNER JOIN haltungen AS ha ON lf.haltnam = ha.haltnam""",
+     u"""SELECT count(MakeLine(PointOnSurface(lf.geom), MakePoint(ha.xmitte, ha.ymitte, SRID(ha.geom))))
+        FROM linkfl AS lf INNER JOIN haltungen AS ha ON lf.haltnam = ha.haltnam"""),
+]
+
+
+def messen(cursl, sql, wiederholungen):
+    """Gibt die kürzeste Laufzeit aus mehreren Wiederholungen zurück"""
+    zeiten = []
+    for i in range(wiederholungen):
+        start = time.time()
+        cursl.execute(sql)
+        cursl.fetchall()
+        zeiten.append(time.time() - start)
+    return min(zeiten)
+
+
+def main(database, wiederholungen=3):
+    consl = splite.connect(database=database)
+    cursl = consl.cursor()
+
+    print(u'{:<68s} {:>10s} {:>10s} {:>8s}'.format(u'Abfrage', u'vorher [s]', u'nachher [s]', u'Faktor'))
+    for bezeichnung, vorher, nachher in ABFRAGEN:
+        tv = messen(cursl, vorher, wiederholungen)
+        tn = messen(cursl, nachher, wiederholungen)
+        print(u'{:<68s} {:>10.3f} {:>10.3f} {:>8.1f}'.format(bezeichnung, tv, tn, tv / max(tn, 1e-6)))
+
+    consl.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Benchmark QKan
+  ==============
+
+  Misst Laufzeit und Spitzenspeicher der QKan-Funktionen auf synthetischen Projekten
+  (s. qkan_testprojekt.py) in mehreren Größen. Je Größe wird ein neues Projekt mit
+  Datenbank und DYNA-Datei in einem temporären Verzeichnis erzeugt; anschließend werden die
+  Funktionen in der Reihenfolge eines typischen Arbeitsablaufs aufgerufen:
+
+    createlinkfl        Verknüpfung der Flächen mit den Haltungen
+    createUnbefFlaechen Erzeugen der unbefestigten Flächen
+    setRunoffparams     Oberflächenabflussparameter (Maniak, Fließzeiten)
+    akkumulation        Akkumulierte Flächen, Einwohner und Zuflüsse
+    fliesszeiten        Rohrfließzeiten und Konzentrationszeiten
+    pruefen             Plausibilitätsprüfung aller Tabellen (vollständig und inkrementell)
+    Navigator           Route vom obersten Schacht bis zum Auslass (ohne und mit Cache)
+    exportKanaldaten    Export nach DYNA
+    importKanaldaten    Import der DYNA-Datei in eine neue Datenbank
+
+  Mit --index wird stattdessen das Einfügen und Ändern von Verknüpfungen in linkfl mit
+  laufender Pflege des räumlichen Index (Trigger je Datensatz) und mit Aufbau des Index am
+  Ende (DBConnection.massenladen) verglichen.
+
+  Der Spitzenspeicher wird mit psutil als größter Arbeitsspeicher des Prozesses während
+  des Aufrufs ermittelt. Ohne psutil wird ersatzweise das Maximum seit Programmstart aus
+  dem Modul resource angegeben (nur Linux/macOS), unter Windows ohne psutil keine Angabe.
+
+  Aufruf (in der OSGeo4W-Shell):
+
+    python benchmark_qkan.py [Größen ...] [--form raster] [--index] [--csv <Datei>] [--verzeichnis <Pfad>]
+
+  Beispiel: python benchmark_qkan.py 1000 10000 100000 --csv benchmark.csv
+
+'''
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from qgis.core import QgsApplication
+from qgis.gui import QgsMapCanvas, QgsMessageBar
+from qgis.PyQt.QtGui import QMainWindow
+
+# Die QKan-Funktionen erwarten die QGIS-Oberfläche. Außerhalb von QGIS wird eine minimale
+# Oberfläche bereitgestellt, bevor die Module importiert werden.
+qgs = QgsApplication([], True)
+qgs.initQgis()
+
+
+class Oberflaeche(object):
+    """Ersatz für iface mit den von den QKan-Funktionen verwendeten Methoden"""
+
+    def __init__(self):
+        self.__fenster = QMainWindow()
+        self.__meldungen = QgsMessageBar()
+        self.__karte = QgsMapCanvas()
+
+    def mainWindow(self):
+        return self.__fenster
+
+    def messageBar(self):
+        return self.__meldungen
+
+    def mapCanvas(self):
+        return self.__karte
+
+
+import qgis.utils
+if qgis.utils.iface is None:
+    qgis.utils.iface = Oberflaeche()
+iface = qgis.utils.iface
+
+from qkan.database.dbfunc import DBConnection
+from qkan.database.navigation import Navigator, Routencache
+from qkan.linkflaechen.k_link import createlinkfl
+from qkan.createunbeffl.k_unbef import createUnbefFlaechen
+from qkan.tools.k_runoffparams import setRunoffparams
+from qkan.tools.k_akkumulation import akkumulation
+from qkan.tools.k_fliesszeit import fliesszeiten
+from qkan.tools.k_pruefung import pruefen
+from qkan.exportdyna.k_qkkp import exportKanaldaten
+from qkan.importdyna.import_from_dyna import importKanaldaten
+
+import qkan_testprojekt
+
+# Abflussfunktionen wie in tools/application.py (Voreinstellung der Rauheiten)
+MANNING_BEF = 0.02
+MANNING_DUR = 0.10
+RUNOFFPARAMSFUNCTIONS = {
+    'Maniak': [
+        '0.02 * pow(abstand, 0.77) * pow(neigung, -0.385) + pow(2*{rb} * (abstand + fliesslaenge) / SQRT(neigung), 0.467)',
+        'pow(2*{rd} * (abstand + fliesslaenge) / SQRT(neigung), 0.467)',
+        '0.02 * pow(abstand, 0.77) * pow(neigung, -0.385) + pow(2*{rb} * abstand / SQRT(neigung), 0.467)',
+        'pow(2*{rd} * abstand / SQRT(neigung), 0.467)',
+        '0.02 * pow(abstand, 0.77) * pow(neigung, -0.385) + pow(2*{rb} * fliesslaenge / SQRT(neigung), 0.467)',
+        'pow(2*{rd} * fliesslaenge / SQRT(neigung), 0.467)']
+}
+RUNOFFPARAMSFUNCTIONS['Maniak'] = [f.format(rb=MANNING_BEF, rd=MANNING_DUR) for f in RUNOFFPARAMSFUNCTIONS['Maniak']]
+
+
+class Speichermessung(object):
+    """Ermittelt den größten Arbeitsspeicher des Prozesses in MB, solange der Kontext aktiv ist"""
+
+    def __init__(self, intervall=0.05):
+        self.intervall = intervall
+        self.spitze = None
+        self.__ende = threading.Event()
+        self.__faden = None
+
+    def __enter__(self):
+        if psutil is not None:
+            prozess = psutil.Process()
+            self.spitze = prozess.memory_info().rss
+
+            def abtasten():
+                while not self.__ende.wait(self.intervall):
+                    self.spitze = max(self.spitze, prozess.memory_info().rss)
+
+            self.__faden = threading.Thread(target=abtasten)
+            self.__faden.daemon = True
+            self.__faden.start()
+        return self
+
+    def __exit__(self, *args):
+        if self.__faden is not None:
+            self.__ende.set()
+            self.__faden.join()
+            self.spitze = max(self.spitze, psutil.Process().memory_info().rss) / 1024. / 1024.
+        elif resource is not None:
+            # ru_maxrss: Linux in kB, macOS in Byte
+            faktor = 1024. * 1024. if sys.platform == 'darwin' else 1024.
+            self.spitze = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / faktor
+        return False
+
+
+def messen(bezeichnung, funktion, *args, **kwargs):
+    """Ruft eine Funktion auf und gibt (Bezeichnung, Laufzeit, Spitzenspeicher, Ergebnis) zurück.
+    Ausnahmen werden protokolliert und als Ergebnis zurückgegeben."""
+
+    with Speichermessung() as speicher:
+        start = time.time()
+        try:
+            ergebnis = funktion(*args, **kwargs)
+        except BaseException as err:
+            logging.getLogger(u'QKan').exception(u'benchmark_qkan: Fehler in {}'.format(bezeichnung))
+            ergebnis = err
+        dauer = time.time() - start
+    return bezeichnung, dauer, speicher.spitze, ergebnis
+
+
+def projekt(verzeichnis, anzahl, form):
+    """Führt alle Funktionen auf einem neuen Testprojekt aus
+
+    :returns:       Liste mit (Bezeichnung, Laufzeit, Spitzenspeicher, Ergebnis)
+    """
+
+    database = os.path.join(verzeichnis, u'test_{}.sqlite'.format(anzahl))
+    einfile = os.path.join(verzeichnis, u'test_{}.ein'.format(anzahl))
+    ergebnisse = [messen(u'Testprojekt erzeugen', qkan_testprojekt.erzeugen, database, anzahl, form,
+                         einfile=einfile)]
+
+    dbQK = DBConnection(dbname=database)
+    if not dbQK.connected:
+        ergebnisse.append((u'DBConnection', 0., None, False))
+        return ergebnisse
+    epsg = dbQK.getepsg()
+
+    ergebnisse.append(messen(u'createlinkfl', createlinkfl, dbQK, [], [], [], epsg=str(epsg)))
+    ergebnisse.append(messen(u'createUnbefFlaechen', createUnbefFlaechen, dbQK, [], True))
+    ergebnisse.append(messen(u'setRunoffparams', setRunoffparams, dbQK, u'Maniak', u'Fliesszeiten',
+                             RUNOFFPARAMSFUNCTIONS, [], [], u'spatialite'))
+    ergebnisse.append(messen(u'akkumulation', akkumulation, dbQK))
+    ergebnisse.append(messen(u'fliesszeiten', fliesszeiten, dbQK))
+    ergebnisse.append(messen(u'pruefen', pruefen, dbQK))
+    # Die erste inkrementelle Prüfung richtet die Änderungsvermerke ein und prüft vollständig
+    ergebnisse.append(messen(u'pruefen (inkrementell, Einrichtung)', pruefen, dbQK, inkrementell=True))
+    ergebnisse.append(messen(u'pruefen (inkrementell)', pruefen, dbQK, inkrementell=True))
+
+    # Route vom entferntesten Schacht des Rasters zum Auslass
+    dbQK.sql(u"SELECT schoben FROM haltungen ORDER BY pk LIMIT 1", u'benchmark_qkan')
+    oben, = dbQK.fetchone()
+    navigator = Navigator(database, cache=Routencache())
+    ergebnisse.append(messen(u'Navigator', navigator.calculate_route_schacht, [oben, u'S0']))
+    ergebnisse.append(messen(u'Navigator (Cache)', navigator.calculate_route_schacht, [oben, u'S0']))
+
+    dynaexport = os.path.join(verzeichnis, u'export_{}.ein'.format(anzahl))
+    ergebnisse.append(messen(u'exportKanaldaten', exportKanaldaten, iface, dynaexport, einfile, dbQK,
+                             u'flaechen', u'profilname', [], False, 0, False))
+    del dbQK
+
+    dbimport = os.path.join(verzeichnis, u'import_{}.sqlite'.format(anzahl))
+    projectfile = os.path.join(verzeichnis, u'import_{}.qgs'.format(anzahl))
+    ergebnisse.append(messen(u'importKanaldaten', importKanaldaten, einfile, dbimport, projectfile, epsg))
+
+    return ergebnisse
+
+
+def indexvergleich(verzeichnis, anzahl, form):
+    """Vergleicht das Schreiben in linkfl mit laufender und mit zurückgestellter Pflege des
+    räumlichen Index (glink)
+
+    :returns:       Liste mit (Bezeichnung, Laufzeit, Spitzenspeicher, Ergebnis)
+    """
+
+    database = os.path.join(verzeichnis, u'index_{}.sqlite'.format(anzahl))
+    ergebnisse = [messen(u'Testprojekt erzeugen', qkan_testprojekt.erzeugen, database, anzahl, form)]
+
+    dbQK = DBConnection(dbname=database)
+    if not dbQK.connected:
+        ergebnisse.append((u'DBConnection', 0., None, False))
+        return ergebnisse
+
+    sqllis = [u"""INSERT INTO linkfl (flnam, geom, glink)
+                SELECT flnam, geom, MakeLine(PointOnSurface(geom), Centroid(geom))
+                FROM flaechen""",
+              u"""UPDATE linkfl SET glink = MakeLine(Centroid(geom), PointOnSurface(geom))"""]
+
+    def schreiben(dbQK, massenladen):
+        if massenladen:
+            block = dbQK.massenladen([u'linkfl'], u'benchmark_qkan')
+        else:
+            block = dbQK.transaktion(u'benchmark_qkan')
+        with block as ta:
+            for sql in sqllis:
+                if not dbQK.sql(sql, u'benchmark_qkan.indexvergleich'):
+                    break
+        return not ta.fehler
+
+    for bezeichnung, massenladen in [(u'linkfl (Index laufend)', False), (u'linkfl (Index am Ende)', True)]:
+        dbQK.sql(u"DELETE FROM linkfl", u'benchmark_qkan.indexvergleich')
+        dbQK.commit()
+        ergebnisse.append(messen(bezeichnung, schreiben, dbQK, massenladen))
+    del dbQK
+
+    return ergebnisse
+
+
+def main(groessen, form=u'baum', csvdatei=None, verzeichnis=None, index=False):
+    # Das Debug-Protokoll der Datenbankzugriffe würde die Messung verfälschen
+    logging.getLogger(u'QKan').setLevel(logging.WARNING)
+
+    temporaer = verzeichnis is None
+    if temporaer:
+        verzeichnis = tempfile.mkdtemp(prefix=u'qkan_benchmark_')
+
+    zeilen = []
+    try:
+        for anzahl in groessen:
+            print(u'\n{} Haltungen ({})'.format(anzahl, form))
+            print(u'{:<24s} {:>10s} {:>12s}  {}'.format(u'Funktion', u'Zeit [s]', u'Speicher [MB]', u'Ergebnis'))
+            messung = indexvergleich if index else projekt
+            for bezeichnung, dauer, spitze, ergebnis in messung(verzeichnis, anzahl, form):
+                print(u'{:<24s} {:>10.2f} {:>12s}  {}'.format(
+                    bezeichnung, dauer, u'-' if spitze is None else u'{:.0f}'.format(spitze),
+                    repr(ergebnis)[:40]))
+                zeilen.append((anzahl, form, bezeichnung, dauer, spitze,
+                               not isinstance(ergebnis, BaseException) and ergebnis is not False))
+    finally:
+        if temporaer:
+            shutil.rmtree(verzeichnis, ignore_errors=True)
+
+    if csvdatei is not None:
+        neu = not os.path.exists(csvdatei)
+        with open(csvdatei, 'a') as csv:
+            if neu:
+                csv.write(u'anzahl;form;funktion;zeit_s;speicher_mb;erfolg\n')
+            for anzahl, form, bezeichnung, dauer, spitze, erfolg in zeilen:
+                csv.write(u'{};{};{};{:.3f};{};{}\n'.format(
+                    anzahl, form, bezeichnung, dauer, u'' if spitze is None else u'{:.0f}'.format(spitze),
+                    int(erfolg)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Laufzeiten der QKan-Funktionen auf Testprojekten')
+    parser.add_argument('groessen', type=int, nargs='*', default=[1000, 10000, 100000])
+    parser.add_argument('--form', choices=[u'baum', u'raster'], default=u'baum')
+    parser.add_argument('--index', action='store_true',
+                        help=u'Räumlichen Index laufend und am Ende aufbauen (linkfl) vergleichen')
+    parser.add_argument('--csv', default=None)
+    parser.add_argument('--verzeichnis', default=None)
+    args = parser.parse_args()
+
+    main(args.groessen, args.form, args.csv, args.verzeichnis, args.index)
+    qgs.exitQgis()
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+  Synthetisches QKan-Testprojekt
+  ==============================
+
+  Erzeugt eine QKan-Datenbank beliebiger Größe mit einem Kanalnetz auf einem regelmäßigen
+  Raster, Haltungsflächen (tezg), befestigten Flächen (flaechen), Einzeleinleitern (einleit)
+  und Teilgebieten sowie optional eine dazu passende DYNA-Datei (*.EIN). Die Tabellen werden
+  mit createdbtables angelegt, so dass die Datenbank der aktuellen QKan-Version entspricht.
+
+  Netzformen:
+    baum    Jeder Schacht entwässert zu genau einem Nachbarschacht in Richtung Auslass
+    raster  Wie baum, aber ein Teil der Schächte entwässert zusätzlich zum zweiten
+            Nachbarschacht (Verzweigungen)
+
+  Zusätzlich wird an einem Teil der Schächte ein Wehr zu einem eigenen Auslass angelegt.
+
+  Aufruf (in der OSGeo4W-Shell):
+
+    python qkan_testprojekt.py <QKan-Datenbank> <Anzahl Haltungen> [--form raster]
+                               [--ein <DYNA-Datei>] [--seed <n>] [--epsg <n>]
+
+'''
+
+from __future__ import print_function
+
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyspatialite.dbapi2 as splite
+
+from qkan.database.qkan_database import createdbtables, dbVersion
+from qkan.exportdyna.k_qkkp import formf
+
+# Ursprung des Rasters (ETRS89 / UTM 32N) und Höhen
+X0 = 350000.
+Y0 = 5650000.
+SOHLE0 = 97.5
+GEFAELLE = 0.005
+UEBERDECKUNG = 2.5
+KS = 1.5
+
+# DYNA-Schlüssel in der erzeugten EIN-Datei
+DYNA_KS_KEY = u'1'
+DYNA_PROFIL_KEY = u'1'
+DYNA_ENTWART = 0                # kp_nr von 'Mischwasser'
+
+
+def _netz(anzahl, form, zufall):
+    """Erzeugt die Topologie auf einem Raster mit dem Auslass in der linken unteren Ecke
+
+    :returns:       Anzahl Spalten, Anzahl Schächte und Liste der Haltungen (oben, unten)
+                    als Indizes der Schächte, sortiert von oben nach unten
+    """
+
+    nx = max(int(math.ceil(math.sqrt(anzahl + 1))), 2)
+    nsch = anzahl + 1
+    haltungen = []
+    for k in range(nsch - 1, 0, -1):
+        i, j = k % nx, k // nx
+        ziele = []
+        if i > 0:
+            ziele.append(k - 1)
+        if j > 0:
+            ziele.append(k - nx)
+        zufall.shuffle(ziele)
+        if form == u'raster' and len(ziele) == 2 and zufall.random() < 0.1:
+            haltungen.extend([(k, z) for z in ziele])
+        else:
+            haltungen.append((k, ziele[0]))
+    return nx, nsch, haltungen
+
+
+def _kanalnummern(haltungen, nsch):
+    """Vergibt DYNA-Kanal- und Haltungsnummern: Eine Haltung setzt den Kanal der oberhalb
+    liegenden Haltung fort, wenn diese die einzige zufließende Haltung ist und noch nicht
+    fortgesetzt wurde.
+
+    :returns:       Liste mit (kanalnummer, haltungsnummer) je Haltung
+    """
+
+    zulauf = [[] for k in range(nsch)]
+    for n, (oben, unten) in enumerate(haltungen):
+        zulauf[unten].append(n)
+
+    nummern = [None] * len(haltungen)
+    fortgesetzt = set()
+    kanal = 0
+    for n, (oben, unten) in enumerate(haltungen):
+        vor = zulauf[oben][0] if len(zulauf[oben]) == 1 else None
+        if vor is not None and vor not in fortgesetzt and nummern[vor][1] < 999:
+            fortgesetzt.add(vor)
+            kn, hn = nummern[vor]
+            nummern[n] = (kn, hn + 1)
+        else:
+            kanal += 1
+            nummern[n] = (kanal, 1)
+    return nummern
+
+
+def erzeugen(dbname, anzahl, form=u'baum', epsg=25832, seed=1, einfile=None,
+             abstand=40., anteil_wehre=0.01, anteil_einleit=0.3):
+    """Erzeugt ein Testprojekt
+
+    :dbname:        Pfad der neuen QKan-Datenbank. Eine vorhandene Datei wird überschrieben.
+    :type dbname:   String
+
+    :anzahl:        Anzahl der Haltungen (bei form='raster' etwas mehr)
+    :type anzahl:   integer
+
+    :form:          Netzform 'baum' oder 'raster'
+    :type form:     String
+
+    :einfile:       Pfad der zu schreibenden DYNA-Datei, None: keine DYNA-Datei
+    :type einfile:  String
+
+    :returns:       Anzahl der erzeugten Objekte je Tabelle
+    :rtype:         dict
+    """
+
+    zufall = random.Random(seed)
+
+    if os.path.exists(dbname):
+        os.remove(dbname)
+    consl = splite.connect(database=dbname)
+    cursl = consl.cursor()
+    cursl.execute(u'SELECT InitSpatialMetadata()')
+    if not createdbtables(consl, cursl, dbVersion(), epsg):
+        raise RuntimeError(u'Tabellen konnten nicht angelegt werden: {}'.format(dbname))
+
+    nx, nsch, verbindungen = _netz(anzahl, form, zufall)
+    ny = (nsch + nx - 1) // nx
+    nummern = _kanalnummern(verbindungen, nsch)
+
+    def lage(k):
+        return X0 + (k % nx) * abstand, Y0 + (k // nx) * abstand
+
+    def teilgebiet(k):
+        return u'TG{}'.format(1 + 2 * (k // nx >= ny // 2) + (k % nx >= nx // 2))
+
+    # Schächte
+    schaechte = []
+    for k in range(nsch):
+        x, y = lage(k)
+        sohle = SOHLE0 + GEFAELLE * abstand * (k % nx + k // nx)
+        deckel = sohle + UEBERDECKUNG + zufall.random() * 0.5
+        schaechte.append([u'S{}'.format(k), x, y, sohle, deckel, teilgebiet(k),
+                          u'Auslass' if k == 0 else u'Schacht'])
+
+    # Wehre zu eigenen Auslässen
+    wehre = []
+    for k in zufall.sample(range(1, nsch), int(anteil_wehre * (nsch - 1))):
+        x, y = lage(k)
+        sch = schaechte[k]
+        schaechte.append([u'A{}'.format(k), x + abstand / 4., y + abstand / 4., sch[3] - 0.5, sch[4],
+                          sch[5], u'Auslass'])
+        wehre.append((u'W{}'.format(k), sch[0], u'A{}'.format(k), sch[3] + 1., x, y,
+                      x + abstand / 4., y + abstand / 4.))
+
+    # Haltungen mit Nennweiten, die zum Auslass hin zunehmen
+    dmax = float(nx + ny)
+    haltungen = []
+    for (oben, unten), (kn, hn) in zip(verbindungen, nummern):
+        so, su = schaechte[oben], schaechte[unten]
+        hoehe = 0.3 + 0.1 * int(6 * (1. - (oben % nx + oben // nx) / dmax))
+        haltungen.append((u'{}-{}'.format(kn, hn), so[0], su[0], hoehe, abstand,
+                          so[3], su[3], so[4], su[4], so[5], KS, so[1], so[2], su[1], su[2]))
+
+    cursl.executemany(u"""INSERT INTO schaechte
+            (schnam, xsch, ysch, sohlhoehe, deckelhoehe, teilgebiet, schachttyp, durchm, entwart, geop, geom)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1.0, 'Mischwasser', MakePoint(?, ?, {epsg}),
+                CastToMultiPolygon(Buffer(MakePoint(?, ?, {epsg}), 0.5)))""".format(epsg=epsg),
+                      [s + [s[1], s[2], s[1], s[2]] for s in schaechte])
+
+    cursl.executemany(u"""INSERT INTO haltungen
+            (haltnam, schoben, schunten, hoehe, laenge, sohleoben, sohleunten, deckeloben, deckelunten,
+             teilgebiet, ks, profilnam, entwart, xschob, yschob, xschun, yschun, geom)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'Kreisquerschnitt', 'Mischwasser', ?, ?, ?, ?,
+                MakeLine(MakePoint(?, ?, {epsg}), MakePoint(?, ?, {epsg})))""".format(epsg=epsg),
+                      [h + h[-4:] for h in haltungen])
+
+    cursl.executemany(u"""INSERT INTO wehre (wnam, schoben, schunten, schwellenhoehe, laenge, geom)
+            VALUES (?, ?, ?, ?, 1.0, MakeLine(MakePoint(?, ?, {epsg}), MakePoint(?, ?, {epsg})))""".format(
+                          epsg=epsg), wehre)
+
+    # Teilgebiete als Quadranten
+    teilgebiete = []
+    for n in range(4):
+        i0, j0 = (n % 2) * (nx // 2), (n // 2) * (ny // 2)
+        i1, j1 = (nx // 2, nx)[n % 2], (ny // 2, ny)[n // 2]
+        teilgebiete.append((u'TG{}'.format(n + 1), X0 + (i0 - 0.5) * abstand, Y0 + (j0 - 0.5) * abstand,
+                            X0 + (i1 - 0.5) * abstand, Y0 + (j1 - 0.5) * abstand))
+    cursl.executemany(u"""INSERT INTO teilgebiete (tgnam, geom)
+            VALUES (?, CastToMultiPolygon(BuildMbr(?, ?, ?, ?, {epsg})))""".format(epsg=epsg), teilgebiete)
+
+    # Haltungsflächen: Rasterzelle um den oberen Schacht, je Schacht nur einmal
+    tezg = []
+    belegt = set()
+    for h in haltungen:
+        if h[1] in belegt:
+            continue
+        belegt.add(h[1])
+        x, y = h[11], h[12]
+        tezg.append((u'tz_{}'.format(h[0]), h[0], h[9], x - abstand / 2., y - abstand / 2.,
+                     x + abstand / 2., y + abstand / 2.))
+    cursl.executemany(u"""INSERT INTO tezg (flnam, haltnam, teilgebiet, abflussparameter, neigkl, geom)
+            VALUES (?, ?, ?, '$Default_Unbef', 1, CastToMultiPolygon(BuildMbr(?, ?, ?, ?, {epsg})))""".format(
+                          epsg=epsg), tezg)
+
+    # Befestigte Flächen: je Zelle ein Dach und ein Straßenabschnitt, der über die Zellgrenze
+    # reicht und deshalb mit den Haltungsflächen verschnitten wird
+    flaechen = []
+    for n, tz in enumerate(tezg):
+        xm, ym = (tz[3] + tz[5]) / 2., (tz[4] + tz[6]) / 2.
+        b, t = 8. + zufall.random() * 7., 8. + zufall.random() * 7.
+        dx, dy = (zufall.random() - 0.5) * 10., 5. + zufall.random() * 5.
+        flaechen.append((u'fd{}'.format(n), tz[2], u'nein', zufall.randint(1, 3),
+                         xm + dx - b / 2., ym + dy - t / 2., xm + dx + b / 2., ym + dy + t / 2.))
+        flaechen.append((u'fs{}'.format(n), tz[2], u'ja', 1,
+                         tz[3] - abstand / 4., tz[4] + 2., tz[5] + abstand / 4., tz[4] + 8.))
+    cursl.executemany(u"""INSERT INTO flaechen (flnam, teilgebiet, aufteilen, neigkl, abflussparameter, geom)
+            VALUES (?, ?, ?, ?, '$Default_Bef', CastToMultiPolygon(BuildMbr(?, ?, ?, ?, {epsg})))""".format(
+                          epsg=epsg), flaechen)
+
+    # Einzeleinleiter
+    einleit = []
+    for n, tz in enumerate(zufall.sample(tezg, int(anteil_einleit * len(tezg)))):
+        x = tz[3] + zufall.random() * abstand
+        y = tz[4] + zufall.random() * abstand
+        einleit.append((u'e{}'.format(n), tz[2], zufall.randint(2, 20) * 1., zufall.random() * 0.05, x, y))
+    cursl.executemany(u"""INSERT INTO einleit (elnam, teilgebiet, ew, zufluss, geom)
+            VALUES (?, ?, ?, ?, MakePoint(?, ?, {epsg}))""".format(epsg=epsg), einleit)
+
+    consl.commit()
+    consl.close()
+
+    if einfile is not None:
+        _schreibeein(einfile, haltungen, schaechte, flaechen, tezg, abstand)
+
+    return dict(schaechte=len(schaechte), haltungen=len(haltungen), wehre=len(wehre),
+                tezg=len(tezg), flaechen=len(flaechen), einleit=len(einleit))
+
+
+def _schreibeein(einfile, haltungen, schaechte, flaechen, tezg, abstand):
+    """Schreibt die Haltungen (Typ 12), Auslässe (Typ 41), die Rauheit (Typ 05) und ein
+    Kreisprofil in eine DYNA-Datei. Die Flächen werden je Haltung summiert."""
+
+    flges = {}
+    for tz in tezg:
+        flges[tz[1]] = abstand * abstand / 10000.
+    flbef = {}
+    for fl, tz in zip(flaechen[::2], tezg):
+        flbef[tz[1]] = (fl[6] - fl[4]) * (fl[7] - fl[5]) / 10000.
+    schacht = dict((s[0], s) for s in schaechte)
+
+    with open(einfile, 'w') as df:
+        df.write(u'## Synthetisches QKan-Testprojekt ({} Haltungen)\n'.format(len(haltungen)))
+        df.write(u'++SCHL\n')
+        df.write(u'05 {id:1s} {mat:4s} {sp:10s}{kb:10.6f}\n'.format(id=DYNA_KS_KEY, mat=u'B', sp=u'', kb=KS))
+        df.write(u'++KANA\n')
+        auslaesse = []
+        for h in haltungen:
+            kn, hn = h[0].split(u'-')
+            fg = flges.get(h[0], 0.)
+            befgrad = int(round(min(99., 100. * flbef.get(h[0], 0.) / fg))) if fg > 0 else 0
+            df.write(u'12    {kn:>8s}{hn:>3s}{laenge:7s}{deckel:7s}{sob:7s}{sun:7s}0'.format(
+                         kn=kn, hn=hn, laenge=formf(h[4], 7), deckel=formf(h[7], 7),
+                         sob=formf(h[5], 7), sun=formf(h[6], 7)) +
+                     u'{pk:2s}{ph:4d}{ks:1s}{bg:2d}  3{qzu:5s}{ew:3d}{tg:5d}'.format(
+                         pk=DYNA_PROFIL_KEY, ph=int(h[3] * 1000), ks=DYNA_KS_KEY, bg=befgrad,
+                         qzu=formf(0., 5), ew=0, tg=0) +
+                     u'{fl:5s}1{ea:1d}0  {so:>12s} {su:>12s}{x:14s}{y:14s}\n'.format(
+                         fl=formf(fg, 5), ea=DYNA_ENTWART, so=h[1], su=h[2],
+                         x=formf(h[11], 14), y=formf(h[12], 14)))
+            if schacht[h[2]][6] == u'Auslass':
+                auslaesse.append((kn, hn, schacht[h[2]]))
+        df.write(u'++NETZ\n')
+        df.write(u'++DECK\n')
+        for kn, hn, s in auslaesse:
+            df.write(u'41    {kn:>8s}{hn:>3s}       {deckel:7s}{x:14s}{y:14s}{nam:>12s}\n'.format(
+                kn=kn, hn=hn, deckel=formf(s[4], 7), x=formf(s[1], 14), y=formf(s[2], 14), nam=s[0]))
+        df.write(u'++QUER\n')
+        df.write(u'Querprofile\n')
+        df.write(u'Kreisquerschnitt\n')
+        df.write(u'{}\n'.format(DYNA_PROFIL_KEY))
+        df.write(u'(0,0),\n')
+        df.write(u'(500,500,500),\n')
+        df.write(u'(0,1000,500),\n')
+        df.write(u'(-500,500,500),\n')
+        df.write(u'(0,0,500),\n')
+        df.write(u'++ENDE\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Erzeugt ein synthetisches QKan-Testprojekt')
+    parser.add_argument('datenbank')
+    parser.add_argument('anzahl', type=int)
+    parser.add_argument('--form', choices=[u'baum', u'raster'], default=u'baum')
+    parser.add_argument('--ein', default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--epsg', type=int, default=25832)
+    args = parser.parse_args()
+
+    anzahl = erzeugen(args.datenbank, args.anzahl, args.form, args.epsg, args.seed, args.ein)
+    print(u', '.join([u'{}: {}'.format(k, v) for k, v in sorted(anzahl.items())]))